@@ -5,27 +5,57 @@ For more details about this integration, please refer to
 https://github.com/pcartwright81/Home-Assistant-Here-Comes-The-Bus
 """
 
-from hcb_soap_client.hcb_soap_client import HcbSoapClient
+from functools import partial
+
 from homeassistant.const import (
     Platform,
 )
 from homeassistant.core import HomeAssistant
 from homeassistant.loader import async_get_loaded_integration
 
-from .coordinator import HCBDataCoordinator
-from .data import HCBConfigEntry, HCBData
+from .arrival_model import ArrivalModel
+from .cache import HCBCache
+from .client import POOL_LIMIT, POOL_LIMIT_PER_HOST, async_get_client_registry
+from .const import (
+    CONF_CAPTURE_RESPONSES,
+    CONF_PARSE_IN_EXECUTOR,
+    CONF_POOL_LIMIT,
+    CONF_POOL_LIMIT_PER_HOST,
+    DEFAULT_CAPTURE_RESPONSES,
+    DEFAULT_PARSE_IN_EXECUTOR,
+)
+from .coordinator import HCBDataCoordinator, HCBScheduleCoordinator
+from .data import HCBConfigEntry, HCBData, get_option
 
 PLATFORMS = [Platform.BINARY_SENSOR, Platform.DEVICE_TRACKER, Platform.SENSOR]
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: HCBConfigEntry) -> bool:
     """Set up Here Comes the Bus integration from a config entry."""
-    coordinator = HCBDataCoordinator(hass, entry)
+    registry = async_get_client_registry(hass)
+    options = {
+        "parse_in_executor": get_option(
+            entry, CONF_PARSE_IN_EXECUTOR, DEFAULT_PARSE_IN_EXECUTOR
+        ),
+        "capture": get_option(entry, CONF_CAPTURE_RESPONSES, DEFAULT_CAPTURE_RESPONSES),
+    }
+    client = registry.async_acquire(
+        **options,
+        limit=get_option(entry, CONF_POOL_LIMIT, POOL_LIMIT),
+        limit_per_host=get_option(entry, CONF_POOL_LIMIT_PER_HOST, POOL_LIMIT_PER_HOST),
+    )
+    # released when the entry is unloaded or when the setup fails.
+    entry.async_on_unload(partial(registry.async_release, **options))
+    schedule_coordinator = HCBScheduleCoordinator(hass, entry)
+    coordinator = HCBDataCoordinator(hass, entry, schedule_coordinator)
     entry.runtime_data = HCBData(
-        client=HcbSoapClient(),
+        client=client,
         integration=async_get_loaded_integration(hass, entry.domain),
         coordinator=coordinator,
+        schedule_coordinator=schedule_coordinator,
     )
+    # the location coordinator polls using the schedule, so it goes second.
+    await schedule_coordinator.async_config_entry_first_refresh()
     await coordinator.async_config_entry_first_refresh()
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     entry.async_on_unload(entry.add_update_listener(async_reload_entry))
@@ -37,9 +67,20 @@ async def async_unload_entry(
     entry: HCBConfigEntry,
 ) -> bool:
     """Handle removal of an entry."""
+    # the arrivals learned since the last save are not lost on a reload.
+    await entry.runtime_data.coordinator.arrivals.async_save()
     return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
 
 
+async def async_remove_entry(
+    hass: HomeAssistant,
+    entry: HCBConfigEntry,
+) -> None:
+    """Remove the cached data and learned arrivals of a deleted entry."""
+    await HCBCache(hass, entry.entry_id).async_remove()
+    await ArrivalModel(hass, entry.entry_id).async_remove()
+
+
 async def async_reload_entry(
     hass: HomeAssistant,
     entry: HCBConfigEntry,
@@ -0,0 +1,338 @@
+"""Learn when the buses really arrive from the trips they made."""
+
+from __future__ import annotations
+
+import math
+from bisect import insort
+from dataclasses import dataclass
+from datetime import time
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, LOGGER
+
+if TYPE_CHECKING:
+    from datetime import datetime
+
+    from homeassistant.core import HomeAssistant
+
+STORAGE_VERSION = 1
+
+# The arrivals are saved at most this often, in seconds.
+SAVE_DELAY = 60
+
+# The bus passes a place at its closest fix within this many meters.
+PASS_RADIUS = 250
+
+# The places of a trip whose arrivals are learned.
+PLACE_STOP = "stop"
+PLACE_SCHOOL = "school"
+
+# The quantiles kept of the arrivals, the bounds and the median.
+LOW_QUANTILE = 0.1
+MEDIAN_QUANTILE = 0.5
+HIGH_QUANTILE = 0.9
+QUANTILES = (LOW_QUANTILE, MEDIAN_QUANTILE, HIGH_QUANTILE)
+
+# Arrivals are only predicted from at least this many trips.
+MIN_SAMPLES = 3
+
+# The P² estimator keeps five markers.
+MARKERS = 5
+
+# The quantiles of up to this many arrivals are the exact ones, the markers
+# are placed once there are more. Their estimate of fewer is too coarse for
+# the bounds, with five all three quantiles are the middle arrival.
+EXACT_SAMPLES = 20
+
+
+class P2Quantile:
+    """
+    Estimate a quantile in constant memory with the P² algorithm.
+
+    Five markers follow the minimum, the maximum, the quantile and the
+    quantiles halfway to the extremes. Their heights are adjusted with a
+    piecewise parabolic fit as the observations come in. The first
+    EXACT_SAMPLES observations are kept and give the exact quantile, the
+    markers are placed in them once there are more and none is kept after.
+    """
+
+    def __init__(self, quantile: float) -> None:
+        """Initialize the markers of the quantile."""
+        self.quantile = quantile
+        self.count = 0
+        # the sorted observations, None once the markers are placed.
+        self.samples: list[float] | None = []
+        self.heights: list[float] = []
+        self.positions: list[int] = []
+        self._increments = (0, quantile / 2, quantile, (1 + quantile) / 2, 1)
+
+    def add(self, value: float) -> None:
+        """Add an observation."""
+        self.count += 1
+        if self.samples is not None:
+            insort(self.samples, value)
+            if self.count > EXACT_SAMPLES:
+                self._place_markers(self.samples)
+            return
+        heights = self.heights
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[-1]:
+            heights[-1] = value
+            cell = MARKERS - 2
+        else:
+            cell = next(i for i in range(MARKERS - 1) if value < heights[i + 1])
+        for i in range(cell + 1, MARKERS):
+            self.positions[i] += 1
+        for i in range(1, MARKERS - 1):
+            self._adjust(i)
+
+    def _place_markers(self, samples: list[float]) -> None:
+        """Place the markers at their desired positions in the observations."""
+        self.positions = [round(self._desired(i)) for i in range(MARKERS)]
+        self.heights = [samples[position - 1] for position in self.positions]
+        self.samples = None
+
+    def _desired(self, i: int) -> float:
+        """Return the desired position of a marker."""
+        return 1 + (self.count - 1) * self._increments[i]
+
+    def _adjust(self, i: int) -> None:
+        """Move a middle marker towards its desired position."""
+        heights, positions = self.heights, self.positions
+        desired = self._desired(i)
+        offset = desired - positions[i]
+        if not (
+            (offset >= 1 and positions[i + 1] - positions[i] > 1)
+            or (offset <= -1 and positions[i - 1] - positions[i] < -1)
+        ):
+            return
+        step = 1 if offset > 0 else -1
+        parabolic = heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + step)
+            * (heights[i + 1] - heights[i])
+            / (positions[i + 1] - positions[i])
+            + (positions[i + 1] - positions[i] - step)
+            * (heights[i] - heights[i - 1])
+            / (positions[i] - positions[i - 1])
+        )
+        if heights[i - 1] < parabolic < heights[i + 1]:
+            heights[i] = parabolic
+        else:
+            heights[i] += (
+                step
+                * (heights[i + step] - heights[i])
+                / (positions[i + step] - positions[i])
+            )
+        positions[i] += step
+
+    def value(self) -> float | None:
+        """Return the estimate of the quantile, None without observations."""
+        if not self.count:
+            return None
+        if self.samples is not None:
+            rank = max(math.ceil(self.quantile * self.count), 1)
+            return self.samples[rank - 1]
+        return self.heights[2]
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the observations or the markers to store."""
+        return {
+            "count": self.count,
+            "samples": self.samples,
+            "heights": self.heights,
+            "positions": self.positions,
+        }
+
+    @classmethod
+    def from_dict(cls, quantile: float, stored: dict[str, Any]) -> P2Quantile:
+        """Return the estimator of the stored observations or markers."""
+        estimator = cls(quantile)
+        estimator.count = stored["count"]
+        if stored["samples"] is not None:
+            estimator.samples = list(stored["samples"])
+        else:
+            estimator.samples = None
+        estimator.heights = list(stored["heights"])
+        estimator.positions = list(stored["positions"])
+        return estimator
+
+
+class RunningStats:
+    """Mean and variance by Welford's method, and the quantiles by P²."""
+
+    def __init__(self) -> None:
+        """Initialize the statistics."""
+        self.count = 0
+        self.mean = 0.0
+        self._squares = 0.0
+        self.quantiles = {quantile: P2Quantile(quantile) for quantile in QUANTILES}
+
+    def add(self, value: float) -> None:
+        """Add an observation."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._squares += delta * (value - self.mean)
+        for estimator in self.quantiles.values():
+            estimator.add(value)
+
+    @property
+    def variance(self) -> float:
+        """Return the sample variance, zero before there are two."""
+        if self.count < 2:  # noqa: PLR2004
+            return 0.0
+        return self._squares / (self.count - 1)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the statistics to store."""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "squares": self._squares,
+            "quantiles": [self.quantiles[quantile].as_dict() for quantile in QUANTILES],
+        }
+
+    @classmethod
+    def from_dict(cls, stored: dict[str, Any]) -> RunningStats:
+        """Return the stored statistics."""
+        stats = cls()
+        stats.count = stored["count"]
+        stats.mean = stored["mean"]
+        stats._squares = stored["squares"]
+        stats.quantiles = {
+            quantile: P2Quantile.from_dict(quantile, markers)
+            for quantile, markers in zip(QUANTILES, stored["quantiles"], strict=True)
+        }
+        return stats
+
+
+@dataclass(frozen=True)
+class ArrivalPrediction:
+    """The predicted arrival at a place, between the low and high bounds."""
+
+    arrival: time
+    low: time
+    high: time
+    mean: time
+    std_dev: float
+    samples: int
+
+
+def _seconds(value: datetime) -> float:
+    """Return the seconds since the local midnight of the time."""
+    local = dt_util.as_local(value)
+    return local.hour * 3600 + local.minute * 60 + local.second
+
+
+def _time(seconds: float) -> time:
+    """Return the time of the seconds since midnight, within the day."""
+    seconds = min(max(round(seconds), 0), 24 * 3600 - 1)
+    return time(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class ArrivalModel:
+    """
+    The arrivals of the buses at the stops and schools of the students.
+
+    The closest fix of a bus within the pass radius of a place is when it
+    arrived there. The arrivals are kept per student, time of day, place and
+    weekday as running statistics, so memory does not grow with the trips,
+    and they are saved in a store of the config entry.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        """Initialize the model."""
+        self._store: Store[dict[str, Any]] = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.arrivals"
+        )
+        self._stats: dict[str, RunningStats] = {}
+        # the closest fix to each place so far during the current window.
+        self._approaches: dict[tuple[str, str, str], tuple[float, datetime]] = {}
+
+    async def async_load(self) -> None:
+        """Load the stored arrivals."""
+        stored = await self._store.async_load()
+        if not stored:
+            return
+        self._stats = {
+            key: RunningStats.from_dict(stats)
+            for key, stats in stored["arrivals"].items()
+        }
+
+    async def async_save(self) -> None:
+        """Save the arrivals now, rather than after the delay."""
+        await self._store.async_save(self._data_to_save())
+
+    async def async_remove(self) -> None:
+        """Remove the stored arrivals."""
+        await self._store.async_remove()
+
+    def observe(
+        self,
+        student_id: str,
+        time_of_day_id: str,
+        place: str,
+        meters: float,
+        log_time: datetime,
+    ) -> None:
+        """
+        Observe the distance of a fix to a place.
+
+        The arrival is recorded once the bus leaves the pass radius, at the
+        first of its closest fixes.
+        """
+        key = (student_id, time_of_day_id, place)
+        if meters <= PASS_RADIUS:
+            closest = self._approaches.get(key)
+            if closest is None or meters < closest[0]:
+                self._approaches[key] = (meters, log_time)
+        elif key in self._approaches:
+            self._record(key, self._approaches.pop(key)[1])
+
+    def finish(self, student_id: str) -> None:
+        """Record the arrivals of the student's bus still within the radius."""
+        for key in [key for key in self._approaches if key[0] == student_id]:
+            self._record(key, self._approaches.pop(key)[1])
+
+    def _record(self, key: tuple[str, str, str], log_time: datetime) -> None:
+        """Add an arrival to the statistics of its weekday and save them."""
+        weekday = dt_util.as_local(log_time).weekday()
+        stats = self._stats.setdefault(_key(*key, weekday), RunningStats())
+        stats.add(_seconds(log_time))
+        LOGGER.debug("Bus of %s arrived at the %s at %s", key[0], key[2], log_time)
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    def _data_to_save(self) -> dict[str, Any]:
+        """Return the arrivals to store."""
+        return {
+            "arrivals": {key: stats.as_dict() for key, stats in self._stats.items()}
+        }
+
+    def predict(
+        self, student_id: str, time_of_day_id: str, place: str, weekday: int
+    ) -> ArrivalPrediction | None:
+        """Return the predicted arrival on the weekday, None without enough trips."""
+        stats = self._stats.get(_key(student_id, time_of_day_id, place, weekday))
+        if stats is None or stats.count < MIN_SAMPLES:
+            return None
+        low, median, high = (
+            stats.quantiles[quantile].value() for quantile in QUANTILES
+        )
+        return ArrivalPrediction(
+            arrival=_time(median),
+            low=_time(low),
+            high=_time(high),
+            mean=_time(stats.mean),
+            std_dev=math.sqrt(stats.variance),
+            samples=stats.count,
+        )
+
+
+def _key(student_id: str, time_of_day_id: str, place: str, weekday: int) -> str:
+    """Return the key of the statistics of the arrivals."""
+    return f"{student_id}/{time_of_day_id}/{place}/{weekday}"
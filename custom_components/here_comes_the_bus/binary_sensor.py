@@ -7,7 +7,7 @@ from homeassistant.components.binary_sensor import (
     BinarySensorEntity,
     BinarySensorEntityDescription,
 )
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
 from .coordinator import HCBDataCoordinator
@@ -55,6 +55,13 @@ ENTITY_DESCRIPTIONS: tuple[HCBBinarySensorEntityDescription, ...] = (
         icon_on="mdi:flag",
         value_fn=lambda x: _message_code_to_bool(x.message_code),
     ),
+    HCBBinarySensorEntityDescription(
+        key="bus_near",
+        name="Near stop",
+        icon="mdi:bus-stop",
+        icon_on="mdi:bus-alert",
+        value_fn=lambda x: x.bus_near,
+    ),
 )
 
 
@@ -98,10 +105,3 @@ class HCBBinarySensor(HCBEntity, BinarySensorEntity):
         if self._is_on:
             return self.entity_description.icon_on
         return self.entity_description.icon
-
-    @callback
-    def _handle_coordinator_update(self) -> None:
-        """Handle updated data from the coordinator."""
-        if self.student.student_id in self.coordinator.data:
-            self.student = self.coordinator.data[self.student.student_id]
-            self.async_write_ha_state()
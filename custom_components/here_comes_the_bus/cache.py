@@ -0,0 +1,165 @@
+"""Cache the account and schedule data of an entry across restarts."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, LOGGER
+from .data import StudentData
+
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+
+STORAGE_VERSION = 2
+CACHE_TTL = timedelta(days=7)
+
+# The student data fields that are saved, everything else comes from polling.
+SCHEDULE_FIELDS = (
+    "has_mid_stops",
+    "am_start_time",
+    "am_end_time",
+    "am_school_arrival_time",
+    "am_school_latitude",
+    "am_school_longitude",
+    "am_stop_arrival_time",
+    "am_stop_latitude",
+    "am_stop_longitude",
+    "mid_start_time",
+    "mid_end_time",
+    "mid_school_arrival_time",
+    "mid_school_latitude",
+    "mid_school_longitude",
+    "mid_stop_arrival_time",
+    "mid_stop_latitude",
+    "mid_stop_longitude",
+    "pm_start_time",
+    "pm_end_time",
+    "pm_school_arrival_time",
+    "pm_school_latitude",
+    "pm_school_longitude",
+    "pm_stop_arrival_time",
+    "pm_stop_latitude",
+    "pm_stop_longitude",
+)
+
+
+@dataclass
+class CachedSchedule:
+    """The account and schedule data loaded from the cache."""
+
+    school_id: str
+    parent_id: str
+    time_of_day_ids: list[str]
+    students: dict[str, StudentData]
+    saved_at: datetime
+    # False when some stops could not be fetched, they keep their last value.
+    complete: bool
+
+
+class _CacheStore(Store[dict[str, Any]]):
+    """Store that discards data saved with another schema version."""
+
+    async def _async_migrate_func(
+        self,
+        old_major_version: int,
+        old_minor_version: int,
+        old_data: dict[str, Any],  # noqa: ARG002
+    ) -> dict[str, Any]:
+        """Drop the cached data, it is fetched again instead of migrated."""
+        LOGGER.debug(
+            "Discarding cache with schema version %s.%s",
+            old_major_version,
+            old_minor_version,
+        )
+        return {}
+
+
+def _encode(value: Any) -> Any:
+    """Encode a student data value for JSON."""
+    if isinstance(value, time):
+        return value.isoformat()
+    return value
+
+
+def _decode(name: str, value: Any) -> Any:
+    """Decode a student data value from JSON."""
+    if value is not None and name.endswith("_time"):
+        return time.fromisoformat(value)
+    return value
+
+
+class HCBCache:
+    """Cache of the account and schedule data of a config entry."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        """Initialize the cache."""
+        self._store = _CacheStore(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}")
+
+    async def async_load(self) -> CachedSchedule | None:
+        """Return the cached schedule, or None if it is missing or expired."""
+        stored = await self._store.async_load()
+        if not stored:
+            return None
+        saved_at = dt_util.parse_datetime(stored["saved_at"])
+        if saved_at is None or dt_util.utcnow() - saved_at > CACHE_TTL:
+            LOGGER.debug("Cached schedule has expired")
+            return None
+        return CachedSchedule(
+            school_id=stored["school_id"],
+            parent_id=stored["parent_id"],
+            time_of_day_ids=stored["time_of_day_ids"],
+            students={
+                student["student_id"]: StudentData(
+                    first_name=student["first_name"],
+                    student_id=student["student_id"],
+                    **{
+                        name: _decode(name, student[name])
+                        for name in SCHEDULE_FIELDS
+                        if name in student
+                    },
+                )
+                for student in stored["students"]
+            },
+            saved_at=saved_at,
+            complete=stored["complete"],
+        )
+
+    async def async_save(
+        self,
+        school_id: str,
+        parent_id: str,
+        time_of_day_ids: list[str],
+        students: dict[str, StudentData],
+        *,
+        complete: bool = True,
+    ) -> None:
+        """Save the account and schedule data, complete unless stops failed."""
+        await self._store.async_save(
+            {
+                "school_id": school_id,
+                "parent_id": parent_id,
+                "time_of_day_ids": time_of_day_ids,
+                "students": [
+                    {
+                        "first_name": student_data.first_name,
+                        "student_id": student_data.student_id,
+                        **{
+                            name: _encode(getattr(student_data, name))
+                            for name in SCHEDULE_FIELDS
+                        },
+                    }
+                    for student_data in students.values()
+                ],
+                "saved_at": dt_util.utcnow().isoformat(),
+                "complete": complete,
+            }
+        )
+
+    async def async_remove(self) -> None:
+        """Remove the cached data."""
+        await self._store.async_remove()
@@ -0,0 +1,121 @@
+"""Capture the responses of the HCB api, so a session can be replayed later."""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, LOGGER
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+# The capture of every config entry is appended to this file in the config dir.
+CAPTURE_FILE = f"{DOMAIN}.capture.jsonl.gz"
+
+# The credentials sent to these methods are never written to the capture.
+CREDENTIAL_PARAMS = {"s1157": frozenset({"P2", "P3"})}
+
+
+@dataclass(frozen=True)
+class CapturedResponse:
+    """A response of the api and when it was received."""
+
+    time: datetime
+    method: str
+    params: dict[str, str]
+    response: str
+
+
+class ResponseCapture:
+    """
+    Append the responses of the api to a gzip compressed JSON lines file.
+
+    The responses are written in the executor, in the order they were
+    received. Every flush appends a new gzip member, so the file stays
+    readable when Home Assistant stops halfway through a write.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        """Initialize the capture."""
+        self._path = path
+        self._pending: list[str] = []
+        self._flush_task: asyncio.Task[None] | None = None
+
+    def record(
+        self, method: str, params: list[tuple[str, str]], response_text: str
+    ) -> None:
+        """Record a response and write it in the background."""
+        redacted = CREDENTIAL_PARAMS.get(method, frozenset())
+        self._pending.append(
+            json.dumps(
+                {
+                    "time": dt_util.utcnow().isoformat(),
+                    "method": method,
+                    "params": {
+                        name: value for name, value in params if name not in redacted
+                    },
+                    "response": response_text,
+                },
+                separators=(",", ":"),
+            )
+        )
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(
+                self._async_flush(), name=f"{DOMAIN} capture"
+            )
+
+    async def _async_flush(self) -> None:
+        """Write the pending responses until there are none left."""
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                lines, self._pending = self._pending, []
+                await loop.run_in_executor(None, _append, self._path, lines)
+        except OSError as err:
+            LOGGER.warning("Unable to write the capture to %s: %s", self._path, err)
+            self._pending.clear()
+        finally:
+            self._flush_task = None
+
+    async def async_close(self) -> None:
+        """Wait until every recorded response was written."""
+        if self._flush_task is not None:
+            await self._flush_task
+
+
+def _append(path: str | Path, lines: list[str]) -> None:
+    """Append the lines to the capture as a new gzip member."""
+    with gzip.open(path, "at", encoding="utf-8") as file:
+        file.writelines(f"{line}\n" for line in lines)
+
+
+def load_capture(path: str | Path) -> list[CapturedResponse]:
+    """
+    Return the responses of a capture, in the order they were received.
+
+    A write that was cut off at the end of the file is skipped.
+    """
+    responses: list[CapturedResponse] = []
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                captured = json.loads(line)
+                responses.append(
+                    CapturedResponse(
+                        time=datetime.fromisoformat(captured["time"]),
+                        method=captured["method"],
+                        params=captured["params"],
+                        response=captured["response"],
+                    )
+                )
+        except (EOFError, zlib.error, json.JSONDecodeError) as err:
+            LOGGER.debug("Capture %s ends with a partial write: %s", path, err)
+    return responses
@@ -0,0 +1,349 @@
+"""Share one HCB client and its pooled HTTP session across the integration."""
+
+from __future__ import annotations
+
+import asyncio
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+import aiohttp
+from hcb_soap_client import xpath_attr
+from hcb_soap_client.account_response import AccountResponse
+from hcb_soap_client.hcb_soap_client import APP_VERSION, HcbSoapClient
+from hcb_soap_client.stop_response import StopResponse
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import callback
+from homeassistant.util.hass_dict import HassKey
+from homeassistant.util.ssl import get_default_context
+from lxml import etree
+
+from .capture import CAPTURE_FILE, ResponseCapture
+from .const import DOMAIN, LOGGER
+from .metrics import RequestMetrics, timed_parse
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+    from homeassistant.core import Event, HomeAssistant
+
+DATA_CLIENT_REGISTRY: HassKey[HCBClientRegistry] = HassKey(DOMAIN)
+
+# Default limits of the connection pool shared by every config entry.
+POOL_LIMIT = 10
+POOL_LIMIT_PER_HOST = 4
+# Keep idle connections open for longer than the default poll interval, so
+# the next poll reuses the connection instead of paying a new TLS handshake.
+POOL_KEEPALIVE_TIMEOUT = 60
+
+# The SOAP methods of the HCB api. The methods and params are those of the
+# pinned hcb_soap_client release, the tests check them against its public
+# methods.
+SCHOOL_ID_METHOD = "s1100"
+PARENT_INFO_METHOD = "s1157"
+STOP_INFO_METHOD = "s1158"
+
+
+type StopKey = tuple[str, str, str, str]
+
+
+def _parse_school_id(response_text: str) -> str:
+    """Return the school id of the response to the school code."""
+    root = etree.fromstring(response_text.encode())
+    return xpath_attr(root, "//*[local-name()='Customer']/@ID")
+
+
+class HCBClient(HcbSoapClient):
+    """
+    HCB client that shares concurrent stop requests.
+
+    Callers asking for the stops of the same student and time of day while
+    a request is in flight await that request instead of sending their own.
+    The request is cancelled once every caller awaiting it was cancelled.
+    The network and parse time of every call is recorded, also to the
+    metrics of the caller when it passes its own, and the responses can be
+    parsed in the executor instead of on the event loop. While a
+    capture is set, every response is written to it.
+    """
+
+    def __init__(
+        self,
+        url: str | None = None,
+        session: aiohttp.ClientSession | None = None,
+    ) -> None:
+        """Create an instance of the client."""
+        super().__init__(url, session)
+        self._in_flight: dict[StopKey, asyncio.Task[StopResponse]] = {}
+        self._waiters: dict[asyncio.Task[StopResponse], int] = {}
+        self.metrics = RequestMetrics()
+        self.parse_in_executor = False
+        self.capture: ResponseCapture | None = None
+
+    def use_session(self, session: aiohttp.ClientSession) -> None:
+        """Send the next requests with the session."""
+        self._session = session
+
+    async def get_school_id(
+        self, school_code: str, *, metrics: RequestMetrics | None = None
+    ) -> str:
+        """Return the school ID from the api."""
+        return await self._async_call(
+            SCHOOL_ID_METHOD, [("P1", school_code)], _parse_school_id, metrics
+        )
+
+    async def get_parent_info(
+        self,
+        school_id: str,
+        username: str,
+        password: str,
+        *,
+        metrics: RequestMetrics | None = None,
+    ) -> AccountResponse:
+        """Return the user info from the api."""
+        return await self._async_call(
+            PARENT_INFO_METHOD,
+            [
+                ("P1", school_id),
+                ("P2", username),
+                ("P3", password),
+                ("P4", "LookupItem_Source_Android"),
+                ("P5", "Android"),
+                ("P6", APP_VERSION),
+                ("P7", ""),
+            ],
+            AccountResponse.from_text,
+            metrics,
+        )
+
+    async def get_stop_info(
+        self,
+        school_id: str,
+        parent_id: str,
+        student_id: str,
+        time_of_day_id: str,
+        *,
+        metrics: RequestMetrics | None = None,
+    ) -> StopResponse:
+        """
+        Return the bus stop info, sharing the request with other callers.
+
+        A shared request is counted in the metrics of the caller that sent it.
+        """
+        key = (school_id, parent_id, student_id, time_of_day_id)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(
+                self._async_call(
+                    STOP_INFO_METHOD,
+                    [
+                        ("P1", school_id),
+                        ("P2", parent_id),
+                        ("P3", student_id),
+                        ("P4", time_of_day_id),
+                        ("P5", "true"),
+                        ("P6", "false"),
+                        ("P7", "10"),
+                        ("P8", "14"),
+                        ("P9", "english"),
+                    ],
+                    StopResponse.from_text,
+                    metrics,
+                ),
+                name=f"{DOMAIN} stop info",
+            )
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._async_forget(key, done))
+        # a caller that is cancelled must not cancel the request of the others.
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                # nobody is waiting for the response any more, the next
+                # caller sends a new request.
+                if not task.done():
+                    if self._in_flight.get(key) is task:
+                        del self._in_flight[key]
+                    task.cancel()
+
+    async def _async_call[T](
+        self,
+        method: str,
+        params: list[tuple[str, str]],
+        parse: Callable[[str], T],
+        metrics: RequestMetrics | None = None,
+    ) -> T:
+        """Call an api method and parse the response, timing both."""
+        recorders = [self.metrics] if metrics is None else [self.metrics, metrics]
+        start = perf_counter()
+        try:
+            response_text = await self._request(method, params)
+            network = perf_counter() - start
+            if self.capture is not None:
+                self.capture.record(method, params, response_text)
+            if self.parse_in_executor:
+                result, parse_time = await asyncio.get_running_loop().run_in_executor(
+                    None, timed_parse, parse, response_text
+                )
+            else:
+                result, parse_time = timed_parse(parse, response_text)
+        except Exception:
+            for recorder in recorders:
+                recorder.record_error(method)
+            raise
+        for recorder in recorders:
+            recorder.record(
+                method,
+                network,
+                parse_time,
+                on_loop=not self.parse_in_executor,
+                size=len(response_text),
+            )
+        return result
+
+    @callback
+    def _async_forget(self, key: StopKey, task: asyncio.Task[StopResponse]) -> None:
+        """Forget a finished request, so the next caller sends a new one."""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # mark the error as retrieved when every caller was cancelled.
+            task.exception()
+
+
+class HCBClientRegistry:
+    """
+    Reference counted HCB client shared by the config entries and flows.
+
+    The session is created when the first user acquires the client and is
+    closed when the last user releases it or Home Assistant closes. Its pool
+    has the largest limits asked for by the users. The responses are captured
+    to the capture path while any user asks for it.
+    """
+
+    def __init__(
+        self,
+        *,
+        limit: int = POOL_LIMIT,
+        limit_per_host: int = POOL_LIMIT_PER_HOST,
+        keepalive_timeout: float = POOL_KEEPALIVE_TIMEOUT,
+        capture_path: str | Path | None = None,
+    ) -> None:
+        """Initialize the registry."""
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._session: aiohttp.ClientSession | None = None
+        self._session_limits: tuple[int, int] | None = None
+        # replaced sessions, closed with the shared one.
+        self._retired: list[aiohttp.ClientSession] = []
+        self._client: HCBClient | None = None
+        self._users = 0
+        self._executor_users = 0
+        self._capture_path = capture_path
+        self._capture_users = 0
+
+    @callback
+    def async_acquire(
+        self,
+        *,
+        parse_in_executor: bool = False,
+        capture: bool = False,
+        limit: int | None = None,
+        limit_per_host: int | None = None,
+    ) -> HCBClient:
+        """
+        Return the shared client, creating the session for the first user.
+
+        The session is replaced by one with a larger pool when a user asks
+        for larger limits than the users before it, the requests in flight
+        finish on the replaced session. Responses are parsed in the executor
+        and captured while any user asks for it.
+        """
+        limits = (
+            self._limit if limit is None else limit,
+            self._limit_per_host if limit_per_host is None else limit_per_host,
+        )
+        if self._session_limits is not None:
+            limits = (
+                max(limits[0], self._session_limits[0]),
+                max(limits[1], self._session_limits[1]),
+            )
+        if limits != self._session_limits:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=limits[0],
+                    limit_per_host=limits[1],
+                    keepalive_timeout=self._keepalive_timeout,
+                    ssl=get_default_context(),
+                )
+            )
+            if self._session is not None:
+                self._retired.append(self._session)
+            self._session = session
+            self._session_limits = limits
+            if self._client is None:
+                self._client = HCBClient(session=session)
+            else:
+                self._client.use_session(session)
+            LOGGER.debug("Created the shared HCB session with the limits %s", limits)
+        self._users += 1
+        self._executor_users += parse_in_executor
+        self._client.parse_in_executor = self._executor_users > 0
+        self._capture_users += capture
+        if (
+            self._capture_users > 0
+            and self._capture_path is not None
+            and self._client.capture is None
+        ):
+            self._client.capture = ResponseCapture(self._capture_path)
+            LOGGER.info("Capturing the HCB responses to %s", self._capture_path)
+        return self._client
+
+    async def async_release(
+        self, *, parse_in_executor: bool = False, capture: bool = False
+    ) -> None:
+        """Release the client, closing the session after the last user."""
+        self._users -= 1
+        self._executor_users -= parse_in_executor
+        self._capture_users -= capture
+        if self._client is not None:
+            self._client.parse_in_executor = self._executor_users > 0
+            if self._capture_users == 0:
+                await self._async_close_capture()
+        if self._users == 0:
+            await self.async_close()
+
+    async def async_close(self, _: Event | None = None) -> None:
+        """Close the session and the capture, also while users remain."""
+        await self._async_close_capture()
+        if self._session is None:
+            return
+        sessions = [*self._retired, self._session]
+        self._retired = []
+        self._session = None
+        self._session_limits = None
+        self._client = None
+        for session in sessions:
+            await session.close()
+        LOGGER.debug("Closed the shared HCB session")
+
+    async def _async_close_capture(self) -> None:
+        """Stop capturing the responses."""
+        if self._client is not None and self._client.capture is not None:
+            response_capture = self._client.capture
+            self._client.capture = None
+            await response_capture.async_close()
+
+
+@callback
+def async_get_client_registry(hass: HomeAssistant) -> HCBClientRegistry:
+    """Return the client registry of the integration."""
+    if DATA_CLIENT_REGISTRY not in hass.data:
+        registry = HCBClientRegistry(capture_path=hass.config.path(CAPTURE_FILE))
+        # the entries are not unloaded when Home Assistant stops.
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, registry.async_close)
+        hass.data[DATA_CLIENT_REGISTRY] = registry
+    return hass.data[DATA_CLIENT_REGISTRY]
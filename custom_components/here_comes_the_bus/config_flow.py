@@ -1,18 +1,56 @@
 """Adds config flow for Here comes the bus."""
 
+from __future__ import annotations
+
 import homeassistant.helpers.config_validation as cv
 import voluptuous as vol
-from hcb_soap_client.hcb_soap_client import HcbSoapClient
 from homeassistant import config_entries
 from homeassistant.auth.providers.homeassistant import InvalidAuth
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import callback
 
+from .client import POOL_LIMIT, POOL_LIMIT_PER_HOST, async_get_client_registry
 from .const import (
+    CONF_CALL_TIMEOUT,
+    CONF_CAPTURE_RESPONSES,
+    CONF_CLOSURE_KEYWORDS,
+    CONF_EARLY_RELEASE_KEYWORD,
+    CONF_MAX_CONCURRENT_REQUESTS,
+    CONF_MAX_STALE_AGE,
+    CONF_MAX_UPDATE_INTERVAL,
+    CONF_MIN_UPDATE_INTERVAL,
+    CONF_PARSE_IN_EXECUTOR,
+    CONF_POLLING_MODE,
+    CONF_POOL_LIMIT,
+    CONF_POOL_LIMIT_PER_HOST,
+    CONF_PROXIMITY_RADIUS,
+    CONF_SCHOOL_CALENDAR,
     CONF_SCHOOL_CODE,
+    CONF_STALE_WHILE_REVALIDATE,
+    CONF_TICK_BUDGET,
+    CONF_TRACKER_MIN_DISTANCE,
+    CONF_TRACKER_MIN_INTERVAL,
     CONF_UPDATE_INTERVAL,
+    DEFAULT_CALL_TIMEOUT,
+    DEFAULT_CAPTURE_RESPONSES,
+    DEFAULT_CLOSURE_KEYWORDS,
+    DEFAULT_EARLY_RELEASE_KEYWORD,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    DEFAULT_MAX_STALE_AGE,
+    DEFAULT_MAX_UPDATE_INTERVAL,
+    DEFAULT_MIN_UPDATE_INTERVAL,
+    DEFAULT_PARSE_IN_EXECUTOR,
+    DEFAULT_PROXIMITY_RADIUS,
+    DEFAULT_STALE_WHILE_REVALIDATE,
+    DEFAULT_TICK_BUDGET,
+    DEFAULT_TRACKER_MIN_DISTANCE,
+    DEFAULT_TRACKER_MIN_INTERVAL,
     DOMAIN,
     HERE_COMES_THE_BUS,
     LOGGER,
+    MIN_POLL_INTERVAL,
+    POLLING_MODE_ADAPTIVE,
+    POLLING_MODE_FIXED,
 )
 
 TITLE = HERE_COMES_THE_BUS
@@ -21,7 +59,65 @@ DATA_SCHEMA = vol.Schema(
         vol.Required(CONF_USERNAME): cv.string,
         vol.Required(CONF_PASSWORD): cv.string,
         vol.Required(CONF_SCHOOL_CODE): cv.string,
-        vol.Optional(CONF_UPDATE_INTERVAL, default=20): cv.positive_int,
+    }
+)
+OPTIONS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_UPDATE_INTERVAL, default=20): vol.All(
+            vol.Coerce(int), vol.Range(min=MIN_POLL_INTERVAL)
+        ),
+        vol.Optional(
+            CONF_MAX_CONCURRENT_REQUESTS, default=DEFAULT_MAX_CONCURRENT_REQUESTS
+        ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Optional(CONF_POOL_LIMIT, default=POOL_LIMIT): vol.All(
+            vol.Coerce(int), vol.Range(min=1)
+        ),
+        vol.Optional(CONF_POOL_LIMIT_PER_HOST, default=POOL_LIMIT_PER_HOST): vol.All(
+            vol.Coerce(int), vol.Range(min=1)
+        ),
+        vol.Optional(CONF_POLLING_MODE, default=POLLING_MODE_FIXED): vol.In(
+            [POLLING_MODE_FIXED, POLLING_MODE_ADAPTIVE]
+        ),
+        vol.Optional(
+            CONF_MIN_UPDATE_INTERVAL, default=DEFAULT_MIN_UPDATE_INTERVAL
+        ): vol.All(vol.Coerce(int), vol.Range(min=MIN_POLL_INTERVAL)),
+        vol.Optional(
+            CONF_MAX_UPDATE_INTERVAL, default=DEFAULT_MAX_UPDATE_INTERVAL
+        ): vol.All(vol.Coerce(int), vol.Range(min=MIN_POLL_INTERVAL)),
+        vol.Optional(
+            CONF_PARSE_IN_EXECUTOR, default=DEFAULT_PARSE_IN_EXECUTOR
+        ): cv.boolean,
+        vol.Optional(
+            CONF_CAPTURE_RESPONSES, default=DEFAULT_CAPTURE_RESPONSES
+        ): cv.boolean,
+        vol.Optional(CONF_SCHOOL_CALENDAR, default=""): cv.string,
+        vol.Optional(
+            CONF_EARLY_RELEASE_KEYWORD, default=DEFAULT_EARLY_RELEASE_KEYWORD
+        ): cv.string,
+        vol.Optional(
+            CONF_CLOSURE_KEYWORDS, default=DEFAULT_CLOSURE_KEYWORDS
+        ): cv.string,
+        vol.Optional(
+            CONF_STALE_WHILE_REVALIDATE, default=DEFAULT_STALE_WHILE_REVALIDATE
+        ): cv.boolean,
+        vol.Optional(
+            CONF_MAX_STALE_AGE, default=DEFAULT_MAX_STALE_AGE
+        ): cv.positive_int,
+        vol.Optional(CONF_CALL_TIMEOUT, default=DEFAULT_CALL_TIMEOUT): vol.All(
+            vol.Coerce(int), vol.Range(min=1)
+        ),
+        vol.Optional(CONF_TICK_BUDGET, default=DEFAULT_TICK_BUDGET): vol.All(
+            vol.Coerce(int), vol.Range(min=1)
+        ),
+        vol.Optional(
+            CONF_PROXIMITY_RADIUS, default=DEFAULT_PROXIMITY_RADIUS
+        ): cv.positive_int,
+        vol.Optional(
+            CONF_TRACKER_MIN_INTERVAL, default=DEFAULT_TRACKER_MIN_INTERVAL
+        ): cv.positive_int,
+        vol.Optional(
+            CONF_TRACKER_MIN_DISTANCE, default=DEFAULT_TRACKER_MIN_DISTANCE
+        ): cv.positive_int,
     }
 )
 
@@ -31,6 +127,14 @@ class HCBConfigFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        _: config_entries.ConfigEntry,
+    ) -> HCBOptionsFlowHandler:
+        """Return the options flow of an entry."""
+        return HCBOptionsFlowHandler()
+
     async def async_step_user(
         self,
         user_input: dict | None = None,
@@ -59,11 +163,46 @@ class HCBConfigFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
 
     async def test_credentials(self, user_input: dict) -> bool:
         """Validate credentials."""
-        client = HcbSoapClient()
-        school_id = await client.get_school_id(user_input[CONF_SCHOOL_CODE])
-        account_info = await client.get_parent_info(
-            school_id=school_id,
-            username=user_input[CONF_USERNAME],
-            password=user_input[CONF_PASSWORD],
-        )
+        registry = async_get_client_registry(self.hass)
+        client = registry.async_acquire()
+        try:
+            school_id = await client.get_school_id(user_input[CONF_SCHOOL_CODE])
+            account_info = await client.get_parent_info(
+                school_id=school_id,
+                username=user_input[CONF_USERNAME],
+                password=user_input[CONF_PASSWORD],
+            )
+        finally:
+            await registry.async_release()
         return account_info.account_id != ""
+
+
+class HCBOptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle the options of an entry, tuning how the buses are polled."""
+
+    async def async_step_init(
+        self,
+        user_input: dict | None = None,
+    ) -> config_entries.ConfigFlowResult:
+        """Manage the options."""
+        _errors = {}
+        if user_input is not None:
+            if (
+                user_input[CONF_MIN_UPDATE_INTERVAL]
+                > user_input[CONF_MAX_UPDATE_INTERVAL]
+            ):
+                _errors[CONF_MIN_UPDATE_INTERVAL] = "min_above_max"
+            else:
+                return self.async_create_entry(data=user_input)
+
+        # entries set up before the options flow keep their options in the data.
+        values = {
+            **self.config_entry.data,
+            **self.config_entry.options,
+            **(user_input or {}),
+        }
+        return self.async_show_form(
+            step_id="init",
+            data_schema=self.add_suggested_values_to_schema(OPTIONS_SCHEMA, values),
+            errors=_errors,
+        )
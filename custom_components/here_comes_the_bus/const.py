@@ -16,3 +16,50 @@ HMS = "%H:%M:%S"
 # configuration
 CONF_SCHOOL_CODE = "school_code"
 CONF_UPDATE_INTERVAL = "update_interval"
+CONF_MAX_CONCURRENT_REQUESTS = "max_concurrent_requests"
+CONF_POOL_LIMIT = "pool_limit"
+CONF_POOL_LIMIT_PER_HOST = "pool_limit_per_host"
+CONF_POLLING_MODE = "polling_mode"
+CONF_MIN_UPDATE_INTERVAL = "min_update_interval"
+CONF_MAX_UPDATE_INTERVAL = "max_update_interval"
+CONF_PARSE_IN_EXECUTOR = "parse_in_executor"
+CONF_CAPTURE_RESPONSES = "capture_responses"
+CONF_SCHOOL_CALENDAR = "school_calendar"
+CONF_EARLY_RELEASE_KEYWORD = "early_release_keyword"
+CONF_CLOSURE_KEYWORDS = "closure_keywords"
+CONF_STALE_WHILE_REVALIDATE = "stale_while_revalidate"
+CONF_MAX_STALE_AGE = "max_stale_age"
+CONF_CALL_TIMEOUT = "call_timeout"
+CONF_TICK_BUDGET = "tick_budget"
+CONF_PROXIMITY_RADIUS = "proximity_radius"
+CONF_TRACKER_MIN_INTERVAL = "tracker_min_interval"
+CONF_TRACKER_MIN_DISTANCE = "tracker_min_distance"
+
+# polling modes
+POLLING_MODE_FIXED = "fixed"
+POLLING_MODE_ADAPTIVE = "adaptive"
+
+# polling any faster than this, in seconds, only adds load on the api.
+MIN_POLL_INTERVAL = 5
+
+# defaults
+DEFAULT_MAX_CONCURRENT_REQUESTS = 4
+DEFAULT_MIN_UPDATE_INTERVAL = 10
+DEFAULT_MAX_UPDATE_INTERVAL = 120
+DEFAULT_PARSE_IN_EXECUTOR = False
+DEFAULT_CAPTURE_RESPONSES = False
+DEFAULT_EARLY_RELEASE_KEYWORD = "early"
+DEFAULT_CLOSURE_KEYWORDS = ""
+DEFAULT_STALE_WHILE_REVALIDATE = False
+DEFAULT_MAX_STALE_AGE = 120
+DEFAULT_CALL_TIMEOUT = 10
+DEFAULT_TICK_BUDGET = 15
+DEFAULT_PROXIMITY_RADIUS = 500
+DEFAULT_TRACKER_MIN_INTERVAL = 30
+DEFAULT_TRACKER_MIN_DISTANCE = 0
+
+# attributes
+ATTR_STALE = "stale"
+
+# services
+SERVICE_GET_ROUTE_TRACE = "get_route_trace"
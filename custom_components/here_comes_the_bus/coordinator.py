@@ -1,17 +1,69 @@
 """Coordinator file for Here comes the bus Home assistant integration."""
 
+import asyncio
+import math
+import random
 from calendar import SATURDAY
-from datetime import datetime, time, timedelta
+from collections.abc import Awaitable
+from dataclasses import replace
+from datetime import date, datetime, time, timedelta
 from enum import StrEnum
+from typing import Any
 
-from hcb_soap_client.stop_response import StudentStop, VehicleLocation
+from aiohttp import ClientError
+from hcb_soap_client.hcb_soap_client import HcbApiError
+from hcb_soap_client.stop_response import StopResponse, StudentStop, VehicleLocation
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from homeassistant.util import dt as dt_util
+from lxml.etree import XMLSyntaxError
 
-from .const import CONF_SCHOOL_CODE, CONF_UPDATE_INTERVAL, DOMAIN, LOGGER
-from .data import HCBConfigEntry, StudentData
+from .arrival_model import PLACE_SCHOOL, PLACE_STOP, ArrivalModel
+from .cache import SCHEDULE_FIELDS, HCBCache
+from .const import (
+    CONF_CALL_TIMEOUT,
+    CONF_CLOSURE_KEYWORDS,
+    CONF_EARLY_RELEASE_KEYWORD,
+    CONF_MAX_CONCURRENT_REQUESTS,
+    CONF_MAX_STALE_AGE,
+    CONF_MAX_UPDATE_INTERVAL,
+    CONF_MIN_UPDATE_INTERVAL,
+    CONF_POLLING_MODE,
+    CONF_PROXIMITY_RADIUS,
+    CONF_SCHOOL_CALENDAR,
+    CONF_SCHOOL_CODE,
+    CONF_STALE_WHILE_REVALIDATE,
+    CONF_TICK_BUDGET,
+    CONF_UPDATE_INTERVAL,
+    DEFAULT_CALL_TIMEOUT,
+    DEFAULT_CLOSURE_KEYWORDS,
+    DEFAULT_EARLY_RELEASE_KEYWORD,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    DEFAULT_MAX_STALE_AGE,
+    DEFAULT_MAX_UPDATE_INTERVAL,
+    DEFAULT_MIN_UPDATE_INTERVAL,
+    DEFAULT_PROXIMITY_RADIUS,
+    DEFAULT_STALE_WHILE_REVALIDATE,
+    DEFAULT_TICK_BUDGET,
+    DOMAIN,
+    LOGGER,
+    POLLING_MODE_ADAPTIVE,
+    POLLING_MODE_FIXED,
+)
+from .data import (
+    FetchStatus,
+    HCBConfigEntry,
+    PollTimeouts,
+    StudentData,
+    get_option,
+)
+from .eta import Eta, distance_to_stop, estimate_arrival
+from .metrics import Freshness, ProcessingMetrics
+from .route_trace import RouteTrace
+from .school_calendar import SchoolCalendar
+from .timeline import DayTimeline
 
 
 class TimeOfDay(StrEnum):
@@ -22,155 +74,463 @@ class TimeOfDay(StrEnum):
     PM = "6E7A050E-0295-4200-8EDC-3611BB5DE1C1"
 
 
-class HCBDataCoordinator(DataUpdateCoordinator):
-    """Define a data coordinator."""
+# The time of day of the window fields of the student data with this prefix.
+WINDOW_PREFIXES = {"am": TimeOfDay.AM, "mid": TimeOfDay.MID, "pm": TimeOfDay.PM}
 
-    def __init__(self, hass: HomeAssistant, config_entry: HCBConfigEntry) -> None:
+# Fields of the student data that come from the vehicle location.
+VEHICLE_LOCATION_FIELDS = (
+    "address",
+    "bus_name",
+    "display_on_map",
+    "heading",
+    "ignition",
+    "latent",
+    "latitude",
+    "longitude",
+    "log_time",
+    "message_code",
+    "speed",
+)
+
+# Fields of the student data estimated from the location and the stop.
+ETA_FIELDS = ("minutes_to_stop", "stop_distance")
+
+# The distance to the stop is rounded to this many meters, so the bus
+# idling at a light does not write a new state on every poll.
+STOP_DISTANCE_PRECISION = 10
+
+# A bus near the stop stays near until it is this much further than the
+# proximity radius, so it does not flip while it drives along the edge.
+PROXIMITY_EXIT_FACTOR = 1.25
+
+# Fields of the student data that only have a value during a bus window.
+WINDOW_FIELDS = (*ETA_FIELDS, "bus_near")
+
+# A bus nobody rode for this long is forgotten, with its route and the
+# sensor of its freshness.
+BUS_RETENTION = timedelta(days=7)
+
+# How often the students and their stops are fetched again.
+SCHEDULE_UPDATE_INTERVAL = timedelta(hours=6)
+
+# Failed stop fetches are retried with an exponential backoff between these.
+RETRY_BASE_DELAY = timedelta(seconds=30)
+RETRY_MAX_DELAY = timedelta(minutes=30)
+# A stop fetch that failed this often is left to the next schedule refresh.
+RETRY_MAX_ATTEMPTS = 8
+
+# Errors of a single request or of parsing its response, these do not fail
+# the whole update. A response that fails validation raises a ValueError.
+FETCH_ERRORS = (HcbApiError, ClientError, TimeoutError, ValueError, XMLSyntaxError)
+
+# How many days ahead to look for the next bus window, the school calendar
+# is indexed for these days and today.
+WINDOW_LOOKAHEAD_DAYS = 7
+
+# In adaptive polling mode, aim for this many polls before the bus arrives.
+ADAPTIVE_POLLS_BEFORE_ARRIVAL = 10
+
+
+async def _gather_with_limit[T](
+    limit: int, *aws: Awaitable[T], return_exceptions: bool = False
+) -> list[T | BaseException]:
+    """
+    Await all of the awaitables with at most `limit` running at the same time.
+
+    The results are returned in the same order as the awaitables were given.
+    With `return_exceptions` a failed awaitable returns its exception instead
+    of failing the others.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _limited(aw: Awaitable[T]) -> T:
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(
+        *(_limited(aw) for aw in aws), return_exceptions=return_exceptions
+    )
+
+
+class HCBCoordinator(DataUpdateCoordinator[dict[str, StudentData]]):
+    """Base coordinator of the student data."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        config_entry: HCBConfigEntry,
+        *,
+        name: str,
+        update_interval: timedelta,
+    ) -> None:
         """Initialize the coordinator."""
         super().__init__(
             hass,
             LOGGER,
+            config_entry=config_entry,
             # Name of the data. For logging purposes.
-            name=DOMAIN,
+            name=name,
             # Polling interval. Will only be polled if there are subscribers.
-            update_interval=timedelta(
-                seconds=config_entry.data.get(CONF_UPDATE_INTERVAL, 20)
-            ),
-            # Set always_update to `False` if the data returned from the
-            # api can be compared via `__eq__` to avoid duplicate updates
-            # being dispatched to listeners
-            always_update=True,  # This has to be true.  But why?
+            update_interval=update_interval,
+            # Updates replace the student data of the students that changed,
+            # so unchanged data compares equal via `__eq__` and no update is
+            # dispatched to listeners.
+            always_update=False,
+        )
+        # the fields that changed for each student during the last update,
+        # entities whose fields did not change have nothing new to write.
+        self.changes: dict[str, set[str]] = {}
+        # the students whose data is older than it should be.
+        self.stale: set[str] = set()
+        # the time spent applying the responses to the student data.
+        self.processing = ProcessingMetrics()
+        self.config_entry: HCBConfigEntry
+        self.data: dict[str, StudentData]
+
+    def _set_fields(
+        self, student_data: StudentData, values: dict[str, Any]
+    ) -> set[str]:
+        """Set the values on the student data and return the fields that changed."""
+        changed = {
+            name
+            for name, value in values.items()
+            if getattr(student_data, name) != value
+        }
+        for name in changed:
+            setattr(student_data, name, values[name])
+        return changed
+
+
+class HCBScheduleCoordinator(HCBCoordinator):
+    """
+    Coordinator of the students and the schedule of their stops.
+
+    The schedule rarely changes, so it is only fetched a few times a day.
+    """
+
+    def __init__(self, hass: HomeAssistant, config_entry: HCBConfigEntry) -> None:
+        """Initialize the coordinator."""
+        super().__init__(
+            hass,
+            config_entry,
+            name=f"{DOMAIN} schedule",
+            update_interval=SCHEDULE_UPDATE_INTERVAL,
         )
         self._school_id: str = ""
         self._parent_id: str = ""
-        self.config_entry = config_entry
-        self.data: dict[str, StudentData]
+        self._time_of_day_ids: list[str] = []
+        self._cache = HCBCache(hass, config_entry.entry_id)
+        self._max_concurrent_requests: int = get_option(
+            config_entry, CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS
+        )
+        # the status of the last stop fetch of each student and time of day.
+        self.fetch_status: dict[tuple[str, str], FetchStatus] = {}
+        # when the stops of every student were last fetched.
+        self._fetched_at: datetime | None = None
+        self.calendar = SchoolCalendar(
+            hass,
+            get_option(config_entry, CONF_SCHOOL_CALENDAR, ""),
+            get_option(
+                config_entry, CONF_EARLY_RELEASE_KEYWORD, DEFAULT_EARLY_RELEASE_KEYWORD
+            ),
+            get_option(config_entry, CONF_CLOSURE_KEYWORDS, DEFAULT_CLOSURE_KEYWORDS),
+        )
+
+    @property
+    def school_id(self) -> str:
+        """Return the id of the school."""
+        return self._school_id
+
+    @property
+    def parent_id(self) -> str:
+        """Return the id of the parent account."""
+        return self._parent_id
 
     async def async_config_entry_first_refresh(self) -> None:
-        """Handle the first refresh."""
-        user_info = None
-        if self._school_id == "":
-            self._school_id = await self.config_entry.runtime_data.client.get_school_id(
-                self.config_entry.data[CONF_SCHOOL_CODE]
-            )
-        if self._parent_id == "":
-            user_info = await self.config_entry.runtime_data.client.get_parent_info(
-                self._school_id,
-                self.config_entry.data[CONF_USERNAME],
-                self.config_entry.data[CONF_PASSWORD],
-            )
-            self._parent_id = user_info.account_id
-            self.data = {}
-            # first get the list of students and add them to the data
-            for student in user_info.students:
-                student_data = StudentData(student.first_name, student.student_id)
-                self.data[student.student_id] = student_data
+        """
+        Handle the first refresh.
+
+        A cached schedule is used right away, otherwise the schedule is
+        fetched before setup continues. A cached schedule older than the
+        update interval, or missing stops that failed, is revalidated in the
+        background. Any other is fetched again by the regular refresh once it
+        is that old.
+        """
+        cached = await self._cache.async_load()
+        if cached is not None:
+            self._school_id = cached.school_id
+            self._parent_id = cached.parent_id
+            self._time_of_day_ids = cached.time_of_day_ids
+            self.data = cached.students
+            self._fetched_at = cached.saved_at
+            age = dt_util.utcnow() - cached.saved_at
+            if age < SCHEDULE_UPDATE_INTERVAL and cached.complete:
+                self.update_interval = SCHEDULE_UPDATE_INTERVAL - age
+            else:
+                self.config_entry.async_create_background_task(
+                    self.hass,
+                    self._async_revalidate(),
+                    f"{DOMAIN} revalidate schedule",
+                )
         else:
-            user_info = await self.config_entry.runtime_data.client.get_parent_info(
-                self._school_id,
-                self.config_entry.data[CONF_USERNAME],
-                self.config_entry.data[CONF_PASSWORD],
-            )
-            if not hasattr(self, "data") or self.data is None:
-                self.data = {}
-                for student in user_info.students:
-                    student_data = StudentData(student.first_name, student.student_id)
-                    self.data[student.student_id] = student_data
+            self.data, _ = await self._async_fetch_schedule()
+        LOGGER.debug("Schedule initialization complete")
+
+    async def _async_revalidate(self) -> None:
+        """Fetch the schedule again and apply any changes to the cached one."""
         try:
-            # this fails during specific hours
-            for student_data in self.data.values():
-                # next get the stops for each time.
-                for time_of_day in user_info.times:
-                    stop_response = (
-                        await self.config_entry.runtime_data.client.get_stop_info(
-                            self._school_id,
-                            self._parent_id,
-                            student_data.student_id,
-                            time_of_day.id,
-                        )
-                    )
-                    if time_of_day.id == TimeOfDay.AM:
-                        self._update_vehicle_location(
-                            student_data, stop_response.vehicle_location
-                        )
-                    elif time_of_day.id == TimeOfDay.MID:
-                        student_data.has_mid_stops = any(stop_response.student_stops)
-                        if not student_data.has_mid_stops:
-                            continue
-                    self._update_stops(student_data, stop_response.student_stops)
-        except ValueError as e:
-            LOGGER.error(e)
-        LOGGER.debug("Initialization Complete")
+            data, changes = await self._async_fetch_schedule()
+        except FETCH_ERRORS as err:
+            LOGGER.warning("Unable to revalidate the cached schedule: %s", err)
+            return
+        if self._students_changed(data):
+            return
+        changes = {
+            student_id: changed for student_id, changed in changes.items() if changed
+        }
+        if not changes:
+            # pick up a retry of failed stops, there is no update to trigger it.
+            if self._listeners:
+                self._schedule_refresh()
+            return
+        self.changes = changes
+        self.async_set_updated_data(data)
 
     async def _async_update_data(self) -> dict[str, StudentData]:
-        # Iterate through each student and update their data
-        for student_data in self.data.values():
-            if not self._student_is_moving(student_data):
-                continue
-            # Fetch stop information from the HCB service
-            stops = await self.config_entry.runtime_data.client.get_stop_info(
-                self._school_id,
-                self._parent_id,
-                student_data.student_id,
-                self._get_time_of_day_id(dt_util.now().time()),
+        # the first refresh after a cached schedule may have come early.
+        self.update_interval = SCHEDULE_UPDATE_INTERVAL
+        today = dt_util.now().date()
+        await self.calendar.async_index(today, WINDOW_LOOKAHEAD_DAYS + 1)
+        if self.calendar.is_closed(today):
+            # no school today, the schedule is fetched again on a school day.
+            self.changes = {}
+            return self.data
+        dt_now = dt_util.utcnow()
+        retries = {
+            key: status.next_retry
+            for key, status in self.fetch_status.items()
+            if status.next_retry is not None
+        }
+        if not retries or self._schedule_due(dt_now):
+            data, changes = await self._async_fetch_schedule()
+            if self._students_changed(data):
+                return self.data
+        else:
+            # only retry the failed stops whose backoff is over.
+            data = {
+                student_id: replace(student_data)
+                for student_id, student_data in self.data.items()
+            }
+            changes = {student_id: set() for student_id in data}
+            await self._async_fetch_stops(
+                data,
+                changes,
+                [key for key, next_retry in retries.items() if next_retry <= dt_now],
             )
-            # Update the student's data with the retrieved information
-            self._update_vehicle_location(student_data, stops.vehicle_location)
-            self._update_stops(student_data, stops.student_stops)
-
-        return self.data  # Return the updated data dictionary
+        self.changes = changes
+        return data
 
-    def _student_is_moving(self, student_data: StudentData) -> bool:
-        """Check to see if the student should be moving on the bus."""
-        dt_now = dt_util.now()
-        time_now = dt_now.time()
+    def _schedule_due(self, dt_now: datetime) -> bool:
+        """Return whether the stops of every student are to be fetched again."""
+        return (
+            self._fetched_at is None
+            or dt_now - self._fetched_at >= SCHEDULE_UPDATE_INTERVAL
+        )
 
-        if dt_now.weekday() >= SATURDAY:
+    def _students_changed(self, data: dict[str, StudentData]) -> bool:
+        """Reload the entry when students were added or removed."""
+        if data.keys() == self.data.keys():
             return False
-        if self._is_am(time_now):
-            return student_data.am_start_time <= time_now <= student_data.am_end_time
-        if self._is_mid(time_now):
-            if not student_data.has_mid_stops:
-                return False
-            return student_data.mid_start_time <= time_now <= student_data.mid_end_time
+        # the entities of the students need to be rebuilt.
+        self.hass.config_entries.async_schedule_reload(self.config_entry.entry_id)
+        return True
 
-        return student_data.pm_start_time <= time_now <= student_data.pm_end_time
+    async def _async_fetch_schedule(
+        self,
+    ) -> tuple[dict[str, StudentData], dict[str, set[str]]]:
+        """
+        Fetch the students and their stops for every time of day.
 
-    def _update_vehicle_location(
-        self, student_data: StudentData, vehicle_location: VehicleLocation | None
+        Returns the updated copy of the student data and the fields that
+        changed for each student.
+        """
+        client = self.config_entry.runtime_data.client
+        metrics = self.config_entry.runtime_data.requests
+        if self._school_id == "":
+            self._school_id = await client.get_school_id(
+                self.config_entry.data[CONF_SCHOOL_CODE], metrics=metrics
+            )
+        user_info = await client.get_parent_info(
+            self._school_id,
+            self.config_entry.data[CONF_USERNAME],
+            self.config_entry.data[CONF_PASSWORD],
+            metrics=metrics,
+        )
+        self._parent_id = user_info.account_id
+        self._time_of_day_ids = [time_of_day.id for time_of_day in user_info.times]
+        # get the list of students, keeping a copy of the known students.
+        current = self.data or {}
+        data = {
+            student.student_id: replace(current[student.student_id])
+            if student.student_id in current
+            else StudentData(student.first_name, student.student_id)
+            for student in user_info.students
+        }
+        changes: dict[str, set[str]] = {student_id: set() for student_id in data}
+        keys = [
+            (student_id, time_of_day_id)
+            for student_id in data
+            for time_of_day_id in self._time_of_day_ids
+        ]
+        # every stop is fetched again, a failed one gets all its retries back.
+        self.fetch_status = {
+            key: replace(status, attempts=0, next_retry=None)
+            for key, status in self.fetch_status.items()
+            if key in keys
+        }
+        self._fetched_at = dt_util.utcnow()
+        await self._async_fetch_stops(data, changes, keys)
+        return data, changes
+
+    async def _async_fetch_stops(
+        self,
+        data: dict[str, StudentData],
+        changes: dict[str, set[str]],
+        keys: list[tuple[str, str]],
     ) -> None:
-        """Update student data with the provided vehicle location information."""
-        if vehicle_location:
-            student_data.address = vehicle_location.address
-            student_data.bus_name = vehicle_location.name
-            student_data.display_on_map = vehicle_location.display_on_map
-            student_data.heading = vehicle_location.heading
-            student_data.ignition = vehicle_location.ignition
-            student_data.latent = vehicle_location.latent
-            student_data.latitude = vehicle_location.latitude
-            student_data.longitude = vehicle_location.longitude
-            student_data.log_time = vehicle_location.log_time.replace(
-                tzinfo=dt_util.now().tzinfo
-            )
-            student_data.message_code = vehicle_location.message_code
-            student_data.speed = vehicle_location.speed
+        """
+        Fetch and apply the stops of each student and time of day.
+
+        Every stop fetch succeeds or fails on its own, a failed one is retried
+        after a backoff. The schedule is cached when any fetch succeeded, a
+        failed one keeps its last stops and marks the cache incomplete.
+        """
+        client = self.config_entry.runtime_data.client
+        # request every student and time of day at once, then apply the
+        # responses in a fixed order so the result matches a sequential fetch.
+        stop_responses = await _gather_with_limit(
+            self._max_concurrent_requests,
+            *(
+                client.get_stop_info(
+                    self._school_id,
+                    self._parent_id,
+                    student_id,
+                    time_of_day_id,
+                    metrics=self.config_entry.runtime_data.requests,
+                )
+                for student_id, time_of_day_id in keys
+            ),
+            return_exceptions=True,
+        )
+        dt_now = dt_util.utcnow()
+        succeeded = False
+        for key, stop_response in zip(keys, stop_responses, strict=True):
+            student_id, time_of_day_id = key
+            if isinstance(stop_response, BaseException):
+                if not isinstance(stop_response, FETCH_ERRORS):
+                    raise stop_response
+                self._record_failure(key, stop_response, dt_now)
+                continue
+            try:
+                changed = self._apply_stops(
+                    data[student_id], time_of_day_id, stop_response
+                )
+            except ValueError as err:
+                # this fails during specific hours
+                self._record_failure(key, err, dt_now)
+                continue
+            changes[student_id] |= changed
+            self.fetch_status[key] = FetchStatus(last_success=dt_now)
+            succeeded = True
+        self._schedule_retry(dt_now)
+        if succeeded:
+            await self._cache.async_save(
+                self._school_id,
+                self._parent_id,
+                self._time_of_day_ids,
+                data,
+                complete=not any(
+                    status.attempts for status in self.fetch_status.values()
+                ),
+            )
+
+    def _apply_stops(
+        self,
+        student_data: StudentData,
+        time_of_day_id: str,
+        stop_response: StopResponse,
+    ) -> set[str]:
+        """Apply the stops of a time of day and return the fields that changed."""
+        if time_of_day_id == TimeOfDay.MID:
+            changed = self._set_fields(
+                student_data, {"has_mid_stops": any(stop_response.student_stops)}
+            )
+            if not student_data.has_mid_stops:
+                return changed
         else:
-            student_data.address = None
-            student_data.bus_name = None
-            student_data.display_on_map = None
-            student_data.heading = None
-            student_data.ignition = None
-            student_data.latent = None
-            student_data.latitude = None
-            student_data.longitude = None
-            student_data.log_time = None
-            student_data.message_code = None
-            student_data.speed = None
+            changed = set()
+        with self.processing.timed("update_stops"):
+            return changed | self._update_stops(
+                student_data, stop_response.student_stops
+            )
+
+    def _record_failure(
+        self, key: tuple[str, str], err: Exception, dt_now: datetime
+    ) -> None:
+        """Record a failed stop fetch and when to retry it, if at all."""
+        status = self.fetch_status.get(key, FetchStatus())
+        attempts = status.attempts + 1
+        if attempts >= RETRY_MAX_ATTEMPTS:
+            self.fetch_status[key] = replace(
+                status, attempts=attempts, last_error=str(err), next_retry=None
+            )
+            LOGGER.warning(
+                "Unable to fetch the stops of student %s for %s after %s attempts, "
+                "fetching them with the next schedule: %s",
+                *key,
+                attempts,
+                err,
+            )
+            return
+        delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+        # the jitter spreads out the retries of the fetches that failed together.
+        delay *= random.uniform(0.5, 1)  # noqa: S311
+        self.fetch_status[key] = replace(
+            status,
+            attempts=attempts,
+            last_error=str(err),
+            next_retry=dt_now + delay,
+        )
+        LOGGER.warning(
+            "Unable to fetch the stops of student %s for %s, retrying in %s: %s",
+            *key,
+            delay,
+            err,
+        )
+
+    def _schedule_retry(self, dt_now: datetime) -> None:
+        """Refresh when the first failed fetch or the schedule is due."""
+        retries = [
+            status.next_retry
+            for status in self.fetch_status.values()
+            if status.next_retry is not None
+        ]
+        if not retries:
+            self.update_interval = SCHEDULE_UPDATE_INTERVAL
+            return
+        if self._fetched_at is not None:
+            retries.append(self._fetched_at + SCHEDULE_UPDATE_INTERVAL)
+        # an interval of zero would stop the refreshes instead.
+        self.update_interval = max(min(retries) - dt_now, timedelta(seconds=1))
 
     def _update_stops(
         self, student_data: StudentData, stops: list[StudentStop]
-    ) -> None:
-        """Update student data with information from the provided stops."""
+    ) -> set[str]:
+        """
+        Update student data with information from the provided stops.
+
+        Returns the names of the fields that changed.
+        """
         if not stops or len(stops) == 0:
             msg = "No stops returned."
             raise ValueError(msg)
@@ -179,35 +539,53 @@ class HCBDataCoordinator(DataUpdateCoordinator):
             raise ValueError(msg)
         school = "School"
         stop = "Stop"
+        stop_latitude, stop_longitude = self._get_stop_location(stops, stop)
+        school_latitude, school_longitude = self._get_stop_location(stops, school)
         if stops[0].time_of_day_id == TimeOfDay.AM:
-            student_data.am_start_time = self._get_start_time(stops)
-            student_data.am_end_time = self._get_end_time(stops)
-            student_data.am_school_arrival_time = self._get_stop_time(stops, school)
-            student_data.am_stop_arrival_time = self._get_stop_time(stops, stop)
-            return
+            return self._set_fields(
+                student_data,
+                {
+                    "am_start_time": self._get_start_time(stops),
+                    "am_end_time": self._get_end_time(stops),
+                    "am_school_arrival_time": self._get_stop_time(stops, school),
+                    "am_school_latitude": school_latitude,
+                    "am_school_longitude": school_longitude,
+                    "am_stop_arrival_time": self._get_stop_time(stops, stop),
+                    "am_stop_latitude": stop_latitude,
+                    "am_stop_longitude": stop_longitude,
+                },
+            )
         if stops[0].time_of_day_id == TimeOfDay.MID:
-            student_data.mid_start_time = self._get_start_time(stops)
-            student_data.mid_end_time = self._get_end_time(stops)
-            student_data.mid_school_arrival_time = self._get_stop_time(stops, school)
-            student_data.mid_stop_arrival_time = self._get_stop_time(stops, stop)
-            return
+            return self._set_fields(
+                student_data,
+                {
+                    "mid_start_time": self._get_start_time(stops),
+                    "mid_end_time": self._get_end_time(stops),
+                    "mid_school_arrival_time": self._get_stop_time(stops, school),
+                    "mid_school_latitude": school_latitude,
+                    "mid_school_longitude": school_longitude,
+                    "mid_stop_arrival_time": self._get_stop_time(stops, stop),
+                    "mid_stop_latitude": stop_latitude,
+                    "mid_stop_longitude": stop_longitude,
+                },
+            )
         if stops[0].time_of_day_id == TimeOfDay.PM:
-            student_data.pm_start_time = self._get_start_time(stops)
-            student_data.pm_end_time = self._get_end_time(stops)
-            student_data.pm_school_arrival_time = self._get_stop_time(stops, school)
-            student_data.pm_stop_arrival_time = self._get_stop_time(stops, stop)
-            return
+            return self._set_fields(
+                student_data,
+                {
+                    "pm_start_time": self._get_start_time(stops),
+                    "pm_end_time": self._get_end_time(stops),
+                    "pm_school_arrival_time": self._get_stop_time(stops, school),
+                    "pm_school_latitude": school_latitude,
+                    "pm_school_longitude": school_longitude,
+                    "pm_stop_arrival_time": self._get_stop_time(stops, stop),
+                    "pm_stop_latitude": stop_latitude,
+                    "pm_stop_longitude": stop_longitude,
+                },
+            )
         msg = "Invalid time of day ID. Cannot update stops."
         raise ValueError(msg)
 
-    def _get_time_of_day_id(self, check_time: time) -> str:
-        """Get the time of day ID based on the given time."""
-        if self._is_am(check_time):
-            return TimeOfDay.AM
-        if self._is_mid(check_time):
-            return TimeOfDay.MID
-        return TimeOfDay.PM
-
     def _adjust_time(self, base_time: time, delta_minutes: int) -> time:
         """Adjust a time by adding or subtracting minutes."""
         dummy_date = dt_util.now().date()
@@ -226,17 +604,14 @@ class HCBDataCoordinator(DataUpdateCoordinator):
         stop_stops = [stop for stop in stops if stop.stop_type == stop_type]
         return self._fix_time(stop_stops[0].arrival_time)
 
-    def _is_am(self, check_time: time) -> bool:
-        """Return True if the time is between midnight and 10:00 AM, False otherwise."""
-        return time(0) <= check_time < time(10)
-
-    def _is_mid(self, check_time: time) -> bool:
-        """Return True if the time is between 10:00 AM and 1:30 PM, False otherwise."""
-        return time(10) <= check_time < time(13, 30)
-
-    def _is_pm(self, check_time: time) -> bool:
-        """Return True if the time is between 1:30 PM and midnight, False otherwise."""
-        return time(13, 30) <= check_time <= time(23, 59, 59)
+    def _get_stop_location(
+        self, stops: list[StudentStop], stop_type: str
+    ) -> tuple[float | None, float | None]:
+        """Return the coordinates of the stop, HCB sends 0, 0 when unknown."""
+        stop = next((stop for stop in stops if stop.stop_type == stop_type), None)
+        if stop is None or (stop.latitude == 0 and stop.longitude == 0):
+            return None, None
+        return stop.latitude, stop.longitude
 
     def _fix_time(self, input_time: time | None) -> time | None:
         """
@@ -248,3 +623,610 @@ class HCBDataCoordinator(DataUpdateCoordinator):
         if input_time is None or input_time == time(0):
             return None
         return input_time.replace(microsecond=0)
+
+
+class HCBDataCoordinator(HCBCoordinator):
+    """
+    Coordinator of the vehicle locations.
+
+    The location is only polled while a bus window is open, using the
+    schedule of the students from the schedule coordinator. In stale while
+    revalidate mode a refresh returns the last locations right away and
+    polls in the background, a failed poll keeps the last locations.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        config_entry: HCBConfigEntry,
+        schedule: HCBScheduleCoordinator,
+    ) -> None:
+        """Initialize the coordinator."""
+        super().__init__(
+            hass,
+            config_entry,
+            name=DOMAIN,
+            update_interval=timedelta(
+                seconds=get_option(config_entry, CONF_UPDATE_INTERVAL, 20)
+            ),
+        )
+        self._schedule = schedule
+        self._poll_interval = self.update_interval
+        # the timelines of a regular day and of the early release dismissals,
+        # built from the windows of the students on first use.
+        self._timelines: dict[time | None, DayTimeline] = {}
+        self._polling_mode: str = get_option(
+            config_entry, CONF_POLLING_MODE, POLLING_MODE_FIXED
+        )
+        self._min_update_interval = timedelta(
+            seconds=get_option(
+                config_entry, CONF_MIN_UPDATE_INTERVAL, DEFAULT_MIN_UPDATE_INTERVAL
+            )
+        )
+        self._max_update_interval = timedelta(
+            seconds=get_option(
+                config_entry, CONF_MAX_UPDATE_INTERVAL, DEFAULT_MAX_UPDATE_INTERVAL
+            )
+        )
+        self._stale_while_revalidate: bool = get_option(
+            config_entry, CONF_STALE_WHILE_REVALIDATE, DEFAULT_STALE_WHILE_REVALIDATE
+        )
+        self._max_stale_age = timedelta(
+            seconds=get_option(config_entry, CONF_MAX_STALE_AGE, DEFAULT_MAX_STALE_AGE)
+        )
+        self._revalidate_task: asyncio.Task[None] | None = None
+        self._max_concurrent_requests: int = get_option(
+            config_entry, CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS
+        )
+        # the time limits of a call and of a poll, in seconds of the loop.
+        self._call_timeout: float = get_option(
+            config_entry, CONF_CALL_TIMEOUT, DEFAULT_CALL_TIMEOUT
+        )
+        self._tick_budget: float = get_option(
+            config_entry, CONF_TICK_BUDGET, DEFAULT_TICK_BUDGET
+        )
+        self._proximity_radius: float = get_option(
+            config_entry, CONF_PROXIMITY_RADIUS, DEFAULT_PROXIMITY_RADIUS
+        )
+        self.timeouts = PollTimeouts()
+        # how old the location of each bus is when it reaches the state, by
+        # the name of the bus.
+        self.freshness: dict[str, Freshness] = {}
+        # the route of each bus during the current window, by the name of the
+        # bus.
+        self.traces: dict[str, RouteTrace] = {}
+        # when the buses really reached the stops and schools.
+        self.arrivals = ArrivalModel(hass, config_entry.entry_id)
+        # when the location of each student was last fetched, and since when
+        # the riding students are riding.
+        self._fetched_at: dict[str, datetime] = {}
+        self._riding_since: dict[str, datetime] = {}
+
+    async def async_config_entry_first_refresh(self) -> None:
+        """
+        Handle the first refresh.
+
+        The students and their schedule are copied from the schedule
+        coordinator, which must be refreshed first, and later schedule
+        updates are merged in.
+        """
+        self.data = {
+            student_id: replace(student_data)
+            for student_id, student_data in self._schedule.data.items()
+        }
+        self._timelines = {}
+        self.config_entry.async_on_unload(
+            self._schedule.async_add_listener(self._handle_schedule_update)
+        )
+        await self.arrivals.async_load()
+        try:
+            self.data = await self._async_fetch_locations()
+        except UpdateFailed as err:
+            raise ConfigEntryNotReady(err) from err
+        LOGGER.debug("Initialization Complete")
+
+    @callback
+    def _handle_schedule_update(self) -> None:
+        """Merge the updated schedule and recalculate the next poll."""
+        self.data = {
+            student_id: replace(
+                student_data,
+                **{
+                    name: getattr(self._schedule.data[student_id], name)
+                    for name in SCHEDULE_FIELDS
+                },
+            )
+            for student_id, student_data in self.data.items()
+        }
+        self._timelines = {}
+        self._schedule_next_poll(self.data)
+        if self._listeners:
+            self._schedule_refresh()
+
+    async def _async_update_data(self) -> dict[str, StudentData]:
+        if not self._stale_while_revalidate:
+            return await self._async_fetch_locations()
+        # a poll that is still running is not started again.
+        if self._revalidate_task is None or self._revalidate_task.done():
+            self._revalidate_task = self.config_entry.async_create_background_task(
+                self.hass, self._async_revalidate(), f"{DOMAIN} revalidate locations"
+            )
+        dt_now = dt_util.now()
+        self.changes = {}
+        if self._update_stale(dt_now, self._riding(dt_now, self.data)):
+            self.async_update_listeners()
+        return self.data
+
+    async def _async_revalidate(self) -> None:
+        """Poll the locations and publish them, keeping the last ones on failure."""
+        try:
+            data = await self._async_fetch_locations()
+        except UpdateFailed as err:
+            LOGGER.warning("Serving the last locations: %s", err)
+            self.changes = {}
+            self.async_update_listeners()
+            return
+        self.async_set_updated_data(data)
+
+    async def _async_fetch_locations(self) -> dict[str, StudentData]:
+        """
+        Fetch the location of every student whose bus window is open.
+
+        The students are fetched at the same time, every call within the
+        call timeout and all of them within the budget of the poll. A call
+        that runs out of time is cancelled and its student keeps the last
+        location, so one hung request does not hold up the others.
+        """
+        changes: dict[str, set[str]] = {}
+        errors: list[Exception] = []
+        dt_now = dt_util.now()
+        await self._schedule.calendar.async_index(
+            dt_now.date(), WINDOW_LOOKAHEAD_DAYS + 1
+        )
+        riding = self._riding(dt_now, self.data)
+        keys = [
+            (student_id, riding[student_id])
+            for student_id in self.data
+            if student_id in riding
+        ]
+        budget_timeouts = self.timeouts.budget_timeouts
+        deadline = asyncio.get_running_loop().time() + self._tick_budget
+        responses = await _gather_with_limit(
+            self._max_concurrent_requests,
+            *(
+                self._async_fetch_location(student_id, time_of_day_id, deadline)
+                for student_id, time_of_day_id in keys
+            ),
+            return_exceptions=True,
+        )
+        if self.timeouts.budget_timeouts > budget_timeouts:
+            self.timeouts.budget_overruns += 1
+        fetched_at = dt_util.now()
+        # copied once the calls are done, so a schedule merged in while they
+        # ran is kept.
+        data = dict(self.data)
+        # the students sharing a bus get the same fix, it is recorded once.
+        fresh_buses: set[str] = set()
+        for (student_id, time_of_day_id), stops in zip(keys, responses, strict=True):
+            # a failed student keeps its last location until the next poll.
+            if isinstance(stops, BaseException):
+                if not isinstance(stops, FETCH_ERRORS):
+                    raise stops
+                LOGGER.warning(
+                    "Unable to fetch the location of student %s: %s", student_id, stops
+                )
+                errors.append(stops)
+                continue
+            self._fetched_at[student_id] = dt_now
+            # Update a copy of the student's data, so the previous data can
+            # still be compared against the new data.
+            updated = replace(self.data[student_id])
+            changed = self._apply_location(updated, time_of_day_id, stops, fetched_at)
+            self._record_freshness(updated, fetched_at, fresh_buses)
+            if changed:
+                data[student_id] = updated
+                changes[student_id] = changed
+        # the window fields of the students no longer riding are cleared.
+        self._end_windows(riding, data)
+        self._forget_idle_buses(fetched_at)
+        for student_id, student_data in self.data.items():
+            if student_id not in riding and any(
+                getattr(student_data, name) is not None for name in WINDOW_FIELDS
+            ):
+                data[student_id] = replace(student_data)
+                changes[student_id] = self._set_fields(
+                    data[student_id], dict.fromkeys(WINDOW_FIELDS)
+                )
+
+        self.changes = changes
+        stale_changed = self._update_stale(dt_now, riding)
+        self._schedule_next_poll(data, dt_now)
+        failed = bool(errors) and len(errors) == len(keys)
+        # the coordinator publishes neither the same data nor another failed
+        # poll, so a change of the stale students is published here. The
+        # stale while revalidate poll always publishes its outcome.
+        if (
+            stale_changed
+            and (failed or not changes)
+            and not self._stale_while_revalidate
+        ):
+            self.changes = {}
+            self.async_update_listeners()
+        if failed:
+            msg = f"Unable to fetch the location of any student: {errors[-1]}"
+            raise UpdateFailed(msg) from errors[-1]
+        if not changes:
+            return self.data
+        return data  # Return the updated data dictionary
+
+    def _end_windows(
+        self, riding: dict[str, str], data: dict[str, StudentData]
+    ) -> None:
+        """Finish the windows of the students and buses no longer riding."""
+        for student_id in self._riding_since:
+            if student_id not in riding:
+                self.arrivals.finish(student_id)
+        riding_buses = {data[student_id].bus_name for student_id in riding}
+        for bus_name, trace in self.traces.items():
+            if bus_name not in riding_buses:
+                trace.clear()
+
+    def _forget_idle_buses(self, dt_now: datetime) -> None:
+        """Forget the buses nobody rode for the retention."""
+        for bus_name, freshness in list(self.freshness.items()):
+            if (
+                freshness.fetched_at is not None
+                and dt_now - freshness.fetched_at > BUS_RETENTION
+            ):
+                del self.freshness[bus_name]
+                self.traces.pop(bus_name, None)
+
+    def _apply_location(
+        self,
+        student_data: StudentData,
+        time_of_day_id: str,
+        stops: StopResponse,
+        fetched_at: datetime,
+    ) -> set[str]:
+        """
+        Apply a fetched location to the data of a student.
+
+        Returns the names of the fields that changed.
+        """
+        student_id = student_data.student_id
+        with self.processing.timed("update_vehicle_location"):
+            changed = self._update_vehicle_location(
+                student_data, stops.vehicle_location
+            )
+        changed |= self._update_eta(student_data, time_of_day_id, fetched_at)
+        changed |= self._update_proximity(student_data)
+        self._record_trace(time_of_day_id, student_data)
+        self._observe_arrivals(student_id, time_of_day_id, student_data)
+        return changed
+
+    def _record_freshness(
+        self, student_data: StudentData, fetched_at: datetime, recorded: set[str]
+    ) -> None:
+        """Record the fetched fix of the bus, unless recorded during this poll."""
+        bus_name = student_data.bus_name
+        if bus_name is None or bus_name in recorded:
+            return
+        recorded.add(bus_name)
+        self.freshness.setdefault(bus_name, Freshness()).record_fetch(
+            student_data.log_time, fetched_at
+        )
+
+    async def _async_fetch_location(
+        self, student_id: str, time_of_day_id: str, deadline: float
+    ) -> StopResponse:
+        """Fetch the stops of a student, cancelled at the timeout or deadline."""
+        loop = asyncio.get_running_loop()
+        call_deadline = loop.time() + self._call_timeout
+        # a call that would start after the deadline is not sent at all.
+        if deadline <= loop.time():
+            raise self._timed_out(budget=True)
+        try:
+            async with asyncio.timeout_at(min(deadline, call_deadline)) as timeout:
+                return await self.config_entry.runtime_data.client.get_stop_info(
+                    self._schedule.school_id,
+                    self._schedule.parent_id,
+                    student_id,
+                    time_of_day_id,
+                    metrics=self.config_entry.runtime_data.requests,
+                )
+        except TimeoutError as err:
+            if not timeout.expired():
+                raise
+            raise self._timed_out(budget=deadline < call_deadline) from err
+
+    def _timed_out(self, *, budget: bool) -> TimeoutError:
+        """Count a fetch that ran out of time and return its error."""
+        if budget:
+            self.timeouts.budget_timeouts += 1
+            return TimeoutError(f"The poll ran out of its {self._tick_budget} s budget")
+        self.timeouts.call_timeouts += 1
+        return TimeoutError(f"The request timed out after {self._call_timeout} s")
+
+    def _update_stale(self, dt_now: datetime, riding: dict[str, str]) -> bool:
+        """
+        Mark the riding students whose location is older than the maximum age.
+
+        The age counts from the last fetch, or from when the student started
+        riding. Outside of their bus window the location of a student is not
+        expected to change, so it is never stale. Returns whether the stale
+        students changed.
+        """
+        self._riding_since = {
+            student_id: self._riding_since.get(student_id, dt_now)
+            for student_id in riding
+        }
+        stale = {
+            student_id
+            for student_id, since in self._riding_since.items()
+            if dt_now - max(since, self._fetched_at.get(student_id, since))
+            > self._max_stale_age
+        }
+        changed = stale != self.stale
+        self.stale = stale
+        return changed
+
+    def _schedule_next_poll(
+        self, data: dict[str, StudentData], dt_now: datetime | None = None
+    ) -> None:
+        """
+        Poll while a bus window is open, otherwise sleep until the next one.
+
+        Outside of the windows the update interval is stretched to the start
+        of the next window, so the coordinator does not tick in between.
+        """
+        if dt_now is None:
+            dt_now = dt_util.now()
+        riding = self._riding(dt_now, data)
+        if riding:
+            self.update_interval = self._window_update_interval(dt_now, data, riding)
+            return
+        next_start = self._next_window_start(dt_now, data)
+        if next_start is None:
+            self.update_interval = None
+            return
+        LOGGER.debug("No buses running, sleeping until %s", next_start)
+        self.update_interval = dt_util.as_utc(next_start) - dt_util.as_utc(dt_now)
+
+    def _window_update_interval(
+        self,
+        dt_now: datetime,
+        data: dict[str, StudentData],
+        riding: dict[str, str],
+    ) -> timedelta | None:
+        """
+        Return the update interval to use inside a bus window.
+
+        In adaptive mode the interval follows the estimated time until the
+        nearest bus reaches its stop, the same estimate as the minutes to
+        stop, bounded by the minimum and maximum. A bus that passed its stop
+        does not count, the maximum is used when every bus has.
+        """
+        if self._polling_mode != POLLING_MODE_ADAPTIVE:
+            return self._poll_interval
+        etas = [
+            eta
+            for eta in (
+                self._estimate_arrival(data[student_id], time_of_day_id, dt_now)
+                for student_id, time_of_day_id in riding.items()
+                if student_id in data
+            )
+            if eta is not None
+        ]
+        estimates = [eta.seconds for eta in etas if not eta.passed]
+        if not estimates:
+            return self._max_update_interval if etas else self._poll_interval
+        interval = timedelta(seconds=min(estimates) / ADAPTIVE_POLLS_BEFORE_ARRIVAL)
+        return min(max(interval, self._min_update_interval), self._max_update_interval)
+
+    @staticmethod
+    def _stop(
+        student_data: StudentData, time_of_day_id: str
+    ) -> tuple[time | None, float | None, float | None]:
+        """Return the scheduled arrival and location of the stop of a time of day."""
+        if time_of_day_id == TimeOfDay.AM:
+            return (
+                student_data.am_stop_arrival_time,
+                student_data.am_stop_latitude,
+                student_data.am_stop_longitude,
+            )
+        if time_of_day_id == TimeOfDay.MID:
+            return (
+                student_data.mid_stop_arrival_time,
+                student_data.mid_stop_latitude,
+                student_data.mid_stop_longitude,
+            )
+        return (
+            student_data.pm_stop_arrival_time,
+            student_data.pm_stop_latitude,
+            student_data.pm_stop_longitude,
+        )
+
+    def _estimate_arrival(
+        self, student_data: StudentData, time_of_day_id: str, dt_now: datetime
+    ) -> Eta | None:
+        """Estimate the distance and time until the student's bus reaches the stop."""
+        arrival_time, stop_latitude, stop_longitude = self._stop(
+            student_data, time_of_day_id
+        )
+        return estimate_arrival(
+            dt_now,
+            arrival_time=arrival_time,
+            latitude=student_data.latitude,
+            longitude=student_data.longitude,
+            speed=student_data.speed,
+            heading=student_data.heading,
+            stop_latitude=stop_latitude,
+            stop_longitude=stop_longitude,
+        )
+
+    def _update_eta(
+        self,
+        student_data: StudentData,
+        time_of_day_id: str,
+        dt_now: datetime,
+    ) -> set[str]:
+        """
+        Update the distance and minutes until the bus reaches the stop.
+
+        Returns the names of the fields that changed.
+        """
+        eta = self._estimate_arrival(student_data, time_of_day_id, dt_now)
+        if eta is None:
+            return self._set_fields(student_data, dict.fromkeys(ETA_FIELDS))
+        return self._set_fields(
+            student_data,
+            {
+                "minutes_to_stop": math.ceil(eta.seconds / 60),
+                "stop_distance": None
+                if eta.meters is None
+                else round(eta.meters / STOP_DISTANCE_PRECISION)
+                * STOP_DISTANCE_PRECISION,
+            },
+        )
+
+    def _update_proximity(self, student_data: StudentData) -> set[str]:
+        """
+        Update whether the bus is near the stop, from the distance to it.
+
+        The bus comes near within the proximity radius and leaves a little
+        further out, so it changes once per approach. Returns the names of
+        the fields that changed.
+        """
+        meters = student_data.stop_distance
+        if meters is None:
+            return self._set_fields(student_data, {"bus_near": None})
+        radius = self._proximity_radius
+        if student_data.bus_near:
+            radius *= PROXIMITY_EXIT_FACTOR
+        return self._set_fields(student_data, {"bus_near": meters <= radius})
+
+    def _record_trace(self, time_of_day_id: str, student_data: StudentData) -> None:
+        """Add the location of the bus to its route, restarted every window."""
+        if (
+            student_data.bus_name is None
+            or student_data.log_time is None
+            or student_data.latitude is None
+            or student_data.longitude is None
+        ):
+            return
+        trace = self.traces.setdefault(student_data.bus_name, RouteTrace())
+        if trace.time_of_day_id != time_of_day_id:
+            trace.clear()
+            trace.time_of_day_id = time_of_day_id
+        trace.append(
+            student_data.log_time,
+            student_data.latitude,
+            student_data.longitude,
+            student_data.speed,
+            student_data.heading,
+        )
+
+    def _observe_arrivals(
+        self, student_id: str, time_of_day_id: str, student_data: StudentData
+    ) -> None:
+        """Observe how far the bus is from the stop and the school."""
+        if student_data.log_time is None:
+            return
+        _, stop_latitude, stop_longitude = self._stop(student_data, time_of_day_id)
+        prefix = next(
+            prefix
+            for prefix, time_of_day in WINDOW_PREFIXES.items()
+            if time_of_day == time_of_day_id
+        )
+        places = {
+            PLACE_STOP: (stop_latitude, stop_longitude),
+            PLACE_SCHOOL: (
+                getattr(student_data, f"{prefix}_school_latitude"),
+                getattr(student_data, f"{prefix}_school_longitude"),
+            ),
+        }
+        for place, (latitude, longitude) in places.items():
+            meters = distance_to_stop(
+                student_data.latitude, student_data.longitude, latitude, longitude
+            )
+            if meters is not None:
+                self.arrivals.observe(
+                    student_id, time_of_day_id, place, meters, student_data.log_time
+                )
+
+    def _timeline(
+        self, data: dict[str, StudentData], dismissal: time | None = None
+    ) -> DayTimeline:
+        """Return the timeline of the bus windows, built after a schedule update."""
+        if dismissal not in self._timelines:
+            self._timelines[dismissal] = DayTimeline.from_students(
+                data, WINDOW_PREFIXES, dismissal
+            )
+        return self._timelines[dismissal]
+
+    def _is_school_day(self, day: date) -> bool:
+        """Return whether the buses run on the day."""
+        return day.weekday() < SATURDAY and not self._schedule.calendar.is_closed(day)
+
+    def _day_timeline(self, day: date, data: dict[str, StudentData]) -> DayTimeline:
+        """Return the timeline of the day, moved on an early release day."""
+        return self._timeline(data, self._schedule.calendar.dismissal(day))
+
+    def _riding(self, dt_now: datetime, data: dict[str, StudentData]) -> dict[str, str]:
+        """Return the time of day id of every student whose bus window is open."""
+        if not self._is_school_day(dt_now.date()):
+            return {}
+        return self._day_timeline(dt_now.date(), data).riding(dt_now.time())
+
+    def _next_window_start(
+        self, dt_now: datetime, data: dict[str, StudentData]
+    ) -> datetime | None:
+        """
+        Return the start of the next bus window after now.
+
+        When there is no school for the whole lookahead, the start of the
+        first window after it is returned, the calendar is indexed again then.
+        """
+        for days in range(WINDOW_LOOKAHEAD_DAYS + 1):
+            day = dt_now.date() + timedelta(days=days)
+            if not self._is_school_day(day):
+                continue
+            start = self._day_timeline(day, data).next_start(
+                dt_now.time() if days == 0 else None
+            )
+            if start is not None:
+                return datetime.combine(day, start, tzinfo=dt_now.tzinfo)
+        start = self._timeline(data).next_start()
+        if start is None:
+            return None
+        day = dt_now.date() + timedelta(days=WINDOW_LOOKAHEAD_DAYS + 1)
+        return datetime.combine(day, start, tzinfo=dt_now.tzinfo)
+
+    def _update_vehicle_location(
+        self, student_data: StudentData, vehicle_location: VehicleLocation | None
+    ) -> set[str]:
+        """
+        Update student data with the provided vehicle location information.
+
+        Returns the names of the fields that changed.
+        """
+        if vehicle_location:
+            return self._set_fields(
+                student_data,
+                {
+                    "address": vehicle_location.address,
+                    "bus_name": vehicle_location.name,
+                    "display_on_map": vehicle_location.display_on_map,
+                    "heading": vehicle_location.heading,
+                    "ignition": vehicle_location.ignition,
+                    "latent": vehicle_location.latent,
+                    "latitude": vehicle_location.latitude,
+                    "longitude": vehicle_location.longitude,
+                    "log_time": vehicle_location.log_time.replace(
+                        tzinfo=dt_util.now().tzinfo
+                    ),
+                    "message_code": vehicle_location.message_code,
+                    "speed": vehicle_location.speed,
+                },
+            )
+        return self._set_fields(student_data, dict.fromkeys(VEHICLE_LOCATION_FIELDS))
@@ -4,28 +4,38 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from datetime import time
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 from homeassistant.config_entries import ConfigEntry
 
+from .metrics import RequestMetrics
+
 if TYPE_CHECKING:
     from datetime import datetime
 
-    from hcb_soap_client.hcb_soap_client import HcbSoapClient
     from homeassistant.loader import Integration
 
-    from .coordinator import HCBDataCoordinator
+    from .client import HCBClient
+    from .coordinator import HCBDataCoordinator, HCBScheduleCoordinator
 
 type HCBConfigEntry = ConfigEntry[HCBData]
 
 
+def get_option(entry: ConfigEntry, key: str, default: Any) -> Any:
+    """Return an option of the entry, or the value it was set up with before."""
+    return {**entry.data, **entry.options}.get(key, default)
+
+
 @dataclass
 class HCBData:
     """Data for the Here comes the bus integration."""
 
-    client: HcbSoapClient
+    client: HCBClient
     coordinator: HCBDataCoordinator
+    schedule_coordinator: HCBScheduleCoordinator
     integration: Integration
+    # the calls this entry made through the shared client.
+    requests: RequestMetrics = field(default_factory=RequestMetrics)
 
 
 @dataclass
@@ -45,12 +55,27 @@ class StudentData:
     address: str | None = None
     message_code: int | None = None
     display_on_map: bool | None = None
+    stop_distance: float | None = None
+    minutes_to_stop: int | None = None
+    bus_near: bool | None = None
     am_school_arrival_time: time | None = None
+    am_school_latitude: float | None = None
+    am_school_longitude: float | None = None
     am_stop_arrival_time: time | None = None
+    am_stop_latitude: float | None = None
+    am_stop_longitude: float | None = None
     mid_school_arrival_time: time | None = None
+    mid_school_latitude: float | None = None
+    mid_school_longitude: float | None = None
     mid_stop_arrival_time: time | None = None
+    mid_stop_latitude: float | None = None
+    mid_stop_longitude: float | None = None
     pm_school_arrival_time: time | None = None
+    pm_school_latitude: float | None = None
+    pm_school_longitude: float | None = None
     pm_stop_arrival_time: time | None = None
+    pm_stop_latitude: float | None = None
+    pm_stop_longitude: float | None = None
     am_start_time: time = field(default_factory=lambda: time(6, 0))
     am_end_time: time = field(default_factory=lambda: time(9, 0))
     mid_start_time: time = field(default_factory=lambda: time(11, 0))
@@ -58,3 +83,25 @@ class StudentData:
     pm_start_time: time = field(default_factory=lambda: time(14, 0))
     pm_end_time: time = field(default_factory=lambda: time(16, 0))
     has_mid_stops: bool = False
+
+
+@dataclass
+class FetchStatus:
+    """Status of the stop fetches of a student and time of day."""
+
+    attempts: int = 0
+    last_error: str | None = None
+    last_success: datetime | None = None
+    next_retry: datetime | None = None
+
+
+@dataclass
+class PollTimeouts:
+    """Counters of the location fetches that ran out of time."""
+
+    # fetches cancelled by the timeout of a single call.
+    call_timeouts: int = 0
+    # fetches cancelled because the poll ran out of its budget.
+    budget_timeouts: int = 0
+    # polls that ran out of their budget.
+    budget_overruns: int = 0
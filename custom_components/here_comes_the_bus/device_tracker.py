@@ -1,19 +1,43 @@
 """Define a device tracker."""
 
 from collections.abc import Callable
+from datetime import datetime, timedelta
 
 from attr import dataclass
 from homeassistant.components.device_tracker import (
+    ATTR_SOURCE_TYPE,
     TrackerEntity,  # type: ignore i am pretty sure it is but ?
     TrackerEntityDescription,  # type: ignore i am pretty sure it is but ?
 )
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.const import ATTR_GPS_ACCURACY
+from homeassistant.core import (
+    CALLBACK_TYPE,
+    HomeAssistant,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.helpers import entity_platform
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util import dt as dt_util
+from homeassistant.util.location import distance
+
+from .const import (
+    CONF_TRACKER_MIN_DISTANCE,
+    CONF_TRACKER_MIN_INTERVAL,
+    DEFAULT_TRACKER_MIN_DISTANCE,
+    DEFAULT_TRACKER_MIN_INTERVAL,
+    SERVICE_GET_ROUTE_TRACE,
+)
 from .coordinator import HCBDataCoordinator
-from .data import HCBConfigEntry, StudentData
+from .data import HCBConfigEntry, StudentData, get_option
 from .entity import HCBEntity
 
+# A location held back for being close to the written one is written at least
+# this long after, so the tracker catches up once the bus stops.
+TRAILING_WRITE_DELAY = timedelta(seconds=60)
+
 
 @dataclass(frozen=True, kw_only=True)
 class HCBTrackerEntityDescription(TrackerEntityDescription, frozen_or_thawed=True):
@@ -24,6 +48,9 @@ class HCBTrackerEntityDescription(TrackerEntityDescription, frozen_or_thawed=Tru
     address_fn: Callable[[StudentData], str | None]
 
 
+# The student data fields the tracker is built from.
+TRACKER_FIELDS = frozenset({"address", "latitude", "longitude"})
+
 DEVICE_TRACKERS = [
     HCBTrackerEntityDescription(
         name="",
@@ -42,25 +69,141 @@ async def async_setup_entry(
 ) -> None:
     """Set up bus sensors."""
     async_add_entities(
-        HCBTracker(entry.runtime_data.coordinator, student, tracker)
+        HCBTracker(
+            entry.runtime_data.coordinator,
+            student,
+            tracker,
+            min_interval=get_option(
+                entry, CONF_TRACKER_MIN_INTERVAL, DEFAULT_TRACKER_MIN_INTERVAL
+            ),
+            min_distance=get_option(
+                entry, CONF_TRACKER_MIN_DISTANCE, DEFAULT_TRACKER_MIN_DISTANCE
+            ),
+        )
         for student in entry.runtime_data.coordinator.data.values()
         for tracker in DEVICE_TRACKERS
     )
+    entity_platform.async_get_current_platform().async_register_entity_service(
+        SERVICE_GET_ROUTE_TRACE,
+        None,
+        "async_get_route_trace",
+        supports_response=SupportsResponse.ONLY,
+    )
 
 
 class HCBTracker(HCBEntity, TrackerEntity):
-    """Defines a single bus sensor."""
-
+    """
+    Defines a single bus sensor.
+
+    A new location within the minimum interval or the minimum distance of
+    the last written one is held back, so the recorder stores fewer rows.
+    A location held back by the interval is written when it is over. One
+    held back by the distance is written after the interval, and at least
+    TRAILING_WRITE_DELAY, unless the bus moved far enough before then. The
+    state always ends up at the last location of the bus, also once it stops.
+    Every location is a new set of attributes, the ones that never change are
+    left out of the recorder to keep them small.
+    """
+
+    coordinator: HCBDataCoordinator
     entity_description: HCBTrackerEntityDescription
+    _unrecorded_attributes = frozenset({ATTR_GPS_ACCURACY, ATTR_SOURCE_TYPE})
 
     def __init__(
         self,
         coordinator: HCBDataCoordinator,
         student: StudentData,
         description: HCBTrackerEntityDescription,
+        *,
+        min_interval: int = DEFAULT_TRACKER_MIN_INTERVAL,
+        min_distance: int = DEFAULT_TRACKER_MIN_DISTANCE,
     ) -> None:
         """Pass coordinator to CoordinatorEntity."""
         super().__init__(coordinator, student, description)
+        self._min_interval = timedelta(seconds=min_interval)
+        self._min_distance = min_distance
+        # when and where the location was last written, and the write of a
+        # held back location.
+        self._written_at: datetime | None = None
+        self._written_location: tuple[float | None, float | None] = (None, None)
+        self._unsub_pending_write: CALLBACK_TYPE | None = None
+
+    @property
+    def data_fields(self) -> frozenset[str]:
+        """Return the student data fields this entity is built from."""
+        return TRACKER_FIELDS
+
+    async def async_get_route_trace(self) -> ServiceResponse:
+        """Return the route of the bus during the current window."""
+        bus_name = self.student.bus_name
+        trace = None if bus_name is None else self.coordinator.traces.get(bus_name)
+        if trace is None:
+            return {"time_of_day_id": None, "fixes": []}
+        return {"time_of_day_id": trace.time_of_day_id, "fixes": trace.as_list()}
+
+    @callback
+    def async_write_ha_state(self) -> None:
+        """Write the state and record the delay since the location was fetched."""
+        location = (self.latitude, self.longitude)
+        if self._written_at is not None and location != self._written_location:
+            wait = self._written_at + self._min_interval - dt_util.utcnow()
+            if wait > timedelta(0):
+                self._schedule_pending_write(wait, self._async_write_pending)
+                return
+            if self._moved(location) < self._min_distance:
+                self._schedule_pending_write(
+                    max(self._min_interval, TRAILING_WRITE_DELAY),
+                    self._async_write_trailing,
+                )
+                return
+        self._write_location(location)
+
+    def _write_location(self, location: tuple[float | None, float | None]) -> None:
+        """Write the state of the location, cancelling any held back write."""
+        self._cancel_pending_write()
+        self._written_at = dt_util.utcnow()
+        self._written_location = location
+        super().async_write_ha_state()
+        if freshness := self.coordinator.freshness.get(self.student.bus_name):
+            freshness.record_write()
+
+    def _moved(self, location: tuple[float | None, float | None]) -> float:
+        """Return the meters from the last written location, inf when unknown."""
+        if None in location or None in self._written_location:
+            return float("inf")
+        return distance(*self._written_location, *location)
+
+    def _schedule_pending_write(
+        self, delay: timedelta, action: Callable[[datetime], None]
+    ) -> None:
+        """Write a held back location after the delay, unless one is pending."""
+        if self._unsub_pending_write is None:
+            self._unsub_pending_write = async_call_later(
+                self.hass, delay.total_seconds(), action
+            )
+
+    @callback
+    def _async_write_pending(self, _: datetime) -> None:
+        """Write the location held back during the interval."""
+        self._unsub_pending_write = None
+        self.async_write_ha_state()
+
+    @callback
+    def _async_write_trailing(self, _: datetime) -> None:
+        """Write the last location, held back for being close to the written one."""
+        self._unsub_pending_write = None
+        self._write_location((self.latitude, self.longitude))
+
+    def _cancel_pending_write(self) -> None:
+        """Cancel the write of a held back location."""
+        if self._unsub_pending_write is not None:
+            self._unsub_pending_write()
+            self._unsub_pending_write = None
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Cancel the write of a held back location."""
+        await super().async_will_remove_from_hass()
+        self._cancel_pending_write()
 
     @property
     def location_name(self) -> str | None:
@@ -81,10 +224,3 @@ class HCBTracker(HCBEntity, TrackerEntity):
     def location_accuracy(self) -> int:
         """Return the gps accuracy of the device."""
         return 100
-
-    @callback
-    def _handle_coordinator_update(self) -> None:
-        """Handle updated self.student from the coordinator."""
-        if self.student.student_id in self.coordinator.data:
-            self.student = self.coordinator.data[self.student.student_id]
-            self.async_write_ha_state()
@@ -0,0 +1,45 @@
+"""Diagnostics support for Here comes the bus."""
+
+from __future__ import annotations
+
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+
+    from .data import HCBConfigEntry
+
+TO_REDACT = {CONF_PASSWORD, CONF_USERNAME}
+
+
+async def async_get_config_entry_diagnostics(
+    _: HomeAssistant, entry: HCBConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    schedule_coordinator = entry.runtime_data.schedule_coordinator
+    coordinator = entry.runtime_data.coordinator
+    fetch_status = schedule_coordinator.fetch_status
+    timeouts = coordinator.timeouts
+    client = entry.runtime_data.client
+    return {
+        "entry": async_redact_data(entry.data, TO_REDACT),
+        "parse_in_executor": client.parse_in_executor,
+        "api_calls": entry.runtime_data.requests.as_dict(),
+        "stop_fetches": [
+            {"student_id": student_id, "time_of_day_id": tod, **asdict(status)}
+            for (student_id, tod), status in fetch_status.items()
+        ],
+        "location_timeouts": asdict(timeouts),
+        "processing": {
+            **schedule_coordinator.processing.as_dict(),
+            **coordinator.processing.as_dict(),
+        },
+        "freshness": {
+            bus_name: freshness.as_dict()
+            for bus_name, freshness in coordinator.freshness.items()
+        },
+    }
@@ -2,13 +2,14 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
+from homeassistant.core import callback
 from homeassistant.helpers.device_registry import DeviceEntryType, DeviceInfo
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from .const import BUS, DOMAIN, HERE_COMES_THE_BUS
-from .coordinator import HCBDataCoordinator
+from .const import ATTR_STALE, BUS, DOMAIN, HERE_COMES_THE_BUS
+from .coordinator import HCBCoordinator
 
 if TYPE_CHECKING:
     from homeassistant.helpers.entity import EntityDescription
@@ -16,12 +17,12 @@ if TYPE_CHECKING:
     from .data import StudentData
 
 
-class HCBEntity(CoordinatorEntity[HCBDataCoordinator]):
+class HCBEntity(CoordinatorEntity[HCBCoordinator]):
     """HCB class."""
 
     def __init__(
         self,
-        coordinator: HCBDataCoordinator,
+        coordinator: HCBCoordinator,
         student: StudentData,
         description: EntityDescription,
     ) -> None:
@@ -30,6 +31,8 @@ class HCBEntity(CoordinatorEntity[HCBDataCoordinator]):
         self.student = student
         self.entity_description = description
         self.use_device_name = True
+        self._available_written = True
+        self._stale_written = False
         self._attr_device_info = DeviceInfo(
             entry_type=DeviceEntryType.SERVICE,
             identifiers={(DOMAIN, student.student_id)},
@@ -51,3 +54,38 @@ class HCBEntity(CoordinatorEntity[HCBDataCoordinator]):
     def icon(self) -> str | None:
         """Return the icon to use in the frontend."""
         return "mdi:bus"
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return whether the data of the student is older than it should be."""
+        return {ATTR_STALE: self.student.student_id in self.coordinator.stale}
+
+    @property
+    def data_fields(self) -> frozenset[str]:
+        """Return the student data fields this entity is built from."""
+        return frozenset({self.entity_description.key})
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """
+        Handle updated data from the coordinator.
+
+        The state is only written when one of the fields of this entity
+        changed, or the availability or staleness of the entity changed.
+        """
+        student_id = self.student.student_id
+        if student_id not in self.coordinator.data:
+            return
+        self.student = self.coordinator.data[student_id]
+        available = self.available
+        stale = student_id in self.coordinator.stale
+        if (
+            not self.data_fields.isdisjoint(
+                self.coordinator.changes.get(student_id, ())
+            )
+            or available != self._available_written
+            or stale != self._stale_written
+        ):
+            self._available_written = available
+            self._stale_written = stale
+            self.async_write_ha_state()
@@ -0,0 +1,129 @@
+"""Estimate when the bus reaches the student's stop."""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from datetime import datetime, time
+
+from homeassistant.util import dt as dt_util
+from homeassistant.util.location import distance
+
+# Conversion from the miles per hour reported by HCB.
+METERS_PER_SECOND_PER_MPH = 0.44704
+
+# The roads to the stop are about this much longer than the straight line.
+ROUTE_FACTOR = 1.3
+
+# The speed assumed for a bus that is waiting or crawling, in mph.
+MIN_SPEED_MPH = 12
+
+# The weight of the estimate by distance in the blend with the schedule, when
+# the bus heads towards the stop and when it heads away from it.
+TOWARDS_WEIGHT = 0.75
+AWAY_WEIGHT = 0.25
+
+# The compass headings reported by HCB, in degrees.
+COMPASS_DEGREES = {
+    heading: index * 45
+    for index, heading in enumerate(("N", "NE", "E", "SE", "S", "SW", "W", "NW"))
+}
+
+
+@dataclass(frozen=True)
+class Eta:
+    """The estimated distance and time until the bus reaches the stop."""
+
+    meters: float | None
+    seconds: float
+    # the scheduled arrival passed and the bus heads away from the stop.
+    passed: bool = False
+
+
+def distance_to_stop(
+    latitude: float | None,
+    longitude: float | None,
+    stop_latitude: float | None,
+    stop_longitude: float | None,
+) -> float | None:
+    """Return the distance in meters between the bus and the stop."""
+    if None in (latitude, longitude, stop_latitude, stop_longitude):
+        return None
+    return distance(latitude, longitude, stop_latitude, stop_longitude)
+
+
+def bearing_to_stop(
+    latitude: float, longitude: float, stop_latitude: float, stop_longitude: float
+) -> float:
+    """Return the bearing from the bus to the stop, in degrees from north."""
+    north = stop_latitude - latitude
+    east = (stop_longitude - longitude) * math.cos(math.radians(latitude))
+    return math.degrees(math.atan2(east, north)) % 360
+
+
+def heads_towards(
+    heading: str | None,
+    latitude: float | None,
+    longitude: float | None,
+    stop_latitude: float | None,
+    stop_longitude: float | None,
+) -> bool | None:
+    """Return whether the bus heads towards the stop, None if unknown."""
+    degrees = COMPASS_DEGREES.get((heading or "").upper())
+    if (
+        degrees is None
+        or latitude is None
+        or longitude is None
+        or stop_latitude is None
+        or stop_longitude is None
+    ):
+        return None
+    bearing = bearing_to_stop(latitude, longitude, stop_latitude, stop_longitude)
+    return abs((bearing - degrees + 180) % 360 - 180) <= 90  # noqa: PLR2004
+
+
+def _scheduled_seconds(dt_now: datetime, arrival_time: time | None) -> float | None:
+    """Return the seconds until the scheduled arrival, zero once it passed."""
+    if arrival_time is None:
+        return None
+    arrival = datetime.combine(dt_now.date(), arrival_time, tzinfo=dt_now.tzinfo)
+    return max((dt_util.as_utc(arrival) - dt_util.as_utc(dt_now)).total_seconds(), 0)
+
+
+def estimate_arrival(  # noqa: PLR0913
+    dt_now: datetime,
+    *,
+    arrival_time: time | None,
+    latitude: float | None,
+    longitude: float | None,
+    speed: int | None,
+    heading: str | None,
+    stop_latitude: float | None,
+    stop_longitude: float | None,
+) -> Eta | None:
+    """
+    Estimate the distance and time until the bus reaches the stop.
+
+    The time to drive the distance along the roads, at the speed of the bus
+    but no slower than a crawl, is blended with the scheduled arrival. The
+    distance counts for more while the bus heads towards the stop. A bus
+    heading away after the scheduled arrival has most likely passed it.
+    """
+    scheduled = _scheduled_seconds(dt_now, arrival_time)
+    meters = distance_to_stop(latitude, longitude, stop_latitude, stop_longitude)
+    if meters is None:
+        return None if scheduled is None else Eta(None, scheduled)
+    by_distance = (
+        meters
+        * ROUTE_FACTOR
+        / (max(speed or 0, MIN_SPEED_MPH) * METERS_PER_SECOND_PER_MPH)
+    )
+    if scheduled is None:
+        return Eta(meters, by_distance)
+    towards = heads_towards(heading, latitude, longitude, stop_latitude, stop_longitude)
+    weight = AWAY_WEIGHT if towards is False else TOWARDS_WEIGHT
+    return Eta(
+        meters,
+        weight * by_distance + (1 - weight) * scheduled,
+        passed=towards is False and scheduled == 0,
+    )
@@ -0,0 +1,271 @@
+"""Timings of the calls to the HCB api, of processing them and data freshness."""
+
+from __future__ import annotations
+
+import math
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import accumulate
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+from .const import LOGGER
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from datetime import datetime
+
+# Parsing on the event loop for longer than this is logged.
+SLOW_PARSE_SECONDS = 0.005
+
+# The durations are counted in buckets growing by this factor from the first
+# one, so a percentile is at most a fifth above the real value. The last
+# bucket also counts everything longer than it, about 90 seconds.
+HISTOGRAM_FIRST_BUCKET = 0.0001
+HISTOGRAM_GROWTH = 2**0.25
+HISTOGRAM_BUCKETS = 80
+
+# The ages of the locations start at a hundredth of a second, so the last
+# bucket is about two and a half hours, and only the latest fixes count.
+FRESHNESS_FIRST_BUCKET = 0.01
+FRESHNESS_SAMPLES = 256
+
+# The percentiles reported of every histogram.
+PERCENTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+
+@dataclass
+class Histogram:
+    """Fixed size histogram of durations in seconds, with logarithmic buckets."""
+
+    counts: list[int] = field(default_factory=lambda: [0] * HISTOGRAM_BUCKETS)
+    count: int = 0
+    first_bucket: float = HISTOGRAM_FIRST_BUCKET
+
+    def _bucket(self, seconds: float) -> int:
+        """Return the index of the bucket of a duration."""
+        if seconds <= self.first_bucket:
+            return 0
+        return min(
+            math.ceil(math.log(seconds / self.first_bucket, HISTOGRAM_GROWTH)),
+            HISTOGRAM_BUCKETS - 1,
+        )
+
+    def add(self, seconds: float) -> None:
+        """Count a duration."""
+        self.counts[self._bucket(seconds)] += 1
+        self.count += 1
+
+    def percentile(self, quantile: float) -> float | None:
+        """Return the upper bound of the bucket of the quantile, in seconds."""
+        if not self.count:
+            return None
+        rank = max(math.ceil(quantile * self.count), 1)
+        index = bisect_left(list(accumulate(self.counts)), rank)
+        return self.first_bucket * HISTOGRAM_GROWTH**index
+
+    def percentiles(self, prefix: str = "") -> dict[str, float | None]:
+        """Return the reported percentiles, named with the prefix."""
+        return {
+            f"{prefix}{name}": self.percentile(quantile)
+            for name, quantile in PERCENTILES.items()
+        }
+
+
+@dataclass
+class RollingHistogram(Histogram):
+    """Histogram of the latest durations, the oldest one drops out of it."""
+
+    first_bucket: float = FRESHNESS_FIRST_BUCKET
+    samples: deque[int] = field(default_factory=lambda: deque(maxlen=FRESHNESS_SAMPLES))
+
+    def add(self, seconds: float) -> None:
+        """Count a duration, forgetting the oldest one when full."""
+        if len(self.samples) == self.samples.maxlen:
+            self.counts[self.samples[0]] -= 1
+            self.count -= 1
+        index = self._bucket(seconds)
+        self.samples.append(index)
+        self.counts[index] += 1
+        self.count += 1
+
+
+@dataclass
+class CallTimings:
+    """Network and parse time of the calls of one api method, in seconds."""
+
+    calls: int = 0
+    errors: int = 0
+    bytes_received: int = 0
+    network_total: float = 0.0
+    network_max: float = 0.0
+    parse_total: float = 0.0
+    parse_max: float = 0.0
+    slow_parses: int = 0
+    network: Histogram = field(default_factory=Histogram)
+
+    def add(self, network: float, parse: float, *, slow: bool, size: int = 0) -> None:
+        """Add the timings and the response size of a call."""
+        self.calls += 1
+        self.bytes_received += size
+        self.network_total += network
+        self.network_max = max(self.network_max, network)
+        self.network.add(network)
+        self.parse_total += parse
+        self.parse_max = max(self.parse_max, parse)
+        self.slow_parses += slow
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the timings with the percentiles of the network time."""
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "bytes_received": self.bytes_received,
+            "network_total": self.network_total,
+            "network_max": self.network_max,
+            **self.network.percentiles("network_"),
+            "parse_total": self.parse_total,
+            "parse_max": self.parse_max,
+            "slow_parses": self.slow_parses,
+        }
+
+
+@dataclass
+class Durations:
+    """Count, total, maximum and histogram of the durations of a step."""
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    histogram: Histogram = field(default_factory=Histogram)
+
+    def add(self, seconds: float) -> None:
+        """Add the duration of a run of the step."""
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.histogram.add(seconds)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the durations with their percentiles."""
+        return {
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+            **self.histogram.percentiles(),
+        }
+
+
+class RequestMetrics:
+    """Record the network and parse time of every api call."""
+
+    def __init__(self) -> None:
+        """Initialize the metrics."""
+        self.calls: dict[str, CallTimings] = {}
+
+    def record(
+        self, method: str, network: float, parse: float, *, on_loop: bool, size: int = 0
+    ) -> None:
+        """Record the timings of a call, flagging slow parsing on the loop."""
+        slow = on_loop and parse > SLOW_PARSE_SECONDS
+        if slow:
+            LOGGER.debug(
+                "Parsing the response of %s blocked the event loop for %.1f ms",
+                method,
+                parse * 1000,
+            )
+        self.calls.setdefault(method, CallTimings()).add(
+            network, parse, slow=slow, size=size
+        )
+
+    def record_error(self, method: str) -> None:
+        """Count a failed call."""
+        self.calls.setdefault(method, CallTimings()).errors += 1
+
+    def as_dict(self) -> dict[str, dict[str, Any]]:
+        """Return the timings of every api method."""
+        return {method: timings.as_dict() for method, timings in self.calls.items()}
+
+
+class ProcessingMetrics:
+    """Record the time spent in the steps processing the responses."""
+
+    def __init__(self) -> None:
+        """Initialize the metrics."""
+        self.steps: dict[str, Durations] = {}
+
+    @contextmanager
+    def timed(self, step: str) -> Iterator[None]:
+        """Time the code run in the context as a run of the step."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.setdefault(step, Durations()).add(perf_counter() - start)
+
+    def as_dict(self) -> dict[str, dict[str, Any]]:
+        """Return the durations of every step."""
+        return {step: durations.as_dict() for step, durations in self.steps.items()}
+
+
+def timed_parse[T](parse: Callable[[str], T], text: str) -> tuple[T, float]:
+    """Parse the text and return the result with the seconds it took."""
+    start = perf_counter()
+    result = parse(text)
+    return result, perf_counter() - start
+
+
+class Freshness:
+    """
+    Record how old the location of a bus is on its way to Home Assistant.
+
+    The age of the fix when its poll finished, the delay from the poll to the
+    state of the tracker and the time between distinct fixes of the bus are
+    kept in rolling histograms. Comparing them tells whether polling faster
+    gets fresher locations, or the bus reports them no more often.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the histograms."""
+        self.fix_age = RollingHistogram()
+        self.write_delay = RollingHistogram()
+        self.fix_interval = RollingHistogram()
+        # the age of the last fix when it was fetched, in seconds, and when
+        # the bus was last fetched.
+        self.last_age: float | None = None
+        self.fetched_at: datetime | None = None
+        self._last_fix: datetime | None = None
+        # when the poll of a new fix finished, until the tracker writes it.
+        self._fetched: float | None = None
+
+    def record_fetch(self, log_time: datetime | None, fetched_at: datetime) -> None:
+        """Record a fetched location, fixed by the bus at the log time."""
+        self.fetched_at = fetched_at
+        if log_time is None:
+            return
+        self.last_age = max((fetched_at - log_time).total_seconds(), 0.0)
+        self.fix_age.add(self.last_age)
+        if log_time == self._last_fix:
+            return
+        if self._last_fix is not None:
+            self.fix_interval.add((log_time - self._last_fix).total_seconds())
+        self._last_fix = log_time
+        self._fetched = perf_counter()
+
+    def record_write(self) -> None:
+        """Record the state write of the last fetched fix."""
+        if self._fetched is None:
+            return
+        self.write_delay.add(perf_counter() - self._fetched)
+        self._fetched = None
+
+    def as_dict(self) -> dict[str, float | None]:
+        """Return the last age and the percentiles of every histogram."""
+        return {
+            "last_age": self.last_age,
+            **self.fix_age.percentiles("fix_age_"),
+            **self.write_delay.percentiles("write_delay_"),
+            **self.fix_interval.percentiles("fix_interval_"),
+        }
@@ -0,0 +1,118 @@
+"""Route of a bus during its window, kept in a fixed size ring buffer."""
+
+from __future__ import annotations
+
+from array import array
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.util import dt as dt_util
+
+from .eta import COMPASS_DEGREES
+
+if TYPE_CHECKING:
+    from datetime import datetime
+
+# An hour of fixes at a ten second poll.
+TRACE_CAPACITY = 360
+
+# The compass headings, stored by their index.
+HEADINGS = tuple(COMPASS_DEGREES)
+
+# Stored for a speed or heading that was not reported.
+UNKNOWN = -1
+
+
+class RouteTrace:
+    """
+    The latest fixes of a bus, oldest first.
+
+    The fixes are stored in packed arrays of a fixed capacity rather than as
+    an object per fix, the newest fix overwriting the oldest one when full.
+    A fix that repeats the last one is not stored, so a waiting bus does not
+    push its route out of the buffer.
+    """
+
+    def __init__(self, capacity: int = TRACE_CAPACITY) -> None:
+        """Allocate the arrays of the fixes."""
+        self.capacity = capacity
+        self.time_of_day_id: str | None = None
+        self._log_times = array("d", bytes(8 * capacity))
+        self._latitudes = array("d", bytes(8 * capacity))
+        self._longitudes = array("d", bytes(8 * capacity))
+        self._speeds = array("h", bytes(2 * capacity))
+        self._headings = array("b", bytes(capacity))
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        """Return the number of fixes."""
+        return self._size
+
+    def append(
+        self,
+        log_time: datetime,
+        latitude: float,
+        longitude: float,
+        speed: int | None,
+        heading: str | None,
+    ) -> bool:
+        """Add a fix, returning whether it was stored."""
+        timestamp = log_time.timestamp()
+        speed_value = UNKNOWN if speed is None else speed
+        heading_value = (
+            HEADINGS.index(heading.upper())
+            if heading and heading.upper() in HEADINGS
+            else UNKNOWN
+        )
+        if self._size:
+            last = (self._start + self._size - 1) % self.capacity
+            if self._log_times[last] == timestamp or (
+                self._latitudes[last] == latitude
+                and self._longitudes[last] == longitude
+                and self._speeds[last] == speed_value
+                and self._headings[last] == heading_value
+            ):
+                return False
+        if self._size < self.capacity:
+            index = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            index = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._log_times[index] = timestamp
+        self._latitudes[index] = latitude
+        self._longitudes[index] = longitude
+        self._speeds[index] = speed_value
+        self._headings[index] = heading_value
+        return True
+
+    def clear(self) -> None:
+        """Forget the fixes, the arrays are kept."""
+        self.time_of_day_id = None
+        self._start = 0
+        self._size = 0
+
+    def _indexes(self) -> list[int]:
+        """Return the indexes of the fixes, oldest first."""
+        return [(self._start + offset) % self.capacity for offset in range(self._size)]
+
+    def coordinates(self) -> list[tuple[float, float]]:
+        """Return the latitude and longitude of the fixes, oldest first."""
+        return [(self._latitudes[i], self._longitudes[i]) for i in self._indexes()]
+
+    def as_list(self) -> list[dict[str, Any]]:
+        """Return the fixes, oldest first."""
+        return [
+            {
+                "log_time": dt_util.as_local(
+                    dt_util.utc_from_timestamp(self._log_times[i])
+                ).isoformat(),
+                "latitude": self._latitudes[i],
+                "longitude": self._longitudes[i],
+                "speed": None if self._speeds[i] == UNKNOWN else self._speeds[i],
+                "heading": None
+                if self._headings[i] == UNKNOWN
+                else HEADINGS[self._headings[i]],
+            }
+            for i in self._indexes()
+        ]
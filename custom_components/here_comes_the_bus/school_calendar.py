@@ -0,0 +1,253 @@
+"""Days without school and early releases, read from a school calendar."""
+
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.util import dt as dt_util
+
+from .const import LOGGER
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from homeassistant.core import HomeAssistant
+
+CALENDAR_DOMAIN = "calendar"
+
+# The start and end of an event, a date for all day events, and its summary.
+type CalendarEvent = tuple[date | datetime, date | datetime, str]
+
+# When the buses leave the school on an early release day of an all day
+# event, which has no time of its own.
+ALL_DAY_DISMISSAL = time(12, 0)
+
+
+def _parse_ics_value(value: str, params: dict[str, str]) -> date | datetime:
+    """Parse a DTSTART or DTEND value of an ICS file."""
+    if params.get("VALUE", "").upper() == "DATE" or len(value) == len("YYYYMMDD"):
+        return datetime.strptime(value, "%Y%m%d").date()  # noqa: DTZ007
+    if value.endswith("Z"):
+        parsed = datetime.strptime(value, "%Y%m%dT%H%M%SZ")  # noqa: DTZ007
+        return parsed.replace(tzinfo=dt_util.UTC)
+    parsed = datetime.strptime(value, "%Y%m%dT%H%M%S")  # noqa: DTZ007
+    time_zone = dt_util.get_time_zone(params["TZID"]) if "TZID" in params else None
+    return parsed.replace(tzinfo=time_zone or dt_util.get_default_time_zone())
+
+
+def parse_ics(text: str) -> list[CalendarEvent]:
+    """
+    Return the start, end and summary of the events of an ICS file.
+
+    Only the single events are read, recurrence rules are not expanded. An
+    all day event without an end lasts one day.
+    """
+    # a line starting with white space continues the line before it.
+    lines: list[str] = []
+    for line in text.splitlines():
+        if line[:1] in {" ", "\t"} and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+    events: list[CalendarEvent] = []
+    fields: dict[str, date | datetime] | None = None
+    summary = ""
+    for line in lines:
+        name_params, _, value = line.partition(":")
+        name, *params = name_params.split(";")
+        name = name.upper()
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            fields = {}
+            summary = ""
+        elif name == "END" and value.upper() == "VEVENT" and fields is not None:
+            if "DTSTART" in fields:
+                start = fields["DTSTART"]
+                end = fields.get("DTEND", start)
+                if not isinstance(start, datetime) and end == start:
+                    end = start + timedelta(days=1)
+                events.append((start, end, summary))
+            fields = None
+        elif name == "SUMMARY" and fields is not None:
+            summary = value
+        elif name in {"DTSTART", "DTEND"} and fields is not None:
+            fields[name] = _parse_ics_value(
+                value.strip(),
+                {
+                    key.upper(): param_value
+                    for key, _, param_value in (
+                        param.partition("=") for param in params
+                    )
+                },
+            )
+    return events
+
+
+def _parse_event_value(value: str) -> date | datetime:
+    """Parse the start or end of an event of a calendar entity."""
+    if "T" not in value and " " not in value:
+        return date.fromisoformat(value)
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=dt_util.get_default_time_zone())
+    return parsed
+
+
+class SchoolCalendar:
+    """
+    Index of the school days of a calendar.
+
+    The calendar is an entity of Home Assistant or an ICS file in the config
+    directory. An event whose summary has the early release keyword is an
+    early release, the buses leave the school when it starts, or at
+    ALL_DAY_DISMISSAL for an all day event. Any other all day event closes
+    the school on every day it covers, or only one whose summary has a
+    closure keyword when there are any. Other events with a time, like
+    meetings, are left out. The events are indexed once a day.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        source: str,
+        early_release_keyword: str,
+        closure_keywords: str = "",
+    ) -> None:
+        """Initialize the calendar, the closure keywords separated by commas."""
+        self._hass = hass
+        self._source = source
+        self._early_release_keyword = early_release_keyword.casefold()
+        self._closure_keywords = [
+            keyword.strip()
+            for keyword in closure_keywords.casefold().split(",")
+            if keyword.strip()
+        ]
+        self._indexed: date | None = None
+        # the day the calendar last failed to be read, warned about once.
+        self._failed: date | None = None
+        self._closed: set[date] = set()
+        self._dismissals: dict[date, time] = {}
+
+    def is_closed(self, day: date) -> bool:
+        """Return whether the calendar closes the school on the day."""
+        return day in self._closed
+
+    def dismissal(self, day: date) -> time | None:
+        """Return when the buses leave the school on an early release day."""
+        return self._dismissals.get(day)
+
+    async def async_index(self, day: date, days: int) -> None:
+        """
+        Index the events of the day and the days after it.
+
+        Nothing is read when the day is already indexed. A calendar that
+        cannot be read, like an entity that is not loaded yet, keeps the last
+        index and is read again on the next call.
+        """
+        if not self._source or self._indexed == day:
+            return
+        start = datetime.combine(day, time(), tzinfo=dt_util.get_default_time_zone())
+        end = start + timedelta(days=days)
+        try:
+            if self._source.startswith(f"{CALENDAR_DOMAIN}."):
+                events = await self._async_entity_events(start, end)
+            else:
+                events = await self._async_file_events()
+        except (HomeAssistantError, OSError, ValueError) as err:
+            if self._failed == day:
+                LOGGER.debug(
+                    "Unable to read the school calendar %s: %s", self._source, err
+                )
+            else:
+                LOGGER.warning(
+                    "Unable to read the school calendar %s: %s", self._source, err
+                )
+            self._failed = day
+            return
+        self._indexed = day
+        self._failed = None
+        self._closed, self._dismissals = _index(
+            events,
+            day,
+            day + timedelta(days=days),
+            self._early_release_keyword,
+            self._closure_keywords,
+        )
+        LOGGER.debug(
+            "Indexed the school calendar from %s: %s closed, %s early releases",
+            day,
+            len(self._closed),
+            len(self._dismissals),
+        )
+
+    async def _async_entity_events(
+        self, start: datetime, end: datetime
+    ) -> list[CalendarEvent]:
+        """Return the events of the calendar entity between the times."""
+        response: dict[str, Any] | None = await self._hass.services.async_call(
+            CALENDAR_DOMAIN,
+            "get_events",
+            {
+                "entity_id": self._source,
+                "start_date_time": start,
+                "end_date_time": end,
+            },
+            blocking=True,
+            return_response=True,
+        )
+        return [
+            (
+                _parse_event_value(event["start"]),
+                _parse_event_value(event["end"]),
+                event.get("summary", ""),
+            )
+            for event in (response or {}).get(self._source, {}).get("events", [])
+        ]
+
+    async def _async_file_events(self) -> list[CalendarEvent]:
+        """Return the events of the ICS file."""
+        path = Path(self._hass.config.path(self._source))
+        text = await self._hass.async_add_executor_job(path.read_text)
+        return parse_ics(text)
+
+
+def _index(
+    events: Iterable[CalendarEvent],
+    first: date,
+    last: date,
+    keyword: str,
+    closure_keywords: list[str],
+) -> tuple[set[date], dict[date, time]]:
+    """Return the closed days and the early releases between the days."""
+    closed: set[date] = set()
+    dismissals: dict[date, time] = {}
+    for start, end, summary in events:
+        words = summary.casefold()
+        early_release = bool(keyword) and keyword in words
+        if isinstance(start, datetime):
+            local = dt_util.as_local(start)
+            day = local.date()
+            if first <= day < last and early_release:
+                dismissals[day] = min(local.time(), dismissals.get(day, time.max))
+            continue
+        if (
+            not early_release
+            and closure_keywords
+            and not any(
+                closure_keyword in words for closure_keyword in closure_keywords
+            )
+        ):
+            # like a picture day on the calendar of the district.
+            continue
+        # the end of an all day event is the day after it.
+        end_day = end.date() if isinstance(end, datetime) else end
+        day = max(start, first)
+        while day < min(end_day, last):
+            if early_release:
+                dismissals[day] = min(ALL_DAY_DISMISSAL, dismissals.get(day, time.max))
+            else:
+                closed.add(day)
+            day += timedelta(days=1)
+    return closed, dismissals
@@ -2,20 +2,39 @@
 
 from collections.abc import Callable
 from dataclasses import dataclass
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 from typing import Any
 
 from homeassistant.components.sensor import SensorEntity, SensorEntityDescription
-from homeassistant.components.sensor.const import SensorDeviceClass
+from homeassistant.components.sensor.const import SensorDeviceClass, SensorStateClass
 from homeassistant.const import (
+    EntityCategory,
+    UnitOfInformation,
+    UnitOfLength,
     UnitOfSpeed,
+    UnitOfTime,
 )
 from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.device_registry import DeviceEntryType, DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import dt as dt_util
 
-from .coordinator import HCBDataCoordinator
-from .data import HCBConfigEntry, StudentData
+from .arrival_model import PLACE_SCHOOL, PLACE_STOP, ArrivalPrediction
+from .client import PARENT_INFO_METHOD, STOP_INFO_METHOD
+from .const import ATTR_STALE, BUS, DOMAIN, HERE_COMES_THE_BUS
+from .coordinator import WINDOW_PREFIXES, HCBCoordinator, HCBDataCoordinator
+from .data import HCBConfigEntry, HCBData, StudentData
 from .entity import HCBEntity
+from .metrics import PERCENTILES, CallTimings, Durations, Freshness
+
+# The metric sensors are polled, the metrics change on every call.
+SCAN_INTERVAL = timedelta(minutes=1)
+
+# How often the predicted arrivals are checked for a new weekday or arrival.
+PREDICTION_INTERVAL = timedelta(minutes=1)
 
 
 @dataclass(frozen=True, kw_only=True)
@@ -23,6 +42,7 @@ class HCBSensorEntityDescription(SensorEntityDescription):
     """A class that describes sensor entities."""
 
     value_fn: Callable[[StudentData], float | str | datetime | time | None]
+    from_schedule: bool = False
 
 
 ENTITY_DESCRIPTIONS: tuple[HCBSensorEntityDescription, ...] = (
@@ -36,6 +56,7 @@ ENTITY_DESCRIPTIONS: tuple[HCBSensorEntityDescription, ...] = (
         name="Speed",
         device_class=SensorDeviceClass.SPEED,
         native_unit_of_measurement=UnitOfSpeed.MILES_PER_HOUR,
+        state_class=SensorStateClass.MEASUREMENT,
         value_fn=lambda x: x.speed,
     ),
     HCBSensorEntityDescription(
@@ -52,55 +73,260 @@ ENTITY_DESCRIPTIONS: tuple[HCBSensorEntityDescription, ...] = (
         key="log_time",
         name="Log time",
         device_class=SensorDeviceClass.TIMESTAMP,
+        # the log time changes with every location, most of the recorded rows.
+        entity_registry_enabled_default=False,
         value_fn=lambda x: x.log_time,
     ),
+    HCBSensorEntityDescription(
+        key="minutes_to_stop",
+        name="Minutes to stop",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MINUTES,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda x: x.minutes_to_stop,
+    ),
+    HCBSensorEntityDescription(
+        key="stop_distance",
+        name="Distance to stop",
+        device_class=SensorDeviceClass.DISTANCE,
+        native_unit_of_measurement=UnitOfLength.METERS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda x: x.stop_distance,
+    ),
     HCBSensorEntityDescription(
         key="am_school_arrival_time",
         name="AM school arrival time",
         value_fn=lambda x: x.am_school_arrival_time,
+        from_schedule=True,
     ),
     HCBSensorEntityDescription(
         key="am_stop_arrival_time",
         name="AM stop arrival time",
         value_fn=lambda x: x.am_stop_arrival_time,
+        from_schedule=True,
     ),
     HCBSensorEntityDescription(
         key="mid_school_arrival_time",
         name="mid school arrival time",
         value_fn=lambda x: x.mid_school_arrival_time,
+        from_schedule=True,
     ),
     HCBSensorEntityDescription(
         key="mid_stop_arrival_time",
         name="mid stop arrival time",
         value_fn=lambda x: x.mid_stop_arrival_time,
+        from_schedule=True,
     ),
     HCBSensorEntityDescription(
         key="pm_school_arrival_time",
         name="PM school arrival time",
         value_fn=lambda x: x.pm_school_arrival_time,
+        from_schedule=True,
     ),
     HCBSensorEntityDescription(
         key="pm_stop_arrival_time",
         name="PM stop arrival time",
         value_fn=lambda x: x.pm_stop_arrival_time,
+        from_schedule=True,
     ),
 )
 
 
+@dataclass(frozen=True, kw_only=True)
+class HCBMetricSensorEntityDescription(SensorEntityDescription):
+    """A class that describes the sensors of the api and processing metrics."""
+
+    value_fn: Callable[[HCBData], float | None]
+
+
+def _call_timings(data: HCBData, method: str) -> CallTimings:
+    """Return the timings of the calls of an api method."""
+    return data.requests.calls.get(method) or CallTimings()
+
+
+def _durations(data: HCBData, step: str) -> Durations:
+    """Return the durations of a processing step of either coordinator."""
+    return (
+        data.coordinator.processing.steps.get(step)
+        or data.schedule_coordinator.processing.steps.get(step)
+        or Durations()
+    )
+
+
+def _milliseconds(seconds: float | None) -> float | None:
+    """Return the seconds in milliseconds, rounded for display."""
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def _method_descriptions(
+    method: str, name: str
+) -> tuple[HCBMetricSensorEntityDescription, ...]:
+    """Return the descriptions of the metric sensors of an api method."""
+    return (
+        *(
+            HCBMetricSensorEntityDescription(
+                key=f"{method}_latency_{percentile}",
+                name=f"{name} latency {percentile}",
+                device_class=SensorDeviceClass.DURATION,
+                native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+                state_class=SensorStateClass.MEASUREMENT,
+                value_fn=lambda data, quantile=quantile: _milliseconds(
+                    _call_timings(data, method).network.percentile(quantile)
+                ),
+            )
+            for percentile, quantile in PERCENTILES.items()
+        ),
+        HCBMetricSensorEntityDescription(
+            key=f"{method}_calls",
+            name=f"{name} calls",
+            state_class=SensorStateClass.TOTAL_INCREASING,
+            value_fn=lambda data: _call_timings(data, method).calls,
+        ),
+        HCBMetricSensorEntityDescription(
+            key=f"{method}_errors",
+            name=f"{name} errors",
+            state_class=SensorStateClass.TOTAL_INCREASING,
+            value_fn=lambda data: _call_timings(data, method).errors,
+        ),
+        HCBMetricSensorEntityDescription(
+            key=f"{method}_bytes_received",
+            name=f"{name} bytes received",
+            device_class=SensorDeviceClass.DATA_SIZE,
+            native_unit_of_measurement=UnitOfInformation.BYTES,
+            state_class=SensorStateClass.TOTAL_INCREASING,
+            value_fn=lambda data: _call_timings(data, method).bytes_received,
+        ),
+    )
+
+
+def _step_description(step: str, name: str) -> HCBMetricSensorEntityDescription:
+    """Return the description of the sensor of a processing step."""
+    return HCBMetricSensorEntityDescription(
+        key=f"{step}_p95",
+        name=f"{name} time p95",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda data: _milliseconds(
+            _durations(data, step).histogram.percentile(PERCENTILES["p95"])
+        ),
+    )
+
+
+METRIC_DESCRIPTIONS: tuple[HCBMetricSensorEntityDescription, ...] = (
+    *_method_descriptions(PARENT_INFO_METHOD, "Parent info"),
+    *_method_descriptions(STOP_INFO_METHOD, "Stop info"),
+    _step_description("update_vehicle_location", "Location update"),
+    _step_description("update_stops", "Stops update"),
+)
+
+
+FRESHNESS_DESCRIPTION = SensorEntityDescription(
+    key="freshness",
+    name="Freshness",
+    device_class=SensorDeviceClass.DURATION,
+    native_unit_of_measurement=UnitOfTime.SECONDS,
+    state_class=SensorStateClass.MEASUREMENT,
+    entity_category=EntityCategory.DIAGNOSTIC,
+)
+
+
+@dataclass(frozen=True, kw_only=True)
+class HCBPredictedArrivalSensorEntityDescription(SensorEntityDescription):
+    """A class that describes the sensors of the learned arrival times."""
+
+    time_of_day_id: str
+    place: str
+
+
+PREDICTED_ARRIVAL_DESCRIPTIONS: tuple[
+    HCBPredictedArrivalSensorEntityDescription, ...
+] = tuple(
+    HCBPredictedArrivalSensorEntityDescription(
+        key=f"{prefix}_{place}_predicted_arrival",
+        name=f"{label} {place} predicted arrival",
+        time_of_day_id=WINDOW_PREFIXES[prefix],
+        place=place,
+    )
+    for prefix, label in (("am", "AM"), ("mid", "mid"), ("pm", "PM"))
+    for place in (PLACE_STOP, PLACE_SCHOOL)
+)
+
+
 async def async_setup_entry(
-    _: HomeAssistant,
+    hass: HomeAssistant,
     entry: HCBConfigEntry,
     async_add_entities: AddEntitiesCallback,
 ) -> None:
     """Set up bus sensors."""
     async_add_entities(
-        HCBSensor(entry.runtime_data.coordinator, entity_description, student)
-        for entity_description in ENTITY_DESCRIPTIONS
-        for student in entry.runtime_data.coordinator.data.values()
-        if student.has_mid_stops
-        or entity_description.key
-        not in ("mid_school_arrival_time", "mid_stop_arrival_time")
+        [
+            *(
+                HCBSensor(
+                    _coordinator(entry, entity_description), entity_description, student
+                )
+                for entity_description in ENTITY_DESCRIPTIONS
+                for student in _coordinator(entry, entity_description).data.values()
+                if student.has_mid_stops
+                or entity_description.key
+                not in ("mid_school_arrival_time", "mid_stop_arrival_time")
+            ),
+            *(
+                HCBPredictedArrivalSensor(
+                    entry.runtime_data.coordinator, student, entity_description
+                )
+                for entity_description in PREDICTED_ARRIVAL_DESCRIPTIONS
+                for student in entry.runtime_data.coordinator.data.values()
+                if student.has_mid_stops
+                or not entity_description.key.startswith("mid_")
+            ),
+            *(
+                HCBMetricSensor(entry, entity_description)
+                for entity_description in METRIC_DESCRIPTIONS
+            ),
+        ]
     )
+    _add_freshness_sensors(hass, entry, async_add_entities)
+
+
+def _add_freshness_sensors(
+    hass: HomeAssistant, entry: HCBConfigEntry, async_add_entities: AddEntitiesCallback
+) -> None:
+    """
+    Add a freshness sensor for every bus, once its first location is fetched.
+
+    The buses are only known from their locations, so the sensors are added
+    as the coordinator sees them, and removed once it forgets them.
+    """
+    coordinator = entry.runtime_data.coordinator
+    added: dict[str, HCBFreshnessSensor] = {}
+
+    @callback
+    def _async_update_buses() -> None:
+        """Add the sensors of the new buses and remove the forgotten ones."""
+        if new_buses := coordinator.freshness.keys() - added.keys():
+            sensors = [
+                HCBFreshnessSensor(entry, bus_name, FRESHNESS_DESCRIPTION)
+                for bus_name in sorted(new_buses)
+            ]
+            added.update((sensor.bus_name, sensor) for sensor in sensors)
+            async_add_entities(sensors)
+        for bus_name in added.keys() - coordinator.freshness.keys():
+            sensor = added.pop(bus_name)
+            if sensor.registry_entry is not None:
+                er.async_get(hass).async_remove(sensor.entity_id)
+
+    _async_update_buses()
+    entry.async_on_unload(coordinator.async_add_listener(_async_update_buses))
+
+
+def _coordinator(
+    entry: HCBConfigEntry, description: HCBSensorEntityDescription
+) -> HCBCoordinator:
+    """Return the coordinator the sensor gets its data from."""
+    if description.from_schedule:
+        return entry.runtime_data.schedule_coordinator
+    return entry.runtime_data.coordinator
 
 
 class HCBSensor(HCBEntity, SensorEntity):
@@ -110,7 +336,7 @@ class HCBSensor(HCBEntity, SensorEntity):
 
     def __init__(
         self,
-        coordinator: HCBDataCoordinator,
+        coordinator: HCBCoordinator,
         description: HCBSensorEntityDescription,
         student: StudentData,
     ) -> None:
@@ -122,9 +348,199 @@ class HCBSensor(HCBEntity, SensorEntity):
         """Return the state of the sensor."""
         return self.entity_description.value_fn(self.student)
 
+
+class HCBFreshnessSensor(CoordinatorEntity[HCBDataCoordinator], SensorEntity):
+    """
+    Defines the sensor of how old the location of a bus is.
+
+    There is one sensor per bus, shared by the students riding it, on the
+    device of the config entry. The state is the age of the last fix when it
+    was fetched, the attributes are the percentiles of the latest ages, of
+    the delays until the tracker wrote them and of the time between the
+    fixes. The percentiles change on every fix, so the recorder leaves them
+    out.
+    """
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_has_entity_name = True
+    _unrecorded_attributes = frozenset(Freshness().as_dict()) - {"last_age"}
+
+    def __init__(
+        self,
+        entry: HCBConfigEntry,
+        bus_name: str,
+        description: SensorEntityDescription,
+    ) -> None:
+        """Initialize the sensor of the bus."""
+        super().__init__(entry.runtime_data.coordinator)
+        self.bus_name = bus_name
+        self.entity_description = description
+        self._available_written = True
+        self._stale_written = False
+        self._attr_name = f"{BUS} {bus_name} {description.name}"
+        self._attr_unique_id = f"{entry.entry_id}_{bus_name}_{description.key}"
+        self._attr_device_info = DeviceInfo(
+            entry_type=DeviceEntryType.SERVICE,
+            identifiers={(DOMAIN, entry.entry_id)},
+            manufacturer=HERE_COMES_THE_BUS,
+            name=HERE_COMES_THE_BUS,
+        )
+
+    def _student_ids(self) -> list[str]:
+        """Return the ids of the students riding the bus."""
+        return [
+            student_id
+            for student_id, student_data in self.coordinator.data.items()
+            if student_data.bus_name == self.bus_name
+        ]
+
+    def _stale(self) -> bool:
+        """Return whether the location of any student riding the bus is stale."""
+        return any(
+            student_id in self.coordinator.stale for student_id in self._student_ids()
+        )
+
     @callback
     def _handle_coordinator_update(self) -> None:
-        """Handle updated data from the coordinator."""
-        if self.student.student_id in self.coordinator.data:
-            self.student = self.coordinator.data[self.student.student_id]
+        """
+        Handle updated data from the coordinator.
+
+        The state is only written when the bus has a new fix, or the
+        availability or staleness of the sensor changed.
+        """
+        available = self.available
+        stale = self._stale()
+        if (
+            any(
+                "log_time" in self.coordinator.changes.get(student_id, ())
+                for student_id in self._student_ids()
+            )
+            or available != self._available_written
+            or stale != self._stale_written
+        ):
+            self._available_written = available
+            self._stale_written = stale
+            self.async_write_ha_state()
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the age of the last fix when it was fetched, in seconds."""
+        freshness = self.coordinator.freshness.get(self.bus_name)
+        if freshness is None or freshness.last_age is None:
+            return None
+        return round(freshness.last_age, 1)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return whether the bus is stale and the percentiles of the ages."""
+        attributes: dict[str, Any] = {ATTR_STALE: self._stale()}
+        if freshness := self.coordinator.freshness.get(self.bus_name):
+            attributes.update(
+                (name, None if value is None else round(value, 3))
+                for name, value in freshness.as_dict().items()
+                if name != "last_age"
+            )
+        return attributes
+
+
+class HCBPredictedArrivalSensor(HCBEntity, SensorEntity):
+    """
+    Defines a sensor of when the bus usually arrives at the stop or school.
+
+    The state is the median of the arrivals learned on today's weekday, the
+    attributes are the bounds most arrivals fall within. The prediction
+    changes with the weekday rather than with the location, so it is checked
+    on a timer and written when it changed. The sensor is not polled, a poll
+    would refresh the coordinator and fetch the locations.
+    """
+
+    coordinator: HCBDataCoordinator
+    entity_description: HCBPredictedArrivalSensorEntityDescription
+    _prediction_written: ArrivalPrediction | None = None
+
+    async def async_added_to_hass(self) -> None:
+        """Check the prediction on a timer once the sensor is added."""
+        await super().async_added_to_hass()
+        self._prediction_written = self._prediction()
+        self.async_on_remove(
+            async_track_time_interval(
+                self.hass, self._async_check_prediction, PREDICTION_INTERVAL
+            )
+        )
+
+    @callback
+    def _async_check_prediction(self, _: datetime) -> None:
+        """Write the state when the prediction changed."""
+        prediction = self._prediction()
+        if prediction != self._prediction_written:
+            self._prediction_written = prediction
             self.async_write_ha_state()
+
+    @property
+    def data_fields(self) -> frozenset[str]:
+        """Return no student data fields, the arrivals are learned from them."""
+        return frozenset()
+
+    def _prediction(self) -> ArrivalPrediction | None:
+        """Return the predicted arrival of today."""
+        return self.coordinator.arrivals.predict(
+            self.student.student_id,
+            self.entity_description.time_of_day_id,
+            self.entity_description.place,
+            dt_util.now().weekday(),
+        )
+
+    @property
+    def native_value(self) -> time | None:
+        """Return the median arrival time."""
+        prediction = self._prediction()
+        return None if prediction is None else prediction.arrival
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return the bounds, the mean and the number of learned arrivals."""
+        attributes = super().extra_state_attributes
+        if prediction := self._prediction():
+            attributes.update(
+                {
+                    "low": prediction.low.isoformat(),
+                    "high": prediction.high.isoformat(),
+                    "mean": prediction.mean.isoformat(),
+                    "std_dev_minutes": round(prediction.std_dev / 60, 1),
+                    "samples": prediction.samples,
+                }
+            )
+        return attributes
+
+
+class HCBMetricSensor(SensorEntity):
+    """
+    Defines a sensor of the api calls or of processing their responses.
+
+    The sensors are diagnostic and disabled by default, they belong to a
+    device of the config entry rather than of a student.
+    """
+
+    entity_description: HCBMetricSensorEntityDescription
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_has_entity_name = True
+
+    def __init__(
+        self, entry: HCBConfigEntry, description: HCBMetricSensorEntityDescription
+    ) -> None:
+        """Initialize the sensor."""
+        self.entry = entry
+        self.entity_description = description
+        self._attr_unique_id = f"{entry.entry_id}_{description.key}"
+        self._attr_device_info = DeviceInfo(
+            entry_type=DeviceEntryType.SERVICE,
+            identifiers={(DOMAIN, entry.entry_id)},
+            manufacturer=HERE_COMES_THE_BUS,
+            name=HERE_COMES_THE_BUS,
+        )
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the metric."""
+        return self.entity_description.value_fn(self.entry.runtime_data)
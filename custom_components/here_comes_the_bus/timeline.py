@@ -0,0 +1,131 @@
+"""Timeline of the bus windows of the students on a school day."""
+
+from __future__ import annotations
+
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import time, timedelta
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+    from .data import StudentData
+
+# The PM window opens this long before the bus leaves the school.
+PM_WINDOW_LEAD = timedelta(minutes=30)
+
+
+@dataclass(frozen=True)
+class BusWindow:
+    """The window during which the bus of a student runs, ends included."""
+
+    student_id: str
+    time_of_day_id: str
+    start: time
+    end: time
+
+
+def _microseconds(value: time) -> int:
+    """Return the microseconds since midnight."""
+    return (
+        (value.hour * 60 + value.minute) * 60 + value.second
+    ) * 1_000_000 + value.microsecond
+
+
+def _time(microseconds: int) -> time:
+    """Return the time of the microseconds since midnight, within the day."""
+    microseconds = min(max(microseconds, 0), _microseconds(time.max))
+    seconds, microsecond = divmod(microseconds, 1_000_000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return time(hour, minute, second, microsecond)
+
+
+def _dismissal_window(student_data: StudentData, dismissal: time) -> tuple[time, time]:
+    """
+    Return the PM window moved so the bus leaves the school at dismissal.
+
+    A dismissal no earlier than the bus usually leaves is not an early
+    release, and the window stays where it is.
+    """
+    start = _microseconds(student_data.pm_start_time)
+    leaves = (
+        _microseconds(student_data.pm_school_arrival_time)
+        if student_data.pm_school_arrival_time is not None
+        else start + PM_WINDOW_LEAD // timedelta(microseconds=1)
+    )
+    shift = _microseconds(dismissal) - leaves
+    if shift >= 0:
+        return student_data.pm_start_time, student_data.pm_end_time
+    return _time(start + shift), _time(_microseconds(student_data.pm_end_time) + shift)
+
+
+class DayTimeline:
+    """
+    The bus windows of the students on a school day.
+
+    The starts and ends of the windows split the day into segments during
+    which the same students ride, so the students riding at any time and the
+    time of day of their bus are found with one bisection. When the windows
+    of a student overlap, the one that started last is used.
+    """
+
+    def __init__(self, windows: Iterable[BusWindow]) -> None:
+        """Sort the windows and work out who rides during every segment."""
+        self.windows = sorted(windows, key=lambda window: _microseconds(window.start))
+        self._starts = [_microseconds(window.start) for window in self.windows]
+        # an end is included, so its segment ends one microsecond later.
+        self._bounds = sorted(
+            {*self._starts} | {_microseconds(window.end) + 1 for window in self.windows}
+        )
+        self._riding = [
+            {
+                window.student_id: window.time_of_day_id
+                for start, window in zip(self._starts, self.windows, strict=True)
+                if start <= bound <= _microseconds(window.end)
+            }
+            for bound in self._bounds
+        ]
+
+    @classmethod
+    def from_students(
+        cls,
+        data: Mapping[str, StudentData],
+        time_of_day_ids: Mapping[str, str],
+        dismissal: time | None = None,
+    ) -> DayTimeline:
+        """
+        Return the timeline of the windows derived from the students' stops.
+
+        The time of day ids are looked up by the `am`, `mid` and `pm` prefix
+        of the window fields. The MID window only counts for the students
+        with MID stops. On an early release day the PM window is moved to
+        the dismissal.
+        """
+        windows = []
+        for student_id, student_data in data.items():
+            for prefix, time_of_day_id in time_of_day_ids.items():
+                if prefix == "mid" and not student_data.has_mid_stops:
+                    continue
+                if prefix == "pm" and dismissal is not None:
+                    start, end = _dismissal_window(student_data, dismissal)
+                else:
+                    start = getattr(student_data, f"{prefix}_start_time")
+                    end = getattr(student_data, f"{prefix}_end_time")
+                windows.append(BusWindow(student_id, time_of_day_id, start, end))
+        return cls(windows)
+
+    def riding(self, value: time) -> dict[str, str]:
+        """Return the time of day id of every student riding at the time."""
+        index = bisect_right(self._bounds, _microseconds(value)) - 1
+        if index < 0:
+            return {}
+        return self._riding[index]
+
+    def next_start(self, value: time | None = None) -> time | None:
+        """Return the first start after the time, or of the day without one."""
+        index = 0 if value is None else bisect_right(self._starts, _microseconds(value))
+        if index == len(self.windows):
+            return None
+        return self.windows[index].start
@@ -0,0 +1,45 @@
+"""Helpers shared by the tests that run the coordinators under a frozen clock."""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any
+from unittest.mock import MagicMock, patch
+
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.util import dt as dt_util
+
+from custom_components.here_comes_the_bus.const import CONF_SCHOOL_CODE
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from datetime import datetime
+
+
+@contextmanager
+def frozen(dt_now: datetime) -> Iterator[None]:
+    """Freeze the time seen by the coordinators, the client and the server."""
+    with (
+        patch("homeassistant.util.dt.now", return_value=dt_util.as_local(dt_now)),
+        patch("homeassistant.util.dt.utcnow", return_value=dt_util.as_utc(dt_now)),
+    ):
+        yield
+
+
+def mock_config_entry(
+    entry_id: str = "entry_id",
+    client: Any = None,
+    *,
+    username: str = "test_user",
+    password: str = "test_password",  # noqa: S107
+) -> MagicMock:
+    """Return a config entry of the account, using the client when given."""
+    config_entry = MagicMock(entry_id=entry_id)
+    config_entry.data = {
+        CONF_SCHOOL_CODE: "school_code",
+        CONF_USERNAME: username,
+        CONF_PASSWORD: password,
+    }
+    if client is not None:
+        config_entry.runtime_data.client = client
+    return config_entry
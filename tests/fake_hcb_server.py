@@ -0,0 +1,303 @@
+"""
+Local stand-in for the HCB SOAP api.
+
+The server answers the requests of `get_school_id`, `get_parent_info` and
+`get_stop_info` from scripted accounts, so the integration can be tested end
+to end without the network. Every stop request moves the bus one point along
+the scripted track of the student. Latency, random errors and windows during
+which the api fails can be injected to test slow or flaky upstream conditions.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Self
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from homeassistant.util import dt as dt_util
+from lxml import etree
+from lxml.builder import E
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+    from datetime import time
+    from types import TracebackType
+
+SCHOOL_ID_METHOD = "s1100"
+PARENT_INFO_METHOD = "s1157"
+STOP_INFO_METHOD = "s1158"
+
+TIME_OF_DAY_NAMES = {
+    "55632A13-35C5-4169-B872-F5ABDC25DF6A": "AM",
+    "27AADCA0-6D7E-4247-A80F-7847C448EEED": "MID",
+    "6E7A050E-0295-4200-8EDC-3611BB5DE1C1": "PM",
+}
+
+
+@dataclass
+class FakeStop:
+    """A scripted stop of a student, a `School` or a `Stop`."""
+
+    stop_type: str
+    start_time: time
+    arrival_time: time
+    latitude: float = 0.0
+    longitude: float = 0.0
+
+
+@dataclass
+class TrackPoint:
+    """A scripted position of a bus."""
+
+    latitude: float
+    longitude: float
+    speed: int = 0
+    heading: str = "N"
+    address: str = ""
+
+
+@dataclass
+class FakeStudent:
+    """A scripted student, with the stops of every time of day they ride."""
+
+    student_id: str
+    first_name: str
+    stops: dict[str, list[FakeStop]] = field(default_factory=dict)
+    track: list[TrackPoint] = field(default_factory=list)
+    bus_name: str = "Bus 1"
+
+
+@dataclass
+class FakeAccount:
+    """A scripted parent account."""
+
+    parent_id: str
+    username: str
+    password: str
+    students: list[FakeStudent] = field(default_factory=list)
+
+
+@dataclass
+class FaultWindow:
+    """A time of day during which the api fails."""
+
+    start: time
+    end: time
+
+    def __contains__(self, value: time) -> bool:
+        """Return True if the time is inside the window."""
+        return self.start <= value <= self.end
+
+
+class FakeHCBServer:
+    """Serve the HCB SOAP api from scripted accounts."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        school_code: str = "school_code",
+        school_id: str = "school_id",
+        accounts: Collection[FakeAccount] = (),
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        fault_windows: Collection[FaultWindow] = (),
+        fault_methods: Collection[str] | None = None,
+        seed: int = 0,
+    ) -> None:
+        """
+        Initialize the server.
+
+        Every response is delayed by the latency plus up to the jitter, in
+        seconds. Requests fail at random with the error rate, and always fail
+        during the fault windows. Faults only hit the fault methods, or every
+        method when they are not given.
+        """
+        self.school_code = school_code
+        self.school_id = school_id
+        self.accounts = {account.parent_id: account for account in accounts}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fault_windows = list(fault_windows)
+        self.fault_methods = fault_methods
+        self._random = random.Random(seed)  # noqa: S311
+        # the requests and failures of every method.
+        self.requests: Counter[str] = Counter()
+        self.failures: Counter[str] = Counter()
+        # the client ports that connected, one per connection.
+        self.peers: set[int] = set()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        # the index in the track of every student and time of day.
+        self._positions: Counter[tuple[str, str]] = Counter()
+        self._handlers = {
+            SCHOOL_ID_METHOD: self._school_id,
+            PARENT_INFO_METHOD: self._parent_info,
+            STOP_INFO_METHOD: self._stop_info,
+        }
+        app = web.Application()
+        app.router.add_post("/", self._handle)
+        self._server = TestServer(app)
+
+    @property
+    def url(self) -> str:
+        """Return the url of the api."""
+        return str(self._server.make_url("/"))
+
+    async def start(self) -> None:
+        """Start serving."""
+        await self._server.start_server()
+
+    async def close(self) -> None:
+        """Stop serving."""
+        await self._server.close()
+
+    async def __aenter__(self) -> Self:
+        """Start serving."""
+        await self.start()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        """Stop serving."""
+        await self.close()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        """Answer a SOAP request."""
+        self.peers.add(request.transport.get_extra_info("peername")[1])
+        body = etree.fromstring(await request.read())
+        method_element = body.xpath("//*[local-name()='Body']/*")[0]
+        method = etree.QName(method_element).localname
+        params = {
+            etree.QName(element).localname: element.text or ""
+            for element in method_element
+        }
+        self.requests[method] += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+            if self._should_fail(method):
+                self.failures[method] += 1
+                return web.Response(status=500, text="Injected fault")
+            response = self._handlers[method](params)
+        finally:
+            self.in_flight -= 1
+        return web.Response(
+            text=etree.tostring(response, encoding="unicode"),
+            content_type="text/xml",
+        )
+
+    def _should_fail(self, method: str) -> bool:
+        """Return True if the request must fail."""
+        if self.fault_methods is not None and method not in self.fault_methods:
+            return False
+        time_now = dt_util.now().time()
+        if any(time_now in window for window in self.fault_windows):
+            return True
+        return self._random.random() < self.error_rate
+
+    def _school_id(self, params: dict[str, str]) -> etree._Element:
+        """Answer `get_school_id`, an unknown code has no customer."""
+        if params["P1"] != self.school_code:
+            return E.Response()
+        return E.Response(E.Customer(ID=self.school_id))
+
+    def _parent_info(self, params: dict[str, str]) -> etree._Element:
+        """Answer `get_parent_info`, unknown credentials have no account."""
+        account = next(
+            (
+                account
+                for account in self.accounts.values()
+                if (account.username, account.password) == (params["P2"], params["P3"])
+            ),
+            None,
+        )
+        if params["P1"] != self.school_id or account is None:
+            return E.Response()
+        time_of_day_ids = {
+            time_of_day_id
+            for student in account.students
+            for time_of_day_id in student.stops
+        }
+        return E.Response(
+            E.Account(ID=account.parent_id),
+            *(
+                E.Student(
+                    EntityID=student.student_id,
+                    FirstName=student.first_name,
+                    LastName="Student",
+                )
+                for student in account.students
+            ),
+            *(
+                E.TimeOfDay(
+                    ID=time_of_day_id,
+                    Name=name,
+                    BeginTime="00:00:00",
+                    EndTime="23:59:59",
+                )
+                for time_of_day_id, name in TIME_OF_DAY_NAMES.items()
+                if time_of_day_id in time_of_day_ids
+            ),
+        )
+
+    def _stop_info(self, params: dict[str, str]) -> etree._Element:
+        """Answer `get_stop_info` and move the bus along its track."""
+        account = self.accounts.get(params["P2"])
+        students = (
+            {student.student_id: student for student in account.students}
+            if account is not None
+            else {}
+        )
+        student = students.get(params["P3"])
+        if student is None:
+            return E.Response()
+        time_of_day_id = params["P4"]
+        response = E.Response(
+            *(
+                E.StudentStop(
+                    Name=f"{stop.stop_type} {index}",
+                    Latitude=str(stop.latitude),
+                    Longitude=str(stop.longitude),
+                    StartTime=stop.start_time.isoformat(),
+                    StopType=stop.stop_type,
+                    VehicleName=student.bus_name,
+                    StopId=f"stop{index}",
+                    ArrivalTime=stop.arrival_time.isoformat(),
+                    TimeOfDayId=time_of_day_id,
+                    VehicleId=student.bus_name,
+                )
+                for index, stop in enumerate(student.stops.get(time_of_day_id, []))
+            )
+        )
+        if student.track:
+            key = (student.student_id, time_of_day_id)
+            point = student.track[min(self._positions[key], len(student.track) - 1)]
+            self._positions[key] += 1
+            response.append(
+                E.VehicleLocation(
+                    Name=student.bus_name,
+                    Latitude=str(point.latitude),
+                    Longitude=str(point.longitude),
+                    LogTime=dt_util.now().strftime("%Y-%m-%dT%H:%M:%S"),
+                    Ignition="Y",
+                    Latent="N",
+                    TimeZoneOffset="0",
+                    Heading=point.heading,
+                    Speed=str(point.speed),
+                    Address=point.address,
+                    MessageCode="0",
+                    DisplayOnMap="Y",
+                )
+            )
+        return response
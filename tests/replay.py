@@ -0,0 +1,174 @@
+"""
+Replay a capture of the HCB api through the coordinators.
+
+The capture of a real session, written by the integration when
+`capture_responses` is enabled, is fed back to the schedule and location
+coordinators under a frozen clock. Every poll of the session is replayed at
+the time it was captured, either as fast as possible or at a multiple of the
+real speed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+from collections import defaultdict
+from itertools import pairwise
+from typing import TYPE_CHECKING
+
+from hcb_soap_client.account_response import AccountResponse
+from hcb_soap_client.hcb_soap_client import HcbApiError
+from hcb_soap_client.stop_response import StopResponse
+from homeassistant.util import dt as dt_util
+
+from custom_components.here_comes_the_bus.client import (
+    PARENT_INFO_METHOD,
+    STOP_INFO_METHOD,
+)
+from custom_components.here_comes_the_bus.coordinator import (
+    HCBDataCoordinator,
+    HCBScheduleCoordinator,
+)
+
+from .common import frozen
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, Sequence
+    from unittest.mock import MagicMock
+
+    from homeassistant.core import HomeAssistant
+
+    from custom_components.here_comes_the_bus.capture import CapturedResponse
+    from custom_components.here_comes_the_bus.metrics import RequestMetrics
+
+# Responses captured less than this many seconds apart belong to one poll.
+TICK_GAP = 1.0
+
+
+class ReplayClient:
+    """
+    Answer the api calls of the coordinators from a capture.
+
+    Every call is answered by the next response captured for the same request
+    up to the current time. Once they run out, the last one is repeated.
+    """
+
+    def __init__(self, responses: Sequence[CapturedResponse]) -> None:
+        """Initialize the client."""
+        self._responses: dict[tuple[str, ...], list[CapturedResponse]] = defaultdict(
+            list
+        )
+        for response in responses:
+            self._responses[_key(response.method, response.params)].append(response)
+        self._served: dict[tuple[str, ...], int] = defaultdict(int)
+
+    async def get_school_id(
+        self, school_code: str, *, metrics: RequestMetrics | None = None
+    ) -> str:
+        """Return the school id the parent info was captured with."""
+        del school_code, metrics
+        return next(key[1] for key in self._responses if key[0] == PARENT_INFO_METHOD)
+
+    async def get_parent_info(
+        self,
+        school_id: str,
+        username: str,
+        password: str,
+        *,
+        metrics: RequestMetrics | None = None,
+    ) -> AccountResponse:
+        """Return the captured user info."""
+        del username, password, metrics
+        return AccountResponse.from_text(
+            self._answer(PARENT_INFO_METHOD, {"P1": school_id})
+        )
+
+    async def get_stop_info(
+        self,
+        school_id: str,
+        parent_id: str,
+        student_id: str,
+        time_of_day_id: str,
+        *,
+        metrics: RequestMetrics | None = None,
+    ) -> StopResponse:
+        """Return the captured stops of the student and time of day."""
+        del metrics
+        return StopResponse.from_text(
+            self._answer(
+                STOP_INFO_METHOD,
+                {
+                    "P1": school_id,
+                    "P2": parent_id,
+                    "P3": student_id,
+                    "P4": time_of_day_id,
+                },
+            )
+        )
+
+    def _answer(self, method: str, params: dict[str, str]) -> str:
+        """Return the next captured response of the request."""
+        key = _key(method, params)
+        responses = self._responses.get(key, [])
+        served = self._served[key]
+        if served < len(responses) and responses[served].time <= dt_util.utcnow():
+            self._served[key] = served + 1
+            return responses[served].response
+        if served == 0:
+            msg = f"No response to {method} was captured for {params}"
+            raise HcbApiError(msg, 404)
+        return responses[served - 1].response
+
+
+def _key(method: str, params: dict[str, str]) -> tuple[str, ...]:
+    """Return the key of a request, leaving the session parameters out."""
+    names = ("P1",) if method == PARENT_INFO_METHOD else ("P1", "P2", "P3", "P4")
+    return (method, *(params.get(name, "") for name in names))
+
+
+def _ticks(responses: Sequence[CapturedResponse]) -> list[list[CapturedResponse]]:
+    """Split the capture into the polls it was captured in."""
+    ticks: list[list[CapturedResponse]] = []
+    for response in responses:
+        if ticks and (response.time - ticks[-1][-1].time).total_seconds() < TICK_GAP:
+            ticks[-1].append(response)
+        else:
+            ticks.append([response])
+    return ticks
+
+
+async def async_replay(
+    hass: HomeAssistant,
+    config_entry: MagicMock,
+    responses: Sequence[CapturedResponse],
+    *,
+    speed: float = math.inf,
+) -> AsyncGenerator[HCBDataCoordinator]:
+    """
+    Replay the capture through the coordinators of the config entry.
+
+    The coordinators are set up at the time of the first poll, then refreshed
+    at the time of every later poll. A poll that fetched the parent info also
+    refreshes the schedule. The location coordinator is yielded after every
+    poll. Between the polls the replay sleeps for the captured delay divided
+    by the speed.
+    """
+    config_entry.runtime_data.client = ReplayClient(responses)
+    ticks = _ticks(responses)
+    if not ticks:
+        return
+    schedule = HCBScheduleCoordinator(hass, config_entry)
+    coordinator = HCBDataCoordinator(hass, config_entry, schedule)
+    with frozen(ticks[0][-1].time):
+        await schedule.async_config_entry_first_refresh()
+        await coordinator.async_config_entry_first_refresh()
+    yield coordinator
+    for previous, tick in pairwise(ticks):
+        if not math.isinf(speed):
+            delay = (tick[0].time - previous[-1].time).total_seconds()
+            await asyncio.sleep(delay / speed)
+        with frozen(tick[-1].time):
+            if any(response.method == PARENT_INFO_METHOD for response in tick):
+                await schedule.async_refresh()
+            await coordinator.async_refresh()
+        yield coordinator
@@ -0,0 +1,653 @@
+"""
+Synthetic school day for a fleet of buses.
+
+The simulated client plugs in for the HCB client. It generates the stops of
+every student and the track of every bus through the AM, MID and PM runs of
+a school day, and answers the api calls of the coordinators from them.
+`async_simulate_day` drives a whole day through the coordinators and their
+entities, and reports the CPU time, event loop lag, state writes, recorder
+rows and memory it took.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import math
+import random
+import tracemalloc
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from functools import partial
+from time import process_time
+from typing import TYPE_CHECKING, Any
+from unittest.mock import MagicMock, patch
+
+from hcb_soap_client.account_response import AccountResponse, Student
+from hcb_soap_client.account_response import TimeOfDay as AccountTimeOfDay
+from hcb_soap_client.stop_response import StopResponse, StudentStop, VehicleLocation
+from homeassistant.components.binary_sensor import BinarySensorEntity
+from homeassistant.components.device_tracker import TrackerEntity
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import dt as dt_util
+
+from custom_components.here_comes_the_bus import (
+    async_remove_entry,
+    binary_sensor,
+    device_tracker,
+    sensor,
+)
+from custom_components.here_comes_the_bus.const import (
+    CONF_TRACKER_MIN_DISTANCE,
+    CONF_TRACKER_MIN_INTERVAL,
+    CONF_UPDATE_INTERVAL,
+    DEFAULT_TRACKER_MIN_DISTANCE,
+    DEFAULT_TRACKER_MIN_INTERVAL,
+)
+from custom_components.here_comes_the_bus.coordinator import (
+    HCBDataCoordinator,
+    HCBScheduleCoordinator,
+    TimeOfDay,
+)
+
+from .common import frozen, mock_config_entry
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    from homeassistant.core import HomeAssistant
+    from homeassistant.helpers.entity import Entity
+
+    from custom_components.here_comes_the_bus.metrics import RequestMetrics
+
+SCHOOL_ID = "school_id"
+PARENT_ID = "parent_id"
+SCHOOL_LATITUDE = 37.7749
+SCHOOL_LONGITUDE = -122.4194
+# The stops are spread this many degrees around the school.
+STOP_SPREAD = 0.015
+MILES_PER_DEGREE = 69.1
+
+# The first bus leaves at these times, the next ones a little later.
+RUN_STARTS = {
+    TimeOfDay.AM: time(6, 45),
+    TimeOfDay.MID: time(11, 30),
+    TimeOfDay.PM: time(15, 0),
+}
+BUS_STAGGER = timedelta(minutes=2)
+STOP_SPACING = timedelta(minutes=3)
+DWELL = timedelta(seconds=30)
+# The ignition is on while the bus warms up before its first stop.
+WARM_UP = timedelta(minutes=10)
+# Every fourth student rides home at midday.
+MID_RIDER_EVERY = 4
+LATENT_RATE = 0.05
+# The message codes the simulated buses report.
+MESSAGE_CODE_DRIVING = 0
+MESSAGE_CODE_STOPPED = 1
+COMPASS = ("N", "NE", "E", "SE", "S", "SW", "W", "NW")
+
+DAY_START = time(5, 30)
+DAY_END = time(18, 0)
+# How often the event loop lag is sampled, in seconds.
+LAG_PROBE_INTERVAL = 0.001
+
+
+@dataclass(frozen=True)
+class Waypoint:
+    """A stop on the route of a bus and when the bus arrives."""
+
+    name: str
+    stop_type: str
+    latitude: float
+    longitude: float
+    arrival: datetime
+
+
+@dataclass
+class SimulatedBus:
+    """A bus and its route for every time of day it runs."""
+
+    name: str
+    routes: dict[str, list[Waypoint]] = field(default_factory=dict)
+
+
+@dataclass
+class SimulatedStudent:
+    """A student, where they live and their stop for every time of day they ride."""
+
+    student_id: str
+    first_name: str
+    bus: SimulatedBus
+    home: tuple[float, float]
+    stops: dict[str, Waypoint] = field(default_factory=dict)
+
+
+@dataclass
+class SimulationReport:
+    """What a simulated school day cost the integration."""
+
+    students: int
+    buses: int
+    polls: int
+    api_calls: int
+    cpu_time: float
+    loop_lag_max: float
+    loop_lag_mean: float
+    state_writes: int
+    recorded_states: int
+    recorded_attributes: int
+    memory_peak: int
+
+    def format(self) -> str:
+        """Return the report as text."""
+        return (
+            f"{self.students} students on {self.buses} buses\n"
+            f"  polls:        {self.polls}\n"
+            f"  api calls:    {self.api_calls}\n"
+            f"  cpu time:     {self.cpu_time:.3f} s\n"
+            f"  loop lag:     {self.loop_lag_max * 1000:.2f} ms max, "
+            f"{self.loop_lag_mean * 1000:.2f} ms mean\n"
+            f"  state writes: {self.state_writes}\n"
+            f"  recorder rows: {self.recorded_states} states, "
+            f"{self.recorded_attributes} attribute sets\n"
+            f"  memory peak:  {self.memory_peak / 1024:.0f} KiB\n"
+        )
+
+
+class SimulatedClient:
+    """Answer the api calls of the coordinators from a simulated fleet."""
+
+    def __init__(
+        self,
+        students: int,
+        buses: int,
+        day: date,
+        *,
+        latent_rate: float = LATENT_RATE,
+        seed: int = 0,
+    ) -> None:
+        """Generate the routes of the buses and the stops of the students."""
+        self._random = random.Random(seed)  # noqa: S311
+        self.latent_rate = latent_rate
+        self.calls = 0
+        self.buses = [SimulatedBus(f"Bus {number + 1}") for number in range(buses)]
+        self.students = {
+            f"student{number}": SimulatedStudent(
+                student_id=f"student{number}",
+                first_name=f"Student {number}",
+                bus=self.buses[number % buses],
+                home=(
+                    SCHOOL_LATITUDE + self._random.uniform(-STOP_SPREAD, STOP_SPREAD),
+                    SCHOOL_LONGITUDE + self._random.uniform(-STOP_SPREAD, STOP_SPREAD),
+                ),
+            )
+            for number in range(students)
+        }
+        riders: dict[tuple[str, str], list[SimulatedStudent]] = {}
+        for number, student in enumerate(self.students.values()):
+            times_of_day = [TimeOfDay.AM, TimeOfDay.PM]
+            if number % MID_RIDER_EVERY == 0:
+                times_of_day.append(TimeOfDay.MID)
+            for time_of_day_id in times_of_day:
+                riders.setdefault((student.bus.name, time_of_day_id), []).append(
+                    student
+                )
+        for index, bus in enumerate(self.buses):
+            for time_of_day_id, start_time in RUN_STARTS.items():
+                on_board = riders.get((bus.name, time_of_day_id))
+                if on_board:
+                    start = datetime.combine(
+                        day, start_time, dt_util.get_default_time_zone()
+                    )
+                    self._plan_route(
+                        bus, time_of_day_id, on_board, start + index * BUS_STAGGER
+                    )
+        # the last location reported for every bus and time of day.
+        self._reported: dict[tuple[str, str], VehicleLocation] = {}
+
+    def _plan_route(
+        self,
+        bus: SimulatedBus,
+        time_of_day_id: str,
+        students: list[SimulatedStudent],
+        start: datetime,
+    ) -> None:
+        """
+        Plan the route of a bus.
+
+        In the AM the bus starts at the stop furthest from the school and ends
+        at the school, later runs leave the school and drop off the nearest
+        student first.
+        """
+        order = sorted(
+            students,
+            key=lambda student: _miles(
+                (SCHOOL_LATITUDE, SCHOOL_LONGITUDE), student.home
+            ),
+            reverse=time_of_day_id == TimeOfDay.AM,
+        )
+        stops = [
+            ("Stop", f"{student.first_name} Stop", student.home) for student in order
+        ]
+        school = ("School", "School", (SCHOOL_LATITUDE, SCHOOL_LONGITUDE))
+        stops = [*stops, school] if time_of_day_id == TimeOfDay.AM else [school, *stops]
+        route = [
+            Waypoint(name, stop_type, latitude, longitude, start + index * STOP_SPACING)
+            for index, (stop_type, name, (latitude, longitude)) in enumerate(stops)
+        ]
+        bus.routes[time_of_day_id] = route
+        for student, waypoint in zip(
+            order,
+            (waypoint for waypoint in route if waypoint.stop_type == "Stop"),
+            strict=True,
+        ):
+            student.stops[time_of_day_id] = waypoint
+
+    async def get_school_id(
+        self, school_code: str, *, metrics: RequestMetrics | None = None
+    ) -> str:
+        """Return the id of the school."""
+        del school_code, metrics
+        self.calls += 1
+        return SCHOOL_ID
+
+    async def get_parent_info(
+        self,
+        school_id: str,
+        username: str,
+        password: str,
+        *,
+        metrics: RequestMetrics | None = None,
+    ) -> AccountResponse:
+        """Return the account with every student of the fleet."""
+        del school_id, username, password, metrics
+        self.calls += 1
+        return AccountResponse(
+            account_id=PARENT_ID,
+            students=[
+                Student(
+                    student_id=student.student_id,
+                    first_name=student.first_name,
+                    last_name="Student",
+                )
+                for student in self.students.values()
+            ],
+            times=[
+                AccountTimeOfDay(
+                    id=time_of_day_id,
+                    name=time_of_day_id.name,
+                    begin_time="00:00:00",
+                    end_time="23:59:59",
+                )
+                for time_of_day_id in TimeOfDay
+            ],
+        )
+
+    async def get_stop_info(
+        self,
+        school_id: str,
+        parent_id: str,
+        student_id: str,
+        time_of_day_id: str,
+        *,
+        metrics: RequestMetrics | None = None,
+    ) -> StopResponse:
+        """Return the stops of the student and where their bus is now."""
+        del school_id, parent_id, metrics
+        self.calls += 1
+        student = self.students[student_id]
+        stop = student.stops.get(time_of_day_id)
+        if stop is None:
+            return StopResponse(vehicle_location=None, student_stops=[])
+        route = student.bus.routes[time_of_day_id]
+        school = next(waypoint for waypoint in route if waypoint.stop_type == "School")
+        return StopResponse(
+            vehicle_location=self.vehicle_location(student.bus, time_of_day_id),
+            student_stops=[
+                _student_stop(student.bus, time_of_day_id, route[0], waypoint)
+                for waypoint in sorted((stop, school), key=lambda w: w.arrival)
+            ],
+        )
+
+    def vehicle_location(
+        self, bus: SimulatedBus, time_of_day_id: str
+    ) -> VehicleLocation:
+        """
+        Return where the bus is now.
+
+        The bus is parked with the ignition off outside its run. Now and then
+        the last location is reported again as latent, like a tracker that
+        could not reach the network.
+        """
+        key = (bus.name, time_of_day_id)
+        reported = self._reported.get(key)
+        if reported is not None and self._random.random() < self.latent_rate:
+            return reported.model_copy(update={"latent": True})
+        dt_now = dt_util.now()
+        route = bus.routes[time_of_day_id]
+        latitude, longitude, speed, heading = _position(route, dt_now)
+        running = route[0].arrival - WARM_UP <= dt_now <= route[-1].arrival + DWELL
+        location = VehicleLocation(
+            name=bus.name,
+            latitude=latitude,
+            longitude=longitude,
+            log_time=dt_now.strftime("%Y-%m-%dT%H:%M:%S"),
+            ignition="Y" if running else "N",
+            latent="N",
+            time_zone_offset=0,
+            heading=heading,
+            speed=speed,
+            address="",
+            message_code=MESSAGE_CODE_DRIVING if speed else MESSAGE_CODE_STOPPED,
+            display_on_map="Y",
+        )
+        self._reported[key] = location
+        return location
+
+
+def _student_stop(
+    bus: SimulatedBus, time_of_day_id: str, first: Waypoint, waypoint: Waypoint
+) -> StudentStop:
+    """Return a stop of a student the way the api sends it."""
+    arrival_time = dt_util.as_local(waypoint.arrival).time()
+    return StudentStop(
+        name=waypoint.name,
+        latitude=waypoint.latitude,
+        longitude=waypoint.longitude,
+        start_time=arrival_time,
+        stop_type=waypoint.stop_type,
+        substitute_vehicle_name="",
+        vehicle_name=bus.name,
+        stop_id=waypoint.name,
+        arrival_time=arrival_time,
+        time_of_day_id=time_of_day_id,
+        vehicle_id=bus.name,
+        esn="",
+        tier_start_time=dt_util.as_local(first.arrival).time(),
+        bus_visibility_start_offset=0,
+    )
+
+
+def _miles(start: tuple[float, float], end: tuple[float, float]) -> float:
+    """Return the distance between two points, flat earth is close enough."""
+    north = (end[0] - start[0]) * MILES_PER_DEGREE
+    east = (end[1] - start[1]) * MILES_PER_DEGREE * math.cos(math.radians(start[0]))
+    return math.hypot(north, east)
+
+
+def _heading(start: tuple[float, float], end: tuple[float, float]) -> str:
+    """Return the compass heading from one point to the other."""
+    north = end[0] - start[0]
+    east = (end[1] - start[1]) * math.cos(math.radians(start[0]))
+    degrees = math.degrees(math.atan2(east, north)) % 360
+    return COMPASS[round(degrees / 45) % len(COMPASS)]
+
+
+def _position(route: list[Waypoint], dt_now: datetime) -> tuple[float, float, int, str]:
+    """
+    Return the latitude, longitude, speed and heading of the bus on the route.
+
+    The bus waits at every stop for a while, then drives to the next one at
+    the speed that gets it there on time.
+    """
+    index = bisect_right([waypoint.arrival for waypoint in route], dt_now) - 1
+    index = max(index, 0)
+    current = route[index]
+    here = (current.latitude, current.longitude)
+    if index == len(route) - 1 or dt_now < current.arrival + DWELL:
+        return *here, 0, "N"
+    following = route[index + 1]
+    there = (following.latitude, following.longitude)
+    departure = current.arrival + DWELL
+    duration = following.arrival - departure
+    fraction = (dt_now - departure) / duration
+    speed = _miles(here, there) / (duration.total_seconds() / 3600)
+    return (
+        here[0] + (there[0] - here[0]) * fraction,
+        here[1] + (there[1] - here[1]) * fraction,
+        round(speed),
+        _heading(here, there),
+    )
+
+
+class _LoopLagMonitor:
+    """Sample how late the event loop runs a callback."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Initialize the monitor."""
+        self._loop = loop
+        self._handle: asyncio.TimerHandle | None = None
+        self.lags: list[float] = []
+
+    def start(self) -> None:
+        """Start sampling."""
+        self._handle = self._loop.call_at(
+            self._loop.time() + LAG_PROBE_INTERVAL,
+            self._probe,
+            self._loop.time() + LAG_PROBE_INTERVAL,
+        )
+
+    def _probe(self, expected: float) -> None:
+        """Record the lag and sample again."""
+        self.lags.append(self._loop.time() - expected)
+        self.start()
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        if self._handle is not None:
+            self._handle.cancel()
+
+
+class _RecorderRows:
+    """
+    Count the state writes and the rows the recorder would store for them.
+
+    The state machine drops a write that changes neither the state nor the
+    attributes, every other write is a row of the states. The recorded
+    attributes are stored once for every distinct set of them.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the counts."""
+        self.writes = 0
+        self.states = 0
+        self._last: dict[int, tuple[Any, dict[str, Any]]] = {}
+        self._attributes: set[str] = set()
+
+    @property
+    def attributes(self) -> int:
+        """Return the number of distinct sets of recorded attributes."""
+        return len(self._attributes)
+
+    def write(self, entity: Entity) -> None:
+        """Count a state write of the entity."""
+        self.writes += 1
+        state, attributes = _state(entity)
+        if self._last.get(id(entity)) == (state, attributes):
+            return
+        self._last[id(entity)] = (state, attributes)
+        self.states += 1
+        recorded = sorted(
+            (name, repr(value))
+            for name, value in attributes.items()
+            if name not in entity._unrecorded_attributes  # noqa: SLF001
+        )
+        self._attributes.add(repr(recorded))
+
+
+def _state(entity: Entity) -> tuple[Any, dict[str, Any]]:
+    """Return the state and the attributes the entity writes."""
+    if not entity.available:
+        return "unavailable", {}
+    attributes = dict(entity.extra_state_attributes or {})
+    if isinstance(entity, TrackerEntity):
+        attributes |= {"latitude": entity.latitude, "longitude": entity.longitude}
+        return entity.location_name, attributes
+    if isinstance(entity, BinarySensorEntity):
+        return entity.is_on, attributes
+    return getattr(entity, "native_value", None), attributes
+
+
+class _SimulatedTimers:
+    """Timers of the entities that fire at the simulated time of the day."""
+
+    def __init__(self) -> None:
+        """Initialize the timers."""
+        self._timers: list[tuple[datetime, int, Callable[[datetime], None]]] = []
+        self._cancelled: set[int] = set()
+        self._scheduled = 0
+
+    def call_later(
+        self, _: HomeAssistant, delay: float, action: Callable[[datetime], None]
+    ) -> Callable[[], None]:
+        """Schedule the action, a stand in for `async_call_later`."""
+        self._scheduled += 1
+        heapq.heappush(
+            self._timers,
+            (dt_util.now() + timedelta(seconds=delay), self._scheduled, action),
+        )
+        return partial(self._cancelled.add, self._scheduled)
+
+    def next_due(self) -> datetime | None:
+        """Return when the next timer fires, None without timers."""
+        while self._timers and self._timers[0][1] in self._cancelled:
+            heapq.heappop(self._timers)
+        return self._timers[0][0] if self._timers else None
+
+    def fire(self, dt_now: datetime) -> None:
+        """Run the actions of the timers due at the time."""
+        while (due := self.next_due()) is not None and due <= dt_now:
+            _, _, action = heapq.heappop(self._timers)
+            action(dt_now)
+
+
+async def _async_add_entities(
+    config_entry: MagicMock, unsubscribes: list[Callable[[], None]]
+) -> None:
+    """
+    Set up the entities of every platform for the entry.
+
+    The entities are subscribed to their coordinators as they are added,
+    also the ones a platform adds later on, unless they are disabled by
+    default. What the platforms would undo at the unload of the entry is
+    undone with them.
+    """
+    config_entry.async_on_unload = unsubscribes.append
+
+    def add_entities(new_entities: Iterable[Entity]) -> None:
+        unsubscribes.extend(
+            entity.coordinator.async_add_listener(entity._handle_coordinator_update)  # noqa: SLF001
+            for entity in new_entities
+            if isinstance(entity, CoordinatorEntity)
+            and entity.entity_registry_enabled_default
+        )
+
+    # the entity services are registered on the platform being set up.
+    with patch("homeassistant.helpers.entity_platform.async_get_current_platform"):
+        for platform in (sensor, binary_sensor, device_tracker):
+            await platform.async_setup_entry(MagicMock(), config_entry, add_entities)
+
+
+async def async_simulate_day(  # noqa: PLR0913
+    hass: HomeAssistant,
+    client: SimulatedClient,
+    day: date,
+    *,
+    update_interval: int = 20,
+    tracker_min_interval: int = DEFAULT_TRACKER_MIN_INTERVAL,
+    tracker_min_distance: int = DEFAULT_TRACKER_MIN_DISTANCE,
+) -> SimulationReport:
+    """
+    Simulate a school day of the client's fleet and report what it cost.
+
+    The coordinators and every entity are set up before the AM run, then the
+    clock jumps to each poll the coordinators schedule, and to each timer of
+    the entities, until the end of the day. The state machine is left out,
+    the state writes and the recorder rows they would make are only counted.
+    The CPU time includes the overhead of tracing the memory.
+    """
+    config_entry = mock_config_entry("simulation", client)
+    config_entry.data.update(
+        {
+            CONF_UPDATE_INTERVAL: update_interval,
+            CONF_TRACKER_MIN_INTERVAL: tracker_min_interval,
+            CONF_TRACKER_MIN_DISTANCE: tracker_min_distance,
+        }
+    )
+    dt_now = datetime.combine(day, DAY_START, dt_util.get_default_time_zone())
+    day_end = datetime.combine(day, DAY_END, dt_util.get_default_time_zone())
+    loop = asyncio.get_running_loop()
+    monitor = _LoopLagMonitor(loop)
+    rows = _RecorderRows()
+    timers = _SimulatedTimers()
+    unsubscribes: list[Callable[[], None]] = []
+    tracemalloc.start()
+    monitor.start()
+    cpu_start = process_time()
+    try:
+        with (
+            patch(
+                "homeassistant.helpers.entity.Entity.async_write_ha_state",
+                autospec=True,
+                side_effect=rows.write,
+            ),
+            patch(
+                "custom_components.here_comes_the_bus.device_tracker.async_call_later",
+                timers.call_later,
+            ),
+        ):
+            with frozen(dt_now):
+                schedule = HCBScheduleCoordinator(hass, config_entry)
+                await schedule.async_config_entry_first_refresh()
+                coordinator = HCBDataCoordinator(hass, config_entry, schedule)
+                await coordinator.async_config_entry_first_refresh()
+            config_entry.runtime_data.schedule_coordinator = schedule
+            config_entry.runtime_data.coordinator = coordinator
+            # the metric sensors are polled, they have no coordinator.
+            await _async_add_entities(config_entry, unsubscribes)
+            next_schedule = dt_now + schedule.update_interval
+            polls = 0
+            while coordinator.update_interval is not None:
+                next_poll = dt_now + coordinator.update_interval
+                # the timers fire in between, without moving the next poll.
+                while (
+                    next_timer := timers.next_due()
+                ) is not None and next_timer < min(next_poll, next_schedule):
+                    with frozen(next_timer):
+                        timers.fire(next_timer)
+                dt_now = min(next_poll, next_schedule)
+                if dt_now > day_end:
+                    break
+                # give the lag monitor a chance to run between the polls.
+                await asyncio.sleep(0)
+                with frozen(dt_now):
+                    if dt_now == next_schedule:
+                        await schedule.async_refresh()
+                        next_schedule += schedule.update_interval
+                    else:
+                        await coordinator.async_refresh()
+                        polls += 1
+        cpu_time = process_time() - cpu_start
+        _, memory_peak = tracemalloc.get_traced_memory()
+    finally:
+        monitor.stop()
+        tracemalloc.stop()
+        for unsubscribe in unsubscribes:
+            unsubscribe()
+        # the next simulated day starts without the schedule and arrivals.
+        await async_remove_entry(hass, config_entry)
+    return SimulationReport(
+        students=len(client.students),
+        buses=len(client.buses),
+        polls=polls,
+        api_calls=client.calls,
+        cpu_time=cpu_time,
+        loop_lag_max=max(monitor.lags, default=0.0),
+        loop_lag_mean=sum(monitor.lags) / len(monitor.lags) if monitor.lags else 0.0,
+        state_writes=rows.writes,
+        recorded_states=rows.states,
+        recorded_attributes=rows.attributes,
+        memory_peak=memory_peak,
+    )
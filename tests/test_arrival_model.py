@@ -0,0 +1,227 @@
+"""Tests of the model of the arrival times learned from the trips."""
+
+import math
+import random
+import statistics
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import pytest
+from freezegun.api import FrozenDateTimeFactory
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.here_comes_the_bus.arrival_model import (
+    EXACT_SAMPLES,
+    MIN_SAMPLES,
+    PASS_RADIUS,
+    PLACE_SCHOOL,
+    PLACE_STOP,
+    SAVE_DELAY,
+    ArrivalModel,
+    P2Quantile,
+    RunningStats,
+)
+from custom_components.here_comes_the_bus.const import DOMAIN
+
+ENTRY_ID = "entry_id"
+STORAGE_KEY = f"{DOMAIN}.{ENTRY_ID}.arrivals"
+LOG_TIME = datetime(2024, 10, 3, 14, 15, tzinfo=UTC)
+
+
+def test_running_stats() -> None:
+    """Test the running statistics match the statistics of all the values."""
+    rng = random.Random(0)  # noqa: S311
+    values = [rng.gauss(27000, 120) for _ in range(500)]
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+
+    assert stats.count == len(values)
+    assert abs(stats.mean - statistics.mean(values)) < 1e-6  # noqa: PLR2004
+    assert abs(stats.variance - statistics.variance(values)) < 1e-3  # noqa: PLR2004
+    deciles = statistics.quantiles(values, n=10)
+    spread = deciles[-1] - deciles[0]
+    for quantile, expected in ((0.1, deciles[0]), (0.5, deciles[4]), (0.9, deciles[8])):
+        assert abs(stats.quantiles[quantile].value() - expected) < spread / 10
+
+
+def test_p2_quantile_few_values() -> None:
+    """Test the quantile of fewer values than markers is one of the values."""
+    estimator = P2Quantile(0.5)
+    assert estimator.value() is None
+
+    for value in (30, 10, 20):
+        estimator.add(value)
+
+    assert estimator.value() == 20  # noqa: PLR2004
+    assert estimator.samples == [10, 20, 30]
+
+
+@pytest.mark.parametrize("count", range(5, EXACT_SAMPLES + 1))
+def test_running_stats_exact_bounds(count: int) -> None:
+    """Test the quantiles of few arrivals are the arrivals of their rank."""
+    rng = random.Random(count)  # noqa: S311
+    values = rng.sample(range(27000, 28000), count)
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+
+    ordered = sorted(values)
+    low, median, high = (
+        stats.quantiles[quantile].value() for quantile in (0.1, 0.5, 0.9)
+    )
+    assert low < median < high
+    assert low == ordered[max(math.ceil(count * 0.1), 1) - 1]
+    assert median == ordered[math.ceil(count * 0.5) - 1]
+    assert high == ordered[math.ceil(count * 0.9) - 1]
+
+
+def test_p2_quantile_constant_memory() -> None:
+    """Test the estimator keeps five markers however many values it sees."""
+    estimator = P2Quantile(0.9)
+    for value in range(1000):
+        estimator.add(value)
+
+    assert estimator.samples is None
+    assert len(estimator.heights) == len(estimator.positions) == 5  # noqa: PLR2004
+    assert abs(estimator.value() - 900) < 10  # noqa: PLR2004
+
+
+def test_p2_quantile_two_values() -> None:
+    """Test the markers stay between the values the parabola overshoots."""
+    estimator = P2Quantile(0.5)
+    for index in range(60):
+        estimator.add(index % 2 * 1000)
+
+    assert estimator.heights == sorted(estimator.heights)
+    assert 0 <= estimator.value() <= 1000  # noqa: PLR2004
+
+
+def test_running_stats_single_value() -> None:
+    """Test a single value has no variance."""
+    stats = RunningStats()
+    stats.add(27000)
+
+    assert stats.variance == 0.0
+    assert stats.quantiles[0.5].value() == 27000  # noqa: PLR2004
+
+
+@pytest.mark.parametrize("count", [10, EXACT_SAMPLES + 10])
+def test_running_stats_round_trip(count: int) -> None:
+    """Test the statistics are the same after they are stored."""
+    stats = RunningStats()
+    for value in range(count):
+        stats.add(value)
+
+    stored = RunningStats.from_dict(stats.as_dict())
+    stored.add(count)
+    stats.add(count)
+
+    assert stored.as_dict() == stats.as_dict()
+
+
+def _trip(model: ArrivalModel, day: int, minutes: int) -> None:
+    """Observe a bus passing the stop, closest the minutes after the log time."""
+    arrival = LOG_TIME + timedelta(days=day, minutes=minutes)
+    for offset, meters in ((-1, 200), (0, 20), (1, 150), (2, PASS_RADIUS + 100)):
+        model.observe(
+            "student1",
+            "am",
+            PLACE_STOP,
+            meters,
+            arrival + timedelta(minutes=offset),
+        )
+
+
+async def test_observe_and_predict(hass: HomeAssistant) -> None:
+    """Test the arrivals are the closest fixes and predicted per weekday."""
+    model = ArrivalModel(hass, ENTRY_ID)
+    local = dt_util.as_local(LOG_TIME)
+
+    for week, minutes in enumerate((0, 2, 4)):
+        assert model.predict("student1", "am", PLACE_STOP, local.weekday()) is None
+        _trip(model, 7 * week, minutes)
+    # a trip on another weekday is kept apart.
+    _trip(model, 1, 30)
+
+    prediction = model.predict("student1", "am", PLACE_STOP, local.weekday())
+    assert prediction is not None
+    assert prediction.samples == MIN_SAMPLES
+    assert prediction.arrival == (local + timedelta(minutes=2)).time()
+    assert prediction.low == local.time()
+    assert prediction.high == (local + timedelta(minutes=4)).time()
+    assert prediction.mean == prediction.arrival
+    assert prediction.std_dev == 120  # noqa: PLR2004
+    assert model.predict("student1", "am", PLACE_SCHOOL, local.weekday()) is None
+
+
+async def test_finish_records_the_arrival(hass: HomeAssistant) -> None:
+    """Test a window ending with the bus still at the school records the arrival."""
+    model = ArrivalModel(hass, ENTRY_ID)
+    local = dt_util.as_local(LOG_TIME)
+    for week in range(MIN_SAMPLES):
+        model.observe(
+            "student1", "am", PLACE_SCHOOL, 40, LOG_TIME + timedelta(days=7 * week)
+        )
+        model.observe(
+            "student1",
+            "am",
+            PLACE_SCHOOL,
+            40,
+            LOG_TIME + timedelta(days=7 * week, minutes=5),
+        )
+        model.finish("student1")
+
+    prediction = model.predict("student1", "am", PLACE_SCHOOL, local.weekday())
+    assert prediction is not None
+    # the bus waiting at the school arrived at its first closest fix.
+    assert prediction.arrival == local.time()
+    assert prediction.std_dev == 0
+
+
+async def test_save_and_load(
+    hass: HomeAssistant, hass_storage: dict[str, Any], freezer: FrozenDateTimeFactory
+) -> None:
+    """Test the arrivals are saved after a delay and loaded again."""
+    model = ArrivalModel(hass, ENTRY_ID)
+    for week in range(MIN_SAMPLES):
+        _trip(model, 7 * week, week)
+    assert STORAGE_KEY not in hass_storage
+
+    freezer.tick(timedelta(seconds=SAVE_DELAY))
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done()
+    assert STORAGE_KEY in hass_storage
+
+    loaded = ArrivalModel(hass, ENTRY_ID)
+    await loaded.async_load()
+    weekday = dt_util.as_local(LOG_TIME).weekday()
+    assert loaded.predict("student1", "am", PLACE_STOP, weekday) == model.predict(
+        "student1", "am", PLACE_STOP, weekday
+    )
+
+    await loaded.async_remove()
+    assert STORAGE_KEY not in hass_storage
+
+
+async def test_save_now(hass: HomeAssistant, hass_storage: dict[str, Any]) -> None:
+    """Test the arrivals are saved at once, without waiting for the delay."""
+    model = ArrivalModel(hass, ENTRY_ID)
+    _trip(model, 0, 0)
+
+    await model.async_save()
+
+    assert STORAGE_KEY in hass_storage
+    loaded = ArrivalModel(hass, ENTRY_ID)
+    await loaded.async_load()
+    assert loaded._stats.keys() == model._stats.keys()
+
+
+async def test_load_missing(hass: HomeAssistant) -> None:
+    """Test nothing is predicted before any arrival was saved."""
+    model = ArrivalModel(hass, ENTRY_ID)
+    await model.async_load()
+
+    assert model.predict("student1", "am", PLACE_STOP, 0) is None
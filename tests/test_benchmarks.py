@@ -0,0 +1,288 @@
+"""
+Benchmarks of the coordinator and entity update hot path.
+
+The benchmarks run once as regular tests. `scripts/benchmark` runs them for
+real and compares the results with the baseline saved in `benchmarks/`.
+"""
+
+import asyncio
+import tracemalloc
+from collections.abc import Generator
+from datetime import datetime, time
+from itertools import cycle
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from hcb_soap_client.stop_response import StopResponse, StudentStop, VehicleLocation
+from homeassistant.util import dt as dt_util
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from custom_components.here_comes_the_bus.binary_sensor import (
+    ENTITY_DESCRIPTIONS as BINARY_SENSOR_DESCRIPTIONS,
+)
+from custom_components.here_comes_the_bus.binary_sensor import HCBBinarySensor
+from custom_components.here_comes_the_bus.coordinator import (
+    HCBDataCoordinator,
+    HCBScheduleCoordinator,
+    TimeOfDay,
+)
+from custom_components.here_comes_the_bus.data import StudentData
+from custom_components.here_comes_the_bus.device_tracker import (
+    DEVICE_TRACKERS,
+    HCBTracker,
+)
+from custom_components.here_comes_the_bus.school_calendar import SchoolCalendar
+from custom_components.here_comes_the_bus.sensor import (
+    ENTITY_DESCRIPTIONS as SENSOR_DESCRIPTIONS,
+)
+from custom_components.here_comes_the_bus.sensor import HCBSensor
+
+from .common import mock_config_entry
+
+if TYPE_CHECKING:
+    from custom_components.here_comes_the_bus.entity import HCBEntity
+
+ROUNDS = 20
+MEMORY_STUDENTS = 1000
+TIMES_OF_DAY = {
+    1: [TimeOfDay.AM],
+    2: [TimeOfDay.AM, TimeOfDay.PM],
+    3: [TimeOfDay.AM, TimeOfDay.MID, TimeOfDay.PM],
+}
+
+
+@pytest.fixture
+def benchmark_loop() -> Generator[asyncio.AbstractEventLoop]:
+    """Return an event loop to run the coordinator code on."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def _stop(time_of_day_id: str, stop_type: str, index: int) -> StudentStop:
+    """Return a stop of a time of day."""
+    start_time = time(6 + index // 60 % 3, index % 60)
+    return StudentStop(
+        name=f"{stop_type} {index}",
+        latitude=37.7649,
+        longitude=-122.4094,
+        start_time=start_time,
+        stop_type=stop_type,
+        substitute_vehicle_name="",
+        vehicle_name="Bus 1",
+        stop_id=str(index),
+        arrival_time=start_time,
+        time_of_day_id=time_of_day_id,
+        vehicle_id="1",
+        esn="",
+        tier_start_time=time(6, 0),
+        bus_visibility_start_offset=0,
+    )
+
+
+def _stops(time_of_day_id: str, count: int) -> list[StudentStop]:
+    """Return stops of the student, with the school as the last one."""
+    return [_stop(time_of_day_id, "Stop", index) for index in range(count - 1)] + [
+        _stop(time_of_day_id, "School", count - 1)
+    ]
+
+
+def _vehicle_location(latitude: float) -> VehicleLocation:
+    """Return a vehicle location."""
+    return VehicleLocation(
+        name="Bus 1",
+        latitude=latitude,
+        longitude=-122.4094,
+        log_time="2024-10-30T07:15:00",
+        ignition="Y",
+        latent="N",
+        time_zone_offset=0,
+        heading="N",
+        speed=25,
+        address="123 Main St",
+        message_code=0,
+        display_on_map="Y",
+    )
+
+
+def _student(index: int) -> StudentData:
+    """Return a student with a full schedule and location."""
+    return StudentData(
+        first_name=f"Student {index}",
+        student_id=f"student{index}",
+        bus_name="Bus 1",
+        latitude=37.7749,
+        longitude=-122.4194,
+        log_time=dt_util.now(),
+        ignition=True,
+        latent=False,
+        heading="N",
+        speed=25,
+        address="123 Main St",
+        message_code=0,
+        display_on_map=True,
+        am_school_arrival_time=time(7, 45),
+        am_stop_arrival_time=time(7, 20),
+        am_stop_latitude=37.7649,
+        am_stop_longitude=-122.4094,
+        pm_school_arrival_time=time(15, 0),
+        pm_stop_arrival_time=time(15, 40),
+        pm_stop_latitude=37.7649,
+        pm_stop_longitude=-122.4094,
+        am_start_time=time(6, 30),
+        am_end_time=time(8, 0),
+    )
+
+
+@pytest.mark.parametrize("time_of_day_count", sorted(TIMES_OF_DAY))
+@pytest.mark.parametrize("student_count", [1, 5, 20])
+def test_benchmark_first_refresh(
+    benchmark: BenchmarkFixture,
+    benchmark_loop: asyncio.AbstractEventLoop,
+    student_count: int,
+    time_of_day_count: int,
+) -> None:
+    """Benchmark the first refresh of the schedule without a cache."""
+    time_of_day_ids = TIMES_OF_DAY[time_of_day_count]
+    stop_responses = {
+        time_of_day_id: StopResponse(
+            vehicle_location=None, student_stops=_stops(time_of_day_id, 2)
+        )
+        for time_of_day_id in time_of_day_ids
+    }
+    client = MagicMock()
+    client.get_school_id = AsyncMock(return_value="school_id")
+    client.get_parent_info = AsyncMock(
+        return_value=SimpleNamespace(
+            account_id="parent_id",
+            students=[
+                SimpleNamespace(student_id=f"student{index}", first_name="Student")
+                for index in range(student_count)
+            ],
+            times=[
+                SimpleNamespace(id=time_of_day_id) for time_of_day_id in time_of_day_ids
+            ],
+        )
+    )
+    client.get_stop_info = AsyncMock(
+        side_effect=lambda *args, **_: stop_responses[args[3]]
+    )
+    config_entry = mock_config_entry(client=client)
+
+    def setup() -> tuple[tuple[HCBScheduleCoordinator], dict[str, Any]]:
+        coordinator = HCBScheduleCoordinator(MagicMock(), config_entry)
+        coordinator._cache = MagicMock(
+            async_load=AsyncMock(return_value=None), async_save=AsyncMock()
+        )
+        return (coordinator,), {}
+
+    def first_refresh(coordinator: HCBScheduleCoordinator) -> None:
+        benchmark_loop.run_until_complete(
+            coordinator.async_config_entry_first_refresh()
+        )
+
+    benchmark.pedantic(first_refresh, setup=setup, rounds=ROUNDS)
+
+    assert client.get_stop_info.call_count >= student_count * time_of_day_count
+
+
+@pytest.mark.parametrize("student_count", [1, 5, 20])
+def test_benchmark_location_tick(
+    benchmark: BenchmarkFixture,
+    benchmark_loop: asyncio.AbstractEventLoop,
+    student_count: int,
+) -> None:
+    """Benchmark a location poll and the update of every entity it feeds."""
+    responses = cycle(
+        [
+            StopResponse(vehicle_location=_vehicle_location(37.7749), student_stops=[]),
+            StopResponse(vehicle_location=_vehicle_location(37.7750), student_stops=[]),
+        ]
+    )
+    client = MagicMock()
+    client.get_stop_info = AsyncMock()
+    schedule = MagicMock(
+        school_id="school_id",
+        parent_id="parent_id",
+        calendar=SchoolCalendar(MagicMock(), "", ""),
+    )
+    coordinator = HCBDataCoordinator(
+        MagicMock(), mock_config_entry(client=client), schedule
+    )
+    students = [_student(index) for index in range(student_count)]
+    coordinator.data = {student.student_id: student for student in students}
+    entities: list[HCBEntity] = [
+        *(
+            HCBSensor(coordinator, description, student)
+            for description in SENSOR_DESCRIPTIONS
+            if not description.from_schedule
+            for student in students
+        ),
+        *(
+            HCBBinarySensor(coordinator, description, student)
+            for description in BINARY_SENSOR_DESCRIPTIONS
+            for student in students
+        ),
+        *(
+            HCBTracker(coordinator, student, description)
+            for description in DEVICE_TRACKERS
+            for student in students
+        ),
+    ]
+    # the state machine is not part of the hot path of the integration.
+    writes: list[HCBEntity] = []
+    for entity in entities:
+        entity.async_write_ha_state = lambda entity=entity: writes.append(entity)
+
+    def tick() -> None:
+        # every tick moves the bus of every student.
+        client.get_stop_info.return_value = next(responses)
+        coordinator.data = benchmark_loop.run_until_complete(
+            coordinator._async_update_data()
+        )
+        for entity in entities:
+            entity._handle_coordinator_update()
+
+    dt_now = datetime(2024, 10, 30, 7, 15, tzinfo=dt_util.get_default_time_zone())
+    with patch("homeassistant.util.dt.now", return_value=dt_now):
+        benchmark(tick)
+
+    assert writes
+
+
+@pytest.mark.parametrize("stop_count", [10, 100, 1000])
+def test_benchmark_update_stops(benchmark: BenchmarkFixture, stop_count: int) -> None:
+    """Benchmark applying a long list of stops to a student."""
+    coordinator = HCBScheduleCoordinator(
+        MagicMock(), mock_config_entry(client=MagicMock())
+    )
+    stops = _stops(TimeOfDay.AM, stop_count)
+
+    benchmark(coordinator._update_stops, StudentData("Student", "student1"), stops)
+
+
+@pytest.mark.parametrize("stop_count", [10, 100, 1000])
+def test_benchmark_get_stop_time(benchmark: BenchmarkFixture, stop_count: int) -> None:
+    """Benchmark finding the school in a long list of stops."""
+    coordinator = HCBScheduleCoordinator(
+        MagicMock(), mock_config_entry(client=MagicMock())
+    )
+    stops = _stops(TimeOfDay.AM, stop_count)
+
+    assert benchmark(coordinator._get_stop_time, stops, "School") is not None
+
+
+def test_benchmark_student_data_memory(benchmark: BenchmarkFixture) -> None:
+    """Benchmark creating a student, recording the memory it takes."""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        students = [_student(index) for index in range(MEMORY_STUDENTS)]
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    benchmark.extra_info["bytes_per_student"] = (after - before) / len(students)
+
+    benchmark(_student, 0)
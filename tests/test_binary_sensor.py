@@ -70,6 +70,8 @@ async def test_binary_sensor_properties() -> None:
 
     student.ignition = False
     coordinator.data = {student.student_id: student}
+    coordinator.changes = {student.student_id: {description.key}}
+    coordinator.last_update_success = True
 
     with patch.object(sensor, "async_write_ha_state") as mock_write_state:
         sensor._handle_coordinator_update()
@@ -128,6 +130,8 @@ async def test_handle_coordinator_update() -> None:
 
     # Test with non-empty data
     coordinator.data = {student.student_id: student}
+    coordinator.changes = {student.student_id: {description.key}}
+    coordinator.last_update_success = True
     with patch.object(sensor, "async_write_ha_state") as mock_write_state:
         sensor._handle_coordinator_update()
         mock_write_state.assert_called_once()
@@ -0,0 +1,98 @@
+"""Tests for the Here Comes the Bus schedule cache."""
+
+from datetime import time, timedelta
+from typing import Any
+
+from freezegun.api import FrozenDateTimeFactory
+from homeassistant.core import HomeAssistant
+
+from custom_components.here_comes_the_bus.cache import (
+    CACHE_TTL,
+    STORAGE_VERSION,
+    HCBCache,
+)
+from custom_components.here_comes_the_bus.const import DOMAIN
+from custom_components.here_comes_the_bus.data import StudentData
+
+ENTRY_ID = "entry_id"
+STORAGE_KEY = f"{DOMAIN}.{ENTRY_ID}"
+
+
+def _students() -> dict[str, StudentData]:
+    """Return a student with a full schedule."""
+    student_data = StudentData(first_name="Alice", student_id="student1")
+    student_data.has_mid_stops = True
+    student_data.am_start_time = time(7, 0)
+    student_data.am_stop_arrival_time = time(7, 20)
+    student_data.am_stop_latitude = 37.7649
+    student_data.am_stop_longitude = -122.4094
+    student_data.pm_end_time = time(16, 0)
+    student_data.latitude = 37.7749
+    student_data.speed = 25
+    return {student_data.student_id: student_data}
+
+
+async def test_save_and_load(hass: HomeAssistant) -> None:
+    """Test the schedule survives a save and load."""
+    cache = HCBCache(hass, ENTRY_ID)
+    await cache.async_save("school_id", "parent_id", ["am", "pm"], _students())
+
+    cached = await HCBCache(hass, ENTRY_ID).async_load()
+
+    assert cached is not None
+    assert cached.school_id == "school_id"
+    assert cached.parent_id == "parent_id"
+    assert cached.time_of_day_ids == ["am", "pm"]
+    assert cached.complete
+    student_data = cached.students["student1"]
+    assert student_data.first_name == "Alice"
+    assert student_data.has_mid_stops is True
+    assert student_data.am_start_time == time(7, 0)
+    assert student_data.am_stop_arrival_time == time(7, 20)
+    assert student_data.am_stop_latitude == 37.7649  # noqa: PLR2004
+    assert student_data.pm_end_time == time(16, 0)
+    assert student_data.am_school_arrival_time is None
+    # the location is polled, it is not cached.
+    assert student_data.latitude is None
+    assert student_data.speed is None
+
+
+async def test_load_missing(hass: HomeAssistant) -> None:
+    """Test nothing is loaded before the schedule was saved."""
+    assert await HCBCache(hass, ENTRY_ID).async_load() is None
+
+
+async def test_load_expired(
+    hass: HomeAssistant, freezer: FrozenDateTimeFactory
+) -> None:
+    """Test an expired schedule is not used."""
+    cache = HCBCache(hass, ENTRY_ID)
+    await cache.async_save("school_id", "parent_id", [], _students())
+
+    freezer.tick(CACHE_TTL - timedelta(minutes=1))
+    assert await cache.async_load() is not None
+    freezer.tick(timedelta(minutes=2))
+    assert await cache.async_load() is None
+
+
+async def test_load_other_version(
+    hass: HomeAssistant, hass_storage: dict[str, Any]
+) -> None:
+    """Test a schedule saved with another schema version is discarded."""
+    cache = HCBCache(hass, ENTRY_ID)
+    await cache.async_save("school_id", "parent_id", [], _students())
+    hass_storage[STORAGE_KEY]["version"] = STORAGE_VERSION - 1
+
+    assert await HCBCache(hass, ENTRY_ID).async_load() is None
+
+
+async def test_remove(hass: HomeAssistant, hass_storage: dict[str, Any]) -> None:
+    """Test removing the cached schedule."""
+    cache = HCBCache(hass, ENTRY_ID)
+    await cache.async_save("school_id", "parent_id", [], _students())
+    assert STORAGE_KEY in hass_storage
+
+    await cache.async_remove()
+
+    assert STORAGE_KEY not in hass_storage
+    assert await cache.async_load() is None
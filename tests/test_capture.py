@@ -0,0 +1,88 @@
+"""Tests for the capture of the HCB api responses."""
+
+import gzip
+from pathlib import Path
+
+import pytest
+
+from custom_components.here_comes_the_bus.capture import (
+    ResponseCapture,
+    load_capture,
+)
+
+PARENT_INFO_PARAMS = [
+    ("P1", "school_id"),
+    ("P2", "test_user"),
+    ("P3", "test_password"),
+    ("P4", "LookupItem_Source_Android"),
+]
+STOP_INFO_PARAMS = [
+    ("P1", "school_id"),
+    ("P2", "parent_id"),
+    ("P3", "student1"),
+    ("P4", "am"),
+]
+
+
+async def test_capture_round_trip(tmp_path: Path) -> None:
+    """Test the captured responses are loaded in order without credentials."""
+    path = tmp_path / "capture.jsonl.gz"
+    capture = ResponseCapture(path)
+
+    capture.record("s1157", PARENT_INFO_PARAMS, "<Response>parent</Response>")
+    capture.record("s1158", STOP_INFO_PARAMS, "<Response>stop 1</Response>")
+    await capture.async_close()
+    # the next flush appends to the same file.
+    capture.record("s1158", STOP_INFO_PARAMS, "<Response>stop 2</Response>")
+    await capture.async_close()
+
+    responses = load_capture(path)
+
+    assert [response.response for response in responses] == [
+        "<Response>parent</Response>",
+        "<Response>stop 1</Response>",
+        "<Response>stop 2</Response>",
+    ]
+    assert responses[0].method == "s1157"
+    assert responses[0].params == {
+        "P1": "school_id",
+        "P4": "LookupItem_Source_Android",
+    }
+    assert responses[1].params == dict(STOP_INFO_PARAMS)
+    assert responses[0].time <= responses[1].time <= responses[2].time
+
+
+@pytest.mark.parametrize(
+    "partial",
+    [
+        # a gzip member that was cut off.
+        gzip.compress(b'{"time":"2024-10-30T14:15:00+00:00"}\n')[:20],
+        # a line that was cut off.
+        gzip.compress(b'{"time":"2024-10-30T14:'),
+    ],
+)
+async def test_capture_partial_write(tmp_path: Path, partial: bytes) -> None:
+    """Test a write that was cut off at the end of the capture is skipped."""
+    path = tmp_path / "capture.jsonl.gz"
+    capture = ResponseCapture(path)
+    capture.record("s1158", STOP_INFO_PARAMS, "<Response />")
+    await capture.async_close()
+    with path.open("ab") as file:
+        file.write(partial)
+
+    responses = load_capture(path)
+
+    assert [response.response for response in responses] == ["<Response />"]
+
+
+async def test_capture_write_error(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test a capture that cannot be written is dropped with a warning."""
+    capture = ResponseCapture(tmp_path / "missing" / "capture.jsonl.gz")
+
+    capture.record("s1158", STOP_INFO_PARAMS, "<Response />")
+    await capture.async_close()
+
+    assert "Unable to write the capture" in caplog.text
+    assert not capture._pending
@@ -0,0 +1,421 @@
+"""Tests for the shared Here Comes the Bus client."""
+
+import asyncio
+import threading
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from hcb_soap_client.hcb_soap_client import HcbApiError, HcbSoapClient
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import HomeAssistant
+
+from custom_components.here_comes_the_bus.capture import load_capture
+from custom_components.here_comes_the_bus.client import (
+    HCBClient,
+    HCBClientRegistry,
+    async_get_client_registry,
+)
+from custom_components.here_comes_the_bus.metrics import RequestMetrics
+
+CLIENT = "custom_components.here_comes_the_bus.client"
+POLLS = 5
+SCHOOL_RESPONSE = '<Response><Customer ID="school_id" /></Response>'
+STOP_KEY = ("school_id", "parent_id", "student1", "am")
+
+
+async def test_registry_is_shared(hass: HomeAssistant) -> None:
+    """Test every caller gets the same registry."""
+    assert async_get_client_registry(hass) is async_get_client_registry(hass)
+
+
+async def test_registry_reference_counts_the_client() -> None:
+    """Test the session lives until the last user releases the client."""
+    registry = HCBClientRegistry()
+
+    first = registry.async_acquire()
+    second = registry.async_acquire()
+    assert first is second
+    session = registry._session
+    assert session is not None
+
+    await registry.async_release()
+    assert not session.closed
+
+    await registry.async_release()
+    assert session.closed
+    assert registry._session is None
+
+    # the next user gets a new session
+    third = registry.async_acquire()
+    assert third is not first
+    await registry.async_release()
+
+
+async def test_registry_uses_the_largest_pool_limits() -> None:
+    """Test the session pool grows to the largest limits of the users."""
+    registry = HCBClientRegistry()
+
+    client = registry.async_acquire(limit=5, limit_per_host=8)
+    first = registry._session
+    assert first is not None
+
+    # smaller limits share the pool.
+    registry.async_acquire(limit=2, limit_per_host=2)
+    assert registry._session is first
+
+    registry.async_acquire(limit=20, limit_per_host=4)
+    second = registry._session
+    assert second is not None
+    assert second is not first
+    assert client._session is second
+    assert second.connector.limit == 20  # noqa: PLR2004
+    assert second.connector.limit_per_host == 8  # noqa: PLR2004
+    # the requests in flight finish on the replaced session.
+    assert not first.closed
+
+    for _ in range(3):
+        await registry.async_release()
+    assert first.closed
+    assert second.closed
+
+
+async def test_registry_closes_when_home_assistant_closes(hass: HomeAssistant) -> None:
+    """Test the session is closed at shutdown, when the entries stay loaded."""
+    registry = async_get_client_registry(hass)
+    registry.async_acquire()
+    session = registry._session
+    assert session is not None
+
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_CLOSE)
+    await hass.async_block_till_done()
+
+    assert session.closed
+    assert registry._session is None
+    # the entry released later finds nothing left to close.
+    await registry.async_release()
+
+
+async def test_registry_parses_in_executor_while_any_user_asks() -> None:
+    """Test responses are parsed in the executor while a user asks for it."""
+    registry = HCBClientRegistry()
+
+    client = registry.async_acquire()
+    assert client.parse_in_executor is False
+    registry.async_acquire(parse_in_executor=True)
+    assert client.parse_in_executor is True
+
+    await registry.async_release(parse_in_executor=True)
+    assert client.parse_in_executor is False
+    await registry.async_release()
+
+
+async def test_registry_captures_while_any_user_asks(tmp_path: Path) -> None:
+    """Test the responses are captured while a user asks for it."""
+    path = tmp_path / "capture.jsonl.gz"
+    registry = HCBClientRegistry(capture_path=path)
+
+    client = registry.async_acquire()
+    assert client.capture is None
+    registry.async_acquire(capture=True)
+    capture = client.capture
+    assert capture is not None
+    registry.async_acquire(capture=True)
+    assert client.capture is capture
+
+    with patch.object(client, "_request", AsyncMock(return_value="response")):
+        await client._async_call("s1158", [("P3", "student1")], str)
+    await registry.async_release(capture=True)
+    assert client.capture is capture
+    await registry.async_release(capture=True)
+    assert client.capture is None
+    await registry.async_release()
+
+    responses = load_capture(path)
+    assert len(responses) == 1
+    assert responses[0].method == "s1158"
+    assert responses[0].params == {"P3": "student1"}
+    assert responses[0].response == "response"
+
+
+async def test_registry_without_capture_path() -> None:
+    """Test nothing is captured without a capture path."""
+    registry = HCBClientRegistry()
+
+    assert registry.async_acquire(capture=True).capture is None
+    await registry.async_release(capture=True)
+
+
+@pytest.mark.parametrize(
+    ("name", "args"),
+    [
+        ("get_school_id", ("school_code",)),
+        ("get_parent_info", ("school_id", "username", "password")),
+        ("get_stop_info", STOP_KEY),
+    ],
+)
+async def test_client_sends_the_library_requests(
+    name: str, args: tuple[str, ...]
+) -> None:
+    """Test the client sends the same method and params as the library."""
+    requests = []
+
+    async def request(method: str, params: list[tuple[str, str]]) -> str:
+        requests.append((method, params))
+        raise HcbApiError(method)
+
+    for client in (HcbSoapClient(), HCBClient()):
+        with (
+            patch.object(client, "_request", request),
+            pytest.raises(HcbApiError),
+        ):
+            await getattr(client, name)(*args)
+
+    library, ours = requests
+    assert ours == library
+
+
+async def _count_connections(client: HcbSoapClient, server: TestServer) -> int:
+    """Poll the server and return the number of connections that were opened."""
+    peers: set[int] = set()
+
+    async def handle(request: web.Request) -> web.Response:
+        peers.add(request.transport.get_extra_info("peername")[1])
+        return web.Response(text=SCHOOL_RESPONSE)
+
+    server.app.router.add_post("/", handle)
+    await server.start_server()
+    client._url = str(server.make_url("/"))
+    for _ in range(POLLS):
+        assert await client.get_school_id("school_code") == "school_id"
+    await server.close()
+    return len(peers)
+
+
+@pytest.mark.usefixtures("socket_enabled")
+async def test_pooled_session_reuses_connections() -> None:
+    """Test polls reuse the pooled connection instead of opening new ones."""
+    # a client without a session opens a connection for every request
+    assert (
+        await _count_connections(HcbSoapClient(), TestServer(web.Application()))
+        == POLLS
+    )
+
+    registry = HCBClientRegistry()
+    client = registry.async_acquire()
+    assert await _count_connections(client, TestServer(web.Application())) == 1
+    await registry.async_release()
+
+
+async def test_client_shares_in_flight_stop_requests() -> None:
+    """Test a burst of callers for the same stops costs one request."""
+    release = asyncio.Event()
+    response = MagicMock()
+
+    async def get_stop_info(*_: str) -> MagicMock:
+        await release.wait()
+        return response
+
+    client = HCBClient()
+    with patch.object(
+        HCBClient, "_async_call", side_effect=get_stop_info
+    ) as mock_get_stop_info:
+        burst = [
+            asyncio.create_task(client.get_stop_info(*STOP_KEY)) for _ in range(POLLS)
+        ]
+        other = asyncio.create_task(
+            client.get_stop_info("school_id", "parent_id", "student2", "am")
+        )
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*burst, other)
+
+        assert results == [response] * (POLLS + 1)
+        assert mock_get_stop_info.call_count == 2  # noqa: PLR2004 one per key
+        assert not client._in_flight
+
+        # a finished request is not reused
+        assert await client.get_stop_info(*STOP_KEY) is response
+        assert mock_get_stop_info.call_count == 3  # noqa: PLR2004
+
+
+async def test_client_shares_in_flight_errors() -> None:
+    """Test every caller of a failed request gets the error."""
+    release = asyncio.Event()
+
+    async def get_stop_info(*_: str) -> MagicMock:
+        await release.wait()
+        msg = "error"
+        raise HcbApiError(msg)
+
+    client = HCBClient()
+    with patch.object(HCBClient, "_async_call", side_effect=get_stop_info):
+        burst = [
+            asyncio.create_task(client.get_stop_info(*STOP_KEY)) for _ in range(POLLS)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*burst, return_exceptions=True)
+
+    assert all(isinstance(result, HcbApiError) for result in results)
+    assert not client._in_flight
+
+
+async def test_client_cancelled_caller_does_not_cancel_others() -> None:
+    """Test a cancelled caller leaves the shared request running."""
+    release = asyncio.Event()
+    response = MagicMock()
+
+    async def get_stop_info(*_: str) -> MagicMock:
+        await release.wait()
+        return response
+
+    client = HCBClient()
+    with patch.object(HCBClient, "_async_call", side_effect=get_stop_info):
+        cancelled = asyncio.create_task(client.get_stop_info(*STOP_KEY))
+        waiting = asyncio.create_task(client.get_stop_info(*STOP_KEY))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        release.set()
+
+        assert await waiting is response
+        assert cancelled.cancelled()
+
+
+async def test_client_cancels_request_without_callers() -> None:
+    """Test the request is cancelled once every caller was cancelled."""
+    started = asyncio.Event()
+    release = asyncio.Event()
+    response = MagicMock()
+
+    async def get_stop_info(*_: str) -> MagicMock:
+        started.set()
+        await release.wait()
+        return response
+
+    client = HCBClient()
+    with patch.object(HCBClient, "_async_call", side_effect=get_stop_info):
+        caller = asyncio.create_task(client.get_stop_info(*STOP_KEY))
+        await started.wait()
+        request = client._in_flight[STOP_KEY]
+        caller.cancel()
+        await asyncio.wait([caller, request])
+
+        assert caller.cancelled()
+        assert request.cancelled()
+        assert not client._in_flight
+        assert not client._waiters
+
+        # the next caller sends a new request.
+        release.set()
+        assert await client.get_stop_info(*STOP_KEY) is response
+
+
+async def test_client_parses_in_executor() -> None:
+    """Test the response is parsed off the event loop and timed."""
+    loop_thread = threading.get_ident()
+    parse_threads: list[int] = []
+    response = MagicMock()
+
+    def from_text(text: str) -> MagicMock:
+        assert text == "response"
+        parse_threads.append(threading.get_ident())
+        return response
+
+    client = HCBClient()
+    client.parse_in_executor = True
+    with (
+        patch.object(client, "_request", AsyncMock(return_value="response")),
+        patch(f"{CLIENT}.StopResponse") as mock_stop_response,
+    ):
+        mock_stop_response.from_text = from_text
+        assert await client.get_stop_info(*STOP_KEY) is response
+
+    assert parse_threads
+    assert parse_threads[0] != loop_thread
+    timings = client.metrics.calls["s1158"]
+    assert timings.calls == 1
+    assert timings.slow_parses == 0
+
+
+async def test_client_flags_slow_parse_on_the_loop() -> None:
+    """Test a slow parse on the event loop is counted."""
+    response = MagicMock()
+    client = HCBClient()
+    with (
+        patch.object(client, "_request", AsyncMock(return_value="response")),
+        patch(f"{CLIENT}.AccountResponse") as mock_account_response,
+        patch("custom_components.here_comes_the_bus.metrics.SLOW_PARSE_SECONDS", -1),
+    ):
+        mock_account_response.from_text.return_value = response
+        assert (
+            await client.get_parent_info("school_id", "username", "password")
+            is response
+        )
+
+    mock_account_response.from_text.assert_called_once_with("response")
+    timings = client.metrics.calls["s1157"]
+    assert timings.calls == 1
+    assert timings.slow_parses == 1
+    assert client.metrics.as_dict()["s1157"]["slow_parses"] == 1
+
+
+async def test_client_counts_errors_and_bytes() -> None:
+    """Test the failed calls and the size of the responses are counted."""
+    client = HCBClient()
+    with (
+        patch.object(
+            client,
+            "_request",
+            AsyncMock(side_effect=[HcbApiError("error"), "response"]),
+        ),
+        patch(f"{CLIENT}.StopResponse"),
+    ):
+        with pytest.raises(HcbApiError):
+            await client.get_stop_info(*STOP_KEY)
+        await client.get_stop_info(*STOP_KEY)
+
+    timings = client.metrics.calls["s1158"]
+    assert timings.errors == 1
+    assert timings.calls == 1
+    assert timings.bytes_received == len("response")
+    assert timings.network.count == 1
+
+
+async def test_client_times_the_school_id() -> None:
+    """Test the calls for the school id are timed like the others."""
+    client = HCBClient()
+    with patch.object(
+        client,
+        "_request",
+        AsyncMock(side_effect=[SCHOOL_RESPONSE, HcbApiError("error")]),
+    ):
+        assert await client.get_school_id("school_code") == "school_id"
+        with pytest.raises(HcbApiError):
+            await client.get_school_id("school_code")
+
+    timings = client.metrics.calls["s1100"]
+    assert timings.calls == 1
+    assert timings.errors == 1
+    assert timings.bytes_received == len(SCHOOL_RESPONSE)
+
+
+async def test_client_records_to_the_caller_metrics() -> None:
+    """Test the calls are also counted in the metrics the caller passes."""
+    client = HCBClient()
+    metrics = RequestMetrics()
+    with patch.object(
+        client,
+        "_request",
+        AsyncMock(side_effect=[SCHOOL_RESPONSE, HcbApiError("error")]),
+    ):
+        assert await client.get_school_id("school_code", metrics=metrics) == "school_id"
+        with pytest.raises(HcbApiError):
+            await client.get_school_id("school_code")
+
+    assert metrics.calls["s1100"].calls == 1
+    assert metrics.calls["s1100"].errors == 0
+    assert client.metrics.calls["s1100"].calls == 1
+    assert client.metrics.calls["s1100"].errors == 1
@@ -7,21 +7,31 @@ from homeassistant import config_entries, data_entry_flow
 from homeassistant.auth.providers.homeassistant import InvalidAuth
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
 from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.common import MockConfigEntry
 
+from custom_components.here_comes_the_bus.client import async_get_client_registry
 from custom_components.here_comes_the_bus.config_flow import HCBConfigFlowHandler
 from custom_components.here_comes_the_bus.const import (
+    CONF_CALL_TIMEOUT,
+    CONF_MAX_CONCURRENT_REQUESTS,
+    CONF_MAX_UPDATE_INTERVAL,
+    CONF_MIN_UPDATE_INTERVAL,
     CONF_SCHOOL_CODE,
+    CONF_TICK_BUDGET,
     CONF_UPDATE_INTERVAL,
     DOMAIN,
+    MIN_POLL_INTERVAL,
 )
+from custom_components.here_comes_the_bus.data import get_option
 
 # Mock data
 MOCK_USER_INPUT = {
     CONF_USERNAME: "test_username",
     CONF_PASSWORD: "test_password",
     CONF_SCHOOL_CODE: "test_school_code",
-    CONF_UPDATE_INTERVAL: 20,
 }
+# an entry set up before the options flow, with its options in the data.
+MOCK_ENTRY_DATA = {**MOCK_USER_INPUT, CONF_UPDATE_INTERVAL: 25}
 
 
 # This fixture is used to enable custom integrations, otherwise the custom_components
@@ -35,7 +45,7 @@ def auto_enable_custom_integrations(enable_custom_integrations):  # noqa: ANN001
 async def test_async_step_user_success(hass: HomeAssistant) -> None:
     """Test successful user step."""
     with patch(
-        "custom_components.here_comes_the_bus.config_flow.HcbSoapClient"
+        "custom_components.here_comes_the_bus.client.HCBClient"
     ) as mock_soap_client:
         # Mock the client instance and its methods
         mock_instance = AsyncMock()
@@ -110,18 +120,91 @@ async def test_async_step_user_unknown_error(hass: HomeAssistant) -> None:
         assert result["errors"] == {"base": "unknown"}
 
 
-async def test_credentials() -> None:
+async def test_options_flow(hass: HomeAssistant) -> None:
+    """Test the options of an entry set up with them in its data are changed."""
+    entry = MockConfigEntry(domain=DOMAIN, data=MOCK_ENTRY_DATA)
+    entry.add_to_hass(hass)
+
+    result = await hass.config_entries.options.async_init(entry.entry_id)
+    assert result["type"] == data_entry_flow.FlowResultType.FORM
+    assert result["step_id"] == "init"
+    # the form starts from the update interval the entry was set up with.
+    suggested = {
+        key.schema: key.description["suggested_value"]
+        for key in result["data_schema"].schema
+        if key.description
+    }
+    assert suggested[CONF_UPDATE_INTERVAL] == MOCK_ENTRY_DATA[CONF_UPDATE_INTERVAL]
+
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"], user_input={CONF_UPDATE_INTERVAL: 30}
+    )
+    assert result["type"] == data_entry_flow.FlowResultType.CREATE_ENTRY
+    assert entry.options[CONF_UPDATE_INTERVAL] == 30  # noqa: PLR2004
+    assert get_option(entry, CONF_UPDATE_INTERVAL, 20) == 30  # noqa: PLR2004
+
+
+async def test_options_flow_min_above_max(hass: HomeAssistant) -> None:
+    """Test the minimum adaptive interval can not be above the maximum."""
+    entry = MockConfigEntry(domain=DOMAIN, data=MOCK_ENTRY_DATA)
+    entry.add_to_hass(hass)
+
+    result = await hass.config_entries.options.async_init(entry.entry_id)
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"],
+        user_input={CONF_MIN_UPDATE_INTERVAL: 60, CONF_MAX_UPDATE_INTERVAL: 30},
+    )
+    assert result["type"] == data_entry_flow.FlowResultType.FORM
+    assert result["errors"] == {CONF_MIN_UPDATE_INTERVAL: "min_above_max"}
+    assert not entry.options
+
+
+@pytest.mark.parametrize(
+    "option",
+    [CONF_UPDATE_INTERVAL, CONF_MIN_UPDATE_INTERVAL, CONF_MAX_UPDATE_INTERVAL],
+)
+@pytest.mark.parametrize("interval", [0, MIN_POLL_INTERVAL - 1])
+async def test_options_flow_interval_floor(
+    hass: HomeAssistant, option: str, interval: int
+) -> None:
+    """Test the update intervals are not below the floor."""
+    entry = MockConfigEntry(domain=DOMAIN, data=MOCK_ENTRY_DATA)
+    entry.add_to_hass(hass)
+
+    result = await hass.config_entries.options.async_init(entry.entry_id)
+    with pytest.raises(data_entry_flow.InvalidData):
+        await hass.config_entries.options.async_configure(
+            result["flow_id"], user_input={option: interval}
+        )
+
+
+@pytest.mark.parametrize(
+    "option", [CONF_MAX_CONCURRENT_REQUESTS, CONF_CALL_TIMEOUT, CONF_TICK_BUDGET]
+)
+async def test_options_flow_at_least_one(hass: HomeAssistant, option: str) -> None:
+    """Test the requests, their timeout and the poll budget are at least one."""
+    entry = MockConfigEntry(domain=DOMAIN, data=MOCK_ENTRY_DATA)
+    entry.add_to_hass(hass)
+
+    result = await hass.config_entries.options.async_init(entry.entry_id)
+    with pytest.raises(data_entry_flow.InvalidData):
+        await hass.config_entries.options.async_configure(
+            result["flow_id"], user_input={option: 0}
+        )
+
+
+async def test_credentials(hass: HomeAssistant) -> None:
     """Test the test_credentials method."""
     handler = HCBConfigFlowHandler()
+    handler.hass = hass
     user_input = {
         "school_code": "test_school",
         "username": "test_user",
         "password": "test_password",
     }
 
-    with patch(
-        "custom_components.here_comes_the_bus.config_flow.HcbSoapClient"
-    ) as mock_client:
+    with patch("custom_components.here_comes_the_bus.client.HCBClient") as mock_client:
+        mock_client.return_value.capture = None
         mock_client.return_value.get_school_id = AsyncMock(return_value="school_id")
         mock_client.return_value.get_parent_info = AsyncMock(
             return_value=MagicMock(account_id="account_id")
@@ -135,3 +218,5 @@ async def test_credentials() -> None:
         )
         result = await handler.test_credentials(user_input)
         assert result is False
+        # the shared session is closed again once the flow is done with it
+        assert async_get_client_registry(hass)._session is None
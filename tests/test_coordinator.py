@@ -1,23 +1,72 @@
 """Tests for the Here Comes the Bus coordinator."""
 
-from datetime import datetime, time, timedelta
+import asyncio
+from dataclasses import replace
+from datetime import UTC, date, datetime, time, timedelta
+from time import perf_counter
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from freezegun.api import FrozenDateTimeFactory
+from hcb_soap_client.hcb_soap_client import HcbApiError
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
 from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers.update_coordinator import UpdateFailed
 from homeassistant.util import dt as dt_util
+from lxml import etree
+from lxml.etree import XMLSyntaxError
+from pydantic import TypeAdapter, ValidationError
+from pytest_homeassistant_custom_component.common import (
+    MockEntityPlatform,
+    async_fire_time_changed,
+)
 
+from custom_components.here_comes_the_bus.arrival_model import (
+    PLACE_SCHOOL,
+    PLACE_STOP,
+    ArrivalPrediction,
+)
+from custom_components.here_comes_the_bus.binary_sensor import (
+    ENTITY_DESCRIPTIONS as BINARY_SENSOR_DESCRIPTIONS,
+)
+from custom_components.here_comes_the_bus.binary_sensor import HCBBinarySensor
+from custom_components.here_comes_the_bus.cache import HCBCache
 from custom_components.here_comes_the_bus.const import (
+    CONF_MAX_CONCURRENT_REQUESTS,
     CONF_SCHOOL_CODE,
     CONF_UPDATE_INTERVAL,
     DOMAIN,
+    POLLING_MODE_ADAPTIVE,
+    POLLING_MODE_FIXED,
 )
 from custom_components.here_comes_the_bus.coordinator import (
+    ADAPTIVE_POLLS_BEFORE_ARRIVAL,
+    BUS_RETENTION,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_MAX_DELAY,
+    SCHEDULE_UPDATE_INTERVAL,
     HCBDataCoordinator,
+    HCBScheduleCoordinator,
     TimeOfDay,
+    _gather_with_limit,
 )
 from custom_components.here_comes_the_bus.data import StudentData
+from custom_components.here_comes_the_bus.device_tracker import (
+    DEVICE_TRACKERS,
+    HCBTracker,
+)
+from custom_components.here_comes_the_bus.metrics import Freshness, RequestMetrics
+from custom_components.here_comes_the_bus.route_trace import RouteTrace
+from custom_components.here_comes_the_bus.sensor import (
+    ENTITY_DESCRIPTIONS as SENSOR_DESCRIPTIONS,
+)
+from custom_components.here_comes_the_bus.sensor import (
+    PREDICTED_ARRIVAL_DESCRIPTIONS,
+    HCBPredictedArrivalSensor,
+    HCBSensor,
+)
 
 TIME_OF_DAY_COUNT = 3
 
@@ -27,6 +76,9 @@ STUDENT_STOPS = [
         time_of_day_id=TimeOfDay.AM,
         tier_start_time=time(6, 0),
         start_time=time(7, 15),
+        arrival_time=time(7, 45),
+        latitude=37.7849,
+        longitude=-122.4294,
         am_school_arrival_time=time(7, 0),
         am_stopa_rrival_time=time(7, 15),
     ),
@@ -35,6 +87,9 @@ STUDENT_STOPS = [
         time_of_day_id=TimeOfDay.AM,
         tier_start_time=time(6, 0),
         start_time=time(7, 30),
+        arrival_time=time(7, 30),
+        latitude=37.7649,
+        longitude=-122.4094,
         am_school_arrival_time=time(7, 0),
         am_stopa_rrival_time=time(7, 15),
     ),
@@ -43,6 +98,7 @@ STUDENT_STOPS = [
 LATITUDE = 37.7749
 LONGITUDE = -122.4194
 SPEED = 25
+LOG_TIME = datetime(2024, 10, 31, 7, 15)  # noqa: DTZ001 HCB times are naive
 
 
 async def test_coordinator_init(hass: HomeAssistant) -> None:
@@ -54,7 +110,9 @@ async def test_coordinator_init(hass: HomeAssistant) -> None:
         CONF_PASSWORD: "test_password",
         CONF_UPDATE_INTERVAL: 30,
     }
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBDataCoordinator(
+        hass, config_entry, HCBScheduleCoordinator(hass, config_entry)
+    )
     assert coordinator.name == DOMAIN
     assert coordinator.update_interval == timedelta(seconds=30)
 
@@ -68,7 +126,7 @@ async def test_async_config_entry_first_refresh(hass: HomeAssistant) -> None:
         CONF_PASSWORD: "test_password",
     }
     config_entry.runtime_data = MagicMock(client=MagicMock())  # Add a mock client
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
 
     # Mock the client methods (access through config_entry)
     config_entry.runtime_data.client.get_school_id = AsyncMock(return_value="school_id")
@@ -88,7 +146,7 @@ async def test_async_config_entry_first_refresh(hass: HomeAssistant) -> None:
     )
     config_entry.runtime_data.client.get_stop_info = AsyncMock(
         return_value=MagicMock(
-            vehicle_location=MagicMock(),
+            vehicle_location=MagicMock(log_time=LOG_TIME),
             student_stops=STUDENT_STOPS,
         )
     )
@@ -112,7 +170,7 @@ async def test_async_config_entry_first_refresh_skips_school_id_when_already_set
         CONF_PASSWORD: "test_password",
     }
     config_entry.runtime_data = MagicMock(client=MagicMock())
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
     coordinator._school_id = "existing_school_id"
 
     config_entry.runtime_data.client.get_school_id = AsyncMock(
@@ -127,7 +185,7 @@ async def test_async_config_entry_first_refresh_skips_school_id_when_already_set
     )
     config_entry.runtime_data.client.get_stop_info = AsyncMock(
         return_value=MagicMock(
-            vehicle_location=MagicMock(),
+            vehicle_location=MagicMock(log_time=LOG_TIME),
             student_stops=STUDENT_STOPS,
         )
     )
@@ -150,7 +208,7 @@ async def test_async_config_entry_first_refresh_handles_existing_parent_id(
         CONF_PASSWORD: "test_password",
     }
     config_entry.runtime_data = MagicMock(client=MagicMock())
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
     coordinator._school_id = "school_id"
     coordinator._parent_id = "parent_id"
     coordinator.data = {
@@ -170,7 +228,7 @@ async def test_async_config_entry_first_refresh_handles_existing_parent_id(
     )
     config_entry.runtime_data.client.get_stop_info = AsyncMock(
         return_value=MagicMock(
-            vehicle_location=MagicMock(),
+            vehicle_location=MagicMock(log_time=LOG_TIME),
             student_stops=STUDENT_STOPS,
         )
     )
@@ -194,7 +252,7 @@ async def test_async_config_entry_first_refresh_initializes_data_when_parent_id_
         CONF_PASSWORD: "test_password",
     }
     config_entry.runtime_data = MagicMock(client=MagicMock())
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
     coordinator._school_id = "school_id"
     coordinator._parent_id = "parent_id"
 
@@ -211,7 +269,7 @@ async def test_async_config_entry_first_refresh_initializes_data_when_parent_id_
     )
     config_entry.runtime_data.client.get_stop_info = AsyncMock(
         return_value=MagicMock(
-            vehicle_location=MagicMock(),
+            vehicle_location=MagicMock(log_time=LOG_TIME),
             student_stops=STUDENT_STOPS,
         )
     )
@@ -237,9 +295,11 @@ async def test_async_update_data(hass: HomeAssistant) -> None:
     # Add a mock client to the config_entry
     config_entry.runtime_data = MagicMock(client=MagicMock())
 
-    coordinator = HCBDataCoordinator(hass, config_entry)
-    coordinator._school_id = "school_id"
-    coordinator._parent_id = "parent_id"
+    coordinator = HCBDataCoordinator(
+        hass, config_entry, HCBScheduleCoordinator(hass, config_entry)
+    )
+    coordinator._schedule._school_id = "school_id"
+    coordinator._schedule._parent_id = "parent_id"
     coordinator.data = {
         "student1": StudentData(
             first_name="Alice",
@@ -256,7 +316,7 @@ async def test_async_update_data(hass: HomeAssistant) -> None:
     # Mock the client method (access through config_entry)
     config_entry.runtime_data.client.get_stop_info = AsyncMock(
         return_value=MagicMock(
-            vehicle_location=MagicMock(),
+            vehicle_location=MagicMock(log_time=LOG_TIME),
             student_stops=STUDENT_STOPS,
         )
     )
@@ -268,7 +328,7 @@ async def test_async_update_data(hass: HomeAssistant) -> None:
             month=10, day=31, year=2024, hour=7, minute=30
         ),
     ):
-        await coordinator._async_update_data()
+        coordinator.data = await coordinator._async_update_data()
 
     # Mock current time to be within MID range
     with patch(
@@ -277,7 +337,7 @@ async def test_async_update_data(hass: HomeAssistant) -> None:
             month=10, day=31, year=2024, hour=11, minute=30
         ),
     ):
-        await coordinator._async_update_data()
+        coordinator.data = await coordinator._async_update_data()
 
     # Mock current time to be within PM range
     with patch(
@@ -286,14 +346,16 @@ async def test_async_update_data(hass: HomeAssistant) -> None:
             month=10, day=31, year=2024, hour=15, minute=30
         ),
     ):
-        await coordinator._async_update_data()
+        coordinator.data = await coordinator._async_update_data()
     assert coordinator.data["student1"].log_time is not None
 
 
 def test_update_vehicle_location_with_data(hass: HomeAssistant) -> None:
     """Test _update_vehicle_location with valid vehicle_location data."""
     coordinator = HCBDataCoordinator(
-        hass=hass, config_entry=MagicMock(data={"update_interval": 20})
+        hass=hass,
+        config_entry=MagicMock(data={"update_interval": 20}),
+        schedule=MagicMock(),
     )
     student_data = StudentData(first_name="Alice", student_id="student1")
     dt_now = dt_util.now()
@@ -327,7 +389,9 @@ def test_update_vehicle_location_with_data(hass: HomeAssistant) -> None:
 def test_update_vehicle_location_no_data(hass: HomeAssistant) -> None:
     """Test _update_vehicle_location with empty vehicle_location data."""
     coordinator = HCBDataCoordinator(
-        hass=hass, config_entry=MagicMock(data={"update_interval": 20})
+        hass=hass,
+        config_entry=MagicMock(data={"update_interval": 20}),
+        schedule=MagicMock(),
     )
     student_data = StudentData(first_name="Alice", student_id="student1")
 
@@ -347,7 +411,7 @@ def test_update_vehicle_location_no_data(hass: HomeAssistant) -> None:
 
 def test_fix_time(hass: HomeAssistant) -> None:
     """Test the _fix_time method."""
-    coordinator = HCBDataCoordinator(
+    coordinator = HCBScheduleCoordinator(
         hass=hass, config_entry=MagicMock(data={"update_interval": 20})
     )
 
@@ -363,25 +427,9 @@ def test_fix_time(hass: HomeAssistant) -> None:
     assert coordinator._fix_time(input_time) == expected_time
 
 
-def test_get_time_of_day_id(hass: HomeAssistant) -> None:
-    """Test the _get_time_of_day_id method."""
-    coordinator = HCBDataCoordinator(
-        hass=hass, config_entry=MagicMock(data={"update_interval": 20})
-    )
-
-    # Test AM time
-    assert coordinator._get_time_of_day_id(time(7, 0)) == TimeOfDay.AM
-
-    # Test MID time
-    assert coordinator._get_time_of_day_id(time(12, 0)) == TimeOfDay.MID
-
-    # Test PM time
-    assert coordinator._get_time_of_day_id(time(15, 0)) == TimeOfDay.PM
-
-
 def test_update_stops_no_stops(hass: HomeAssistant) -> None:
     """Test _update_stops with no stops."""
-    coordinator = HCBDataCoordinator(
+    coordinator = HCBScheduleCoordinator(
         hass=hass, config_entry=MagicMock(data={"update_interval": 20})
     )
     student_data = StudentData(first_name="Alice", student_id="student1")
@@ -397,7 +445,7 @@ def test_update_stops_no_stops(hass: HomeAssistant) -> None:
 
 def test_update_stops_mismatched_time_of_day(hass: HomeAssistant) -> None:
     """Test _update_stops with mismatched time_of_day_id."""
-    coordinator = HCBDataCoordinator(
+    coordinator = HCBScheduleCoordinator(
         hass=hass, config_entry=MagicMock(data={"update_interval": 20})
     )
     student_data = StudentData(first_name="Alice", student_id="student1")
@@ -413,7 +461,7 @@ def test_update_stops_mismatched_time_of_day(hass: HomeAssistant) -> None:
 
 def test_update_stops_am(hass: HomeAssistant) -> None:
     """Test _update_stops with AM stops."""
-    coordinator = HCBDataCoordinator(
+    coordinator = HCBScheduleCoordinator(
         hass=hass, config_entry=MagicMock(data={"update_interval": 20})
     )
     student_data = StudentData(first_name="Alice", student_id="student1")
@@ -452,7 +500,7 @@ def test_update_stops_am(hass: HomeAssistant) -> None:
 
 def test_update_stops_mid(hass: HomeAssistant) -> None:
     """Test _update_stops with MID stops."""
-    coordinator = HCBDataCoordinator(
+    coordinator = HCBScheduleCoordinator(
         hass=hass, config_entry=MagicMock(data={"update_interval": 20})
     )
     student_data = StudentData(first_name="Alice", student_id="student1")
@@ -491,7 +539,7 @@ def test_update_stops_mid(hass: HomeAssistant) -> None:
 
 def test_update_stops_pm(hass: HomeAssistant) -> None:
     """Test _update_stops with PM stops."""
-    coordinator = HCBDataCoordinator(
+    coordinator = HCBScheduleCoordinator(
         hass=hass, config_entry=MagicMock(data={"update_interval": 20})
     )
     student_data = StudentData(first_name="Alice", student_id="student1")
@@ -530,7 +578,7 @@ def test_update_stops_pm(hass: HomeAssistant) -> None:
 
 def test_update_stops_unknown_time_of_day(hass: HomeAssistant) -> None:
     """Test _update_stops when time_of_day_id is not AM, MID, or PM."""
-    coordinator = HCBDataCoordinator(
+    coordinator = HCBScheduleCoordinator(
         hass=hass, config_entry=MagicMock(data={"update_interval": 20})
     )
     student_data = StudentData(first_name="Alice", student_id="student1")
@@ -566,47 +614,14 @@ def test_update_stops_unknown_time_of_day(hass: HomeAssistant) -> None:
     assert student_data.pm_school_arrival_time is None
 
 
-def test_is_am(hass: HomeAssistant) -> None:
-    """Test the _is_am method."""
-    coordinator = HCBDataCoordinator(
-        hass=hass, config_entry=MagicMock(data={"update_interval": 20})
-    )
-    assert coordinator._is_am(time(7, 0)) is True
-    assert coordinator._is_am(time(10, 0)) is False
-    assert coordinator._is_am(time(12, 0)) is False
-
-
-def test_is_mid(hass: HomeAssistant) -> None:
-    """Test the _is_mid method."""
-    coordinator = HCBDataCoordinator(
-        hass=hass, config_entry=MagicMock(data={"update_interval": 20})
-    )
-    assert coordinator._is_mid(time(7, 0)) is False
-    assert coordinator._is_mid(time(10, 0)) is True
-    assert coordinator._is_mid(time(12, 0)) is True
-    assert coordinator._is_mid(time(13, 30)) is False
-    assert coordinator._is_mid(time(15, 0)) is False
-
-
-def test_is_pm(hass: HomeAssistant) -> None:
-    """Test the _is_pm method."""
-    coordinator = HCBDataCoordinator(
-        hass=hass, config_entry=MagicMock(data={"update_interval": 20})
-    )
-    assert coordinator._is_pm(time(7, 0)) is False
-    assert coordinator._is_pm(time(10, 0)) is False
-    assert coordinator._is_pm(time(12, 0)) is False
-    assert coordinator._is_pm(time(13, 30)) is True
-    assert coordinator._is_pm(time(15, 0)) is True
-    assert coordinator._is_pm(time(23, 59, 59)) is True
-
-
-def test_student_is_moving_weekend(hass: HomeAssistant) -> None:
-    """Test the _student_is_moving method on a weekend."""
+def test_student_rides_weekend(hass: HomeAssistant) -> None:
+    """Test no student rides on a weekend."""
     config_entry = MagicMock()
     config_entry.data = {CONF_UPDATE_INTERVAL: 30}
     config_entry.runtime_data = MagicMock(client=MagicMock())
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBDataCoordinator(
+        hass, config_entry, HCBScheduleCoordinator(hass, config_entry)
+    )
     student_data = StudentData(
         first_name="Alice",
         student_id="student1",
@@ -624,15 +639,17 @@ def test_student_is_moving_weekend(hass: HomeAssistant) -> None:
     mock_datetime = dt_util.now() + timedelta(days=days_to_shift)
 
     with patch("homeassistant.util.dt.now", return_value=mock_datetime):  # Saturday
-        assert not coordinator._student_is_moving(student_data)
+        assert coordinator._riding(dt_util.now(), {"student1": student_data}) == {}
 
 
-def test_student_is_moving_am(hass: HomeAssistant) -> None:
-    """Test the _student_is_moving method within AM time range."""
+def test_student_rides_am(hass: HomeAssistant) -> None:
+    """Test a student rides the AM bus inside the AM window."""
     config_entry = MagicMock()
     config_entry.data = {CONF_UPDATE_INTERVAL: 30}
     config_entry.runtime_data = MagicMock(client=MagicMock())
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBDataCoordinator(
+        hass, config_entry, HCBScheduleCoordinator(hass, config_entry)
+    )
     student_data = StudentData(
         first_name="Alice",
         student_id="student1",
@@ -646,15 +663,19 @@ def test_student_is_moving_am(hass: HomeAssistant) -> None:
             month=10, day=31, year=2024, hour=7, minute=30
         ),
     ):
-        assert coordinator._student_is_moving(student_data)
+        assert coordinator._riding(dt_util.now(), {"student1": student_data}) == {
+            "student1": TimeOfDay.AM
+        }
 
 
-def test_student_is_moving_mid(hass: HomeAssistant) -> None:
-    """Test the _student_is_moving method within MID time range."""
+def test_student_rides_mid(hass: HomeAssistant) -> None:
+    """Test a student rides the MID bus inside the MID window."""
     config_entry = MagicMock()
     config_entry.data = {CONF_UPDATE_INTERVAL: 30}
     config_entry.runtime_data = MagicMock(client=MagicMock())
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBDataCoordinator(
+        hass, config_entry, HCBScheduleCoordinator(hass, config_entry)
+    )
     student_data = StudentData(
         first_name="Alice",
         student_id="student1",
@@ -669,15 +690,19 @@ def test_student_is_moving_mid(hass: HomeAssistant) -> None:
             month=10, day=31, year=2024, hour=11, minute=30
         ),
     ):
-        assert coordinator._student_is_moving(student_data)
+        assert coordinator._riding(dt_util.now(), {"student1": student_data}) == {
+            "student1": TimeOfDay.MID
+        }
 
 
-def test_student_is_moving_mid_no_mid_stops(hass: HomeAssistant) -> None:
-    """Test the _student_is_moving method within MID time range."""
+def test_student_rides_mid_no_mid_stops(hass: HomeAssistant) -> None:
+    """Test a student without MID stops does not ride at midday."""
     config_entry = MagicMock()
     config_entry.data = {CONF_UPDATE_INTERVAL: 30}
     config_entry.runtime_data = MagicMock(client=MagicMock())
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBDataCoordinator(
+        hass, config_entry, HCBScheduleCoordinator(hass, config_entry)
+    )
     student_data = StudentData(
         first_name="Alice",
         student_id="student1",
@@ -692,15 +717,17 @@ def test_student_is_moving_mid_no_mid_stops(hass: HomeAssistant) -> None:
             month=10, day=31, year=2024, hour=11, minute=30
         ),
     ):
-        assert not coordinator._student_is_moving(student_data)
+        assert coordinator._riding(dt_util.now(), {"student1": student_data}) == {}
 
 
-def test_student_is_moving_pm(hass: HomeAssistant) -> None:
-    """Test the _student_is_moving method within PM time range."""
+def test_student_rides_pm(hass: HomeAssistant) -> None:
+    """Test a student rides the PM bus inside the PM window."""
     config_entry = MagicMock()
     config_entry.data = {CONF_UPDATE_INTERVAL: 30}
     config_entry.runtime_data = MagicMock(client=MagicMock())
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBDataCoordinator(
+        hass, config_entry, HCBScheduleCoordinator(hass, config_entry)
+    )
     student_data = StudentData(
         first_name="Alice",
         student_id="student1",
@@ -714,15 +741,19 @@ def test_student_is_moving_pm(hass: HomeAssistant) -> None:
             month=10, day=31, year=2024, hour=15, minute=30
         ),
     ):
-        assert coordinator._student_is_moving(student_data)
+        assert coordinator._riding(dt_util.now(), {"student1": student_data}) == {
+            "student1": TimeOfDay.PM
+        }
 
 
-def test_student_is_not_moving_outside_time_ranges(hass: HomeAssistant) -> None:
-    """Test the _student_is_moving method outside of all time ranges."""
+def test_student_rides_outside_time_ranges(hass: HomeAssistant) -> None:
+    """Test no student rides outside of all windows."""
     config_entry = MagicMock()
     config_entry.data = {CONF_UPDATE_INTERVAL: 30}
     config_entry.runtime_data = MagicMock(client=MagicMock())
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBDataCoordinator(
+        hass, config_entry, HCBScheduleCoordinator(hass, config_entry)
+    )
     student_data = StudentData(
         first_name="Alice",
         student_id="student1",
@@ -739,7 +770,7 @@ def test_student_is_not_moving_outside_time_ranges(hass: HomeAssistant) -> None:
         "homeassistant.util.dt.now",
         return_value=dt_util.now().replace(hour=9, minute=0),
     ):
-        assert not coordinator._student_is_moving(student_data)
+        assert coordinator._riding(dt_util.now(), {"student1": student_data}) == {}
 
 
 async def test_async_config_entry_first_refresh_initializes_school_and_parent_id(
@@ -753,7 +784,7 @@ async def test_async_config_entry_first_refresh_initializes_school_and_parent_id
         CONF_PASSWORD: "test_password",
     }
     config_entry.runtime_data = MagicMock(client=MagicMock())  # Add a mock client
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
 
     # Mock the client methods (access through config_entry)
     config_entry.runtime_data.client.get_school_id = AsyncMock(return_value="school_id")
@@ -773,7 +804,7 @@ async def test_async_config_entry_first_refresh_initializes_school_and_parent_id
     )
     config_entry.runtime_data.client.get_stop_info = AsyncMock(
         return_value=MagicMock(
-            vehicle_location=MagicMock(),
+            vehicle_location=MagicMock(log_time=LOG_TIME),
             student_stops=STUDENT_STOPS,
         )
     )
@@ -786,35 +817,31 @@ async def test_async_config_entry_first_refresh_initializes_school_and_parent_id
     assert len(coordinator.data) == expected_student_count
 
 
-async def test_async_config_entry_first_refresh_updates_vehicle_location(
+async def test_location_first_refresh_updates_vehicle_location(
     hass: HomeAssistant,
 ) -> None:
-    """Test that async_config_entry_first_refresh updates vehicle location."""
+    """Test the location first refresh copies the schedule and polls."""
     config_entry = MagicMock()
-    config_entry.data = {
-        CONF_SCHOOL_CODE: "test_school",
-        CONF_USERNAME: "test_user",
-        CONF_PASSWORD: "test_password",
+    config_entry.data = {CONF_UPDATE_INTERVAL: 30}
+    config_entry.runtime_data = MagicMock(client=MagicMock())
+    schedule = HCBScheduleCoordinator(hass, config_entry)
+    schedule._school_id = "school_id"
+    schedule._parent_id = "parent_id"
+    schedule.data = {
+        "student1": StudentData(
+            first_name="Alice",
+            student_id="student1",
+            am_start_time=time(7, 0),
+            am_end_time=time(8, 0),
+        ),
+        "student2": StudentData(
+            first_name="Bob",
+            student_id="student2",
+            am_start_time=time(9, 0),
+            am_end_time=time(9, 30),
+        ),
     }
-    config_entry.runtime_data = MagicMock(client=MagicMock())  # Add a mock client
-    coordinator = HCBDataCoordinator(hass, config_entry)
-
-    # Mock the client methods (access through config_entry)
-    config_entry.runtime_data.client.get_school_id = AsyncMock(return_value="school_id")
-    config_entry.runtime_data.client.get_parent_info = AsyncMock(
-        return_value=MagicMock(
-            account_id="parent_id",
-            students=[
-                MagicMock(first_name="Alice", student_id="student1"),
-                MagicMock(first_name="Bob", student_id="student2"),
-            ],
-            times=[
-                MagicMock(id=TimeOfDay.AM),
-                MagicMock(id=TimeOfDay.MID),
-                MagicMock(id=TimeOfDay.PM),
-            ],
-        )
-    )
+    coordinator = HCBDataCoordinator(hass, config_entry, schedule)
     vehicle_location = MagicMock(
         address="123 Main St",
         display_on_map=True,
@@ -834,8 +861,22 @@ async def test_async_config_entry_first_refresh_updates_vehicle_location(
         )
     )
 
-    await coordinator.async_config_entry_first_refresh()
-
+    with patch(
+        "homeassistant.util.dt.now",
+        return_value=dt_util.now().replace(
+            month=10, day=31, year=2024, hour=7, minute=30
+        ),
+    ):
+        await coordinator.async_config_entry_first_refresh()
+
+    # only the student whose bus is running is polled
+    config_entry.runtime_data.client.get_stop_info.assert_awaited_once_with(
+        "school_id",
+        "parent_id",
+        "student1",
+        TimeOfDay.AM,
+        metrics=config_entry.runtime_data.requests,
+    )
     student_data = coordinator.data["student1"]
     assert student_data.address == "123 Main St"
     assert student_data.bus_name == vehicle_location.name
@@ -848,6 +889,37 @@ async def test_async_config_entry_first_refresh_updates_vehicle_location(
     assert student_data.log_time == vehicle_location.log_time
     assert student_data.message_code == 1
     assert student_data.speed == SPEED
+    # the stops are left to the schedule coordinator
+    assert student_data.am_stop_arrival_time is None
+    assert coordinator.data["student2"].address is None
+    # the schedule data is not changed by the location updates
+    assert schedule.data["student1"].address is None
+    # the schedule listener is removed when the entry is unloaded
+    assert schedule._listeners
+    config_entry.async_on_unload.call_args.args[0]()
+    assert not schedule._listeners
+
+
+def test_location_merges_schedule_updates(hass: HomeAssistant) -> None:
+    """Test a schedule update is merged into the location data."""
+    coordinator = _scheduled_coordinator(hass)
+    schedule = coordinator._schedule
+    schedule.data = {
+        "student1": replace(
+            coordinator.data["student1"], am_stop_arrival_time=time(7, 20)
+        )
+    }
+    coordinator.data["student1"].latitude = LATITUDE
+    coordinator.async_add_listener(lambda: None)
+
+    with patch.object(coordinator, "_schedule_refresh") as schedule_refresh:
+        coordinator._handle_schedule_update()
+
+    student_data = coordinator.data["student1"]
+    assert student_data.am_stop_arrival_time == time(7, 20)
+    assert student_data.latitude == LATITUDE
+    # the next poll is scheduled again for the new schedule.
+    schedule_refresh.assert_called_once()
 
 
 async def test_async_config_entry_first_refresh_handles_no_mid_stops(
@@ -861,7 +933,7 @@ async def test_async_config_entry_first_refresh_handles_no_mid_stops(
         CONF_PASSWORD: "test_password",
     }
     config_entry.runtime_data = MagicMock(client=MagicMock())  # Add a mock client
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
 
     # Mock the client methods (access through config_entry)
     config_entry.runtime_data.client.get_school_id = AsyncMock(return_value="school_id")
@@ -882,27 +954,27 @@ async def test_async_config_entry_first_refresh_handles_no_mid_stops(
     config_entry.runtime_data.client.get_stop_info = AsyncMock(
         side_effect=[
             MagicMock(
-                vehicle_location=MagicMock(),
+                vehicle_location=MagicMock(log_time=LOG_TIME),
                 student_stops=STUDENT_STOPS,
             ),
             MagicMock(
-                vehicle_location=MagicMock(),
+                vehicle_location=MagicMock(log_time=LOG_TIME),
                 student_stops=[],
             ),
             MagicMock(
-                vehicle_location=MagicMock(),
+                vehicle_location=MagicMock(log_time=LOG_TIME),
                 student_stops=STUDENT_STOPS,
             ),
             MagicMock(
-                vehicle_location=MagicMock(),
+                vehicle_location=MagicMock(log_time=LOG_TIME),
                 student_stops=STUDENT_STOPS,
             ),
             MagicMock(
-                vehicle_location=MagicMock(),
+                vehicle_location=MagicMock(log_time=LOG_TIME),
                 student_stops=[],
             ),
             MagicMock(
-                vehicle_location=MagicMock(),
+                vehicle_location=MagicMock(log_time=LOG_TIME),
                 student_stops=STUDENT_STOPS,
             ),
         ]
@@ -925,7 +997,7 @@ async def test_async_config_entry_first_refresh_handles_no_stops_returned(
         CONF_PASSWORD: "test_password",
     }
     config_entry.runtime_data = MagicMock(client=MagicMock())  # Add a mock client
-    coordinator = HCBDataCoordinator(hass, config_entry)
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
 
     # Mock the client methods (access through config_entry)
     config_entry.runtime_data.client.get_school_id = AsyncMock(return_value="school_id")
@@ -944,12 +1016,10 @@ async def test_async_config_entry_first_refresh_handles_no_stops_returned(
         )
     )
     config_entry.runtime_data.client.get_stop_info = AsyncMock(
-        side_effect=[
-            MagicMock(
-                vehicle_location=None,
-                student_stops=[],
-            ),
-        ]
+        return_value=MagicMock(
+            vehicle_location=None,
+            student_stops=[],
+        )
     )
     await coordinator.async_config_entry_first_refresh()
 
@@ -966,9 +1036,11 @@ async def test_async_update_data_student_not_moving(hass: HomeAssistant) -> None
     # Add a mock client to the config_entry
     config_entry.runtime_data = MagicMock(client=MagicMock())
 
-    coordinator = HCBDataCoordinator(hass, config_entry)
-    coordinator._school_id = "school_id"
-    coordinator._parent_id = "parent_id"
+    coordinator = HCBDataCoordinator(
+        hass, config_entry, HCBScheduleCoordinator(hass, config_entry)
+    )
+    coordinator._schedule._school_id = "school_id"
+    coordinator._schedule._parent_id = "parent_id"
     coordinator.data = {
         "student1": StudentData(
             first_name="Alice",
@@ -1009,9 +1081,11 @@ async def test_async_update_data_student_moving(hass: HomeAssistant) -> None:
     # Add a mock client to the config_entry
     config_entry.runtime_data = MagicMock(client=MagicMock())
 
-    coordinator = HCBDataCoordinator(hass, config_entry)
-    coordinator._school_id = "school_id"
-    coordinator._parent_id = "parent_id"
+    coordinator = HCBDataCoordinator(
+        hass, config_entry, HCBScheduleCoordinator(hass, config_entry)
+    )
+    coordinator._schedule._school_id = "school_id"
+    coordinator._schedule._parent_id = "parent_id"
     coordinator.data = {
         "student1": StudentData(
             first_name="Alice",
@@ -1029,7 +1103,7 @@ async def test_async_update_data_student_moving(hass: HomeAssistant) -> None:
     # Mock the client method (access through config_entry)
     config_entry.runtime_data.client.get_stop_info = AsyncMock(
         return_value=MagicMock(
-            vehicle_location=MagicMock(),
+            vehicle_location=MagicMock(log_time=LOG_TIME),
             student_stops=STUDENT_STOPS,
         )
     )
@@ -1044,5 +1118,1587 @@ async def test_async_update_data_student_moving(hass: HomeAssistant) -> None:
         data = await coordinator._async_update_data()
 
     assert config_entry.runtime_data.client.get_stop_info.call_count == 1
-    assert data == coordinator.data
-    assert coordinator.data["student1"].log_time is not None
+    assert data != coordinator.data
+    assert data["student1"].log_time is not None
+    assert coordinator.data["student1"].log_time is None
+    assert coordinator.changes["student1"] >= {"latitude", "log_time", "speed"}
+
+
+class LatencyClient:
+    """Fake HCB client that answers stop requests after an injected delay."""
+
+    def __init__(self, latency: float, slow_latency: float) -> None:
+        """Initialize the client, the AM request for student1 is the slow one."""
+        self.latency = latency
+        self.slow_latency = slow_latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get_stop_info(
+        self,
+        _school_id: str,
+        _parent_id: str,
+        student_id: str,
+        time_of_day_id: str,
+        **_: RequestMetrics,
+    ) -> MagicMock:
+        """Return the stops for the time of day after the configured latency."""
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        slow = student_id == "student1" and time_of_day_id == TimeOfDay.AM
+        await asyncio.sleep(self.slow_latency if slow else self.latency)
+        self.in_flight -= 1
+        hour = {TimeOfDay.AM: 7, TimeOfDay.MID: 11, TimeOfDay.PM: 15}[time_of_day_id]
+        minute = int(student_id.removeprefix("student"))
+        return MagicMock(
+            vehicle_location=None,
+            student_stops=[
+                MagicMock(
+                    time_of_day_id=time_of_day_id,
+                    start_time=time(hour, minute),
+                    stop_type=stop_type,
+                    arrival_time=time(hour, minute + offset),
+                    latitude=LATITUDE,
+                    longitude=LONGITUDE,
+                )
+                for stop_type, offset in (("School", 20), ("Stop", 5))
+            ],
+        )
+
+
+async def _timed_first_refresh(
+    hass: HomeAssistant, client: LatencyClient, student_count: int, limit: int
+) -> tuple[float, HCBScheduleCoordinator]:
+    """Run the first refresh against the client and return the elapsed time."""
+    config_entry = MagicMock()
+    config_entry.data = {
+        CONF_SCHOOL_CODE: "test_school",
+        CONF_USERNAME: "test_user",
+        CONF_PASSWORD: "test_password",
+        CONF_MAX_CONCURRENT_REQUESTS: limit,
+    }
+    config_entry.runtime_data = MagicMock(client=client)
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+    coordinator._school_id = "school_id"
+    client.get_parent_info = AsyncMock(  # type: ignore this is a fake client
+        return_value=MagicMock(
+            account_id="parent_id",
+            students=[
+                MagicMock(first_name=f"Kid {i}", student_id=f"student{i}")
+                for i in range(1, student_count + 1)
+            ],
+            times=[
+                MagicMock(id=TimeOfDay.AM),
+                MagicMock(id=TimeOfDay.MID),
+                MagicMock(id=TimeOfDay.PM),
+            ],
+        )
+    )
+    start = perf_counter()
+    await coordinator.async_config_entry_first_refresh()
+    return perf_counter() - start, coordinator
+
+
+async def test_gather_with_limit_keeps_order_and_limit() -> None:
+    """Test _gather_with_limit returns results in order and caps concurrency."""
+    running = 0
+    peak = 0
+
+    async def work(value: int) -> int:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01 * (5 - value))
+        running -= 1
+        return value
+
+    results = await _gather_with_limit(2, *(work(value) for value in range(5)))
+    assert results == [0, 1, 2, 3, 4]
+    assert peak == 2  # noqa: PLR2004
+
+
+async def test_first_refresh_time_follows_slowest_call(hass: HomeAssistant) -> None:
+    """Benchmark the first refresh against a fake client with injected latency."""
+    latency = 0.05
+    slow_latency = 0.25
+    student_count = 4
+    limit = student_count * TIME_OF_DAY_COUNT
+
+    client = LatencyClient(latency, slow_latency)
+    one_student, _ = await _timed_first_refresh(hass, client, 1, limit)
+    client = LatencyClient(latency, slow_latency)
+    four_students, concurrent = await _timed_first_refresh(
+        hass, client, student_count, limit
+    )
+    assert client.max_in_flight == limit
+
+    # Setup time tracks the slowest call, not the number of calls.
+    sequential_time = slow_latency + latency * (limit - 1)
+    assert slow_latency <= four_students < sequential_time
+    assert four_students < one_student + latency
+
+    # The concurrency cap is honored.
+    client = LatencyClient(latency, slow_latency)
+    _, sequential = await _timed_first_refresh(hass, client, student_count, 1)
+    assert client.max_in_flight == 1
+
+    # Responses are applied in a fixed order, so the data matches a sequential run.
+    assert concurrent.data == sequential.data
+
+
+def _scheduled_coordinator(hass: HomeAssistant) -> HCBDataCoordinator:
+    """Create a coordinator with one student that rides AM, MID and PM."""
+    config_entry = MagicMock()
+    config_entry.data = {CONF_UPDATE_INTERVAL: 30}
+    config_entry.runtime_data = MagicMock(client=MagicMock())
+    coordinator = HCBDataCoordinator(
+        hass, config_entry, HCBScheduleCoordinator(hass, config_entry)
+    )
+    coordinator._schedule._school_id = "school_id"
+    coordinator._schedule._parent_id = "parent_id"
+    coordinator.data = {
+        "student1": StudentData(
+            first_name="Alice",
+            student_id="student1",
+            am_start_time=time(7, 0),
+            am_end_time=time(8, 0),
+            has_mid_stops=True,
+            mid_start_time=time(11, 0),
+            mid_end_time=time(12, 0),
+            pm_start_time=time(15, 0),
+            pm_end_time=time(16, 0),
+        )
+    }
+    return coordinator
+
+
+def test_next_window_start(hass: HomeAssistant) -> None:
+    """Test the next window start skips finished windows and weekends."""
+    coordinator = _scheduled_coordinator(hass)
+    thursday = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=9, minute=0, second=0, microsecond=0
+    )
+
+    assert coordinator._next_window_start(
+        thursday, coordinator.data
+    ) == thursday.replace(hour=11)
+    assert coordinator._next_window_start(
+        thursday.replace(hour=16, minute=30), coordinator.data
+    ) == thursday.replace(day=1, month=11, hour=7)
+    friday_evening = thursday.replace(day=1, month=11, hour=16, minute=30)
+    assert coordinator._next_window_start(
+        friday_evening, coordinator.data
+    ) == thursday.replace(day=4, month=11, hour=7)
+    # without school for the whole lookahead, the first window after it.
+    with patch.object(coordinator, "_is_school_day", return_value=False):
+        assert coordinator._next_window_start(
+            thursday, coordinator.data
+        ) == thursday.replace(day=8, month=11, hour=7)
+
+    # the schedule changed, so the timeline is built again.
+    coordinator.data = {}
+    coordinator._timelines = {}
+    assert coordinator._next_window_start(thursday, coordinator.data) is None
+
+
+async def test_async_update_data_sleeps_outside_windows(hass: HomeAssistant) -> None:
+    """Test the coordinator stops ticking outside windows and wakes up later."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator.config_entry.runtime_data.client.get_stop_info = AsyncMock(
+        return_value=MagicMock(
+            vehicle_location=MagicMock(log_time=LOG_TIME),
+            student_stops=STUDENT_STOPS,
+        )
+    )
+    nine_am = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=9, minute=0, second=0, microsecond=0
+    )
+
+    with patch("homeassistant.util.dt.now", return_value=nine_am):
+        await coordinator._async_update_data()
+
+    assert coordinator.changes == {}
+    assert coordinator.update_interval == timedelta(hours=2)
+    assert coordinator.config_entry.runtime_data.client.get_stop_info.call_count == 0
+
+    # Waking up inside the MID window polls again at the configured interval.
+    with patch(
+        "homeassistant.util.dt.now",
+        return_value=nine_am.replace(hour=11, minute=0),
+    ):
+        await coordinator._async_update_data()
+
+    assert "student1" in coordinator.changes
+    assert coordinator.update_interval == timedelta(seconds=30)
+    assert coordinator.config_entry.runtime_data.client.get_stop_info.call_count == 1
+
+
+async def test_predicted_arrival_sensor_does_not_poll(
+    hass: HomeAssistant, freezer: FrozenDateTimeFactory
+) -> None:
+    """Test the predicted arrival sensor does not refresh the locations."""
+    coordinator = _scheduled_coordinator(hass)
+    client = coordinator.config_entry.runtime_data.client
+    client.get_stop_info = AsyncMock(
+        return_value=MagicMock(
+            vehicle_location=MagicMock(log_time=LOG_TIME),
+            student_stops=STUDENT_STOPS,
+        )
+    )
+    freezer.move_to(
+        datetime(2024, 10, 31, 9, 0, tzinfo=dt_util.get_default_time_zone())
+    )
+    sensor = HCBPredictedArrivalSensor(
+        coordinator, coordinator.data["student1"], PREDICTED_ARRIVAL_DESCRIPTIONS[0]
+    )
+    await MockEntityPlatform(hass).async_add_entities([sensor])
+    prediction = ArrivalPrediction(
+        arrival=time(7, 20),
+        low=time(7, 16),
+        high=time(7, 25),
+        mean=time(7, 20),
+        std_dev=120,
+        samples=3,
+    )
+
+    with (
+        patch.object(
+            coordinator,
+            "async_request_refresh",
+            wraps=coordinator.async_request_refresh,
+        ) as request_refresh,
+        patch.object(coordinator.arrivals, "predict", return_value=None),
+    ):
+        for _ in range(10):
+            freezer.tick(timedelta(minutes=1))
+            async_fire_time_changed(hass)
+            await hass.async_block_till_done()
+        assert hass.states.get(sensor.entity_id).state == "unknown"
+
+        # a new prediction is written at the next check.
+        coordinator.arrivals.predict.return_value = prediction
+        freezer.tick(timedelta(minutes=1))
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done()
+
+    # the quiet hours between the windows make no calls.
+    request_refresh.assert_not_called()
+    assert client.get_stop_info.call_count == 0
+    assert hass.states.get(sensor.entity_id).state == "07:20:00"
+
+
+def test_schedule_next_poll_without_students(hass: HomeAssistant) -> None:
+    """Test the coordinator stops ticking when there are no students."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator.data = {}
+
+    coordinator._schedule_next_poll(coordinator.data)
+
+    assert coordinator.update_interval is None
+
+
+async def test_state_writes_over_route_with_moving_bus(hass: HomeAssistant) -> None:
+    """Count state writes over a route where only speed and position change."""
+    coordinator = _scheduled_coordinator(hass)
+    student = coordinator.data["student1"]
+    entities = [
+        *(
+            HCBSensor(coordinator, description, student)
+            for description in SENSOR_DESCRIPTIONS
+            if not description.from_schedule
+        ),
+        *(
+            HCBBinarySensor(coordinator, description, student)
+            for description in BINARY_SENSOR_DESCRIPTIONS
+        ),
+        *(HCBTracker(coordinator, student, tracker) for tracker in DEVICE_TRACKERS),
+    ]
+    log_time = datetime(2024, 10, 31, 7, 15)  # noqa: DTZ001 HCB times are naive
+    route = [
+        (LATITUDE + step * 0.001, LONGITUDE - step * 0.001, SPEED + step % 3)
+        for step in range(10)
+    ]
+    # The bus stops for two polls, nothing changes while it waits.
+    route[5:7] = [route[4], route[4]]
+
+    def vehicle_location(latitude: float, longitude: float, speed: int) -> MagicMock:
+        location = MagicMock(
+            address="123 Main St",
+            display_on_map=True,
+            heading="N",
+            ignition=True,
+            latent=False,
+            latitude=latitude,
+            longitude=longitude,
+            log_time=log_time,
+            message_code=1,
+            speed=speed,
+        )
+        location.configure_mock(name="Bus 123")
+        return location
+
+    coordinator.config_entry.runtime_data.client.get_stop_info = AsyncMock(
+        side_effect=[
+            MagicMock(
+                vehicle_location=vehicle_location(*point),
+                student_stops=STUDENT_STOPS,
+            )
+            for point in route
+        ]
+    )
+    writes: dict[str, int] = {}
+    unsubscribes = []
+    for entity in entities:
+        entity.async_write_ha_state = MagicMock(  # type: ignore count the writes
+            side_effect=lambda key=entity.entity_description.key: writes.update(
+                {key: writes.get(key, 0) + 1}
+            )
+        )
+        unsubscribes.append(
+            coordinator.async_add_listener(entity._handle_coordinator_update)
+        )
+
+    with patch(
+        "homeassistant.util.dt.now",
+        return_value=dt_util.now().replace(
+            year=2024, month=10, day=31, hour=7, minute=30
+        ),
+    ):
+        await coordinator.async_refresh()
+        first_poll_writes = dict(writes)
+        writes.clear()
+        for _ in route[1:]:
+            await coordinator.async_refresh()
+
+    for unsubscribe in unsubscribes:
+        unsubscribe()
+
+    # The first poll fills in every location field.
+    assert set(first_poll_writes) >= {"speed", "location", "ignition", "bus_name"}
+    # Afterwards only the speed sensor and the tracker follow the bus, and
+    # nothing is written while the bus waits.
+    assert set(writes) == {"speed", "location"}
+    assert writes["location"] == 7  # noqa: PLR2004 nine polls, two while waiting
+    assert writes["speed"] == 6  # noqa: PLR2004 the speed repeats once as well
+
+
+def test_get_stop_location(hass: HomeAssistant) -> None:
+    """Test the stop coordinates, HCB sends zeros when they are unknown."""
+    coordinator = HCBScheduleCoordinator(hass, MagicMock(data={}))
+    stops = [
+        MagicMock(stop_type="School", latitude=1.0, longitude=2.0),
+        MagicMock(stop_type="Stop", latitude=LATITUDE, longitude=LONGITUDE),
+    ]
+    assert coordinator._get_stop_location(stops, "Stop") == (LATITUDE, LONGITUDE)  # type: ignore This is magic mock
+    stops[1].latitude = stops[1].longitude = 0
+    assert coordinator._get_stop_location(stops, "Stop") == (None, None)  # type: ignore This is magic mock
+    assert coordinator._get_stop_location(stops, "Depot") == (None, None)  # type: ignore This is magic mock
+
+
+def test_adaptive_update_interval(hass: HomeAssistant) -> None:
+    """Test the adaptive interval follows the time until the bus arrives."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator._polling_mode = POLLING_MODE_ADAPTIVE
+    coordinator._min_update_interval = timedelta(seconds=10)
+    coordinator._max_update_interval = timedelta(seconds=120)
+    student = coordinator.data["student1"]
+    student.am_stop_arrival_time = time(7, 45)
+    seven = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=0, second=0, microsecond=0
+    )
+
+    def update_interval(dt_now: datetime) -> timedelta | None:
+        return coordinator._window_update_interval(
+            dt_now, coordinator.data, coordinator._riding(dt_now, coordinator.data)
+        )
+
+    with patch("homeassistant.util.dt.now", return_value=seven):
+        # 45 minutes out the maximum is used.
+        assert update_interval(seven) == timedelta(seconds=120)
+        # 10 minutes out the interval is a tenth of that.
+        assert update_interval(seven.replace(minute=35)) == timedelta(seconds=60)
+        # Close to the stop the minimum is used.
+        assert update_interval(seven.replace(minute=44)) == timedelta(seconds=10)
+
+    # A bus close to the stop is polled faster than the schedule suggests,
+    # following the same estimate as the minutes to stop.
+    student.am_stop_latitude = LATITUDE + 0.01
+    student.am_stop_longitude = LONGITUDE
+    student.latitude = LATITUDE
+    student.longitude = LONGITUDE
+    student.speed = SPEED
+    with patch("homeassistant.util.dt.now", return_value=seven):
+        interval = update_interval(seven)
+        eta = coordinator._estimate_arrival(student, TimeOfDay.AM, seven)
+    assert eta is not None
+    assert interval < timedelta(seconds=120)
+    assert interval == timedelta(seconds=eta.seconds / ADAPTIVE_POLLS_BEFORE_ARRIVAL)
+
+    # A bus heading away once the stop time passed is polled at the maximum.
+    student.heading = "S"
+    with patch("homeassistant.util.dt.now", return_value=seven.replace(minute=50)):
+        assert update_interval(seven.replace(minute=50)) == timedelta(seconds=120)
+    student.heading = None
+
+    # Without any estimate the configured interval is used.
+    student.am_stop_arrival_time = None
+    student.latitude = None
+    with patch("homeassistant.util.dt.now", return_value=seven):
+        assert update_interval(seven) == timedelta(seconds=30)
+
+    # In fixed mode the configured interval is always used.
+    coordinator._polling_mode = POLLING_MODE_FIXED
+    assert update_interval(seven) == timedelta(seconds=30)
+
+
+def test_estimate_arrival_uses_time_of_day(hass: HomeAssistant) -> None:
+    """Test the arrival time of the time of day of the bus is used."""
+    coordinator = _scheduled_coordinator(hass)
+    student = coordinator.data["student1"]
+    student.am_stop_arrival_time = time(7, 45)
+    student.mid_stop_arrival_time = time(11, 45)
+    student.pm_stop_arrival_time = time(15, 45)
+    dt_now = dt_util.now().replace(
+        year=2024, month=10, day=31, minute=40, second=0, microsecond=0
+    )
+    five_minutes = timedelta(minutes=5).total_seconds()
+    for hour, time_of_day_id in (
+        (7, TimeOfDay.AM),
+        (11, TimeOfDay.MID),
+        (15, TimeOfDay.PM),
+    ):
+        eta = coordinator._estimate_arrival(
+            student, time_of_day_id, dt_now.replace(hour=hour)
+        )
+        assert eta is not None
+        assert eta.seconds == five_minutes
+
+
+@pytest.mark.parametrize(
+    ("hour", "minute", "time_of_day_id"),
+    [
+        # a late start, the AM run is still going after 10:00.
+        (10, 30, TimeOfDay.AM),
+        # an early dismissal, the PM run starts before 13:30.
+        (13, 15, TimeOfDay.PM),
+    ],
+)
+async def test_async_update_data_follows_the_windows(
+    hass: HomeAssistant, hour: int, minute: int, time_of_day_id: TimeOfDay
+) -> None:
+    """Test the time of day of the bus comes from the windows of the student."""
+    coordinator = _scheduled_coordinator(hass)
+    student = coordinator.data["student1"]
+    student.am_start_time = time(9, 45)
+    student.am_end_time = time(11, 15)
+    student.has_mid_stops = False
+    student.pm_start_time = time(13, 0)
+    student.pm_end_time = time(14, 30)
+    get_stop_info = AsyncMock(
+        return_value=MagicMock(
+            vehicle_location=MagicMock(log_time=LOG_TIME), student_stops=STUDENT_STOPS
+        )
+    )
+    coordinator.config_entry.runtime_data.client.get_stop_info = get_stop_info
+    dt_now = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=hour, minute=minute, second=0, microsecond=0
+    )
+
+    with patch("homeassistant.util.dt.now", return_value=dt_now):
+        await coordinator._async_update_data()
+
+    get_stop_info.assert_awaited_once_with(
+        "school_id",
+        "parent_id",
+        "student1",
+        time_of_day_id,
+        metrics=coordinator.config_entry.runtime_data.requests,
+    )
+    assert coordinator.update_interval == timedelta(seconds=30)
+
+
+async def test_async_update_data_skips_closed_days(hass: HomeAssistant) -> None:
+    """Test no location is fetched on a day the calendar closes the school."""
+    coordinator = _scheduled_coordinator(hass)
+    get_stop_info = AsyncMock()
+    coordinator.config_entry.runtime_data.client.get_stop_info = get_stop_info
+    coordinator._schedule.calendar._closed = {date(2024, 10, 31)}
+    seven = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=30, second=0, microsecond=0
+    )
+
+    with patch("homeassistant.util.dt.now", return_value=seven):
+        await coordinator._async_update_data()
+
+    get_stop_info.assert_not_awaited()
+    # sleeping until the AM window of the next school day.
+    assert (
+        coordinator.update_interval
+        == seven.replace(day=1, month=11, hour=7, minute=0) - seven
+    )
+
+
+def test_early_release_moves_the_pm_window(hass: HomeAssistant) -> None:
+    """Test the PM window of an early release day starts at the dismissal."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator.data["student1"].pm_school_arrival_time = time(15, 30)
+    coordinator._schedule.calendar._dismissals = {date(2024, 10, 31): time(12, 30)}
+    thursday = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=12, minute=15, second=0, microsecond=0
+    )
+    friday = thursday.replace(day=1, month=11)
+
+    assert coordinator._riding(thursday, coordinator.data) == {"student1": TimeOfDay.PM}
+    assert coordinator._riding(thursday.replace(hour=15), coordinator.data) == {}
+    assert coordinator._next_window_start(
+        thursday.replace(hour=11, minute=30), coordinator.data
+    ) == thursday.replace(hour=12, minute=0)
+    # the next day is a regular day.
+    assert coordinator._riding(friday, coordinator.data) == {}
+    assert coordinator._riding(friday.replace(hour=15), coordinator.data) == {
+        "student1": TimeOfDay.PM
+    }
+
+
+async def test_fixed_polling_publishes_stale(hass: HomeAssistant) -> None:
+    """Test the stale students are published while the polls keep failing."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator.config_entry.runtime_data.client.get_stop_info = AsyncMock(
+        side_effect=HcbApiError("error")
+    )
+    listener = MagicMock()
+    coordinator.async_add_listener(listener)
+    seven = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=30, second=0, microsecond=0
+    )
+
+    with (
+        patch("homeassistant.util.dt.now", return_value=seven),
+        pytest.raises(UpdateFailed),
+    ):
+        await coordinator._async_update_data()
+
+    assert coordinator.stale == set()
+    listener.assert_not_called()
+
+    # the coordinator does not publish a second failed poll by itself.
+    with (
+        patch("homeassistant.util.dt.now", return_value=seven + timedelta(minutes=3)),
+        pytest.raises(UpdateFailed),
+    ):
+        await coordinator._async_update_data()
+
+    assert coordinator.stale == {"student1"}
+    assert coordinator.changes == {}
+    listener.assert_called_once()
+
+    # nor the same data, once the window is closed.
+    listener.reset_mock()
+    with patch("homeassistant.util.dt.now", return_value=seven.replace(hour=9)):
+        assert await coordinator._async_update_data() is coordinator.data
+
+    assert coordinator.stale == set()
+    listener.assert_called_once()
+
+
+def _revalidating_coordinator(hass: HomeAssistant) -> HCBDataCoordinator:
+    """Create a scheduled coordinator in stale while revalidate mode."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator._stale_while_revalidate = True
+    coordinator.config_entry.async_create_background_task = lambda hass, target, name: (
+        hass.async_create_background_task(target, name)
+    )
+    return coordinator
+
+
+async def test_stale_while_revalidate_serves_last_locations(
+    hass: HomeAssistant,
+) -> None:
+    """Test a refresh returns the last locations while the poll is running."""
+    coordinator = _revalidating_coordinator(hass)
+    previous = coordinator.data
+    responded = asyncio.Event()
+
+    async def _get_stop_info(*_: str, **__: RequestMetrics) -> MagicMock:
+        await responded.wait()
+        return MagicMock(
+            vehicle_location=MagicMock(log_time=LOG_TIME), student_stops=STUDENT_STOPS
+        )
+
+    get_stop_info = AsyncMock(side_effect=_get_stop_info)
+    coordinator.config_entry.runtime_data.client.get_stop_info = get_stop_info
+    seven = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=30, second=0, microsecond=0
+    )
+
+    with patch("homeassistant.util.dt.now", return_value=seven):
+        data = await coordinator._async_update_data()
+        # the running poll is not started twice.
+        assert await coordinator._async_update_data() is data
+        assert data is previous
+
+        responded.set()
+        await coordinator._revalidate_task
+        assert get_stop_info.await_count == 1
+
+    assert coordinator.data is not previous
+    assert coordinator.last_update_success
+    assert "student1" in coordinator.changes
+    assert coordinator.stale == set()
+
+
+async def test_stale_while_revalidate_keeps_locations_on_failure(
+    hass: HomeAssistant,
+) -> None:
+    """Test a failed poll keeps the last locations until they are too old."""
+    coordinator = _revalidating_coordinator(hass)
+    previous = coordinator.data
+    coordinator.config_entry.runtime_data.client.get_stop_info = AsyncMock(
+        side_effect=HcbApiError("error")
+    )
+    listener = MagicMock()
+    coordinator.async_add_listener(listener)
+    seven = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=30, second=0, microsecond=0
+    )
+
+    with patch("homeassistant.util.dt.now", return_value=seven):
+        await coordinator._async_update_data()
+        await coordinator._revalidate_task
+
+    assert coordinator.data is previous
+    assert coordinator.last_update_success
+    assert coordinator.stale == set()
+
+    # the last location is served until it is older than the maximum age.
+    listener.reset_mock()
+    with patch("homeassistant.util.dt.now", return_value=seven + timedelta(minutes=3)):
+        await coordinator._async_update_data()
+        await coordinator._revalidate_task
+
+    assert coordinator.data is previous
+    assert coordinator.last_update_success
+    assert coordinator.stale == {"student1"}
+    listener.assert_called()
+
+    # the window is closed, so the location is not expected to change.
+    with patch("homeassistant.util.dt.now", return_value=seven.replace(hour=9)):
+        await coordinator._async_update_data()
+        await coordinator._revalidate_task
+
+    assert coordinator.stale == set()
+
+
+def _two_student_coordinator(hass: HomeAssistant) -> HCBDataCoordinator:
+    """Create a scheduled coordinator whose second student hangs."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator.data["student2"] = replace(
+        coordinator.data["student1"], first_name="Bob", student_id="student2"
+    )
+
+    async def _get_stop_info(*args: str, **_: RequestMetrics) -> MagicMock:
+        if args[2] == "student2":
+            await asyncio.Event().wait()
+        return MagicMock(
+            vehicle_location=MagicMock(log_time=LOG_TIME), student_stops=STUDENT_STOPS
+        )
+
+    coordinator.config_entry.runtime_data.client.get_stop_info = _get_stop_info
+    return coordinator
+
+
+async def test_async_update_data_call_timeout(hass: HomeAssistant) -> None:
+    """Test a hung request is cancelled and the other students are served."""
+    coordinator = _two_student_coordinator(hass)
+    coordinator._call_timeout = 0.01
+    seven = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=30, second=0, microsecond=0
+    )
+
+    with patch("homeassistant.util.dt.now", return_value=seven):
+        data = await coordinator._async_update_data()
+
+    assert "student1" in coordinator.changes
+    assert "student2" not in coordinator.changes
+    assert data["student2"] is coordinator.data["student2"]
+    assert coordinator.timeouts.call_timeouts == 1
+    assert coordinator.timeouts.budget_timeouts == 0
+    assert coordinator.timeouts.budget_overruns == 0
+
+
+async def test_async_update_data_request_timeout(hass: HomeAssistant) -> None:
+    """Test a request that times out on its own is a failed request."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator.config_entry.runtime_data.client.get_stop_info = AsyncMock(
+        side_effect=TimeoutError
+    )
+    seven = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=30, second=0, microsecond=0
+    )
+
+    with (
+        patch("homeassistant.util.dt.now", return_value=seven),
+        pytest.raises(UpdateFailed),
+    ):
+        await coordinator._async_update_data()
+
+    assert coordinator.timeouts.call_timeouts == 0
+    assert coordinator.timeouts.budget_timeouts == 0
+
+
+async def test_async_update_data_raises_unexpected_errors(
+    hass: HomeAssistant,
+) -> None:
+    """Test errors that are not request errors are not hidden."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator.config_entry.runtime_data.client.get_stop_info = AsyncMock(
+        side_effect=RuntimeError
+    )
+    seven = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=30, second=0, microsecond=0
+    )
+
+    with (
+        patch("homeassistant.util.dt.now", return_value=seven),
+        pytest.raises(RuntimeError),
+    ):
+        await coordinator._async_update_data()
+
+
+async def test_async_update_data_tick_budget(hass: HomeAssistant) -> None:
+    """Test the requests still running at the end of the budget are cancelled."""
+    coordinator = _two_student_coordinator(hass)
+    coordinator._tick_budget = 0.01
+    coordinator._max_concurrent_requests = 1
+    seven = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=30, second=0, microsecond=0
+    )
+    coordinator.data = {
+        "student2": coordinator.data["student2"],
+        "student1": coordinator.data["student1"],
+    }
+
+    with (
+        patch("homeassistant.util.dt.now", return_value=seven),
+        pytest.raises(UpdateFailed, match="budget"),
+    ):
+        await coordinator._async_update_data()
+
+    # the hung request used up the budget, so nothing was left for the other.
+    assert coordinator.timeouts.call_timeouts == 0
+    assert coordinator.timeouts.budget_timeouts == len(coordinator.data)
+    assert coordinator.timeouts.budget_overruns == 1
+
+
+def _cache_config_entry() -> MagicMock:
+    """Create a config entry with a mock client that returns one student."""
+    config_entry = MagicMock(entry_id="entry_id")
+    config_entry.data = {
+        CONF_SCHOOL_CODE: "test_school",
+        CONF_USERNAME: "test_user",
+        CONF_PASSWORD: "test_password",
+    }
+    client = MagicMock()
+    client.get_school_id = AsyncMock(return_value="school_id")
+    client.get_parent_info = AsyncMock(
+        return_value=MagicMock(
+            account_id="parent_id",
+            students=[MagicMock(first_name="Alice", student_id="student1")],
+            times=[MagicMock(id=TimeOfDay.AM)],
+        )
+    )
+    client.get_stop_info = AsyncMock(
+        return_value=MagicMock(vehicle_location=None, student_stops=STUDENT_STOPS)
+    )
+    config_entry.runtime_data = MagicMock(client=client)
+    return config_entry
+
+
+async def _save_cached_schedule(
+    hass: HomeAssistant,
+    students: list[str],
+    age: timedelta = SCHEDULE_UPDATE_INTERVAL + timedelta(hours=1),
+    *,
+    complete: bool = True,
+) -> None:
+    """Save a cached schedule with the given students, as old as the age."""
+    with patch("homeassistant.util.dt.utcnow", return_value=dt_util.utcnow() - age):
+        await HCBCache(hass, "entry_id").async_save(
+            "school_id",
+            "parent_id",
+            [TimeOfDay.AM],
+            {
+                student_id: StudentData(
+                    first_name=student_id,
+                    student_id=student_id,
+                    # the start time the stops give, only the arrival time differs.
+                    am_start_time=time(6, 45),
+                    am_stop_arrival_time=time(7, 20),
+                )
+                for student_id in students
+            },
+            complete=complete,
+        )
+
+
+async def test_first_refresh_saves_schedule(hass: HomeAssistant) -> None:
+    """Test the fetched schedule is cached for the next start."""
+    config_entry = _cache_config_entry()
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+
+    await coordinator.async_config_entry_first_refresh()
+
+    cached = await HCBCache(hass, "entry_id").async_load()
+    assert cached is not None
+    assert cached.parent_id == "parent_id"
+    assert cached.time_of_day_ids == [TimeOfDay.AM]
+    assert cached.students["student1"].am_stop_arrival_time == time(7, 30)
+
+
+async def test_first_refresh_does_not_save_failed_schedule(
+    hass: HomeAssistant,
+) -> None:
+    """Test a schedule that could not be applied is not cached."""
+    config_entry = _cache_config_entry()
+    config_entry.runtime_data.client.get_stop_info.return_value = MagicMock(
+        vehicle_location=None, student_stops=[]
+    )
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+
+    await coordinator.async_config_entry_first_refresh()
+
+    assert await HCBCache(hass, "entry_id").async_load() is None
+
+
+async def test_first_refresh_uses_cached_schedule(hass: HomeAssistant) -> None:
+    """Test an old cached schedule is used and revalidated in the background."""
+    await _save_cached_schedule(hass, ["student1"])
+    config_entry = _cache_config_entry()
+    client = config_entry.runtime_data.client
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+
+    await coordinator.async_config_entry_first_refresh()
+
+    assert client.get_school_id.call_count == 0
+    assert client.get_parent_info.call_count == 0
+    assert client.get_stop_info.call_count == 0
+    assert coordinator._school_id == "school_id"
+    assert coordinator._parent_id == "parent_id"
+    assert coordinator.data["student1"].am_stop_arrival_time == time(7, 20)
+    config_entry.async_create_background_task.assert_called_once()
+
+    listener = MagicMock()
+    coordinator.async_add_listener(listener)
+    await config_entry.async_create_background_task.call_args[0][1]
+
+    assert client.get_school_id.call_count == 0
+    assert client.get_parent_info.call_count == 1
+    assert coordinator.data["student1"].am_stop_arrival_time == time(7, 30)
+    assert "am_stop_arrival_time" in coordinator.changes["student1"]
+    assert "am_start_time" not in coordinator.changes["student1"]
+    listener.assert_called_once()
+
+
+async def test_first_refresh_revalidates_incomplete_cached_schedule(
+    hass: HomeAssistant,
+) -> None:
+    """Test a recent cached schedule with failed stops is fetched again."""
+    await _save_cached_schedule(
+        hass, ["student1"], age=timedelta(hours=1), complete=False
+    )
+    config_entry = _cache_config_entry()
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+
+    await coordinator.async_config_entry_first_refresh()
+
+    assert coordinator.data["student1"].am_stop_arrival_time == time(7, 20)
+    config_entry.async_create_background_task.assert_called_once()
+
+
+async def test_first_refresh_keeps_recent_cached_schedule(
+    hass: HomeAssistant,
+) -> None:
+    """Test a recent cached schedule is only fetched by the regular refresh."""
+    await _save_cached_schedule(hass, ["student1"], age=timedelta(hours=1))
+    config_entry = _cache_config_entry()
+    client = config_entry.runtime_data.client
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+
+    await coordinator.async_config_entry_first_refresh()
+
+    assert coordinator.data["student1"].am_stop_arrival_time == time(7, 20)
+    config_entry.async_create_background_task.assert_not_called()
+    # the regular refresh comes when the cache is as old as the interval.
+    assert timedelta(hours=4, minutes=59) < coordinator.update_interval
+    assert coordinator.update_interval <= timedelta(hours=5)
+
+    await coordinator._async_update_data()
+
+    assert client.get_parent_info.call_count == 1
+    assert coordinator.update_interval == SCHEDULE_UPDATE_INTERVAL
+
+
+async def test_revalidate_without_changes(hass: HomeAssistant) -> None:
+    """Test an unchanged schedule does not notify the entities."""
+    config_entry = _cache_config_entry()
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+    await coordinator.async_config_entry_first_refresh()
+    listener = MagicMock()
+    coordinator.async_add_listener(listener)
+
+    await coordinator._async_revalidate()
+
+    listener.assert_not_called()
+
+
+async def test_revalidate_reloads_when_students_change(hass: HomeAssistant) -> None:
+    """Test a changed list of students reloads the entry."""
+    await _save_cached_schedule(hass, ["student1", "student2"])
+    config_entry = _cache_config_entry()
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+    await coordinator.async_config_entry_first_refresh()
+
+    with patch.object(hass.config_entries, "async_schedule_reload") as mock_reload:
+        await config_entry.async_create_background_task.call_args[0][1]
+
+    mock_reload.assert_called_once_with("entry_id")
+    assert coordinator.data.keys() == {"student1", "student2"}
+
+
+async def test_revalidate_handles_client_error(hass: HomeAssistant) -> None:
+    """Test the cached schedule is kept when revalidation fails."""
+    await _save_cached_schedule(hass, ["student1"])
+    config_entry = _cache_config_entry()
+    config_entry.runtime_data.client.get_parent_info.side_effect = HcbApiError("error")
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+    await coordinator.async_config_entry_first_refresh()
+
+    await config_entry.async_create_background_task.call_args[0][1]
+
+    assert coordinator.data["student1"].am_stop_arrival_time == time(7, 20)
+
+
+async def test_schedule_update_data(hass: HomeAssistant) -> None:
+    """Test the periodic schedule refresh returns the fetched schedule."""
+    config_entry = _cache_config_entry()
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+    await coordinator.async_config_entry_first_refresh()
+    client = config_entry.runtime_data.client
+    school_stop = MagicMock(
+        stop_type="School",
+        time_of_day_id=TimeOfDay.AM,
+        start_time=time(7, 15),
+        arrival_time=time(7, 50),
+        latitude=STUDENT_STOPS[0].latitude,
+        longitude=STUDENT_STOPS[0].longitude,
+    )
+    client.get_stop_info.return_value = MagicMock(
+        vehicle_location=None, student_stops=[school_stop, STUDENT_STOPS[1]]
+    )
+
+    data = await coordinator._async_update_data()
+
+    assert data["student1"].am_school_arrival_time == time(7, 50)
+    assert coordinator.changes["student1"] == {"am_school_arrival_time"}
+
+
+async def test_schedule_update_data_skips_closed_days(hass: HomeAssistant) -> None:
+    """Test the schedule is not fetched on a day the calendar closes the school."""
+    config_entry = _cache_config_entry()
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+    await coordinator.async_config_entry_first_refresh()
+    client = config_entry.runtime_data.client
+    client.get_parent_info.reset_mock()
+    client.get_stop_info.reset_mock()
+    coordinator.calendar._closed = {dt_util.now().date()}
+
+    data = await coordinator._async_update_data()
+
+    assert data is coordinator.data
+    assert coordinator.changes == {}
+    client.get_parent_info.assert_not_called()
+    client.get_stop_info.assert_not_called()
+
+
+async def test_schedule_update_data_reloads_when_students_change(
+    hass: HomeAssistant,
+) -> None:
+    """Test the periodic schedule refresh reloads when students change."""
+    config_entry = _cache_config_entry()
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+    await coordinator.async_config_entry_first_refresh()
+    config_entry.runtime_data.client.get_parent_info.return_value.students.append(
+        MagicMock(first_name="Bob", student_id="student2")
+    )
+
+    with patch.object(hass.config_entries, "async_schedule_reload") as mock_reload:
+        data = await coordinator._async_update_data()
+
+    mock_reload.assert_called_once_with("entry_id")
+    assert data is coordinator.data
+
+
+def _stop_response(time_of_day_id: str) -> MagicMock:
+    """Return a stop response with a school and a stop for the time of day."""
+    return MagicMock(
+        vehicle_location=None,
+        student_stops=[
+            MagicMock(
+                stop_type=stop_type,
+                time_of_day_id=time_of_day_id,
+                start_time=start_time,
+                arrival_time=start_time,
+                latitude=LATITUDE,
+                longitude=LONGITUDE,
+            )
+            for stop_type, start_time in (
+                ("School", time(7, 45)),
+                ("Stop", time(7, 15)),
+            )
+        ],
+    )
+
+
+def _parse_errors() -> list[Exception]:
+    """Return the errors of a request and of parsing a bad response."""
+    try:
+        etree.fromstring(b"<Response>")
+    except XMLSyntaxError as xml_error:
+        syntax_error = xml_error
+    try:
+        TypeAdapter(int).validate_python("error")
+    except ValidationError as pydantic_error:
+        validation_error = pydantic_error
+    return [HcbApiError("error"), syntax_error, validation_error]
+
+
+def _household_config_entry(
+    failing: set[tuple[str, str]], error: Exception | None = None
+) -> MagicMock:
+    """Create a config entry for two students where some stop fetches fail."""
+    config_entry = _cache_config_entry()
+    client = config_entry.runtime_data.client
+    client.get_parent_info.return_value.students = [
+        MagicMock(first_name="Alice", student_id="student1"),
+        MagicMock(first_name="Bob", student_id="student2"),
+    ]
+    client.get_parent_info.return_value.times = [
+        MagicMock(id=TimeOfDay.AM),
+        MagicMock(id=TimeOfDay.PM),
+    ]
+
+    async def get_stop_info(
+        _school_id: str,
+        _parent_id: str,
+        student_id: str,
+        time_of_day_id: str,
+        **_: RequestMetrics,
+    ) -> MagicMock:
+        if (student_id, time_of_day_id) in failing:
+            raise error or HcbApiError("error")
+        return _stop_response(time_of_day_id)
+
+    client.get_stop_info = AsyncMock(side_effect=get_stop_info)
+    return config_entry
+
+
+@pytest.mark.parametrize("error", _parse_errors())
+async def test_first_refresh_isolates_failed_stops(
+    hass: HomeAssistant, error: Exception
+) -> None:
+    """Test a failed or unparsable stop fetch does not affect the other stops."""
+    config_entry = _household_config_entry({("student1", TimeOfDay.AM)}, error)
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+
+    await coordinator.async_config_entry_first_refresh()
+
+    alice = coordinator.data["student1"]
+    bob = coordinator.data["student2"]
+    assert alice.am_stop_arrival_time is None
+    assert alice.pm_stop_arrival_time == time(7, 15)
+    assert bob.am_stop_arrival_time == time(7, 15)
+    assert bob.pm_stop_arrival_time == time(7, 15)
+    failed = coordinator.fetch_status[("student1", TimeOfDay.AM)]
+    assert failed.attempts == 1
+    assert failed.last_error == str(error)
+    assert failed.next_retry is not None
+    assert coordinator.fetch_status[("student2", TimeOfDay.AM)].attempts == 0
+    assert coordinator.fetch_status[("student2", TimeOfDay.AM)].last_success
+    # the retry is due after the base delay with jitter
+    assert timedelta(seconds=15) <= coordinator.update_interval <= RETRY_BASE_DELAY
+    # the stops that were fetched are cached, the schedule is incomplete
+    cached = await HCBCache(hass, "entry_id").async_load()
+    assert cached is not None
+    assert cached.students["student2"].am_stop_arrival_time == time(7, 15)
+    assert not cached.complete
+
+
+async def test_first_refresh_isolates_missing_stops(hass: HomeAssistant) -> None:
+    """Test a time of day without stops does not affect the other stops."""
+    config_entry = _household_config_entry(set())
+    client = config_entry.runtime_data.client
+    get_stop_info = client.get_stop_info.side_effect
+
+    async def no_am_stops(*key: str, **kwargs: RequestMetrics) -> MagicMock:
+        if key[2:] == ("student1", TimeOfDay.AM):
+            return MagicMock(vehicle_location=None, student_stops=[])
+        return await get_stop_info(*key, **kwargs)
+
+    client.get_stop_info.side_effect = no_am_stops
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+
+    await coordinator.async_config_entry_first_refresh()
+
+    assert coordinator.data["student2"].am_stop_arrival_time == time(7, 15)
+    failed = coordinator.fetch_status[("student1", TimeOfDay.AM)]
+    assert failed.last_error == "No stops returned."
+
+
+async def test_retry_only_failed_stops(
+    hass: HomeAssistant, freezer: FrozenDateTimeFactory
+) -> None:
+    """Test only the failed stop fetches are retried once their backoff is over."""
+    failing = {("student1", TimeOfDay.AM)}
+    config_entry = _household_config_entry(failing)
+    client = config_entry.runtime_data.client
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+    await coordinator.async_config_entry_first_refresh()
+    client.get_stop_info.reset_mock()
+    client.get_parent_info.reset_mock()
+
+    # nothing is due yet
+    coordinator.data = await coordinator._async_update_data()
+    assert client.get_stop_info.call_count == 0
+
+    # the retry fails again and backs off further
+    freezer.tick(RETRY_BASE_DELAY)
+    coordinator.data = await coordinator._async_update_data()
+    assert client.get_stop_info.call_count == 1
+    assert coordinator.fetch_status[("student1", TimeOfDay.AM)].attempts == 2  # noqa: PLR2004
+    assert RETRY_BASE_DELAY <= coordinator.update_interval <= RETRY_BASE_DELAY * 2
+
+    failing.clear()
+    freezer.tick(RETRY_BASE_DELAY * 2)
+    coordinator.data = await coordinator._async_update_data()
+
+    assert client.get_stop_info.call_count == 2  # noqa: PLR2004
+    assert client.get_parent_info.call_count == 0
+    assert coordinator.data["student1"].am_stop_arrival_time == time(7, 15)
+    assert coordinator.changes["student1"] >= {"am_stop_arrival_time"}
+    assert coordinator.fetch_status[("student1", TimeOfDay.AM)].attempts == 0
+    assert coordinator.update_interval == SCHEDULE_UPDATE_INTERVAL
+    # the completed schedule is cached
+    assert await HCBCache(hass, "entry_id").async_load() is not None
+
+
+def test_retry_backoff_is_capped(hass: HomeAssistant) -> None:
+    """Test the retry backoff grows up to the maximum delay, then stops."""
+    coordinator = HCBScheduleCoordinator(hass, MagicMock(data={}))
+    key = ("student1", TimeOfDay.AM)
+    dt_now = dt_util.utcnow()
+    for _ in range(RETRY_MAX_ATTEMPTS - 1):
+        coordinator._record_failure(key, ValueError("error"), dt_now)
+
+    next_retry = coordinator.fetch_status[key].next_retry
+    assert next_retry is not None
+    assert RETRY_MAX_DELAY / 2 <= next_retry - dt_now <= RETRY_MAX_DELAY
+
+    # the last attempt leaves the stops to the next schedule refresh.
+    coordinator._record_failure(key, ValueError("error"), dt_now)
+    coordinator._schedule_retry(dt_now)
+
+    assert coordinator.fetch_status[key].attempts == RETRY_MAX_ATTEMPTS
+    assert coordinator.fetch_status[key].next_retry is None
+    assert coordinator.update_interval == SCHEDULE_UPDATE_INTERVAL
+
+
+async def test_schedule_refresh_runs_with_pending_retries(
+    hass: HomeAssistant, freezer: FrozenDateTimeFactory
+) -> None:
+    """Test the whole schedule is fetched when it is due, retries or not."""
+    failing = {("student1", TimeOfDay.AM)}
+    config_entry = _household_config_entry(failing)
+    client = config_entry.runtime_data.client
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+    await coordinator.async_config_entry_first_refresh()
+    client.get_parent_info.reset_mock()
+
+    # the retries back off until the schedule is due before the next one.
+    for _ in range(RETRY_MAX_ATTEMPTS - 2):
+        freezer.tick(coordinator.update_interval)
+        coordinator.data = await coordinator._async_update_data()
+    assert client.get_parent_info.call_count == 0
+    assert coordinator.fetch_status[("student1", TimeOfDay.AM)].next_retry
+    freezer.tick(SCHEDULE_UPDATE_INTERVAL)
+    coordinator.data = await coordinator._async_update_data()
+
+    assert client.get_parent_info.call_count == 1
+    # the failing stops start their retries over.
+    assert coordinator.fetch_status[("student1", TimeOfDay.AM)].attempts == 1
+    assert coordinator.update_interval <= RETRY_BASE_DELAY
+
+
+async def test_fetch_stops_raises_unexpected_errors(hass: HomeAssistant) -> None:
+    """Test errors that are not request errors are not hidden."""
+    config_entry = _cache_config_entry()
+    config_entry.runtime_data.client.get_stop_info.side_effect = RuntimeError
+    coordinator = HCBScheduleCoordinator(hass, config_entry)
+
+    with pytest.raises(RuntimeError):
+        await coordinator.async_config_entry_first_refresh()
+
+
+async def test_gather_with_limit_returns_exceptions() -> None:
+    """Test a failed awaitable does not fail the others."""
+    error = ValueError("error")
+
+    async def fail() -> int:
+        raise error
+
+    async def succeed() -> int:
+        return 1
+
+    assert await _gather_with_limit(2, succeed(), fail(), return_exceptions=True) == [
+        1,
+        error,
+    ]
+
+
+@pytest.mark.parametrize("error", _parse_errors())
+async def test_location_isolates_failed_students(
+    hass: HomeAssistant, error: Exception
+) -> None:
+    """Test a student whose location fails or is unparsable does not affect others."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator.data["student2"] = replace(
+        coordinator.data["student1"], first_name="Bob", student_id="student2"
+    )
+    vehicle_location = MagicMock(
+        latitude=LATITUDE, longitude=LONGITUDE, log_time=LOG_TIME
+    )
+
+    async def get_stop_info(*key: str, **_: RequestMetrics) -> MagicMock:
+        if key[2] == "student1":
+            raise error
+        return MagicMock(vehicle_location=vehicle_location)
+
+    client = coordinator.config_entry.runtime_data.client
+    client.get_stop_info = AsyncMock(side_effect=get_stop_info)
+    with patch(
+        "homeassistant.util.dt.now",
+        return_value=dt_util.now().replace(
+            year=2024, month=10, day=31, hour=7, minute=30
+        ),
+    ):
+        data = await coordinator._async_update_data()
+
+        assert data["student1"].latitude is None
+        assert data["student2"].latitude == LATITUDE
+
+        # when every student fails the update fails
+        client.get_stop_info.side_effect = error
+        with pytest.raises(UpdateFailed):
+            await coordinator._async_update_data()
+        coordinator._schedule.data = coordinator.data
+        with pytest.raises(ConfigEntryNotReady):
+            await coordinator.async_config_entry_first_refresh()
+
+
+async def test_location_keeps_schedule_merged_during_fetch(
+    hass: HomeAssistant,
+) -> None:
+    """Test a schedule merged in while the locations are fetched is kept."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator.data["student2"] = replace(
+        coordinator.data["student1"], first_name="Bob", student_id="student2"
+    )
+    vehicle_location = MagicMock(
+        latitude=LATITUDE, longitude=LONGITUDE, log_time=LOG_TIME
+    )
+    error = HcbApiError("error")
+
+    async def get_stop_info(*key: str, **_: RequestMetrics) -> MagicMock:
+        # the schedule coordinator merges its update during the call.
+        coordinator.data = {
+            student_id: replace(student_data, am_school_arrival_time=time(8, 0))
+            for student_id, student_data in coordinator.data.items()
+        }
+        if key[2] == "student1":
+            raise error
+        return MagicMock(vehicle_location=vehicle_location)
+
+    coordinator.config_entry.runtime_data.client.get_stop_info = AsyncMock(
+        side_effect=get_stop_info
+    )
+    with patch(
+        "homeassistant.util.dt.now",
+        return_value=dt_util.now().replace(
+            year=2024, month=10, day=31, hour=7, minute=30
+        ),
+    ):
+        data = await coordinator._async_update_data()
+
+    # the failed student as well as the fetched one keep the merged schedule.
+    assert data["student1"].am_school_arrival_time == time(8, 0)
+    assert data["student2"].am_school_arrival_time == time(8, 0)
+    assert data["student2"].latitude == LATITUDE
+
+
+async def test_async_update_data_records_freshness(hass: HomeAssistant) -> None:
+    """Test the age of the fixes and the time between them are recorded."""
+    coordinator = _scheduled_coordinator(hass)
+    vehicle_locations = [
+        MagicMock(log_time=log_time)
+        for log_time in (LOG_TIME, LOG_TIME, LOG_TIME + timedelta(seconds=30))
+    ]
+    for vehicle_location in vehicle_locations:
+        vehicle_location.configure_mock(name="Bus 123")
+    coordinator.config_entry.runtime_data.client.get_stop_info = AsyncMock(
+        side_effect=[
+            MagicMock(vehicle_location=vehicle_location, student_stops=STUDENT_STOPS)
+            for vehicle_location in vehicle_locations
+        ]
+    )
+    dt_now = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=15, second=40, microsecond=0
+    )
+
+    with patch("homeassistant.util.dt.now", return_value=dt_now):
+        for _ in range(3):
+            coordinator.data = await coordinator._async_update_data()
+
+    freshness = coordinator.freshness["Bus 123"]
+    # the same fix fetched twice is counted once between the fixes.
+    assert freshness.fix_age.count == len(["7:15:00", "7:15:00", "7:15:30"])
+    assert freshness.fix_interval.count == 1
+    assert freshness.last_age == 10  # noqa: PLR2004
+    assert 30 <= freshness.fix_interval.percentile(0.5) <= 36  # noqa: PLR2004
+
+
+async def test_async_update_data_records_freshness_per_bus(
+    hass: HomeAssistant,
+) -> None:
+    """Test the fix of a bus shared by two students is recorded once a poll."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator.data["student2"] = replace(
+        coordinator.data["student1"], first_name="Bob", student_id="student2"
+    )
+    vehicle_location = MagicMock(log_time=LOG_TIME)
+    vehicle_location.configure_mock(name="Bus 123")
+    coordinator.config_entry.runtime_data.client.get_stop_info = AsyncMock(
+        return_value=MagicMock(
+            vehicle_location=vehicle_location, student_stops=STUDENT_STOPS
+        )
+    )
+    dt_now = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=15, second=40, microsecond=0
+    )
+
+    with patch("homeassistant.util.dt.now", return_value=dt_now):
+        coordinator.data = await coordinator._async_update_data()
+
+    assert list(coordinator.freshness) == ["Bus 123"]
+    assert coordinator.freshness["Bus 123"].fix_age.count == 1
+
+
+async def test_async_update_data_estimates_arrival(hass: HomeAssistant) -> None:
+    """Test the arrival at the stop is estimated while riding and then cleared."""
+    coordinator = _scheduled_coordinator(hass)
+    student = coordinator.data["student1"]
+    student.am_stop_arrival_time = time(7, 40)
+    student.am_stop_latitude = LATITUDE + 0.01
+    student.am_stop_longitude = LONGITUDE
+    coordinator.config_entry.runtime_data.client.get_stop_info = AsyncMock(
+        return_value=MagicMock(
+            vehicle_location=MagicMock(
+                heading="N",
+                latitude=LATITUDE,
+                longitude=LONGITUDE,
+                log_time=LOG_TIME,
+                speed=SPEED,
+            ),
+            student_stops=STUDENT_STOPS,
+        )
+    )
+    seven = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=30, second=0, microsecond=0
+    )
+
+    with patch("homeassistant.util.dt.now", return_value=seven):
+        coordinator.data = await coordinator._async_update_data()
+
+    # about a kilometer away, a few minutes by distance and ten by schedule.
+    assert coordinator.data["student1"].stop_distance == 1110  # noqa: PLR2004
+    assert 3 < coordinator.data["student1"].minutes_to_stop < 10  # noqa: PLR2004
+    assert coordinator.data["student1"].bus_near is False
+    assert coordinator.changes["student1"] >= {"minutes_to_stop", "stop_distance"}
+
+    with patch(
+        "homeassistant.util.dt.now", return_value=seven.replace(hour=9, minute=0)
+    ):
+        coordinator.data = await coordinator._async_update_data()
+
+    assert coordinator.data["student1"].stop_distance is None
+    assert coordinator.data["student1"].minutes_to_stop is None
+    assert coordinator.data["student1"].bus_near is None
+    assert coordinator.changes["student1"] == {
+        "bus_near",
+        "minutes_to_stop",
+        "stop_distance",
+    }
+
+
+async def test_async_update_data_observes_arrivals(hass: HomeAssistant) -> None:
+    """Test the distances to the stop and school feed the arrival model."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator.arrivals = MagicMock()
+    student = coordinator.data["student1"]
+    student.am_stop_latitude = LATITUDE + 0.01
+    student.am_stop_longitude = LONGITUDE
+    student.am_school_latitude = LATITUDE
+    student.am_school_longitude = LONGITUDE
+    coordinator.config_entry.runtime_data.client.get_stop_info = AsyncMock(
+        return_value=MagicMock(
+            vehicle_location=MagicMock(
+                heading="N",
+                latitude=LATITUDE,
+                longitude=LONGITUDE,
+                log_time=LOG_TIME,
+                speed=SPEED,
+            ),
+            student_stops=STUDENT_STOPS,
+        )
+    )
+    seven = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=30, second=0, microsecond=0
+    )
+
+    with patch("homeassistant.util.dt.now", return_value=seven):
+        coordinator.data = await coordinator._async_update_data()
+
+    meters = {
+        call.args[2]: call.args[3]
+        for call in coordinator.arrivals.observe.call_args_list
+    }
+    assert set(meters) == {PLACE_STOP, PLACE_SCHOOL}
+    assert 1100 < meters[PLACE_STOP] < 1120  # noqa: PLR2004
+    assert meters[PLACE_SCHOOL] == 0
+    coordinator.arrivals.observe.assert_called_with(
+        "student1", TimeOfDay.AM, PLACE_SCHOOL, 0, LOG_TIME.replace(tzinfo=seven.tzinfo)
+    )
+    coordinator.arrivals.finish.assert_not_called()
+
+    # the arrivals still pending are recorded when the window ends.
+    with patch(
+        "homeassistant.util.dt.now", return_value=seven.replace(hour=9, minute=0)
+    ):
+        coordinator.data = await coordinator._async_update_data()
+
+    coordinator.arrivals.finish.assert_called_once_with("student1")
+
+
+async def test_async_update_data_records_route_trace(hass: HomeAssistant) -> None:
+    """Test the route of the bus is traced during its window and then cleared."""
+    coordinator = _scheduled_coordinator(hass)
+    responses = [
+        MagicMock(
+            vehicle_location=MagicMock(
+                heading="N",
+                latitude=LATITUDE + step * 0.001,
+                longitude=LONGITUDE,
+                log_time=LOG_TIME + timedelta(seconds=30 * step),
+                speed=SPEED,
+            ),
+            student_stops=STUDENT_STOPS,
+        )
+        for step in (0, 1, 1)
+    ]
+    for response in responses:
+        response.vehicle_location.name = "Bus 123"
+    coordinator.config_entry.runtime_data.client.get_stop_info = AsyncMock(
+        side_effect=responses
+    )
+    seven = dt_util.now().replace(
+        year=2024, month=10, day=31, hour=7, minute=30, second=0, microsecond=0
+    )
+
+    with patch("homeassistant.util.dt.now", return_value=seven):
+        for _ in range(3):
+            coordinator.data = await coordinator._async_update_data()
+
+    # the route is kept by the bus, shared by the students riding it.
+    assert list(coordinator.traces) == ["Bus 123"]
+    trace = coordinator.traces["Bus 123"]
+    assert trace.time_of_day_id == TimeOfDay.AM
+    # the repeated fix is only traced once.
+    assert trace.coordinates() == [
+        (LATITUDE, LONGITUDE),
+        (LATITUDE + 0.001, LONGITUDE),
+    ]
+
+    with patch(
+        "homeassistant.util.dt.now", return_value=seven.replace(hour=9, minute=0)
+    ):
+        coordinator.data = await coordinator._async_update_data()
+
+    assert len(trace) == 0
+
+
+def test_location_without_fix_is_not_traced(hass: HomeAssistant) -> None:
+    """Test a student without a location of the bus adds nothing to learn."""
+    coordinator = _scheduled_coordinator(hass)
+    coordinator.arrivals = MagicMock()
+    student = StudentData(first_name="Alice", student_id="student1", bus_name="123")
+
+    coordinator._record_trace(TimeOfDay.AM, student)
+    coordinator._observe_arrivals("student1", TimeOfDay.AM, student)
+
+    assert not coordinator.traces
+    coordinator.arrivals.observe.assert_not_called()
+
+
+def test_forget_idle_buses(hass: HomeAssistant) -> None:
+    """Test the buses nobody rode for the retention are forgotten."""
+    coordinator = _scheduled_coordinator(hass)
+    dt_now = datetime(2024, 10, 31, 7, 30, tzinfo=UTC)
+    for bus_name, fetched_at in (
+        ("idle", dt_now - BUS_RETENTION - timedelta(minutes=1)),
+        ("recent", dt_now - BUS_RETENTION),
+    ):
+        coordinator.freshness[bus_name] = Freshness()
+        coordinator.freshness[bus_name].record_fetch(None, fetched_at)
+        coordinator.traces[bus_name] = RouteTrace()
+
+    coordinator._forget_idle_buses(dt_now)
+
+    assert list(coordinator.freshness) == ["recent"]
+    assert list(coordinator.traces) == ["recent"]
+
+
+def test_update_proximity_hysteresis(hass: HomeAssistant) -> None:
+    """Test the bus comes near within the radius and leaves a little further."""
+    coordinator = _scheduled_coordinator(hass)
+    student = StudentData(first_name="Alice", student_id="student1")
+
+    assert coordinator._update_proximity(student) == set()
+    assert student.bus_near is None
+
+    approach = [
+        (1110, False),
+        (600, False),
+        (500, True),
+        # within the exit distance the bus stays near.
+        (600, True),
+        (300, True),
+        (620, True),
+        (630, False),
+        (600, False),
+    ]
+    transitions = 0
+    for meters, near in approach:
+        student.stop_distance = meters
+        transitions += bool(coordinator._update_proximity(student))
+        assert student.bus_near is near
+
+    # None to False, False to True and True to False.
+    assert transitions == len(["unknown", "near", "away"])
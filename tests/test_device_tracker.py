@@ -1,22 +1,34 @@
 """Test the device tracker module."""
 
+from dataclasses import replace
+from datetime import UTC, datetime, timedelta
 from unittest.mock import AsyncMock, MagicMock, patch
 
-from homeassistant.core import HomeAssistant
+from freezegun.api import FrozenDateTimeFactory
+from homeassistant.core import HomeAssistant, SupportsResponse
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
 
+from custom_components.here_comes_the_bus.const import (
+    CONF_TRACKER_MIN_DISTANCE,
+    CONF_TRACKER_MIN_INTERVAL,
+)
 from custom_components.here_comes_the_bus.data import (
     StudentData,  # pylint: disable=import-outside-toplevel
 )
 from custom_components.here_comes_the_bus.device_tracker import (  # pylint: disable=import-outside-toplevel
     DEVICE_TRACKERS,
+    TRAILING_WRITE_DELAY,
     HCBTracker,
     async_setup_entry,
 )
+from custom_components.here_comes_the_bus.metrics import Freshness
+from custom_components.here_comes_the_bus.route_trace import RouteTrace
 
 
 async def test_device_tracker_setup_entry(hass: HomeAssistant) -> None:
     """Test the async_setup_entry function."""
     entry = MagicMock()
+    entry.data = {CONF_TRACKER_MIN_INTERVAL: 60, CONF_TRACKER_MIN_DISTANCE: 100}
     coordinator = MagicMock()
     coordinator.data = {
         "student1": StudentData(first_name="Alice", student_id="student1"),
@@ -25,7 +37,10 @@ async def test_device_tracker_setup_entry(hass: HomeAssistant) -> None:
     entry.runtime_data = MagicMock(coordinator=coordinator)
     async_add_entities = AsyncMock()
 
-    await async_setup_entry(hass, entry, async_add_entities)
+    with patch(
+        "homeassistant.helpers.entity_platform.async_get_current_platform"
+    ) as mock_platform:
+        await async_setup_entry(hass, entry, async_add_entities)
 
     # Convert the generator expression to a list before checking its length
     entities = list(async_add_entities.call_args[0][0])
@@ -33,6 +48,14 @@ async def test_device_tracker_setup_entry(hass: HomeAssistant) -> None:
     # Assert that async_add_entities was called with the expected device trackers
     assert async_add_entities.call_count == 1
     assert len(entities) == len(DEVICE_TRACKERS) * len(coordinator.data)
+    assert entities[0]._min_interval == timedelta(seconds=60)
+    assert entities[0]._min_distance == 100  # noqa: PLR2004
+    mock_platform.return_value.async_register_entity_service.assert_called_once_with(
+        "get_route_trace",
+        None,
+        "async_get_route_trace",
+        supports_response=SupportsResponse.ONLY,
+    )
 
 
 async def test_device_tracker_properties() -> None:
@@ -53,6 +76,9 @@ async def test_device_tracker_properties() -> None:
     assert tracker.latitude == student.latitude
     assert tracker.longitude == student.longitude
     assert tracker.location_accuracy == 100  # noqa: PLR2004
+    # the location is recorded, the attributes that never change are not.
+    assert "gps_accuracy" in tracker._unrecorded_attributes
+    assert "latitude" not in tracker._unrecorded_attributes
 
     # Test with empty coordinator data
     coordinator.data = {}
@@ -62,6 +88,8 @@ async def test_device_tracker_properties() -> None:
 
     # Test with coordinator data containing the student
     coordinator.data = {student.student_id: student}
+    coordinator.changes = {student.student_id: {"latitude"}}
+    coordinator.last_update_success = True
     with patch.object(tracker, "async_write_ha_state") as mock_write_state:
         tracker._handle_coordinator_update()
         mock_write_state.assert_called_once()
@@ -73,3 +101,157 @@ async def test_device_tracker_properties() -> None:
     with patch.object(tracker, "async_write_ha_state") as mock_write_state:
         tracker._handle_coordinator_update()
         mock_write_state.assert_not_called()
+
+
+async def test_device_tracker_records_write_delay() -> None:
+    """Test writing the state of a new fix records the delay since its fetch."""
+    coordinator = MagicMock()
+    freshness = Freshness()
+    log_time = datetime(2024, 10, 31, 7, 15, tzinfo=UTC)
+    freshness.record_fetch(log_time, log_time)
+    coordinator.freshness = {"Bus 123": freshness}
+    student = StudentData(first_name="Alice", student_id="student1", bus_name="Bus 123")
+    tracker = HCBTracker(coordinator, student, DEVICE_TRACKERS[0])
+
+    with patch("homeassistant.helpers.entity.Entity.async_write_ha_state"):
+        tracker.async_write_ha_state()
+        # the fix was written already.
+        tracker.async_write_ha_state()
+
+    assert freshness.write_delay.count == 1
+
+
+async def test_device_tracker_throttles_writes(
+    hass: HomeAssistant, freezer: FrozenDateTimeFactory
+) -> None:
+    """Test a location close in time or distance to the last one is held back."""
+    coordinator = MagicMock()
+    coordinator.freshness = {}
+    student = StudentData(
+        first_name="Alice", student_id="student1", latitude=37.7749, longitude=-122.4194
+    )
+    tracker = HCBTracker(
+        coordinator, student, DEVICE_TRACKERS[0], min_interval=60, min_distance=100
+    )
+    tracker.hass = hass
+
+    with patch(
+        "homeassistant.helpers.entity.Entity.async_write_ha_state"
+    ) as mock_write_state:
+        tracker.async_write_ha_state()
+        assert mock_write_state.call_count == 1
+
+        # a kilometer further, but within the interval.
+        tracker.student = replace(student, latitude=37.7849)
+        tracker.async_write_ha_state()
+        assert mock_write_state.call_count == 1
+
+        # written once the interval is over.
+        freezer.tick(timedelta(seconds=60))
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done()
+        assert mock_write_state.call_count == 2  # noqa: PLR2004
+
+        # a few meters further, after the interval.
+        freezer.tick(timedelta(seconds=60))
+        tracker.student = replace(student, latitude=37.7850)
+        tracker.async_write_ha_state()
+        assert mock_write_state.call_count == 2  # noqa: PLR2004
+
+        # the same location as the last written one is not held back.
+        tracker.student = replace(student, latitude=37.7849)
+        tracker.async_write_ha_state()
+        assert mock_write_state.call_count == 3  # noqa: PLR2004
+
+
+async def test_device_tracker_writes_last_close_location(
+    hass: HomeAssistant, freezer: FrozenDateTimeFactory
+) -> None:
+    """Test a location held back by the distance is written once the bus stops."""
+    coordinator = MagicMock()
+    coordinator.freshness = {}
+    student = StudentData(
+        first_name="Alice", student_id="student1", latitude=37.7749, longitude=-122.4194
+    )
+    tracker = HCBTracker(
+        coordinator, student, DEVICE_TRACKERS[0], min_interval=0, min_distance=100
+    )
+    tracker.hass = hass
+
+    with patch(
+        "homeassistant.helpers.entity.Entity.async_write_ha_state"
+    ) as mock_write_state:
+        tracker.async_write_ha_state()
+        # the bus stops a few meters further.
+        tracker.student = replace(student, latitude=37.7750)
+        tracker.async_write_ha_state()
+        assert mock_write_state.call_count == 1
+
+        freezer.tick(TRAILING_WRITE_DELAY)
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done()
+        assert mock_write_state.call_count == 2  # noqa: PLR2004
+        assert tracker._written_location == (37.7750, -122.4194)
+
+        # an unknown location is written at once.
+        tracker.student = replace(student, latitude=None, longitude=None)
+        tracker.async_write_ha_state()
+
+    assert mock_write_state.call_count == 3  # noqa: PLR2004
+    assert tracker._written_location == (None, None)
+
+
+async def test_device_tracker_cancels_held_back_write(
+    hass: HomeAssistant, freezer: FrozenDateTimeFactory
+) -> None:
+    """Test the write of a held back location is cancelled on removal."""
+    coordinator = MagicMock()
+    coordinator.freshness = {}
+    student = StudentData(
+        first_name="Alice", student_id="student1", latitude=37.7749, longitude=-122.4194
+    )
+    tracker = HCBTracker(coordinator, student, DEVICE_TRACKERS[0], min_interval=60)
+    tracker.hass = hass
+
+    with patch(
+        "homeassistant.helpers.entity.Entity.async_write_ha_state"
+    ) as mock_write_state:
+        tracker.async_write_ha_state()
+        tracker.student = replace(student, latitude=37.7849)
+        tracker.async_write_ha_state()
+        await tracker.async_will_remove_from_hass()
+
+        freezer.tick(timedelta(seconds=60))
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done()
+
+    mock_write_state.assert_called_once()
+
+
+async def test_device_tracker_route_trace() -> None:
+    """Test the service returns the route of the bus during its window."""
+    coordinator = MagicMock()
+    coordinator.traces = {}
+    student = StudentData(first_name="Alice", student_id="student1")
+    tracker = HCBTracker(coordinator, student, DEVICE_TRACKERS[0])
+
+    assert await tracker.async_get_route_trace() == {
+        "time_of_day_id": None,
+        "fixes": [],
+    }
+
+    tracker.student = replace(student, bus_name="Bus 123")
+    assert await tracker.async_get_route_trace() == {
+        "time_of_day_id": None,
+        "fixes": [],
+    }
+
+    trace = RouteTrace()
+    trace.time_of_day_id = "am"
+    trace.append(datetime(2024, 10, 31, 7, 15, tzinfo=UTC), 37.7749, -122.4194, 25, "N")
+    coordinator.traces["Bus 123"] = trace
+
+    assert await tracker.async_get_route_trace() == {
+        "time_of_day_id": "am",
+        "fixes": trace.as_list(),
+    }
@@ -0,0 +1,94 @@
+"""Test the diagnostics module."""
+
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from custom_components.here_comes_the_bus.const import CONF_SCHOOL_CODE
+from custom_components.here_comes_the_bus.coordinator import TimeOfDay
+from custom_components.here_comes_the_bus.data import FetchStatus, PollTimeouts
+from custom_components.here_comes_the_bus.diagnostics import (
+    async_get_config_entry_diagnostics,
+)
+from custom_components.here_comes_the_bus.metrics import (
+    Freshness,
+    ProcessingMetrics,
+    RequestMetrics,
+)
+
+
+async def test_config_entry_diagnostics(hass: HomeAssistant) -> None:
+    """Test the diagnostics show the status of every stop fetch."""
+    next_retry = datetime(2024, 10, 31, 7, 30)  # noqa: DTZ001
+    entry = MagicMock()
+    entry.data = {
+        CONF_SCHOOL_CODE: "school_code",
+        CONF_USERNAME: "test_user",
+        CONF_PASSWORD: "test_password",
+    }
+    entry.runtime_data.schedule_coordinator.fetch_status = {
+        ("student1", TimeOfDay.AM): FetchStatus(
+            attempts=2, last_error="No stops returned.", next_retry=next_retry
+        ),
+    }
+    metrics = RequestMetrics()
+    metrics.record("s1158", 0.2, 0.001, on_loop=True, size=100)
+    metrics.record_error("s1158")
+    entry.runtime_data.requests = metrics
+    entry.runtime_data.client.parse_in_executor = False
+    entry.runtime_data.coordinator.timeouts = PollTimeouts(
+        call_timeouts=2, budget_timeouts=1, budget_overruns=1
+    )
+    entry.runtime_data.coordinator.processing = ProcessingMetrics()
+    freshness = Freshness()
+    freshness.record_fetch(next_retry, next_retry)
+    entry.runtime_data.coordinator.freshness = {"Bus 123": freshness}
+    entry.runtime_data.schedule_coordinator.processing = ProcessingMetrics()
+    with entry.runtime_data.coordinator.processing.timed("update_vehicle_location"):
+        pass
+
+    diagnostics = await async_get_config_entry_diagnostics(hass, entry)
+
+    assert diagnostics["entry"] == {
+        CONF_SCHOOL_CODE: "school_code",
+        CONF_USERNAME: "**REDACTED**",
+        CONF_PASSWORD: "**REDACTED**",
+    }
+    assert diagnostics["stop_fetches"] == [
+        {
+            "student_id": "student1",
+            "time_of_day_id": TimeOfDay.AM,
+            "attempts": 2,
+            "last_error": "No stops returned.",
+            "last_success": None,
+            "next_retry": next_retry,
+        }
+    ]
+    assert diagnostics["parse_in_executor"] is False
+    latency = metrics.calls["s1158"].network.percentile(0.5)
+    assert diagnostics["api_calls"] == {
+        "s1158": {
+            "calls": 1,
+            "errors": 1,
+            "bytes_received": 100,
+            "network_total": 0.2,
+            "network_max": 0.2,
+            "network_p50": latency,
+            "network_p95": latency,
+            "network_p99": latency,
+            "parse_total": 0.001,
+            "parse_max": 0.001,
+            "slow_parses": 0,
+        }
+    }
+    assert diagnostics["location_timeouts"] == {
+        "call_timeouts": 2,
+        "budget_timeouts": 1,
+        "budget_overruns": 1,
+    }
+    assert list(diagnostics["processing"]) == ["update_vehicle_location"]
+    assert diagnostics["processing"]["update_vehicle_location"]["count"] == 1
+    assert diagnostics["freshness"] == {"Bus 123": freshness.as_dict()}
+    assert diagnostics["freshness"]["Bus 123"]["last_age"] == 0
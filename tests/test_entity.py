@@ -1,10 +1,15 @@
 """Tests the entitiy module."""
 
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from homeassistant.helpers.device_registry import DeviceEntryType
 
-from custom_components.here_comes_the_bus.const import BUS, DOMAIN, HERE_COMES_THE_BUS
+from custom_components.here_comes_the_bus.const import (
+    ATTR_STALE,
+    BUS,
+    DOMAIN,
+    HERE_COMES_THE_BUS,
+)
 from custom_components.here_comes_the_bus.data import StudentData
 from custom_components.here_comes_the_bus.entity import HCBEntity
 
@@ -25,3 +30,73 @@ async def test_hcb_entity_properties() -> None:
         "manufacturer": HERE_COMES_THE_BUS,
         "name": f"{student.first_name} {BUS}",
     }
+
+
+async def test_hcb_entity_skips_write_when_fields_unchanged() -> None:
+    """Test the state is only written when a field of the entity changed."""
+    coordinator = MagicMock()
+    student = StudentData(first_name="Alice", student_id="student1")
+    entity = HCBEntity(coordinator, student, MagicMock(key="test_sensor"))
+
+    coordinator.data = {student.student_id: student}
+    coordinator.changes = {}
+    coordinator.last_update_success = True
+    with patch.object(entity, "async_write_ha_state") as mock_write_state:
+        entity._handle_coordinator_update()
+        mock_write_state.assert_not_called()
+
+    coordinator.changes = {student.student_id: {"speed"}}
+    with patch.object(entity, "async_write_ha_state") as mock_write_state:
+        entity._handle_coordinator_update()
+        mock_write_state.assert_not_called()
+
+    coordinator.changes = {student.student_id: {"speed", "test_sensor"}}
+    with patch.object(entity, "async_write_ha_state") as mock_write_state:
+        entity._handle_coordinator_update()
+        mock_write_state.assert_called_once()
+
+
+async def test_hcb_entity_writes_when_availability_changes() -> None:
+    """Test the state is written when the coordinator fails or recovers."""
+    coordinator = MagicMock()
+    student = StudentData(first_name="Alice", student_id="student1")
+    entity = HCBEntity(coordinator, student, MagicMock(key="test_sensor"))
+    coordinator.data = {student.student_id: student}
+    coordinator.changes = {}
+
+    coordinator.last_update_success = False
+    with patch.object(entity, "async_write_ha_state") as mock_write_state:
+        entity._handle_coordinator_update()
+        entity._handle_coordinator_update()
+        mock_write_state.assert_called_once()
+
+    coordinator.last_update_success = True
+    with patch.object(entity, "async_write_ha_state") as mock_write_state:
+        entity._handle_coordinator_update()
+        entity._handle_coordinator_update()
+        mock_write_state.assert_called_once()
+
+
+async def test_hcb_entity_stale_attribute() -> None:
+    """Test the entity reports and writes when its data becomes stale."""
+    coordinator = MagicMock()
+    student = StudentData(first_name="Alice", student_id="student1")
+    entity = HCBEntity(coordinator, student, MagicMock(key="test_sensor"))
+    coordinator.data = {student.student_id: student}
+    coordinator.changes = {}
+    coordinator.last_update_success = True
+    coordinator.stale = set()
+
+    assert entity.extra_state_attributes == {ATTR_STALE: False}
+
+    coordinator.stale = {student.student_id}
+    with patch.object(entity, "async_write_ha_state") as mock_write_state:
+        entity._handle_coordinator_update()
+        entity._handle_coordinator_update()
+        mock_write_state.assert_called_once()
+    assert entity.extra_state_attributes == {ATTR_STALE: True}
+
+    coordinator.stale = set()
+    with patch.object(entity, "async_write_ha_state") as mock_write_state:
+        entity._handle_coordinator_update()
+        mock_write_state.assert_called_once()
@@ -0,0 +1,154 @@
+"""Tests for the Here Comes the Bus arrival estimates."""
+
+from datetime import time
+
+import pytest
+from homeassistant.util import dt as dt_util
+
+from custom_components.here_comes_the_bus.eta import (
+    AWAY_WEIGHT,
+    METERS_PER_SECOND_PER_MPH,
+    MIN_SPEED_MPH,
+    ROUTE_FACTOR,
+    TOWARDS_WEIGHT,
+    Eta,
+    distance_to_stop,
+    estimate_arrival,
+    heads_towards,
+)
+
+LATITUDE = 37.7749
+LONGITUDE = -122.4194
+STOP_LATITUDE = 37.7849
+STOP_LONGITUDE = -122.4194
+
+
+def test_distance_to_stop() -> None:
+    """Test the distance between the bus and the stop."""
+    assert distance_to_stop(
+        LATITUDE, LONGITUDE, STOP_LATITUDE, STOP_LONGITUDE
+    ) == pytest.approx(1112, rel=0.01)
+    assert distance_to_stop(None, LONGITUDE, STOP_LATITUDE, STOP_LONGITUDE) is None
+    assert distance_to_stop(LATITUDE, LONGITUDE, None, None) is None
+
+
+def test_heads_towards() -> None:
+    """Test the compass heading of the bus is compared with the stop's bearing."""
+    # the stop is north of the bus.
+    assert heads_towards("N", LATITUDE, LONGITUDE, STOP_LATITUDE, STOP_LONGITUDE)
+    assert heads_towards("ne", LATITUDE, LONGITUDE, STOP_LATITUDE, STOP_LONGITUDE)
+    assert not heads_towards("S", LATITUDE, LONGITUDE, STOP_LATITUDE, STOP_LONGITUDE)
+    assert not heads_towards("SW", LATITUDE, LONGITUDE, STOP_LATITUDE, STOP_LONGITUDE)
+    assert (
+        heads_towards("Up", LATITUDE, LONGITUDE, STOP_LATITUDE, STOP_LONGITUDE) is None
+    )
+    assert heads_towards("N", None, LONGITUDE, STOP_LATITUDE, STOP_LONGITUDE) is None
+
+
+def test_estimate_arrival_blends_distance_and_schedule() -> None:
+    """Test the time by distance is blended with the scheduled arrival."""
+    dt_now = dt_util.now().replace(hour=7, minute=0, second=0, microsecond=0)
+    meters = distance_to_stop(LATITUDE, LONGITUDE, STOP_LATITUDE, STOP_LONGITUDE)
+    assert meters is not None
+    by_distance = meters * ROUTE_FACTOR / (20 * METERS_PER_SECOND_PER_MPH)
+
+    def estimate(heading: str, speed: int = 20) -> Eta | None:
+        return estimate_arrival(
+            dt_now,
+            arrival_time=time(7, 10),
+            latitude=LATITUDE,
+            longitude=LONGITUDE,
+            speed=speed,
+            heading=heading,
+            stop_latitude=STOP_LATITUDE,
+            stop_longitude=STOP_LONGITUDE,
+        )
+
+    towards = estimate("N")
+    assert towards is not None
+    assert towards.meters == pytest.approx(meters)
+    assert towards.seconds == pytest.approx(
+        TOWARDS_WEIGHT * by_distance + (1 - TOWARDS_WEIGHT) * 600
+    )
+    away = estimate("S")
+    assert away is not None
+    assert away.seconds == pytest.approx(
+        AWAY_WEIGHT * by_distance + (1 - AWAY_WEIGHT) * 600
+    )
+    assert not towards.passed
+    assert not away.passed
+    # a waiting bus is assumed to crawl rather than never arrive.
+    waiting = estimate("N", speed=0)
+    assert waiting is not None
+    assert waiting.seconds == pytest.approx(
+        TOWARDS_WEIGHT * by_distance * 20 / MIN_SPEED_MPH + (1 - TOWARDS_WEIGHT) * 600
+    )
+
+
+def test_estimate_arrival_passed_stop() -> None:
+    """Test a bus heading away after the scheduled arrival has passed the stop."""
+    dt_now = dt_util.now().replace(hour=7, minute=15, second=0, microsecond=0)
+
+    def estimate(heading: str) -> Eta | None:
+        return estimate_arrival(
+            dt_now,
+            arrival_time=time(7, 10),
+            latitude=LATITUDE,
+            longitude=LONGITUDE,
+            speed=20,
+            heading=heading,
+            stop_latitude=STOP_LATITUDE,
+            stop_longitude=STOP_LONGITUDE,
+        )
+
+    away = estimate("S")
+    assert away is not None
+    assert away.passed
+    # a late bus on its way to the stop has not passed it.
+    towards = estimate("N")
+    assert towards is not None
+    assert not towards.passed
+
+
+def test_estimate_arrival_with_one_estimate() -> None:
+    """Test the distance or the schedule alone are used, or nothing."""
+    dt_now = dt_util.now().replace(hour=7, minute=0, second=0, microsecond=0)
+    meters = distance_to_stop(LATITUDE, LONGITUDE, STOP_LATITUDE, STOP_LONGITUDE)
+    assert meters is not None
+
+    assert estimate_arrival(
+        dt_now,
+        arrival_time=None,
+        latitude=LATITUDE,
+        longitude=LONGITUDE,
+        speed=25,
+        heading="S",
+        stop_latitude=STOP_LATITUDE,
+        stop_longitude=STOP_LONGITUDE,
+    ) == Eta(
+        pytest.approx(meters),
+        pytest.approx(meters * ROUTE_FACTOR / (25 * METERS_PER_SECOND_PER_MPH)),
+    )
+    assert estimate_arrival(
+        dt_now,
+        arrival_time=time(7, 10),
+        latitude=None,
+        longitude=None,
+        speed=None,
+        heading=None,
+        stop_latitude=STOP_LATITUDE,
+        stop_longitude=STOP_LONGITUDE,
+    ) == Eta(None, 600)
+    assert (
+        estimate_arrival(
+            dt_now,
+            arrival_time=None,
+            latitude=None,
+            longitude=None,
+            speed=None,
+            heading=None,
+            stop_latitude=None,
+            stop_longitude=None,
+        )
+        is None
+    )
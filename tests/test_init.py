@@ -1,6 +1,7 @@
 """Test the init module."""
 
 from collections.abc import Generator
+from functools import partial
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -9,17 +10,29 @@ from homeassistant.core import HomeAssistant
 
 from custom_components.here_comes_the_bus import (
     async_reload_entry,
+    async_remove_entry,
     async_setup_entry,
     async_unload_entry,
 )
+from custom_components.here_comes_the_bus.client import POOL_LIMIT
+from custom_components.here_comes_the_bus.const import (
+    CONF_PARSE_IN_EXECUTOR,
+    CONF_POOL_LIMIT_PER_HOST,
+)
 
 
 @pytest.fixture(autouse=True)
 def skip_first_refresh() -> Generator:
     """Skip the first refresh."""
-    with patch(
-        "custom_components.here_comes_the_bus.coordinator.HCBDataCoordinator.async_config_entry_first_refresh",
-        return_value=None,
+    with (
+        patch(
+            "custom_components.here_comes_the_bus.coordinator.HCBDataCoordinator.async_config_entry_first_refresh",
+            return_value=None,
+        ),
+        patch(
+            "custom_components.here_comes_the_bus.coordinator.HCBScheduleCoordinator.async_config_entry_first_refresh",
+            return_value=None,
+        ),
     ):
         yield
 
@@ -27,6 +40,7 @@ def skip_first_refresh() -> Generator:
 async def test_async_setup_entry(hass: HomeAssistant) -> None:
     """Test the async_setup_entry function."""
     entry = MagicMock()
+    entry.data = {CONF_PARSE_IN_EXECUTOR: True, CONF_POOL_LIMIT_PER_HOST: 2}
     hass.config_entries.async_forward_entry_setups = AsyncMock()
     entry.add_update_listener = MagicMock()
 
@@ -34,11 +48,17 @@ async def test_async_setup_entry(hass: HomeAssistant) -> None:
         patch(
             "custom_components.here_comes_the_bus.HCBDataCoordinator"
         ) as mock_coordinator,
+        patch(
+            "custom_components.here_comes_the_bus.HCBScheduleCoordinator"
+        ) as mock_schedule_coordinator,
         patch(
             "custom_components.here_comes_the_bus.async_get_loaded_integration"
         ) as mock_get_loaded_integration,
-        patch("custom_components.here_comes_the_bus.HcbSoapClient") as mock_client,
+        patch(
+            "custom_components.here_comes_the_bus.async_get_client_registry"
+        ) as mock_registry,
     ):
+        mock_client = mock_registry.return_value.async_acquire
         # Mock the client methods
         mock_client.return_value.get_school_id = AsyncMock(return_value="school_id")
         mock_client.return_value.get_parent_info = AsyncMock(
@@ -65,22 +85,45 @@ async def test_async_setup_entry(hass: HomeAssistant) -> None:
             )
         )
         mock_coordinator.return_value.async_config_entry_first_refresh = AsyncMock()
+        mock_schedule_coordinator.return_value.async_config_entry_first_refresh = (
+            AsyncMock()
+        )
         mock_get_loaded_integration.return_value = MagicMock()
         result = await async_setup_entry(hass, entry)
         assert result is True
         mock_coordinator.return_value.async_config_entry_first_refresh.assert_called_once()
+        mock_schedule_coordinator.return_value.async_config_entry_first_refresh.assert_called_once()
+        mock_coordinator.assert_called_once_with(
+            hass, entry, mock_schedule_coordinator.return_value
+        )
         hass.config_entries.async_forward_entry_setups.assert_called_once_with(
             entry, [Platform.BINARY_SENSOR, Platform.DEVICE_TRACKER, Platform.SENSOR]
         )
         entry.add_update_listener.assert_called_once_with(async_reload_entry)
+        # the shared client is released together with the entry
+        assert entry.runtime_data.client is mock_client.return_value
+        mock_client.assert_called_once_with(
+            parse_in_executor=True, capture=False, limit=POOL_LIMIT, limit_per_host=2
+        )
+        release = next(
+            call.args[0]
+            for call in entry.async_on_unload.call_args_list
+            if isinstance(call.args[0], partial)
+        )
+        assert release.func is mock_registry.return_value.async_release
+        assert release.keywords == {"parse_in_executor": True, "capture": False}
 
 
 async def test_async_unload_entry(hass: HomeAssistant) -> None:
     """Test the async_unload_entry function."""
     entry = MagicMock()
+    arrivals = entry.runtime_data.coordinator.arrivals
+    arrivals.async_save = AsyncMock()
     hass.config_entries.async_unload_platforms = AsyncMock(return_value=True)
     result = await async_unload_entry(hass, entry)
     assert result is True
+    # the learned arrivals are saved without waiting for the delay.
+    arrivals.async_save.assert_awaited_once()
     hass.config_entries.async_unload_platforms.assert_awaited_once_with(
         entry, [Platform.BINARY_SENSOR, Platform.DEVICE_TRACKER, Platform.SENSOR]
     )
@@ -92,3 +135,19 @@ async def test_async_reload_entry(hass: HomeAssistant) -> None:
     hass.config_entries.async_reload = AsyncMock()
     await async_reload_entry(hass, entry)
     hass.config_entries.async_reload.assert_awaited_once_with(entry.entry_id)
+
+
+async def test_async_remove_entry(hass: HomeAssistant) -> None:
+    """Test the async_remove_entry function removes the cache and arrivals."""
+    entry = MagicMock(entry_id="entry_id")
+    with (
+        patch(
+            "custom_components.here_comes_the_bus.HCBCache.async_remove"
+        ) as mock_remove,
+        patch(
+            "custom_components.here_comes_the_bus.ArrivalModel.async_remove"
+        ) as mock_remove_arrivals,
+    ):
+        await async_remove_entry(hass, entry)
+    mock_remove.assert_awaited_once()
+    mock_remove_arrivals.assert_awaited_once()
@@ -0,0 +1,264 @@
+"""Load tests of the integration against the local HCB api stand-in."""
+
+import asyncio
+from collections import Counter
+from collections.abc import AsyncGenerator
+from datetime import datetime, time, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from custom_components.here_comes_the_bus.client import (
+    POOL_LIMIT_PER_HOST,
+    HCBClient,
+    async_get_client_registry,
+)
+from custom_components.here_comes_the_bus.coordinator import (
+    RETRY_MAX_DELAY,
+    HCBDataCoordinator,
+    HCBScheduleCoordinator,
+    TimeOfDay,
+)
+
+from .common import frozen, mock_config_entry
+from .fake_hcb_server import (
+    PARENT_INFO_METHOD,
+    SCHOOL_ID_METHOD,
+    STOP_INFO_METHOD,
+    FakeAccount,
+    FakeHCBServer,
+    FakeStop,
+    FakeStudent,
+    FaultWindow,
+    TrackPoint,
+)
+
+# the api stand-in listens on a local port.
+pytestmark = pytest.mark.usefixtures("socket_enabled")
+
+ENTRIES = 10
+STUDENTS = 4
+POLLS = 3
+RETRIES = 10
+TRACK_POINTS = 10
+SPEED = 25
+
+
+def _household(index: int) -> FakeAccount:
+    """Return an account whose students ride the bus in the AM and PM."""
+    return FakeAccount(
+        parent_id=f"parent{index}",
+        username=f"user{index}",
+        password="password",  # noqa: S106
+        students=[
+            FakeStudent(
+                student_id=f"student{index}-{number}",
+                first_name=f"Student {number}",
+                stops={
+                    TimeOfDay.AM: [
+                        FakeStop("Stop", time(7, 0), time(7, 20), 37.7649, -122.4094),
+                        FakeStop("School", time(7, 30), time(7, 45)),
+                    ],
+                    TimeOfDay.PM: [
+                        FakeStop("School", time(15, 0), time(15, 0)),
+                        FakeStop(
+                            "Stop", time(15, 20), time(15, 40), 37.7649, -122.4094
+                        ),
+                    ],
+                },
+                track=[
+                    TrackPoint(37.70 + point / 100, -122.40, speed=SPEED)
+                    for point in range(TRACK_POINTS)
+                ],
+            )
+            for number in range(STUDENTS)
+        ],
+    )
+
+
+def _config_entry(index: int, client: HCBClient) -> MagicMock:
+    """Return the config entry of a household."""
+    return mock_config_entry(
+        f"entry{index}",
+        client,
+        username=f"user{index}",
+        password="password",  # noqa: S106
+    )
+
+
+def _today(hour: int, minute: int) -> datetime:
+    """Return a time on a school day."""
+    return datetime(2024, 10, 30, hour, minute, tzinfo=dt_util.get_default_time_zone())
+
+
+async def _async_setup(
+    hass: HomeAssistant, config_entry: MagicMock
+) -> HCBDataCoordinator:
+    """Set up the coordinators of an entry the way the integration does."""
+    schedule = HCBScheduleCoordinator(hass, config_entry)
+    await schedule.async_config_entry_first_refresh()
+    coordinator = HCBDataCoordinator(hass, config_entry, schedule)
+    await coordinator.async_config_entry_first_refresh()
+    return coordinator
+
+
+@pytest.fixture
+async def client(hass: HomeAssistant) -> AsyncGenerator[HCBClient]:
+    """Return the shared client with its pooled session."""
+    registry = async_get_client_registry(hass)
+    yield registry.async_acquire()
+    await registry.async_release()
+
+
+async def test_load_many_entries(hass: HomeAssistant, client: HCBClient) -> None:
+    """Test many households polling at once share the pooled connections."""
+    accounts = [_household(index) for index in range(ENTRIES)]
+    async with FakeHCBServer(accounts=accounts) as server:
+        client._url = server.url
+        with frozen(_today(7, 15)):
+            coordinators = await asyncio.gather(
+                *(
+                    _async_setup(hass, _config_entry(index, client))
+                    for index in range(ENTRIES)
+                )
+            )
+            for _ in range(POLLS):
+                await asyncio.gather(
+                    *(coordinator.async_refresh() for coordinator in coordinators)
+                )
+
+    # the schedule fetches the AM and PM stops, the location only the AM.
+    stop_requests = ENTRIES * STUDENTS * (2 + 1 + POLLS)
+    assert server.requests == Counter(
+        {
+            SCHOOL_ID_METHOD: ENTRIES,
+            PARENT_INFO_METHOD: ENTRIES,
+            STOP_INFO_METHOD: stop_requests,
+        }
+    )
+    assert not server.failures
+    assert server.peak_in_flight <= POOL_LIMIT_PER_HOST
+    assert len(server.peers) <= POOL_LIMIT_PER_HOST
+    # every stop request moved the bus one point along the track.
+    latitude = accounts[0].students[0].track[POLLS + 1].latitude
+    for coordinator in coordinators:
+        assert coordinator.last_update_success
+        assert len(coordinator.data) == STUDENTS
+        for student_data in coordinator.data.values():
+            assert student_data.am_stop_arrival_time == time(7, 20)
+            assert student_data.pm_stop_arrival_time == time(15, 40)
+            assert student_data.latitude == latitude
+            assert student_data.speed == SPEED
+
+
+async def test_load_slow_upstream(hass: HomeAssistant, client: HCBClient) -> None:
+    """Test a slow api is not hit with more requests than the pool allows."""
+    accounts = [_household(index) for index in range(ENTRIES)]
+    async with FakeHCBServer(accounts=accounts, latency=0.02, jitter=0.02) as server:
+        client._url = server.url
+        with frozen(_today(7, 15)):
+            coordinators = await asyncio.gather(
+                *(
+                    _async_setup(hass, _config_entry(index, client))
+                    for index in range(ENTRIES)
+                )
+            )
+            await asyncio.gather(
+                *(coordinator.async_refresh() for coordinator in coordinators)
+            )
+
+    assert server.peak_in_flight <= POOL_LIMIT_PER_HOST
+    assert all(coordinator.last_update_success for coordinator in coordinators)
+    assert client.metrics.calls[STOP_INFO_METHOD].network_max >= 0.02  # noqa: PLR2004
+
+
+async def test_load_fault_window(hass: HomeAssistant, client: HCBClient) -> None:
+    """Test the locations survive a window during which the api fails."""
+    accounts = [_household(index) for index in range(ENTRIES)]
+    async with FakeHCBServer(
+        accounts=accounts,
+        fault_windows=[FaultWindow(time(7, 20), time(7, 40))],
+        fault_methods={STOP_INFO_METHOD},
+    ) as server:
+        client._url = server.url
+        with frozen(_today(7, 15)):
+            coordinators = await asyncio.gather(
+                *(
+                    _async_setup(hass, _config_entry(index, client))
+                    for index in range(ENTRIES)
+                )
+            )
+        latitudes = [
+            {
+                student_id: student_data.latitude
+                for student_id, student_data in coordinator.data.items()
+            }
+            for coordinator in coordinators
+        ]
+
+        with frozen(_today(7, 25)):
+            await asyncio.gather(
+                *(coordinator.async_refresh() for coordinator in coordinators)
+            )
+        assert server.failures[STOP_INFO_METHOD] == ENTRIES * STUDENTS
+        for coordinator, latitude in zip(coordinators, latitudes, strict=True):
+            assert not coordinator.last_update_success
+            # the last known location is kept.
+            assert {
+                student_id: student_data.latitude
+                for student_id, student_data in coordinator.data.items()
+            } == latitude
+
+        with frozen(_today(7, 45)):
+            await asyncio.gather(
+                *(coordinator.async_refresh() for coordinator in coordinators)
+            )
+        assert all(coordinator.last_update_success for coordinator in coordinators)
+
+
+async def test_load_flaky_upstream_recovers(
+    hass: HomeAssistant, client: HCBClient
+) -> None:
+    """Test stop fetches that fail at random are retried until they succeed."""
+    accounts = [_household(index) for index in range(ENTRIES)]
+    async with FakeHCBServer(
+        accounts=accounts,
+        error_rate=0.3,
+        fault_methods={STOP_INFO_METHOD},
+        seed=1,
+    ) as server:
+        client._url = server.url
+        dt_now = _today(6, 0)
+        schedules = [
+            HCBScheduleCoordinator(hass, _config_entry(index, client))
+            for index in range(ENTRIES)
+        ]
+        with frozen(dt_now):
+            await asyncio.gather(
+                *(schedule.async_config_entry_first_refresh() for schedule in schedules)
+            )
+        assert server.failures[STOP_INFO_METHOD]
+
+        for _ in range(RETRIES):
+            # only the schedules with failed stops refresh before the interval.
+            retrying = [
+                schedule
+                for schedule in schedules
+                if any(status.next_retry for status in schedule.fetch_status.values())
+            ]
+            if not retrying:
+                break
+            # every backoff is over after the maximum delay.
+            dt_now += RETRY_MAX_DELAY + timedelta(seconds=1)
+            with frozen(dt_now):
+                await asyncio.gather(
+                    *(schedule.async_refresh() for schedule in retrying)
+                )
+
+    for schedule in schedules:
+        assert not any(status.attempts for status in schedule.fetch_status.values())
+        for student_data in schedule.data.values():
+            assert student_data.am_stop_arrival_time == time(7, 20)
+            assert student_data.pm_stop_arrival_time == time(15, 40)
@@ -0,0 +1,119 @@
+"""Tests of the metrics of the api calls and of processing their responses."""
+
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from custom_components.here_comes_the_bus.metrics import (
+    FRESHNESS_SAMPLES,
+    HISTOGRAM_BUCKETS,
+    HISTOGRAM_FIRST_BUCKET,
+    HISTOGRAM_GROWTH,
+    Freshness,
+    Histogram,
+    ProcessingMetrics,
+    RollingHistogram,
+)
+
+
+def test_histogram_percentiles() -> None:
+    """Test a percentile is the upper bound of its bucket, a fifth off at most."""
+    histogram = Histogram()
+    for milliseconds in range(1, 101):
+        histogram.add(milliseconds / 1000)
+
+    assert histogram.count == len(range(1, 101))
+    for quantile, seconds in ((0.5, 0.05), (0.95, 0.095), (0.99, 0.099)):
+        percentile = histogram.percentile(quantile)
+        assert percentile is not None
+        assert seconds <= percentile <= seconds * HISTOGRAM_GROWTH
+    assert histogram.percentiles("network_") == {
+        "network_p50": histogram.percentile(0.5),
+        "network_p95": histogram.percentile(0.95),
+        "network_p99": histogram.percentile(0.99),
+    }
+
+
+def test_histogram_bounds() -> None:
+    """Test the durations outside of the buckets are counted in the first or last."""
+    histogram = Histogram()
+    assert histogram.percentile(0.5) is None
+
+    histogram.add(0)
+    assert histogram.percentile(0.5) == HISTOGRAM_FIRST_BUCKET
+    histogram.add(3600)
+    assert histogram.counts[-1] == 1
+    assert histogram.percentile(1) == pytest.approx(
+        HISTOGRAM_FIRST_BUCKET * HISTOGRAM_GROWTH ** (HISTOGRAM_BUCKETS - 1)
+    )
+    assert len(histogram.counts) == HISTOGRAM_BUCKETS
+
+
+def test_processing_metrics() -> None:
+    """Test the steps are timed, also when they raise."""
+    processing = ProcessingMetrics()
+
+    with processing.timed("update_stops"):
+        pass
+
+    def _failing_step() -> None:
+        with processing.timed("update_stops"):
+            msg = "error"
+            raise ValueError(msg)
+
+    with pytest.raises(ValueError, match="error"):
+        _failing_step()
+
+    durations = processing.as_dict()["update_stops"]
+    assert durations["count"] == len(["pass", "raise"])
+    assert durations["max"] >= 0
+    assert set(durations) == {"count", "total", "max", "p50", "p95", "p99"}
+
+
+def test_rolling_histogram_forgets_the_oldest() -> None:
+    """Test only the latest durations are counted."""
+    histogram = RollingHistogram()
+    for _ in range(FRESHNESS_SAMPLES):
+        histogram.add(1000)
+    for _ in range(FRESHNESS_SAMPLES):
+        histogram.add(1)
+
+    assert histogram.count == FRESHNESS_SAMPLES
+    assert sum(histogram.counts) == FRESHNESS_SAMPLES
+    percentile = histogram.percentile(0.99)
+    assert percentile is not None
+    assert 1 <= percentile <= HISTOGRAM_GROWTH
+
+
+def test_freshness() -> None:
+    """Test the ages of the fixes, the write delay and the time between fixes."""
+    freshness = Freshness()
+    log_time = datetime(2024, 10, 31, 7, 15, tzinfo=UTC)
+
+    freshness.record_fetch(None, log_time)
+    freshness.record_write()
+    assert freshness.fix_age.count == 0
+    assert freshness.write_delay.count == 0
+
+    freshness.record_fetch(log_time, log_time + timedelta(seconds=5))
+    freshness.record_fetch(log_time, log_time + timedelta(seconds=35))
+    freshness.record_write()
+    freshness.record_write()
+    freshness.record_fetch(
+        log_time + timedelta(seconds=60), log_time + timedelta(seconds=65)
+    )
+
+    assert freshness.fix_age.count == len([5, 35, 5])
+    assert freshness.last_age == 5  # noqa: PLR2004
+    assert freshness.fetched_at == log_time + timedelta(seconds=65)
+    # the same fix fetched again is written once and counted once.
+    assert freshness.write_delay.count == 1
+    assert freshness.fix_interval.count == 1
+    assert set(freshness.as_dict()) == {
+        "last_age",
+        *(
+            f"{histogram}_{percentile}"
+            for histogram in ("fix_age", "write_delay", "fix_interval")
+            for percentile in ("p50", "p95", "p99")
+        ),
+    }
@@ -0,0 +1,146 @@
+"""Tests of replaying a captured session through the coordinators."""
+
+import asyncio
+from datetime import datetime, time
+from pathlib import Path
+
+import pytest
+from hcb_soap_client.hcb_soap_client import HcbApiError
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from custom_components.here_comes_the_bus.capture import load_capture
+from custom_components.here_comes_the_bus.client import HCBClient, HCBClientRegistry
+from custom_components.here_comes_the_bus.coordinator import (
+    HCBDataCoordinator,
+    HCBScheduleCoordinator,
+    TimeOfDay,
+)
+
+from .common import frozen, mock_config_entry
+from .fake_hcb_server import (
+    FakeAccount,
+    FakeHCBServer,
+    FakeStop,
+    FakeStudent,
+    TrackPoint,
+)
+from .replay import ReplayClient, async_replay
+
+MINUTES = [15, 16, 17]
+SPEED = 6000
+
+
+def _account() -> FakeAccount:
+    """Return an account whose students ride the bus in the AM."""
+    return FakeAccount(
+        parent_id="parent_id",
+        username="test_user",
+        password="test_password",  # noqa: S106
+        students=[
+            FakeStudent(
+                student_id=f"student{number}",
+                first_name=f"Student {number}",
+                stops={
+                    TimeOfDay.AM: [
+                        FakeStop("Stop", time(7, 0), time(7, 20), 37.7649, -122.4094),
+                        FakeStop("School", time(7, 30), time(7, 45)),
+                    ],
+                },
+                track=[
+                    TrackPoint(37.70 + point / 100 + number, -122.40, speed=25)
+                    for point in range(10)
+                ],
+            )
+            for number in range(2)
+        ],
+    )
+
+
+def _today(minute: int) -> datetime:
+    """Return a time during the AM window of a school day."""
+    return datetime(2024, 10, 30, 7, minute, tzinfo=dt_util.get_default_time_zone())
+
+
+def _locations(coordinator: HCBDataCoordinator) -> dict[str, float | None]:
+    """Return the latitude of the bus of every student."""
+    return {
+        student_id: student_data.latitude
+        for student_id, student_data in coordinator.data.items()
+    }
+
+
+async def _async_capture(
+    hass: HomeAssistant, path: Path
+) -> list[dict[str, float | None]]:
+    """Capture a session against the stand-in, returning the locations seen."""
+    registry = HCBClientRegistry(capture_path=path)
+    client: HCBClient = registry.async_acquire(capture=True)
+    config_entry = mock_config_entry("entry_id")
+    config_entry.runtime_data.client = client
+    locations = []
+    async with FakeHCBServer(accounts=[_account()]) as server:
+        client._url = server.url
+        for index, minute in enumerate(MINUTES):
+            dt_now = _today(minute)
+            with frozen(dt_now):
+                if index == 0:
+                    schedule = HCBScheduleCoordinator(hass, config_entry)
+                    await schedule.async_config_entry_first_refresh()
+                    coordinator = HCBDataCoordinator(hass, config_entry, schedule)
+                    await coordinator.async_config_entry_first_refresh()
+                else:
+                    await coordinator.async_refresh()
+            locations.append(_locations(coordinator))
+    await registry.async_release(capture=True)
+    return locations
+
+
+@pytest.mark.usefixtures("socket_enabled")
+async def test_replay_matches_capture(hass: HomeAssistant, tmp_path: Path) -> None:
+    """Test the replay of a session sees the locations of the session."""
+    path = tmp_path / "capture.jsonl.gz"
+    captured = await _async_capture(hass, path)
+
+    replayed = [
+        _locations(coordinator)
+        async for coordinator in async_replay(
+            hass, mock_config_entry("replay"), load_capture(path)
+        )
+    ]
+
+    assert replayed == captured
+    # the bus moved on every poll.
+    assert len({location["student0"] for location in replayed}) == len(MINUTES)
+
+
+@pytest.mark.usefixtures("socket_enabled")
+async def test_replay_speed(hass: HomeAssistant, tmp_path: Path) -> None:
+    """Test the replay waits the captured delay divided by the speed."""
+    path = tmp_path / "capture.jsonl.gz"
+    await _async_capture(hass, path)
+    loop = asyncio.get_running_loop()
+
+    start = loop.time()
+    polls = [
+        coordinator.last_update_success
+        async for coordinator in async_replay(
+            hass, mock_config_entry("replay"), load_capture(path), speed=SPEED
+        )
+    ]
+
+    assert polls == [True] * len(MINUTES)
+    delay = (MINUTES[-1] - MINUTES[0]) * 60 / SPEED
+    assert loop.time() - start >= delay
+
+
+async def test_replay_missing_response(hass: HomeAssistant) -> None:
+    """Test a request that was not captured fails like the api."""
+    client = ReplayClient([])
+
+    with pytest.raises(HcbApiError):
+        await client.get_stop_info("school_id", "parent_id", "student1", "am")
+    assert [
+        coordinator
+        async for coordinator in async_replay(hass, mock_config_entry("replay"), [])
+    ] == []
@@ -0,0 +1,63 @@
+"""Tests of the route trace of a bus."""
+
+from datetime import UTC, datetime, timedelta
+
+from homeassistant.util import dt as dt_util
+
+from custom_components.here_comes_the_bus.route_trace import RouteTrace
+
+LOG_TIME = datetime(2024, 10, 31, 7, 15, tzinfo=UTC)
+LATITUDE = 37.7749
+LONGITUDE = -122.4194
+
+
+def test_append_drops_repeated_fixes() -> None:
+    """Test a fix repeating the time or the position of the last one is dropped."""
+    trace = RouteTrace()
+
+    assert trace.append(LOG_TIME, LATITUDE, LONGITUDE, 25, "N")
+    # the same fix fetched again.
+    assert not trace.append(LOG_TIME, LATITUDE + 0.001, LONGITUDE, 25, "N")
+    # the bus waits at the same place.
+    assert not trace.append(
+        LOG_TIME + timedelta(seconds=10), LATITUDE, LONGITUDE, 25, "N"
+    )
+    assert trace.append(LOG_TIME + timedelta(seconds=20), LATITUDE, LONGITUDE, 0, "n")
+    assert trace.append(
+        LOG_TIME + timedelta(seconds=30), LATITUDE, LONGITUDE, None, None
+    )
+
+    assert len(trace) == len(["25 mph", "0 mph", "unknown"])
+    assert trace.as_list() == [
+        {
+            "log_time": dt_util.as_local(
+                LOG_TIME + timedelta(seconds=seconds)
+            ).isoformat(),
+            "latitude": LATITUDE,
+            "longitude": LONGITUDE,
+            "speed": speed,
+            "heading": heading,
+        }
+        for seconds, speed, heading in ((0, 25, "N"), (20, 0, "N"), (30, None, None))
+    ]
+
+
+def test_append_overwrites_the_oldest() -> None:
+    """Test a full trace keeps the latest fixes, oldest first."""
+    trace = RouteTrace(capacity=3)
+
+    for step in range(5):
+        trace.append(
+            LOG_TIME + timedelta(seconds=step), LATITUDE + step, LONGITUDE, 25, "N"
+        )
+
+    assert len(trace) == trace.capacity
+    assert trace.coordinates() == [(LATITUDE + step, LONGITUDE) for step in range(2, 5)]
+
+    trace.time_of_day_id = "am"
+    trace.clear()
+    assert len(trace) == 0
+    assert trace.time_of_day_id is None
+    assert trace.as_list() == []
+    assert trace.append(LOG_TIME, LATITUDE, LONGITUDE, 25, "N")
+    assert trace.coordinates() == [(LATITUDE, LONGITUDE)]
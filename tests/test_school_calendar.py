@@ -0,0 +1,243 @@
+"""Tests of the school calendar."""
+
+import logging
+from datetime import date, datetime, time
+from pathlib import Path
+
+import pytest
+from homeassistant.core import HomeAssistant, ServiceCall, SupportsResponse
+from homeassistant.util import dt as dt_util
+
+from custom_components.here_comes_the_bus.const import DEFAULT_EARLY_RELEASE_KEYWORD
+from custom_components.here_comes_the_bus.school_calendar import (
+    ALL_DAY_DISMISSAL,
+    SchoolCalendar,
+    parse_ics,
+)
+
+DAYS = 8
+KEYWORD = DEFAULT_EARLY_RELEASE_KEYWORD
+
+ICS = """BEGIN:VCALENDAR
+VERSION:2.0
+BEGIN:VEVENT
+SUMMARY:Thanksgiving
+  Break
+DTSTART;VALUE=DATE:20241128
+DTEND;VALUE=DATE:20241130
+END:VEVENT
+BEGIN:VEVENT
+SUMMARY:Early Release
+DTSTART;TZID=America/Los_Angeles:20241126T123000
+DTEND;TZID=America/Los_Angeles:20241126T130000
+END:VEVENT
+BEGIN:VEVENT
+SUMMARY:Staff Development
+DTSTART;VALUE=DATE:20241202
+END:VEVENT
+BEGIN:VEVENT
+SUMMARY:PTA Meeting
+DTSTART;TZID=America/Los_Angeles:20241127T190000
+DTEND;TZID=America/Los_Angeles:20241127T200000
+END:VEVENT
+BEGIN:VTODO
+DTSTART;VALUE=DATE:20241127
+END:VTODO
+END:VCALENDAR
+"""
+
+
+def test_parse_ics() -> None:
+    """Test the events of an ICS file are read."""
+    time_zone = dt_util.get_time_zone("America/Los_Angeles")
+
+    assert parse_ics(ICS) == [
+        (date(2024, 11, 28), date(2024, 11, 30), "Thanksgiving Break"),
+        (
+            datetime(2024, 11, 26, 12, 30, tzinfo=time_zone),
+            datetime(2024, 11, 26, 13, 0, tzinfo=time_zone),
+            "Early Release",
+        ),
+        # an all day event without an end lasts one day.
+        (date(2024, 12, 2), date(2024, 12, 3), "Staff Development"),
+        (
+            datetime(2024, 11, 27, 19, 0, tzinfo=time_zone),
+            datetime(2024, 11, 27, 20, 0, tzinfo=time_zone),
+            "PTA Meeting",
+        ),
+    ]
+    assert parse_ics("BEGIN:VEVENT\nDTSTART:20241126T203000Z\nEND:VEVENT\n") == [
+        (
+            datetime(2024, 11, 26, 20, 30, tzinfo=dt_util.UTC),
+            datetime(2024, 11, 26, 20, 30, tzinfo=dt_util.UTC),
+            "",
+        )
+    ]
+
+
+async def test_index_file(hass: HomeAssistant, tmp_path: Path) -> None:
+    """Test the ICS file is indexed once a day."""
+    await hass.config.async_set_time_zone("America/Los_Angeles")
+    hass.config.config_dir = str(tmp_path)
+    path = tmp_path / "school.ics"
+    path.write_text(ICS)
+    calendar = SchoolCalendar(hass, "school.ics", KEYWORD)
+
+    await calendar.async_index(date(2024, 11, 25), DAYS)
+
+    assert not calendar.is_closed(date(2024, 11, 27))
+    assert calendar.is_closed(date(2024, 11, 28))
+    assert calendar.is_closed(date(2024, 11, 29))
+    assert calendar.is_closed(date(2024, 12, 2))
+    assert calendar.dismissal(date(2024, 11, 26)) == time(12, 30)
+    # an evening meeting is not an early release.
+    assert calendar.dismissal(date(2024, 11, 27)) is None
+
+    # the same day is not read again.
+    path.write_text("")
+    await calendar.async_index(date(2024, 11, 25), DAYS)
+    assert calendar.is_closed(date(2024, 11, 28))
+
+    await calendar.async_index(date(2024, 11, 26), DAYS)
+    assert not calendar.is_closed(date(2024, 11, 28))
+
+
+DISTRICT_ICS = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+SUMMARY:Thanksgiving Break
+DTSTART;VALUE=DATE:20241128
+DTEND;VALUE=DATE:20241130
+END:VEVENT
+BEGIN:VEVENT
+SUMMARY:Minimum Day - Early Release
+DTSTART;VALUE=DATE:20241126
+END:VEVENT
+BEGIN:VEVENT
+SUMMARY:Picture Day
+DTSTART;VALUE=DATE:20241127
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+@pytest.mark.parametrize(
+    ("closure_keywords", "closed"),
+    [("", {27, 28, 29}), ("break, No School", {28, 29})],
+)
+async def test_index_all_day_events(
+    hass: HomeAssistant, tmp_path: Path, closure_keywords: str, closed: set[int]
+) -> None:
+    """Test the all day events close the school, or those with a closure keyword."""
+    await hass.config.async_set_time_zone("America/Los_Angeles")
+    hass.config.config_dir = str(tmp_path)
+    (tmp_path / "school.ics").write_text(DISTRICT_ICS)
+    calendar = SchoolCalendar(hass, "school.ics", KEYWORD, closure_keywords)
+
+    await calendar.async_index(date(2024, 11, 25), DAYS)
+
+    # an all day early release is not a closure.
+    assert not calendar.is_closed(date(2024, 11, 26))
+    assert calendar.dismissal(date(2024, 11, 26)) == ALL_DAY_DISMISSAL
+    # a picture day only closes the school without closure keywords.
+    assert {
+        day for day in range(25, 31) if calendar.is_closed(date(2024, 11, day))
+    } == closed
+
+
+async def test_index_entity(hass: HomeAssistant) -> None:
+    """Test the events of a calendar entity are indexed once a day."""
+    await hass.config.async_set_time_zone("America/Los_Angeles")
+    calls: list[ServiceCall] = []
+
+    async def _get_events(call: ServiceCall) -> dict:
+        calls.append(call)
+        return {
+            "calendar.school": {
+                "events": [
+                    {"start": "2024-11-28", "end": "2024-11-30", "summary": "Break"},
+                    {
+                        "start": "2024-11-26T12:30:00-08:00",
+                        "end": "2024-11-26T13:00:00-08:00",
+                        "summary": "Early Release",
+                    },
+                    {
+                        "start": "2024-11-27T19:00:00-08:00",
+                        "end": "2024-11-27T20:00:00-08:00",
+                        "summary": "PTA Meeting",
+                    },
+                    # a time without a zone is in the zone of Home Assistant.
+                    {
+                        "start": "2024-12-02 11:45:00",
+                        "end": "2024-12-02 12:15:00",
+                        "summary": "Early Release",
+                    },
+                ]
+            }
+        }
+
+    hass.services.async_register(
+        "calendar", "get_events", _get_events, supports_response=SupportsResponse.ONLY
+    )
+    calendar = SchoolCalendar(hass, "calendar.school", KEYWORD)
+
+    await calendar.async_index(date(2024, 11, 25), DAYS)
+    await calendar.async_index(date(2024, 11, 25), DAYS)
+
+    assert len(calls) == 1
+    assert calls[0].data["entity_id"] == "calendar.school"
+    assert calls[0].data["start_date_time"].date() == date(2024, 11, 25)
+    assert calls[0].data["end_date_time"].date() == date(2024, 12, 3)
+    assert calendar.is_closed(date(2024, 11, 28))
+    assert calendar.is_closed(date(2024, 11, 29))
+    assert not calendar.is_closed(date(2024, 11, 30))
+    assert calendar.dismissal(date(2024, 11, 26)) == time(12, 30)
+    assert calendar.dismissal(date(2024, 11, 27)) is None
+    assert calendar.dismissal(date(2024, 12, 2)) == time(11, 45)
+
+
+async def test_index_unreadable(
+    hass: HomeAssistant, tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test a calendar that cannot be read leaves every day open."""
+    hass.config.config_dir = str(tmp_path)
+    missing_file = SchoolCalendar(hass, "missing.ics", KEYWORD)
+    missing_entity = SchoolCalendar(hass, "calendar.missing", KEYWORD)
+
+    await missing_file.async_index(date(2024, 11, 25), DAYS)
+    await missing_entity.async_index(date(2024, 11, 25), DAYS)
+
+    assert not missing_file.is_closed(date(2024, 11, 28))
+    assert not missing_entity.is_closed(date(2024, 11, 28))
+    assert "Unable to read the school calendar missing.ics" in caplog.text
+    assert "Unable to read the school calendar calendar.missing" in caplog.text
+
+
+async def test_index_retried_after_failure(
+    hass: HomeAssistant, tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test a calendar that could not be read is read again the same day."""
+    await hass.config.async_set_time_zone("America/Los_Angeles")
+    hass.config.config_dir = str(tmp_path)
+    calendar = SchoolCalendar(hass, "school.ics", KEYWORD)
+
+    await calendar.async_index(date(2024, 11, 25), DAYS)
+    await calendar.async_index(date(2024, 11, 25), DAYS)
+    # the failure is only warned about once a day.
+    assert [
+        record.levelno for record in caplog.records if record.levelno >= logging.WARNING
+    ] == [logging.WARNING]
+
+    (tmp_path / "school.ics").write_text(ICS)
+    await calendar.async_index(date(2024, 11, 25), DAYS)
+
+    assert calendar.is_closed(date(2024, 11, 28))
+
+
+async def test_without_calendar(hass: HomeAssistant) -> None:
+    """Test every day is open without a calendar."""
+    calendar = SchoolCalendar(hass, "", KEYWORD)
+
+    await calendar.async_index(date(2024, 11, 25), DAYS)
+
+    assert not calendar.is_closed(date(2024, 11, 28))
+    assert calendar.dismissal(date(2024, 11, 26)) is None
@@ -1,12 +1,33 @@
 """Test the sensor module."""
 
+from datetime import UTC, datetime, time, timedelta
 from unittest.mock import AsyncMock, MagicMock, patch
 
+from homeassistant.components.sensor import SensorStateClass
+from homeassistant.const import EntityCategory
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
 
+from custom_components.here_comes_the_bus.arrival_model import (
+    PLACE_STOP,
+    ArrivalPrediction,
+)
+from custom_components.here_comes_the_bus.const import DOMAIN
+from custom_components.here_comes_the_bus.coordinator import TimeOfDay
 from custom_components.here_comes_the_bus.data import StudentData
+from custom_components.here_comes_the_bus.metrics import (
+    Freshness,
+    ProcessingMetrics,
+    RequestMetrics,
+)
 from custom_components.here_comes_the_bus.sensor import (
     ENTITY_DESCRIPTIONS,
+    FRESHNESS_DESCRIPTION,
+    METRIC_DESCRIPTIONS,
+    PREDICTED_ARRIVAL_DESCRIPTIONS,
+    HCBFreshnessSensor,
+    HCBMetricSensor,
+    HCBPredictedArrivalSensor,
     HCBSensor,
     async_setup_entry,
 )
@@ -24,13 +45,34 @@ async def test_sensor_setup_entry(hass: HomeAssistant) -> None:
             first_name="Bob", student_id="student2", has_mid_stops=False
         ),
     }
-    entry.runtime_data = MagicMock(coordinator=coordinator)
+    coordinator.freshness = {}
+    schedule_coordinator = MagicMock(data=coordinator.data)
+    entry.runtime_data = MagicMock(
+        coordinator=coordinator, schedule_coordinator=schedule_coordinator
+    )
     async_add_entities = AsyncMock()
 
     await async_setup_entry(hass, entry, async_add_entities)
 
-    # Convert the generator expression to a list
-    sensors = list(async_add_entities.call_args[0][0])
+    entities = async_add_entities.call_args[0][0]
+    sensors = [entity for entity in entities if isinstance(entity, HCBSensor)]
+    # the freshness sensors are added once the buses are seen.
+    assert not any(isinstance(entity, HCBFreshnessSensor) for entity in entities)
+    metric_sensors = [
+        entity for entity in entities if isinstance(entity, HCBMetricSensor)
+    ]
+    assert len(metric_sensors) == len(METRIC_DESCRIPTIONS)
+    # the mid predictions are only added for the students with mid stops
+    predicted_sensors = [
+        entity for entity in entities if isinstance(entity, HCBPredictedArrivalSensor)
+    ]
+    assert len(predicted_sensors) == 2 * len(PREDICTED_ARRIVAL_DESCRIPTIONS) - 2
+    # the arrival times come from the schedule, everything else is polled
+    for sensor in sensors:
+        if sensor.entity_description.key.endswith("_arrival_time"):
+            assert sensor.coordinator is schedule_coordinator
+        else:
+            assert sensor.coordinator is coordinator
 
     # Assert that async_add_entities was called with the expected sensors
     assert async_add_entities.call_count == 1
@@ -61,6 +103,14 @@ async def test_sensor_properties() -> None:
     sensor = HCBSensor(coordinator, description, student)
     assert sensor.native_value == student.speed
     assert sensor.native_unit_of_measurement == "mph"
+    # the speed goes to the long term statistics.
+    assert sensor.state_class == SensorStateClass.MEASUREMENT
+    assert sensor.entity_registry_enabled_default is True
+
+    # the log time changes with every location.
+    description = ENTITY_DESCRIPTIONS[4]  # "log_time" sensor
+    sensor = HCBSensor(coordinator, description, student)
+    assert sensor.entity_registry_enabled_default is False
 
 
 async def test_sensor_coordinator_update_empty_data() -> None:
@@ -99,6 +149,10 @@ async def test_sensor_coordinator_update() -> None:
     sensor = HCBSensor(coordinator, description, student)
 
     coordinator.data = {student.student_id: student}
+
+    coordinator.changes = {student.student_id: {description.key}}
+
+    coordinator.last_update_success = True
     with patch.object(sensor, "async_write_ha_state") as mock_write_state:
         sensor._handle_coordinator_update()
         mock_write_state.assert_called_once()
@@ -112,3 +166,200 @@ async def test_native_value_with_valid_value_fn() -> None:
     sensor = HCBSensor(coordinator, description, student)
 
     assert sensor.native_value == student.bus_name
+
+
+async def test_metric_sensors() -> None:
+    """Test the metric sensors read the metrics of the entry and coordinators."""
+    entry = MagicMock(entry_id="entry1")
+    entry.runtime_data.requests = RequestMetrics()
+    entry.runtime_data.requests.record("s1158", 0.2, 0.001, on_loop=True, size=100)
+    entry.runtime_data.requests.record_error("s1158")
+    # the calls of the other entries sharing the client do not count.
+    entry.runtime_data.client.metrics = RequestMetrics()
+    entry.runtime_data.client.metrics.record("s1157", 0.2, 0.001, on_loop=True)
+    entry.runtime_data.coordinator.processing = ProcessingMetrics()
+    entry.runtime_data.schedule_coordinator.processing = ProcessingMetrics()
+    with entry.runtime_data.schedule_coordinator.processing.timed("update_stops"):
+        pass
+    sensors = {
+        description.key: HCBMetricSensor(entry, description)
+        for description in METRIC_DESCRIPTIONS
+    }
+
+    latency = sensors["s1158_latency_p95"]
+    assert 200 <= latency.native_value <= 240  # noqa: PLR2004
+    assert latency.unique_id == "entry1_s1158_latency_p95"
+    assert latency.entity_registry_enabled_default is False
+    assert latency.entity_category == EntityCategory.DIAGNOSTIC
+    assert sensors["s1158_calls"].native_value == 1
+    assert sensors["s1158_errors"].native_value == 1
+    assert sensors["s1158_bytes_received"].native_value == 100  # noqa: PLR2004
+    # nothing was called yet.
+    assert sensors["s1157_calls"].native_value == 0
+    assert sensors["s1157_latency_p50"].native_value is None
+    assert sensors["update_stops_p95"].native_value is not None
+    assert sensors["update_vehicle_location_p95"].native_value is None
+
+
+async def test_freshness_sensors_are_added_per_bus(hass: HomeAssistant) -> None:
+    """Test a freshness sensor is added for every bus until it is forgotten."""
+    entry = MagicMock(entry_id="entry1")
+    coordinator = entry.runtime_data.coordinator
+    coordinator.data = {}
+    coordinator.freshness = {}
+    async_add_entities = MagicMock()
+
+    await async_setup_entry(hass, entry, async_add_entities)
+    add_new_buses = coordinator.async_add_listener.call_args[0][0]
+    entry.async_on_unload.assert_called_once_with(
+        coordinator.async_add_listener.return_value
+    )
+
+    # two students riding the same bus share its sensor.
+    coordinator.freshness = {"123": Freshness()}
+    add_new_buses()
+    add_new_buses()
+    coordinator.freshness["456"] = Freshness()
+    add_new_buses()
+
+    added = [
+        [sensor.bus_name for sensor in call.args[0]]
+        for call in async_add_entities.call_args_list[1:]
+    ]
+    assert added == [["123"], ["456"]]
+
+    # the sensors of the forgotten buses are removed from the registry.
+    registry = er.async_get(hass)
+    sensor = async_add_entities.call_args_list[1].args[0][0]
+    sensor.registry_entry = registry.async_get_or_create(
+        "sensor", DOMAIN, sensor.unique_id
+    )
+    sensor.entity_id = sensor.registry_entry.entity_id
+    coordinator.freshness = {}
+    add_new_buses()
+    assert registry.async_get(sensor.entity_id) is None
+
+    # a bus seen again gets a new sensor.
+    coordinator.freshness = {"123": Freshness()}
+    add_new_buses()
+    assert [
+        sensor.bus_name for sensor in async_add_entities.call_args_list[-1].args[0]
+    ] == ["123"]
+
+
+async def test_freshness_sensor() -> None:
+    """Test the freshness sensor shows the age of the last fix of the bus."""
+    entry = MagicMock(entry_id="entry1")
+    coordinator = entry.runtime_data.coordinator
+    coordinator.stale = set()
+    coordinator.freshness = {}
+    coordinator.data = {
+        "student1": StudentData(
+            first_name="Alice", student_id="student1", bus_name="123"
+        ),
+        "student2": StudentData(
+            first_name="Bob", student_id="student2", bus_name="456"
+        ),
+    }
+    sensor = HCBFreshnessSensor(entry, "123", FRESHNESS_DESCRIPTION)
+
+    assert sensor.native_value is None
+    assert sensor.name == "Bus 123 Freshness"
+    assert sensor.unique_id == "entry1_123_freshness"
+    assert sensor.entity_category == EntityCategory.DIAGNOSTIC
+    # the percentiles change with every fix, they are not recorded.
+    assert "fix_age_p50" in sensor._unrecorded_attributes
+    assert "last_age" not in sensor._unrecorded_attributes
+
+    freshness = Freshness()
+    log_time = datetime(2024, 10, 31, 7, 15, tzinfo=UTC)
+    freshness.record_fetch(log_time, log_time + timedelta(seconds=12.34))
+    coordinator.freshness["123"] = freshness
+
+    assert sensor.native_value == 12.3  # noqa: PLR2004
+    attributes = sensor.extra_state_attributes
+    assert attributes["stale"] is False
+    assert 12.34 <= attributes["fix_age_p50"] <= 15  # noqa: PLR2004
+    assert attributes["fix_interval_p50"] is None
+    assert "last_age" not in attributes
+
+    # only a student riding the bus makes it stale.
+    coordinator.stale = {"student2"}
+    assert sensor.extra_state_attributes["stale"] is False
+    coordinator.stale = {"student1"}
+    assert sensor.extra_state_attributes["stale"] is True
+
+
+async def test_freshness_sensor_writes_new_fixes() -> None:
+    """Test the freshness sensor is written when its bus has a new fix."""
+    entry = MagicMock(entry_id="entry1")
+    coordinator = entry.runtime_data.coordinator
+    coordinator.last_update_success = True
+    coordinator.stale = set()
+    coordinator.freshness = {}
+    coordinator.data = {
+        "student1": StudentData(
+            first_name="Alice", student_id="student1", bus_name="123"
+        ),
+        "student2": StudentData(
+            first_name="Bob", student_id="student2", bus_name="456"
+        ),
+    }
+    sensor = HCBFreshnessSensor(entry, "123", FRESHNESS_DESCRIPTION)
+
+    with patch.object(sensor, "async_write_ha_state") as mock_write_state:
+        # another bus has a new fix.
+        coordinator.changes = {"student2": {"log_time"}}
+        sensor._handle_coordinator_update()
+        mock_write_state.assert_not_called()
+
+        coordinator.changes = {"student1": {"log_time", "speed"}}
+        sensor._handle_coordinator_update()
+        mock_write_state.assert_called_once()
+
+        # the staleness of the bus changed without a new fix.
+        coordinator.changes = {}
+        coordinator.stale = {"student1"}
+        sensor._handle_coordinator_update()
+        assert mock_write_state.call_count == 2  # noqa: PLR2004
+
+
+async def test_predicted_arrival_sensor() -> None:
+    """Test the predicted arrival sensor shows the learned arrival of today."""
+    coordinator = MagicMock(stale=set())
+    coordinator.arrivals.predict.return_value = None
+    student = StudentData(first_name="Alice", student_id="student1")
+    description = PREDICTED_ARRIVAL_DESCRIPTIONS[0]
+    sensor = HCBPredictedArrivalSensor(coordinator, student, description)
+
+    assert sensor.should_poll is False
+    assert sensor.data_fields == frozenset()
+    assert sensor.name == "Alice Bus AM stop predicted arrival"
+    assert sensor.native_value is None
+    assert sensor.extra_state_attributes == {"stale": False}
+
+    coordinator.arrivals.predict.return_value = ArrivalPrediction(
+        arrival=time(7, 20),
+        low=time(7, 16, 30),
+        high=time(7, 25),
+        mean=time(7, 20, 30),
+        std_dev=150,
+        samples=12,
+    )
+    with patch(
+        "homeassistant.util.dt.now",
+        return_value=datetime(2024, 10, 31, 6, 0, tzinfo=UTC),
+    ):
+        assert sensor.native_value == time(7, 20)
+        attributes = sensor.extra_state_attributes
+    coordinator.arrivals.predict.assert_called_with(
+        "student1", TimeOfDay.AM, PLACE_STOP, 3
+    )
+    assert attributes == {
+        "stale": False,
+        "low": "07:16:30",
+        "high": "07:25:00",
+        "mean": "07:20:30",
+        "std_dev_minutes": 2.5,
+        "samples": 12,
+    }
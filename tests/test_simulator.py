@@ -0,0 +1,184 @@
+"""
+Tests of the synthetic school day.
+
+`scripts/simulate` runs the full size fleet and prints the report.
+"""
+
+import sys
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from custom_components.here_comes_the_bus.coordinator import TimeOfDay
+from custom_components.here_comes_the_bus.device_tracker import HCBTracker
+from custom_components.here_comes_the_bus.sensor import HCBFreshnessSensor, HCBSensor
+
+from .simulator import (
+    COMPASS,
+    DWELL,
+    MESSAGE_CODE_DRIVING,
+    MESSAGE_CODE_STOPPED,
+    WARM_UP,
+    SimulatedClient,
+    async_simulate_day,
+)
+
+DAY = date(2024, 10, 30)
+
+
+@contextmanager
+def _now(dt_now: datetime) -> Iterator[None]:
+    """Freeze the time seen by the simulated client."""
+    with patch("homeassistant.util.dt.now", return_value=dt_now):
+        yield
+
+
+def test_simulated_track() -> None:
+    """Test the bus warms up, drives between the stops and parks."""
+    client = SimulatedClient(4, 2, DAY, latent_rate=0)
+    bus = client.buses[0]
+    route = bus.routes[TimeOfDay.AM]
+
+    with _now(route[0].arrival - WARM_UP - timedelta(minutes=1)):
+        parked = client.vehicle_location(bus, TimeOfDay.AM)
+    with _now(route[0].arrival):
+        stopped = client.vehicle_location(bus, TimeOfDay.AM)
+    driving_time = route[0].arrival + DWELL + (route[1].arrival - route[0].arrival) / 2
+    with _now(driving_time):
+        driving = client.vehicle_location(bus, TimeOfDay.AM)
+    with _now(route[-1].arrival + DWELL + timedelta(minutes=1)):
+        done = client.vehicle_location(bus, TimeOfDay.AM)
+
+    assert not parked.ignition
+    assert parked.speed == 0
+    assert stopped.ignition
+    assert stopped.speed == 0
+    assert stopped.message_code == MESSAGE_CODE_STOPPED
+    assert (stopped.latitude, stopped.longitude) == (
+        route[0].latitude,
+        route[0].longitude,
+    )
+    assert driving.ignition
+    assert driving.speed > 0
+    assert driving.message_code == MESSAGE_CODE_DRIVING
+    assert driving.heading in COMPASS
+    assert min(route[0].latitude, route[1].latitude) <= driving.latitude
+    assert driving.latitude <= max(route[0].latitude, route[1].latitude)
+    assert not done.ignition
+    assert (done.latitude, done.longitude) == (route[-1].latitude, route[-1].longitude)
+    assert not any((parked.latent, stopped.latent, driving.latent, done.latent))
+
+
+def test_simulated_latent_location() -> None:
+    """Test a latent location repeats the last one reported."""
+    client = SimulatedClient(1, 1, DAY, latent_rate=1)
+    bus = client.buses[0]
+    route = bus.routes[TimeOfDay.AM]
+
+    with _now(route[0].arrival):
+        reported = client.vehicle_location(bus, TimeOfDay.AM)
+    with _now(route[-1].arrival):
+        latent = client.vehicle_location(bus, TimeOfDay.AM)
+
+    assert not reported.latent
+    assert latent.latent
+    assert latent.log_time == reported.log_time
+    assert latent.latitude == reported.latitude
+
+
+async def test_simulated_stops() -> None:
+    """Test the stops of the students follow the routes of their bus."""
+    client = SimulatedClient(8, 2, DAY, latent_rate=0)
+
+    with _now(datetime(2024, 10, 30, 7, 0, tzinfo=dt_util.get_default_time_zone())):
+        am = await client.get_stop_info("", "", "student0", TimeOfDay.AM)
+        mid = await client.get_stop_info("", "", "student0", TimeOfDay.MID)
+        pm = await client.get_stop_info("", "", "student0", TimeOfDay.PM)
+        no_mid = await client.get_stop_info("", "", "student1", TimeOfDay.MID)
+    account = await client.get_parent_info("", "", "")
+
+    assert [stop.stop_type for stop in am.student_stops] == ["Stop", "School"]
+    assert [stop.stop_type for stop in mid.student_stops] == ["School", "Stop"]
+    assert [stop.stop_type for stop in pm.student_stops] == ["School", "Stop"]
+    # the student is picked up and dropped off at home.
+    assert (am.student_stops[0].latitude, am.student_stops[0].longitude) == (
+        pm.student_stops[1].latitude,
+        pm.student_stops[1].longitude,
+    )
+    assert am.vehicle_location is not None
+    assert am.vehicle_location.name == client.students["student0"].bus.name
+    assert no_mid.student_stops == []
+    assert no_mid.vehicle_location is None
+    assert [student.student_id for student in account.students] == list(client.students)
+
+
+@pytest.mark.parametrize(
+    ("students", "buses"),
+    [
+        (8, 3),
+        pytest.param(50, 20, marks=pytest.mark.slow),
+    ],
+)
+async def test_simulate_school_day(
+    hass: HomeAssistant, students: int, buses: int
+) -> None:
+    """Test a whole school day of a fleet, printing what it cost."""
+    client = SimulatedClient(students, buses, DAY)
+
+    report = await async_simulate_day(hass, client, DAY)
+    sys.stdout.write(report.format())
+
+    assert report.students == students
+    assert report.buses == buses
+    assert report.polls > 0
+    # the schedule, then at least one location per poll.
+    assert report.api_calls >= 2 + students * 3 + report.polls
+    assert report.state_writes >= report.recorded_states > 0
+    assert report.recorded_states >= report.recorded_attributes > 0
+    assert report.memory_peak > 0
+    assert report.loop_lag_max >= report.loop_lag_mean >= 0
+
+
+async def test_simulate_school_day_throttled(hass: HomeAssistant) -> None:
+    """
+    Test the recorder writes fewer rows than before the recorder changes.
+
+    The baseline records every attribute of the freshness sensors and the
+    tracker, enables the log time sensors and does not throttle the
+    trackers, as the integration did before. The default leaves those
+    attributes and sensors out and throttles the trackers by time, the
+    throttled day also holds them back by distance.
+    """
+    with (
+        patch.object(HCBFreshnessSensor, "_unrecorded_attributes", frozenset()),
+        patch.object(HCBTracker, "_unrecorded_attributes", frozenset()),
+        patch.object(HCBSensor, "entity_registry_enabled_default", True),  # noqa: FBT003
+    ):
+        baseline = await async_simulate_day(
+            hass,
+            SimulatedClient(8, 3, DAY, seed=1),
+            DAY,
+            tracker_min_interval=0,
+            tracker_min_distance=0,
+        )
+    report = await async_simulate_day(hass, SimulatedClient(8, 3, DAY, seed=1), DAY)
+    throttled = await async_simulate_day(
+        hass,
+        SimulatedClient(8, 3, DAY, seed=1),
+        DAY,
+        tracker_min_interval=60,
+        tracker_min_distance=100,
+    )
+    sys.stdout.write(baseline.format() + report.format() + throttled.format())
+
+    assert throttled.polls == report.polls == baseline.polls
+    assert report.recorded_attributes < baseline.recorded_attributes
+    assert throttled.recorded_attributes < report.recorded_attributes
+    assert report.state_writes < baseline.state_writes
+    assert report.recorded_states < baseline.recorded_states
+    assert throttled.recorded_states < report.recorded_states
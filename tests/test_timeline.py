@@ -0,0 +1,167 @@
+"""Tests of the timeline of the bus windows."""
+
+from datetime import time
+
+from custom_components.here_comes_the_bus.coordinator import (
+    WINDOW_PREFIXES,
+    TimeOfDay,
+)
+from custom_components.here_comes_the_bus.data import StudentData
+from custom_components.here_comes_the_bus.timeline import BusWindow, DayTimeline
+
+
+def _timeline() -> DayTimeline:
+    """Return the timeline of two students whose windows overlap."""
+    return DayTimeline(
+        [
+            BusWindow("student2", TimeOfDay.PM, time(13, 0), time(14, 0)),
+            BusWindow("student1", TimeOfDay.AM, time(7, 0), time(8, 0)),
+            BusWindow("student2", TimeOfDay.AM, time(7, 30), time(9, 0)),
+            BusWindow("student1", TimeOfDay.PM, time(13, 30), time(15, 0)),
+            BusWindow("student1", TimeOfDay.MID, time(13, 0), time(13, 45)),
+        ]
+    )
+
+
+def test_riding() -> None:
+    """Test the students riding at a time and the time of day of their bus."""
+    timeline = _timeline()
+
+    assert timeline.riding(time(6, 59)) == {}
+    assert timeline.riding(time(7, 0)) == {"student1": TimeOfDay.AM}
+    assert timeline.riding(time(7, 45)) == {
+        "student1": TimeOfDay.AM,
+        "student2": TimeOfDay.AM,
+    }
+    # the end of a window is included.
+    assert timeline.riding(time(8, 0)) == {
+        "student1": TimeOfDay.AM,
+        "student2": TimeOfDay.AM,
+    }
+    assert timeline.riding(time(8, 0, 0, 1)) == {"student2": TimeOfDay.AM}
+    assert timeline.riding(time(10, 0)) == {}
+    assert timeline.riding(time(15, 0, 0, 1)) == {}
+
+
+def test_riding_overlapping_windows() -> None:
+    """Test the window that started last is used when windows overlap."""
+    timeline = _timeline()
+
+    assert timeline.riding(time(13, 15)) == {
+        "student1": TimeOfDay.MID,
+        "student2": TimeOfDay.PM,
+    }
+    assert timeline.riding(time(13, 40)) == {
+        "student1": TimeOfDay.PM,
+        "student2": TimeOfDay.PM,
+    }
+    assert timeline.riding(time(14, 30)) == {"student1": TimeOfDay.PM}
+
+
+def test_next_start() -> None:
+    """Test the first window start after a time."""
+    timeline = _timeline()
+
+    assert timeline.next_start() == time(7, 0)
+    assert timeline.next_start(time(7, 0)) == time(7, 30)
+    assert timeline.next_start(time(9, 0)) == time(13, 0)
+    assert timeline.next_start(time(13, 30)) is None
+    assert DayTimeline([]).next_start() is None
+    assert DayTimeline([]).riding(time(7, 0)) == {}
+
+
+def test_from_students() -> None:
+    """Test the windows are derived from the stops of the students."""
+    data = {
+        student_id: StudentData(
+            first_name=student_id,
+            student_id=student_id,
+            am_start_time=time(9, 45),
+            am_end_time=time(11, 15),
+            has_mid_stops=has_mid_stops,
+            mid_start_time=time(11, 0),
+            mid_end_time=time(12, 0),
+            pm_start_time=time(13, 0),
+            pm_end_time=time(14, 0),
+        )
+        for student_id, has_mid_stops in (("student1", True), ("student2", False))
+    }
+
+    timeline = DayTimeline.from_students(data, WINDOW_PREFIXES)
+
+    # student2 has no MID stops, so has no MID window.
+    assert [
+        (window.student_id, window.time_of_day_id) for window in timeline.windows
+    ] == [
+        ("student1", TimeOfDay.AM),
+        ("student2", TimeOfDay.AM),
+        ("student1", TimeOfDay.MID),
+        ("student1", TimeOfDay.PM),
+        ("student2", TimeOfDay.PM),
+    ]
+    # a late start keeps the AM bus running after 10:00.
+    assert timeline.riding(time(10, 30)) == {
+        "student1": TimeOfDay.AM,
+        "student2": TimeOfDay.AM,
+    }
+    assert timeline.riding(time(11, 10)) == {
+        "student1": TimeOfDay.MID,
+        "student2": TimeOfDay.AM,
+    }
+    # an early dismissal starts the PM bus before 13:30.
+    assert timeline.riding(time(13, 0)) == {
+        "student1": TimeOfDay.PM,
+        "student2": TimeOfDay.PM,
+    }
+
+
+def test_from_students_early_release() -> None:
+    """Test the PM window is moved to the dismissal of an early release."""
+    data = {
+        "student1": StudentData(
+            first_name="student1",
+            student_id="student1",
+            pm_start_time=time(15, 0),
+            pm_end_time=time(16, 0),
+            pm_school_arrival_time=time(15, 30),
+        ),
+        # without a school stop the window opens before the dismissal.
+        "student2": StudentData(
+            first_name="student2",
+            student_id="student2",
+            pm_start_time=time(14, 0),
+            pm_end_time=time(15, 0),
+        ),
+    }
+
+    timeline = DayTimeline.from_students(data, WINDOW_PREFIXES, time(12, 0))
+
+    assert [
+        (window.student_id, window.time_of_day_id, window.start, window.end)
+        for window in timeline.windows
+        if window.time_of_day_id == TimeOfDay.PM
+    ] == [
+        ("student1", TimeOfDay.PM, time(11, 30), time(12, 30)),
+        ("student2", TimeOfDay.PM, time(11, 30), time(12, 30)),
+    ]
+
+
+def test_from_students_late_dismissal() -> None:
+    """Test a dismissal after the bus usually leaves does not move the window."""
+    data = {
+        "student1": StudentData(
+            first_name="student1",
+            student_id="student1",
+            pm_start_time=time(15, 0),
+            pm_end_time=time(16, 0),
+            pm_school_arrival_time=time(15, 30),
+        ),
+    }
+
+    timeline = DayTimeline.from_students(data, WINDOW_PREFIXES, time(19, 0))
+
+    assert [
+        (window.start, window.end)
+        for window in timeline.windows
+        if window.time_of_day_id == TimeOfDay.PM
+    ] == [(time(15, 0), time(16, 0))]